@@ -6,6 +6,7 @@ from abc import ABCMeta, abstractmethod
 import argparse
 import sys
 
+from dpa.action.timing import ActionTimer
 from dpa.logging import Logger
 from dpa.ptask.area import PTaskArea
 
@@ -34,13 +35,17 @@ class Action(object):
     # Class methods:
     # ------------------------------------------------------------------------
     @classmethod
-    def cli(cls):
+    def cli(cls, args=None):
         """Execute the action from a command line context. 
 
-        Automatically sets the 'interactive' property to True.
+        Parses the supplied args, or the process' command line args if none
+        are supplied. Automatically sets the 'interactive' property to True.
 
         """
 
+        if args is None:
+            args = sys.argv[1:]
+
         # ----- add common options
 
         # log_level option for stdout
@@ -54,14 +59,35 @@ class Action(object):
             type=str,
         )
 
+        # timing option to print the action's phase timing tree
+        log_level_parser.add_argument(
+            '--timing',
+            action='store_true',
+            help="print the time spent in each phase of the action.",
+        )
+
         # set the log level for stdout
-        (parsed, remainder) = log_level_parser.parse_known_args()
+        (parsed, remainder) = log_level_parser.parse_known_args(args)
         Logger.set_level(parsed.log_level)
         
         # parse the remaining args
-        parser = cls.get_parser()
-        cls.setup_cl_args(parser)
-        kwargs = vars(parser.parse_args(remainder))
+        kwargs = vars(cls.get_cl_parser().parse_args(remainder))
+
+        # because we're running on the command line, set the interactive
+        # property to True
+        return cls.run(interactive=True, timing=parsed.timing, **kwargs)
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def run(cls, interactive=False, timing=False, **kwargs):
+        """Create an instance of the action from kwargs and execute it.
+
+        If ``timing`` is True, an interactive action prints the time spent in
+        each of its phases when it completes.
+
+        Returns the :py:class:`ActionRunStatus` of the execution.
+
+        """
 
         # create the instance
         try:
@@ -72,9 +98,8 @@ class Action(object):
             cls.get_logger().critical(str(e))
             return ActionRunStatus.FAILURE
 
-        # because we're running on the command line, set the interactive
-        # property to True
-        instance.interactive = True
+        instance.interactive = interactive
+        instance.timing = timing
 
         # call the action
         try:
@@ -111,6 +136,22 @@ class Action(object):
                 description=cls.get_description())
         return cls._parser
 
+    # ------------------------------------------------------------------------
+    @classmethod
+    def get_cl_parser(cls):
+        """Returns the class' parser with its command line args set up.
+
+        The args are only set up once, so the parser can be reused to parse
+        any number of command lines.
+
+        """
+
+        parser = cls.get_parser()
+        if not cls.__dict__.get('_cl_args_setup', False):
+            cls.setup_cl_args(parser)
+            cls._cl_args_setup = True
+        return parser
+
     # ------------------------------------------------------------------------
     @classmethod
     def setup_cl_args(cls, parser):
@@ -133,55 +174,67 @@ class Action(object):
         self._args = args
         self._kwargs = kwargs
         self._interactive = False
+        self._timing = False
 
     # ------------------------------------------------------------------------
     def __call__(self):
 
-        # log the action
-        if self.__class__.logging:
-            self.log_action()
-
-        # if the action is being executed interactively, prompt the user for 
-        # any missing properties.
-        if self.interactive:
+        # time each phase, including any actions nested within them
+        with ActionTimer(self, print_tree=self.timing) as timer:
+
+            # log the action
+            if self.__class__.logging:
+                with timer.phase("log_action"):
+                    self.log_action()
+
+            # if the action is being executed interactively, prompt the user
+            # for any missing properties.
+            if self.interactive:
+                try:
+                    with timer.phase("prompt"):
+                        self.prompt()
+                except ActionAborted as e:
+                    print "\nAborted: " + str(e) + "\n"
+                    self.logger.info(str(e))
+                    return
+                except ActionError as e:
+                    self.logger.error(str(e))
+                    return
+
+            # validate the action's properties before continuing
             try:
-                self.prompt()
-            except ActionAborted as e:
-                print "\nAborted: " + str(e) + "\n"
-                self.logger.info(str(e))
-                return
+                with timer.phase("validate"):
+                    self.validate() 
             except ActionError as e:
                 self.logger.error(str(e))
                 return
 
-        # validate the action's properties before continuing
-        try:
-            self.validate() 
-        except ActionError as e:
-            self.logger.error(str(e))
-            return
+            # XXX make sure this action is in accordance with the rules
 
-        # XXX make sure this action is in accordance with the rules
+            # verify that the user wishes to continue with the validated
+            # properties
+            if self.interactive:
+                try:
+                    with timer.phase("verify"):
+                        self.verify()
+                except ActionAborted as e:
+                    print "\nAborted: " + str(e) + "\n"
+                    self.logger.info(str(e))
+                    return
 
-        # verify that the user wishes to continue with the validated properties
-        if self.interactive:
+            # execute the action
             try:
-                self.verify()
-            except ActionAborted as e:
-                print "\nAborted: " + str(e) + "\n"
-                self.logger.info(str(e))
-                return
-
-        # execute the action
-        try:
-            self.execute()
-        except ActionError as e:
-            self.logger.error(str(e))
-            self.logger.debug("Attempting to undo: " + self.full_name)
-            self.undo()
-            raise e
-        else:
-            self.notify()
+                with timer.phase("execute"):
+                    self.execute()
+            except ActionError as e:
+                self.logger.error(str(e))
+                self.logger.debug("Attempting to undo: " + self.full_name)
+                with timer.phase("undo"):
+                    self.undo()
+                raise e
+            else:
+                with timer.phase("notify"):
+                    self.notify()
 
     # ------------------------------------------------------------------------
     # Methods:
@@ -265,6 +318,18 @@ class Action(object):
         """Sets the interactive state of the action."""
         self._interactive = value
 
+    # ------------------------------------------------------------------------
+    @property
+    def timing(self):
+        """:returns: bool, True if phase timing is printed on completion"""
+        return self._timing
+
+    # ------------------------------------------------------------------------
+    @timing.setter
+    def timing(self, value):
+        """Sets whether phase timing is printed on completion."""
+        self._timing = value
+
     # ------------------------------------------------------------------------
     @property
     def logger(self):
@@ -0,0 +1,163 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.action.tests.test_timing
+# -----------------------------------------------------------------------------
+"""Unit tests for dpa action timing."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import json
+import threading
+import unittest
+
+from dpa.action import Action, ActionError
+from dpa.action.timing import ActionTimer
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all action timing tests."""
+
+    return unittest.TestSuite([
+        ActionTimerTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test actions:
+# -----------------------------------------------------------------------------
+class _InnerAction(Action):
+    """Inner test action."""
+
+    name = "inner"
+    target_type = "test"
+    logging = False
+
+    def execute(self):
+        pass
+
+    def undo(self):
+        pass
+
+# -----------------------------------------------------------------------------
+class _OuterAction(Action):
+    """Outer test action. Calls the inner action twice."""
+
+    name = "outer"
+    target_type = "test"
+    logging = False
+
+    def execute(self):
+        _InnerAction()()
+        _InnerAction()()
+
+    def undo(self):
+        pass
+
+# -----------------------------------------------------------------------------
+class _FailAction(Action):
+    """Failing test action."""
+
+    name = "fail"
+    target_type = "test"
+    logging = False
+
+    def execute(self):
+        raise ActionError("failed")
+
+    def undo(self):
+        pass
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class ActionTimerTestCase(unittest.TestCase):
+    """ActionTimer tree tests."""
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_nested_actions(self):
+        """ActionTimer records nested actions under the calling phase"""
+
+        outer = _OuterAction()
+        with ActionTimer(outer) as timer:
+            outer()
+
+        outer_node = timer.node.children[0]
+        self.assertEqual(outer_node.name, "outer.test")
+        self.assertEqual(
+            [c.name for c in outer_node.children],
+            ["validate", "execute", "notify"],
+        )
+
+        execute_node = outer_node.children[1]
+        self.assertEqual(len(execute_node.children), 1)
+        inner_node = execute_node.children[0]
+        self.assertEqual(inner_node.name, "inner.test")
+        self.assertEqual(inner_node.kind, "action")
+        self.assertEqual(inner_node.count, 2)
+        self.assertTrue(outer_node.elapsed >= execute_node.elapsed)
+
+        # the record should be json serializable
+        record = json.loads(json.dumps(timer.to_dict()))
+        self.assertEqual(record['action'], "outer.test")
+
+    # -------------------------------------------------------------------------
+    def test_failed_action(self):
+        """ActionTimer records phases of an action that raises"""
+
+        action = _FailAction()
+        with ActionTimer(action) as timer:
+            self.assertRaises(ActionError, action)
+
+        fail_node = timer.node.children[0]
+        self.assertEqual(
+            [c.name for c in fail_node.children],
+            ["validate", "execute", "undo"],
+        )
+
+    # -------------------------------------------------------------------------
+    def test_unmerged(self):
+        """Repeated nested actions are kept apart unless merging"""
+
+        outer = _OuterAction()
+        with ActionTimer(outer, merge=False) as timer:
+            outer()
+
+        execute_node = timer.node.children[0].children[1]
+        self.assertEqual(
+            [(c.name, c.count) for c in execute_node.children],
+            [("inner.test", 1), ("inner.test", 1)],
+        )
+        self.assertTrue(all(c.cpu is not None for c in execute_node.children))
+
+    # -------------------------------------------------------------------------
+    def test_concurrent_cpu(self):
+        """Cpu time is unknown for phases overlapping another thread's timer"""
+
+        started = threading.Event()
+        finish = threading.Event()
+
+        def _other():
+            with ActionTimer(_InnerAction()):
+                started.set()
+                finish.wait(5)
+
+        thread = threading.Thread(target=_other)
+        thread.start()
+        started.wait(5)
+        try:
+            outer = _OuterAction()
+            with ActionTimer(outer) as timer:
+                outer()
+        finally:
+            finish.set()
+            thread.join()
+
+        outer_node = timer.node.children[0]
+        self.assertEqual(outer_node.cpu, None)
+        self.assertTrue(all(c.cpu is None for c in outer_node.children))
+        self.assertTrue(" - ms proc cpu" in
+            "\n".join(timer.node.lines(details=True)))
@@ -0,0 +1,199 @@
+"""Phase level timing for actions.
+
+Classes
+-------
+ActionTimer
+    Times the phases of an action, and of any actions nested within them.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from contextlib import contextmanager
+import json
+import os
+import sys
+import threading
+import time
+
+from dpa.env.vars import DpaVars
+from dpa.profiler import TimingNode
+from dpa.restful.client import RestfulClient
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class ActionTimer(object):
+    """Times the phases of an action and any actions nested within them.
+
+    Usage::
+
+        >>> with ActionTimer(action) as timer:
+        ...     with timer.phase("validate"):
+        ...         action.validate()
+
+    Each phase records wall time, process cpu time and the number of rest
+    requests made during the phase. Timers are tracked per thread. An action
+    called while another action's phase is being timed is recorded as a child
+    of that phase, so the outermost timer holds the tree for the entire run.
+    If ``merge`` is True for the outermost timer, repeated calls of a nested
+    action within a phase are merged into one node with a count.
+
+    Cpu time is process wide. It is unknown (None) for any phase that ran
+    while an action was being timed on another thread, as when a batch runs
+    several actions at once, since that thread's cpu time would be included.
+
+    When the outermost timer completes, the tree is written to the action's
+    log as json. For interactive actions, the tree is also printed to stderr
+    if ``print_tree`` is True or ``$DPA_ACTION_TIMING`` is set.
+
+    """
+
+    # per-thread stack of the timers and nodes being timed
+    _local = threading.local()
+
+    # outermost timers running in any thread, and the number ever started
+    _lock = threading.Lock()
+    _active = 0
+    _started = 0
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, action, print_tree=False, merge=True):
+
+        self._action = action
+        self._print_tree = print_tree
+        self._merge = merge
+        self._node = TimingNode(action.full_name, kind='action')
+        self._parent = None
+        self._root = None
+        self._start = None
+
+    # ------------------------------------------------------------------------
+    def __enter__(self):
+
+        stack = _get_stack()
+        if stack:
+            (self._root, self._parent) = (stack[0][0], stack[-1][1])
+        else:
+            self._root = self
+            with ActionTimer._lock:
+                ActionTimer._active += 1
+                ActionTimer._started += 1
+        stack.append((self._root, self._node))
+        self._start = _snapshot()
+
+        return self
+
+    # ------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        _record(self._node, self._start)
+        _get_stack().pop()
+
+        if self._parent is not None:
+            self._parent.add_child(self._node, merge=self._root.merge)
+        else:
+            with ActionTimer._lock:
+                ActionTimer._active -= 1
+            self._report()
+
+        return False
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    @contextmanager
+    def phase(self, name):
+        """Context manager that times the enclosed block as a phase."""
+
+        node = TimingNode(name, kind='phase')
+        stack = _get_stack()
+        stack.append((self._root, node))
+        start = _snapshot()
+        try:
+            yield node
+        finally:
+            _record(node, start)
+            stack.pop()
+            self._node.add_child(node, merge=self._root.merge)
+
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+        """Returns a json serializable record of the timing tree."""
+
+        return {
+            'action': self._action.full_name,
+            'pid': os.getpid(),
+            'tree': self._node.to_dict(),
+        }
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def merge(self):
+        return self._merge
+
+    # ------------------------------------------------------------------------
+    @property
+    def node(self):
+        return self._node
+
+    # ------------------------------------------------------------------------
+    @property
+    def print_tree(self):
+        return self._print_tree
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _report(self):
+
+        action = self._action
+
+        if action.__class__.logging:
+            action.logger.info(
+                "Timing: " + json.dumps(self.to_dict(), sort_keys=True))
+
+        if action.interactive and (
+            self.print_tree or DpaVars.action_timing().get()):
+            lines = self._node.lines(details=True, ordered=True)
+            sys.stderr.write("\n" + "\n".join(lines) + "\n\n")
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _get_stack():
+
+    stack = getattr(ActionTimer._local, 'stack', None)
+    if stack is None:
+        stack = ActionTimer._local.stack = []
+
+    return stack
+
+# ----------------------------------------------------------------------------
+def _record(node, start):
+
+    (wall, cpu, rest_calls, active, started) = _snapshot()
+    node.elapsed = wall - start[0]
+    node.rest_calls = rest_calls - start[2]
+
+    # another thread's timer running at the start, or started since
+    if start[3] > 1 or started != start[4]:
+        node.cpu = None
+    else:
+        node.cpu = cpu - start[1]
+
+# ----------------------------------------------------------------------------
+def _snapshot():
+
+    times = os.times()
+    with ActionTimer._lock:
+        (active, started) = (ActionTimer._active, ActionTimer._started)
+
+    return (time.time(), times[0] + times[1], RestfulClient.request_count(),
+        active, started)
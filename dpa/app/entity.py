@@ -6,9 +6,12 @@ import os
 from dpa.action import ActionError
 from dpa.action.registry import ActionRegistry
 from dpa.config import Config
+from dpa.product.representation.manifest import RepresentationManifest
 from dpa.ptask.area import PTaskArea
 from dpa.ptask.spec import PTaskSpec
+from dpa.sequence import find_sequences
 from dpa.singleton import Singleton
+from dpa.sync.manifest import ManifestError
 
 # -----------------------------------------------------------------------------
 class EntityRegistry(Singleton):
@@ -47,7 +50,15 @@ class Entity(object):
         import_files = cls.get_import_files(session, name, category,
             representation, relative_to=relative_to)
 
-        # assume files are of form <name>.[<something>].<ext>. 
+        # the base of the longest sequence, without its separator
+        (sequences, others) = find_sequences(
+            [os.path.basename(f) for f in import_files])
+        if sequences:
+            longest = max(sequences, key=lambda s: s.count)
+            return os.path.join(os.path.dirname(import_files[0]),
+                longest.base.rstrip("._"))
+
+        # otherwise assume files are of form <name>.[<something>].<ext>. 
         # Look for the most common <name> and return that part (everything
         # before the first '.'
         
@@ -80,8 +91,11 @@ class Entity(object):
             representation.resolution
         )
 
-        # get the file in the import_dir
-        import_files = os.listdir(import_dir)
+        # get the file in the import_dir, as recorded in its manifest
+        try:
+            import_files = RepresentationManifest.load(import_dir).files
+        except ManifestError as e:
+            raise EntityError("Could not read import directory: " + str(e))
         import_files = [f for f in import_files 
             if f.endswith('.' + representation.type)]
 
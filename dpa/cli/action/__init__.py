@@ -7,7 +7,8 @@ from abc import ABCMeta
 import argparse
 import sys
 
-from dpa.action import Action
+from dpa.action import Action, ActionError
+from dpa.action.registry import ActionRegistry
 from dpa.logging import Logger
 from dpa.ptask.area import PTaskArea
 
@@ -34,4 +35,67 @@ class CommandLineAction(Action):
         msg += " " + " ".join(sys.argv)
 
         self.logger.info(msg)
-        
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def add_action_subparsers(parser):
+    """Add a subparser to the parser for each registered action.
+
+    Each action gets a subparser for each of its target types (unless the
+    target type is 'none'). The parsed args include the matching action
+    class as 'action_class'.
+
+    """
+
+    action_subparsers = parser.add_subparsers(
+        title="Actions",
+    )
+
+    # get all available actions
+    # sort the actions by name + target type
+    registry = ActionRegistry()
+    all_actions = sorted(registry.get_registered_actions(),
+        key=lambda a: a.name + a.target_type )
+
+    by_action = {}
+    for action_class in all_actions:
+        action_name = action_class.name
+        action_list = by_action.setdefault(action_name, [])
+        action_list.append(action_class)
+
+    for action_name in sorted(by_action.keys()):
+
+        action_parser = action_subparsers.add_parser(action_name, help="")
+        target_subparsers = None
+
+        for action_class in by_action[action_name]:
+
+            target_type = action_class.target_type
+
+            # no subparser
+            if target_type.lower() == "none":
+                if len(by_action[action_name]) > 1:
+                    raise ActionError(
+                        "Multiple actions with target of 'none'"
+                    )
+
+                target_parser = action_parser
+            # subparser
+            else:
+                if not target_subparsers:
+                    target_subparsers = action_parser.add_subparsers(
+                        title="Targets",
+                    )
+
+                # add a parser for the target_type
+                target_parser = target_subparsers.add_parser(
+                    target_type,
+                    help=action_class.get_description(),
+                )
+
+            # extend the target_parser based on the action's args
+            action_class.setup_cl_args(target_parser)
+
+            # set the class for this target parser
+            target_parser.set_defaults(action_class=action_class)
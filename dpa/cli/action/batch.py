@@ -0,0 +1,416 @@
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+from multiprocessing.pool import ThreadPool
+import shlex
+import sys
+import threading
+import time
+
+from dpa.action import Action, ActionError, ActionRunStatus
+from dpa.action.registry import ActionRegistry
+from dpa.cli.action import add_action_subparsers
+from dpa.shell.output import Style
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# a line that waits for all previous lines to complete
+WAIT = "wait"
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class BatchAction(Action):
+    """Run many dpa actions, one per line, in a single process.
+
+    Each line of input is either a dpa command line (the leading 'dpa' is
+    optional) or json. Json lines may be a list of command line args, or an
+    object specifying the action, target and keyword args::
+
+        create ptask shot_010 -t shot -d "Shot 010"
+        ["create", "ptask", "shot_020", "-t", "shot", "-d", "Shot 020"]
+        {"action": "create", "target": "ptask", "args": {"spec": "shot_030"}}
+
+    Blank lines and lines starting with '#' are ignored. A 'wait' line waits
+    for all previous lines to complete before continuing. Actions run
+    non-interactively. A json status is written for each line.
+
+    """
+
+    name = "batch"
+    target_type = "none"
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "input",
+            nargs="?",
+            default=None,
+            help="File of actions to run, one per line. Reads from stdin " + \
+                 "if not supplied or '-'. An interactive prompt is " + \
+                 "presented if stdin is a terminal.",
+        )
+
+        parser.add_argument(
+            "-j", "--jobs",
+            type=int,
+            default=1,
+            help="Number of lines to run concurrently.",
+        )
+
+        parser.add_argument(
+            "-o", "--output",
+            default=None,
+            help="Write the json line statuses to this file, not stdout.",
+        )
+
+        parser.add_argument(
+            "-x", "--stop",
+            action="store_true",
+            help="Stop running new lines after the first failure.",
+        )
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, input=None, jobs=1, output=None, stop=False):
+
+        super(BatchAction, self).__init__(
+            input=input,
+            jobs=jobs,
+            output=output,
+            stop=stop,
+        )
+
+        self._input = input
+        self._jobs = jobs
+        self._output = output
+        self._stop = stop
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._total = 0
+        self._parser = None
+        self._status_fh = None
+
+    # ------------------------------------------------------------------------
+    # Methods:
+    # ------------------------------------------------------------------------
+    def execute(self):
+
+        if self.output:
+            try:
+                self._status_fh = open(self.output, 'w')
+            except IOError as e:
+                raise ActionError("Unable to open output: " + str(e))
+        else:
+            self._status_fh = sys.stdout
+
+        try:
+            if self.repl:
+                self._run_repl()
+            else:
+                self._run_lines(self._read_lines())
+        finally:
+            if self.output:
+                self._status_fh.close()
+
+        if self._failures:
+            raise ActionError(
+                "{f} of {t} lines failed.".format(
+                    f=self._failures, t=self._total)
+            )
+
+    # ------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # ------------------------------------------------------------------------
+    def validate(self):
+
+        if self.jobs < 1:
+            raise ActionError("Jobs must be 1 or more.")
+
+        if self.input and self.input != "-":
+            try:
+                self._input_fh = open(self.input)
+            except IOError as e:
+                raise ActionError("Unable to read input: " + str(e))
+        else:
+            self._input_fh = sys.stdin
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def input(self):
+        return self._input
+
+    # ------------------------------------------------------------------------
+    @property
+    def jobs(self):
+        return self._jobs
+
+    # ------------------------------------------------------------------------
+    @property
+    def output(self):
+        return self._output
+
+    # ------------------------------------------------------------------------
+    @property
+    def repl(self):
+        """True if lines are entered interactively at a prompt."""
+        return (self.interactive and self._input_fh is sys.stdin and
+            sys.stdin.isatty())
+
+    # ------------------------------------------------------------------------
+    @property
+    def stop(self):
+        return self._stop
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _get_parser(self):
+
+        if not self._parser:
+            self._parser = _LineParser(prog="dpa")
+            add_action_subparsers(self._parser)
+
+        return self._parser
+
+    # ------------------------------------------------------------------------
+    def _parse_line(self, text):
+        """Returns (action class, kwargs), WAIT or None for empty lines."""
+
+        text = text.strip()
+        if not text or text.startswith("#"):
+            return None
+
+        if text == WAIT:
+            return WAIT
+
+        if text.startswith(("[", "{")):
+            try:
+                data = _to_str(json.loads(text))
+            except ValueError as e:
+                raise _LineError("Invalid json: " + str(e))
+
+            if isinstance(data, dict):
+                if data.get(WAIT):
+                    return WAIT
+                elif 'argv' in data:
+                    args = data['argv']
+                    if isinstance(args, basestring):
+                        args = shlex.split(args)
+                elif 'action' in data:
+                    return self._parse_action(data)
+                else:
+                    raise _LineError(
+                        "Json objects require an 'argv' or 'action' key.")
+            else:
+                args = data
+        else:
+            try:
+                args = shlex.split(text)
+            except ValueError as e:
+                raise _LineError(str(e))
+
+        if args and args[0] == "dpa":
+            args = args[1:]
+
+        if args and args[0] == self.__class__.name:
+            raise _LineError("Nested batches are not supported.")
+
+        try:
+            kwargs = vars(self._get_parser().parse_args(args))
+        except SystemExit as e:
+            # help requested
+            raise _LineError("Exited with status " + str(e.code))
+
+        action_class = kwargs.pop('action_class')
+
+        return (action_class, kwargs)
+
+    # ------------------------------------------------------------------------
+    def _parse_action(self, data):
+
+        action_name = data['action']
+        target_type = data.get('target', 'none')
+
+        if action_name == self.__class__.name:
+            raise _LineError("Nested batches are not supported.")
+
+        action_class = ActionRegistry().get_action(action_name, target_type)
+        if not action_class:
+            raise _LineError(
+                "Unknown action: {a} {t}".format(a=action_name, t=target_type))
+
+        kwargs = data.get('args', {})
+        if not isinstance(kwargs, dict):
+            raise _LineError("Action 'args' must be a json object.")
+
+        return (action_class, kwargs)
+
+    # ------------------------------------------------------------------------
+    def _read_lines(self):
+
+        # readline rather than iteration. iterating a pipe reads ahead, which
+        # would delay lines written by a slow producer.
+        for (num, text) in enumerate(iter(self._input_fh.readline, ""), 1):
+            yield (num, text)
+
+        if self._input_fh is not sys.stdin:
+            self._input_fh.close()
+
+    # ------------------------------------------------------------------------
+    def _report(self, num, text, status, elapsed=None, error=None):
+
+        result = {
+            'line': num,
+            'command': text.strip(),
+            'status': status,
+        }
+        if elapsed is not None:
+            result['elapsed'] = round(elapsed, 3)
+        if error:
+            result['error'] = error
+
+        with self._lock:
+            self._total += 1
+            if status != ActionRunStatus.SUCCESS:
+                self._failures += 1
+
+            if self.repl and not self.output:
+                if status != ActionRunStatus.SUCCESS:
+                    print Style.bright + "Status {s}".format(s=status) + \
+                        (": " + error if error else "") + Style.reset
+                return
+
+            self._status_fh.write(json.dumps(result, sort_keys=True) + "\n")
+            self._status_fh.flush()
+
+    # ------------------------------------------------------------------------
+    def _run_line(self, num, text, action_class, kwargs):
+
+        start = time.time()
+        status = action_class.run(interactive=self.repl, **kwargs)
+        self._report(num, text, status, elapsed=time.time() - start)
+
+    # ------------------------------------------------------------------------
+    def _run_lines(self, lines):
+
+        pool = ThreadPool(self.jobs) if self.jobs > 1 else None
+        pending = []
+
+        try:
+            for (num, text) in lines:
+
+                if self.stop and self._failures:
+                    break
+
+                try:
+                    parsed = self._parse_line(text)
+                except _LineError as e:
+                    self._report(num, text, ActionRunStatus.FAILURE,
+                        error=str(e))
+                    continue
+
+                if parsed is None:
+                    continue
+
+                if parsed == WAIT:
+                    _wait(pending)
+                    continue
+
+                (action_class, kwargs) = parsed
+
+                # loggers aren't created thread safely. make sure the action's
+                # logger exists before running it in a thread.
+                action_class.get_logger()
+
+                if pool:
+                    pending.append(pool.apply_async(self._run_line,
+                        (num, text, action_class, kwargs)))
+                else:
+                    self._run_line(num, text, action_class, kwargs)
+
+            _wait(pending)
+
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+    # ------------------------------------------------------------------------
+    def _run_repl(self):
+
+        # line editing and history for the prompt, if available
+        try:
+            import readline
+        except ImportError:
+            pass
+
+        num = 0
+        while True:
+            try:
+                text = raw_input(Style.bright + "dpa> " + Style.reset)
+            except EOFError:
+                print ""
+                break
+            except KeyboardInterrupt:
+                print ""
+                continue
+
+            if text.strip() in ["exit", "quit"]:
+                break
+
+            num += 1
+            try:
+                self._run_lines([(num, text)])
+            except KeyboardInterrupt:
+                print "\nInterrupted."
+
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _LineParser(argparse.ArgumentParser):
+    """Raises parse errors rather than exiting the process."""
+
+    def error(self, message):
+        raise _LineError(message)
+
+# ----------------------------------------------------------------------------
+class _LineError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _to_str(value):
+
+    # json gives back unicode. action args expect str.
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [_to_str(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((_to_str(k), _to_str(v)) for (k, v) in value.iteritems())
+
+    return value
+
+# ----------------------------------------------------------------------------
+def _wait(pending):
+
+    while pending:
+        pending.pop(0).get()
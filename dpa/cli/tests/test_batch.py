@@ -0,0 +1,148 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.cli.tests.test_batch
+# -----------------------------------------------------------------------------
+"""Unit tests for running batches of dpa actions."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.action import Action, ActionError, ActionRunStatus
+from dpa.action.registry import ActionRegistry
+from dpa.cli.action.batch import BatchAction
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# command line, json args and json action lines. the third line fails when
+# executed and the fourth when parsed.
+BATCH = """# recorded in order
+dpa record test one
+{"action": "record", "target": "test", "args": {"value": "two"}}
+["record", "test", "fail"]
+record test --no-such-option
+wait
+["record", "test", "three"]
+"""
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all batch tests."""
+
+    return unittest.TestSuite([
+        BatchActionTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test actions:
+# -----------------------------------------------------------------------------
+class _RecordAction(Action):
+    """Records its value. Fails for the value 'fail'."""
+
+    name = "record"
+    target_type = "test"
+    logging = False
+
+    values = []
+
+    @classmethod
+    def setup_cl_args(cls, parser):
+        parser.add_argument("value")
+
+    def __init__(self, value):
+        super(_RecordAction, self).__init__(value)
+        self._value = value
+
+    def execute(self):
+        if self._value == "fail":
+            raise ActionError("failed")
+        self.__class__.values.append(self._value)
+
+    def undo(self):
+        pass
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class BatchActionTestCase(unittest.TestCase):
+    """Batches of actions read from a file and run in this process."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        ActionRegistry().register_action(_RecordAction, override=True)
+        _RecordAction.values = []
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmp_dir, "batch.txt")
+        self.output = os.path.join(self.tmp_dir, "status.json")
+        with open(self.input, 'w') as fh:
+            fh.write(BATCH)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        ActionRegistry().reload_global_actions()
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_batch(self):
+        """Failed lines are reported and the rest still run"""
+
+        status = BatchAction.run(input=self.input, output=self.output)
+
+        self.assertEqual(status, ActionRunStatus.FAILURE)
+        self.assertEqual(_RecordAction.values, ["one", "two", "three"])
+        self.assertEqual(
+            [(s['line'], s['status'], 'error' in s) for s in self._statuses()],
+            [
+                (2, ActionRunStatus.SUCCESS, False),
+                (3, ActionRunStatus.SUCCESS, False),
+                (4, ActionRunStatus.FAILURE, False),
+                (5, ActionRunStatus.FAILURE, True),
+                (7, ActionRunStatus.SUCCESS, False),
+            ]
+        )
+
+    # -------------------------------------------------------------------------
+    def test_concurrent(self):
+        """Lines run concurrently still all report a status"""
+
+        status = BatchAction.run(input=self.input, output=self.output,
+            jobs=3)
+
+        self.assertEqual(status, ActionRunStatus.FAILURE)
+        self.assertEqual(sorted(_RecordAction.values),
+            ["one", "three", "two"])
+        self.assertEqual(sorted(s['line'] for s in self._statuses()),
+            [2, 3, 4, 5, 7])
+
+    # -------------------------------------------------------------------------
+    def test_stop(self):
+        """No new lines run after a failure when stopping"""
+
+        status = BatchAction.run(input=self.input, output=self.output,
+            stop=True)
+
+        self.assertEqual(status, ActionRunStatus.FAILURE)
+        self.assertEqual(_RecordAction.values, ["one", "two"])
+        self.assertEqual([s['line'] for s in self._statuses()], [2, 3, 4])
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _statuses(self):
+        with open(self.output) as fh:
+            return [json.loads(line) for line in fh]
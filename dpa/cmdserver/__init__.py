@@ -0,0 +1,200 @@
+"""A persistent, per-user server for running dpa commands warm.
+
+Starting the ``dpa`` command line means paying for interpreter startup,
+imports, action registry loading and config parsing on every invocation.
+The command server keeps all of that loaded in a long running process and
+forks a fresh worker for each command it receives over a Unix socket.
+
+Classes
+-------
+FrameReader
+    Incrementally decodes frames received on a socket.
+
+Protocol
+--------
+Every message is a frame: a 1 byte channel id and a 4 byte big endian length
+followed by the payload. Client to server channels:
+
+    r - the json encoded command request (argv, cwd, env, tty info)
+    i - data for the command's stdin
+    c - the command's stdin was closed
+    s - a signal number to deliver to the command
+    w - the client's terminal was resized (json [rows, cols])
+
+Server to client channels:
+
+    a - the command was accepted and is about to run
+    o - command stdout (or the combined terminal output for tty commands)
+    e - command stderr
+    x - the command's exit status
+    R - the server is restarting; the client should run the command itself
+
+This module only depends on the standard library so that the thin client can
+import it without loading the rest of the pipeline.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import errno
+import hashlib
+import os
+import socket
+import struct
+import sys
+import tempfile
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+CHANNEL_REQUEST = 'r'
+CHANNEL_STDIN = 'i'
+CHANNEL_STDIN_CLOSE = 'c'
+CHANNEL_SIGNAL = 's'
+CHANNEL_WINSIZE = 'w'
+CHANNEL_ACCEPTED = 'a'
+CHANNEL_STDOUT = 'o'
+CHANNEL_STDERR = 'e'
+CHANNEL_EXIT = 'x'
+CHANNEL_RESTART = 'R'
+
+HEADER = struct.Struct(">cI")
+
+# the installed dpa package directory
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# -----------------------------------------------------------------------------
+# Classes:
+# -----------------------------------------------------------------------------
+class FrameReader(object):
+    """Incrementally decodes frames from data received on a socket."""
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        self._buffer = ""
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def feed(self, data):
+        """Add received data. Returns a list of complete (channel, payload)."""
+
+        self._buffer += data
+        frames = []
+
+        while len(self._buffer) >= HEADER.size:
+            (channel, length) = HEADER.unpack(self._buffer[:HEADER.size])
+            end = HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append((channel, self._buffer[HEADER.size:end]))
+            self._buffer = self._buffer[end:]
+
+        return frames
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def encode_frame(channel, payload=""):
+    """Returns the wire representation of a single frame."""
+    return HEADER.pack(channel, len(payload)) + payload
+
+# -----------------------------------------------------------------------------
+def send_frame(sock, channel, payload=""):
+    """Send a single frame on the supplied socket."""
+    sock.sendall(encode_frame(channel, payload))
+
+# -----------------------------------------------------------------------------
+def recv_frame(sock):
+    """Block until a full frame is received. Returns (channel, payload).
+
+    Returns (None, None) if the socket is closed before a frame arrives.
+
+    """
+
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return (None, None)
+
+    (channel, length) = HEADER.unpack(header)
+    payload = _recv_exactly(sock, length) if length else ""
+    if payload is None:
+        return (None, None)
+
+    return (channel, payload)
+
+# -----------------------------------------------------------------------------
+def runtime_dir():
+    """Returns the private, per-user directory holding the server socket."""
+
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        path = os.path.join(base, "dpa")
+    else:
+        path = os.path.join(
+            tempfile.gettempdir(), "dpa-{uid}".format(uid=os.getuid()))
+
+    try:
+        os.makedirs(path, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # never trust a directory someone else could have created for us
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        raise OSError(errno.EPERM, "Not owned by the current user", path)
+    if stat.st_mode & 0077:
+        os.chmod(path, 0700)
+
+    return path
+
+# -----------------------------------------------------------------------------
+def socket_path(script):
+    """Returns the server socket path for this install and environment.
+
+    Separate installs, interpreters and python paths get separate servers.
+    Ptasks can override pipeline modules via ``$PYTHONPATH``, so a server
+    must never run commands for a different python path than its own.
+
+    """
+
+    key = hashlib.md5("\0".join([
+        PACKAGE_DIR,
+        os.path.realpath(script),
+        sys.executable,
+        os.environ.get('PYTHONPATH', ""),
+    ])).hexdigest()[:12]
+
+    return os.path.join(runtime_dir(), "cmd-{k}.sock".format(k=key))
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _recv_exactly(sock, size):
+
+    chunks = []
+    while size:
+        try:
+            data = sock.recv(min(size, 65536))
+        except socket.error as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        if not data:
+            return None
+        chunks.append(data)
+        size -= len(data)
+
+    return "".join(chunks)
+
+# -----------------------------------------------------------------------------
+# Public exception classes:
+# -----------------------------------------------------------------------------
+class CommandServerError(Exception):
+    pass
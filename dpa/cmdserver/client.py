@@ -0,0 +1,259 @@
+"""Thin client for forwarding dpa commands to the command server.
+
+The ``dpa`` script calls :py:func:`forward_command` before importing anything
+else from the pipeline. If the server isn't running, one is started in the
+background and ``None`` is returned so the command runs locally this time.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import errno
+import fcntl
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import termios
+import tty
+
+from dpa.cmdserver import (
+    CHANNEL_ACCEPTED, CHANNEL_EXIT, CHANNEL_REQUEST, CHANNEL_RESTART,
+    CHANNEL_SIGNAL, CHANNEL_STDERR, CHANNEL_STDIN, CHANNEL_STDIN_CLOSE,
+    CHANNEL_STDOUT, CHANNEL_WINSIZE, CommandServerError, FrameReader,
+    send_frame, socket_path,
+)
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def forward_command(argv, script):
+    """Run the command on the command server.
+
+    Returns the command's exit status, or None if the command could not be
+    handed to the server and should be run locally instead.
+
+    """
+
+    try:
+        path = socket_path(script)
+    except OSError:
+        return None
+
+    sock = _connect(path)
+    if sock is None:
+        _spawn_server(script)
+        return None
+
+    try:
+        return _ClientSession(sock, argv, script).run()
+    except CommandServerError as e:
+        sys.stderr.write("dpa command server: {e}\n".format(e=e))
+        return 1
+    finally:
+        sock.close()
+
+# -----------------------------------------------------------------------------
+# Private classes:
+# -----------------------------------------------------------------------------
+class _ClientSession(object):
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, sock, argv, script):
+
+        self._sock = sock
+        self._argv = argv
+        self._script = script
+        self._accepted = False
+        self._pending = []
+
+        # commands get a terminal on the server only if we have one here
+        self._tty = sys.stdin.isatty() and sys.stdout.isatty()
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def run(self):
+
+        request = {
+            'argv': self._argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+            'script': os.path.abspath(self._script),
+            'tty': self._tty,
+            'winsize': _get_winsize() if self._tty else None,
+        }
+
+        try:
+            send_frame(self._sock, CHANNEL_REQUEST, json.dumps(request))
+        except socket.error:
+            # nothing has run yet, safe to run locally
+            return None
+
+        stdin_fd = sys.stdin.fileno()
+        saved_attrs = None
+        saved_handlers = {}
+
+        if self._tty:
+            saved_attrs = termios.tcgetattr(stdin_fd)
+            tty.setraw(stdin_fd)
+            saved_handlers[signal.SIGWINCH] = signal.signal(
+                signal.SIGWINCH, self._forward_winsize)
+        else:
+            for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+                saved_handlers[signum] = signal.signal(
+                    signum, self._forward_signal)
+
+        try:
+            return self._pump(stdin_fd)
+        except socket.error as e:
+            # until the server accepts the command, nothing has run and it
+            # is safe to fall back to running it locally
+            if not self._accepted:
+                return None
+            raise CommandServerError("Connection lost: " + str(e))
+        finally:
+            if saved_attrs is not None:
+                termios.tcsetattr(stdin_fd, termios.TCSAFLUSH, saved_attrs)
+            for (signum, handler) in saved_handlers.iteritems():
+                signal.signal(signum, handler)
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _forward_signal(self, signum, frame):
+        # sent from the main loop so frames never interleave
+        self._pending.append((CHANNEL_SIGNAL, str(signum)))
+
+    # -------------------------------------------------------------------------
+    def _forward_winsize(self, signum, frame):
+        self._pending.append((CHANNEL_WINSIZE, json.dumps(_get_winsize())))
+
+    # -------------------------------------------------------------------------
+    def _pump(self, stdin_fd):
+
+        reader = FrameReader()
+        inputs = [self._sock, stdin_fd]
+        outputs = {
+            CHANNEL_STDOUT: sys.stdout.fileno(),
+            CHANNEL_STDERR: sys.stderr.fileno(),
+        }
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        while True:
+
+            while self._pending:
+                (channel, payload) = self._pending.pop(0)
+                send_frame(self._sock, channel, payload)
+
+            try:
+                (readable, _, _) = select.select(inputs, [], [])
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if stdin_fd in readable:
+                try:
+                    data = os.read(stdin_fd, 65536)
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                if data:
+                    send_frame(self._sock, CHANNEL_STDIN, data)
+                else:
+                    send_frame(self._sock, CHANNEL_STDIN_CLOSE)
+                    inputs.remove(stdin_fd)
+
+            if self._sock not in readable:
+                continue
+
+            try:
+                data = self._sock.recv(65536)
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            if not data:
+                if not self._accepted:
+                    return None
+                raise CommandServerError("Connection closed unexpectedly.")
+
+            for (channel, payload) in reader.feed(data):
+
+                if channel in outputs:
+                    _write_all(outputs[channel], payload)
+                elif channel == CHANNEL_ACCEPTED:
+                    self._accepted = True
+                elif channel == CHANNEL_EXIT:
+                    return int(payload)
+                elif channel == CHANNEL_RESTART and not self._accepted:
+                    return None
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _connect(path):
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+
+    return sock
+
+# -----------------------------------------------------------------------------
+def _get_winsize():
+
+    try:
+        packed = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ,
+            struct.pack("HHHH", 0, 0, 0, 0))
+        (rows, cols, _, _) = struct.unpack("HHHH", packed)
+    except IOError:
+        return None
+
+    return [rows, cols]
+
+# -----------------------------------------------------------------------------
+def _spawn_server(script):
+
+    devnull = open(os.devnull, 'r+')
+    try:
+        subprocess.Popen(
+            [sys.executable, "-m", "dpa.cmdserver.server",
+             "--script", os.path.abspath(script)],
+            stdin=devnull,
+            stdout=devnull,
+            stderr=devnull,
+            close_fds=True,
+            preexec_fn=os.setsid,
+        )
+    except OSError:
+        pass
+    finally:
+        devnull.close()
+
+# -----------------------------------------------------------------------------
+def _write_all(fd, data):
+
+    while data:
+        try:
+            written = os.write(fd, data)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        data = data[written:]
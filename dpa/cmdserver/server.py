@@ -0,0 +1,658 @@
+"""The dpa command server.
+
+Started on demand by the ``dpa`` client (see :py:mod:`dpa.cmdserver.client`)
+via ``python -m dpa.cmdserver.server --script <dpa script>``. The server
+imports the command line script and loads the action registry once, then
+forks a worker for each command it receives. Workers inherit the warm
+interpreter and run the command with the client's argv, cwd and environment.
+
+The server shuts down after ``$DPA_CMD_SERVER_IDLE`` seconds without a
+command. It reloads the action registry when the global action configs for
+a command's ptask area change, and exits (asking the client to run the
+command itself) when any pipeline source file changes.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import argparse
+import errno
+import fcntl
+import hashlib
+import imp
+import json
+import os
+import pty
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import termios
+import time
+import traceback
+
+from dpa.cmdserver import (
+    CHANNEL_ACCEPTED, CHANNEL_EXIT, CHANNEL_REQUEST, CHANNEL_RESTART,
+    CHANNEL_SIGNAL, CHANNEL_STDERR, CHANNEL_STDIN, CHANNEL_STDIN_CLOSE,
+    CHANNEL_STDOUT, CHANNEL_WINSIZE, FrameReader, recv_frame, send_frame,
+    socket_path,
+)
+from dpa.env.vars import DpaVars
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# how long to wait for a newly connected client to send its request
+REQUEST_TIMEOUT = 5.0
+
+# minimum seconds between checks of the install tree for changes
+FINGERPRINT_INTERVAL = 1.0
+
+# -----------------------------------------------------------------------------
+# Classes:
+# -----------------------------------------------------------------------------
+class CommandServer(object):
+    """Serves dpa commands from a warm interpreter over a Unix socket."""
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, script, idle_timeout=1800):
+
+        self._script = os.path.abspath(script)
+        self._idle_timeout = idle_timeout
+
+        self._cli = None
+        self._config_key = None
+        self._fingerprint = None
+        self._fingerprint_time = 0
+        self._last_activity = time.time()
+        self._listener = None
+        self._lock_file = None
+        self._logger = None
+        self._running = False
+        self._sessions = set()
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def serve(self):
+        """Serve commands until idle or the install changes."""
+
+        path = socket_path(self._script)
+
+        if not self._bind(path):
+            # another server is already running for this install
+            return 0
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        try:
+            self._warm()
+            self._logger.info("Serving: " + path)
+            self._running = True
+            while self._running:
+                self._serve_once()
+        finally:
+            self._unbind(path)
+            if self._logger:
+                self._logger.info("Shut down: " + path)
+
+        return 0
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    # -------------------------------------------------------------------------
+    @property
+    def script(self):
+        return self._script
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _bind(self, path):
+
+        # the lock is held for the life of the server. it keeps concurrently
+        # spawned servers from fighting over the socket path.
+        self._lock_file = open(path + ".lock", 'a')
+        try:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+        # any existing socket is stale since its server no longer holds
+        # the lock
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0077)
+        try:
+            self._listener.bind(path)
+        finally:
+            os.umask(old_umask)
+        self._listener.listen(32)
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def _unbind(self, path):
+
+        if self._listener:
+            self._listener.close()
+            self._listener = None
+
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # -------------------------------------------------------------------------
+    def _warm(self):
+
+        from dpa.logging import Logger
+        self._logger = Logger.get("cmdserver")
+
+        # the cli script imports the action framework and registry
+        self._cli = imp.load_source('_dpa_cli', self._script)
+        self._refresh_registry(dict(os.environ))
+        self._fingerprint = self._install_fingerprint()
+        self._fingerprint_time = time.time()
+
+    # -------------------------------------------------------------------------
+    def _serve_once(self):
+
+        try:
+            (readable, _, _) = select.select([self._listener], [], [], 1.0)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            readable = []
+
+        self._reap_sessions()
+
+        if readable:
+            try:
+                (conn, _) = self._listener.accept()
+            except socket.error as e:
+                if e.errno not in (errno.EINTR, errno.EAGAIN):
+                    raise
+            else:
+                self._last_activity = time.time()
+                try:
+                    self._handle(conn)
+                finally:
+                    conn.close()
+
+        if (not self._sessions and
+            time.time() - self._last_activity > self.idle_timeout):
+            self._logger.info("Idle for {s} seconds.".format(
+                s=self.idle_timeout))
+            self._running = False
+
+    # -------------------------------------------------------------------------
+    def _handle(self, conn):
+
+        if not _peer_is_current_user(conn):
+            return
+
+        conn.settimeout(REQUEST_TIMEOUT)
+        try:
+            (channel, payload) = recv_frame(conn)
+            if channel != CHANNEL_REQUEST:
+                return
+            request = _decode(json.loads(payload))
+        except (socket.error, ValueError):
+            return
+
+        if self._install_changed():
+            self._logger.info("Install changed. Restarting.")
+            self._decline(conn)
+            self._running = False
+            return
+
+        # commands for another install or python path belong to another
+        # server. let the client run them itself.
+        env = request['env']
+        if (request['script'] != self._script or
+            env.get('PYTHONPATH', "") != os.environ.get('PYTHONPATH', "")):
+            self._decline(conn)
+            return
+
+        try:
+            self._refresh_registry(env)
+        except Exception as e:
+            self._logger.error("Unable to reload actions: " + str(e))
+            self._decline(conn)
+            return
+
+        conn.settimeout(None)
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._run_session(conn, request)
+            finally:
+                os._exit(1)
+
+        self._sessions.add(pid)
+
+    # -------------------------------------------------------------------------
+    def _decline(self, conn):
+
+        try:
+            send_frame(conn, CHANNEL_RESTART)
+        except socket.error:
+            pass
+
+    # -------------------------------------------------------------------------
+    def _install_changed(self):
+
+        now = time.time()
+        if now - self._fingerprint_time < FINGERPRINT_INTERVAL:
+            return False
+
+        self._fingerprint_time = now
+        return self._install_fingerprint() != self._fingerprint
+
+    # -------------------------------------------------------------------------
+    def _install_fingerprint(self):
+
+        # dpa modules can be picked up from any dpa package along the python
+        # path, so all of them are part of the install.
+        package_dirs = []
+        for path in sys.path:
+            package_dir = os.path.join(path or os.getcwd(), "dpa")
+            if os.path.isdir(package_dir) and not package_dir in package_dirs:
+                package_dirs.append(package_dir)
+
+        md5 = hashlib.md5()
+        md5.update(_stat_key(self._script))
+
+        for package_dir in package_dirs:
+            for (dir_path, dir_names, file_names) in os.walk(package_dir):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if file_name.endswith((".pyc", ".pyo")):
+                        continue
+                    md5.update(_stat_key(os.path.join(dir_path, file_name)))
+
+        return md5.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def _reap_sessions(self):
+
+        while self._sessions:
+            try:
+                (pid, _) = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                self._sessions.clear()
+                break
+
+            if not pid:
+                break
+
+            self._sessions.discard(pid)
+            self._last_activity = time.time()
+
+    # -------------------------------------------------------------------------
+    def _refresh_registry(self, env):
+        """Reload the registered actions if their config files changed.
+
+        The configs that define the available actions are composited down the
+        ptask hierarchy, so they depend on the command's environment.
+
+        """
+
+        from dpa.action.registry import ActionRegistry, GLOBAL_ACTIONS_CONFIG
+        from dpa.ptask.area import PTaskArea
+
+        saved_env = dict(os.environ)
+        try:
+            _set_environ(env)
+            config_paths = PTaskArea.current().ancestor_paths(
+                relative_file=GLOBAL_ACTIONS_CONFIG, include_install=True)
+            config_key = [_stat_key(p) for p in config_paths]
+
+            if config_key != self._config_key:
+                registry = ActionRegistry()
+                if self._config_key is not None:
+                    self._logger.info("Action configs changed. Reloading.")
+                    registry.reload_global_actions()
+                self._config_key = config_key
+        finally:
+            _set_environ(saved_env)
+
+    # -------------------------------------------------------------------------
+    def _run_session(self, conn, request):
+
+        self._listener.close()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        if request.get('tty'):
+            (master, slave) = pty.openpty()
+            if request.get('winsize'):
+                _set_winsize(master, request['winsize'])
+
+            send_frame(conn, CHANNEL_ACCEPTED)
+
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                os.close(master)
+                os.setsid()
+                fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+                _redirect_std_fds(slave, slave, slave)
+                self._run_worker(request)
+
+            os.close(slave)
+            outputs = {master: CHANNEL_STDOUT}
+            stdin_fd = master
+        else:
+            (in_read, in_write) = os.pipe()
+            (out_read, out_write) = os.pipe()
+            (err_read, err_write) = os.pipe()
+
+            send_frame(conn, CHANNEL_ACCEPTED)
+
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                for fd in (in_write, out_read, err_read):
+                    os.close(fd)
+                # own process group, so forwarded signals reach children too
+                os.setpgrp()
+                _redirect_std_fds(in_read, out_write, err_write)
+                self._run_worker(request)
+
+            for fd in (in_read, out_write, err_write):
+                os.close(fd)
+            outputs = {out_read: CHANNEL_STDOUT, err_read: CHANNEL_STDERR}
+            stdin_fd = in_write
+
+        connected = _pump_session(conn, pid, outputs, stdin_fd,
+            tty=request.get('tty'))
+
+        status = _wait_status(pid)
+        if connected:
+            try:
+                send_frame(conn, CHANNEL_EXIT, str(status))
+            except socket.error:
+                pass
+
+        os._exit(0)
+
+    # -------------------------------------------------------------------------
+    def _run_worker(self, request):
+
+        status = 1
+
+        try:
+            for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+            os.chdir(request['cwd'])
+            _set_environ(request['env'])
+
+            # the log directory is read from the environment at import time
+            from dpa.logging import Logger
+            Logger.log_dir = DpaVars.share_logs(
+                default=tempfile.gettempdir()).get()
+
+            sys.argv = [request['script']] + request['argv']
+            status = self._cli.DPA.cli()
+        except SystemExit as e:
+            status = e.code
+        except KeyboardInterrupt:
+            status = 128 + signal.SIGINT
+        except:
+            traceback.print_exc()
+            status = 1
+        finally:
+            if status is None:
+                status = 0
+            elif not isinstance(status, int):
+                sys.stderr.write(str(status) + "\n")
+                status = 1
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                # exiting without atexit handlers. write queued log records.
+                from dpa.logging import Logger
+                Logger.flush()
+            finally:
+                os._exit(status)
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def main(args=None):
+
+    parser = argparse.ArgumentParser(
+        description="Serve dpa commands from a warm interpreter.")
+    parser.add_argument("--script", required=True,
+        help="Path to the dpa cli script.")
+    parser.add_argument("--idle", type=float,
+        default=float(DpaVars.cmd_server_idle().get()),
+        help="Shut down after this many idle seconds.")
+    parsed = parser.parse_args(args)
+
+    server = CommandServer(parsed.script, idle_timeout=parsed.idle)
+    return server.serve()
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _decode(value):
+
+    # json gives back unicode. the environment and argv want str.
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [_decode(v) for v in value]
+    elif isinstance(value, dict):
+        return dict((_decode(k), _decode(v)) for (k, v) in value.iteritems())
+
+    return value
+
+# -----------------------------------------------------------------------------
+def _peer_is_current_user(conn):
+
+    # the socket lives in a private directory. on linux, double check the
+    # credentials of the connecting process as well.
+    if not sys.platform.startswith("linux"):
+        return True
+
+    so_peercred = getattr(socket, 'SO_PEERCRED', 17)
+    creds_size = struct.calcsize("3i")
+    try:
+        creds = conn.getsockopt(socket.SOL_SOCKET, so_peercred, creds_size)
+    except socket.error:
+        return False
+
+    (_, uid, _) = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+# -----------------------------------------------------------------------------
+def _pump_session(conn, pid, outputs, stdin_fd, tty=False):
+    """Shuttle data between the client and the worker until output closes.
+
+    Returns False if the client went away before the worker finished.
+
+    """
+
+    reader = FrameReader()
+    connected = True
+
+    while outputs:
+
+        watch = outputs.keys()
+        if connected:
+            watch.append(conn)
+
+        try:
+            (readable, _, _) = select.select(watch, [], [])
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        if connected and conn in readable:
+            try:
+                data = conn.recv(65536)
+            except socket.error:
+                data = ""
+
+            if not data:
+                # the client is gone. hang up on the command.
+                connected = False
+                _signal_worker(pid, signal.SIGHUP)
+
+            for (channel, payload) in reader.feed(data):
+                if channel == CHANNEL_STDIN and stdin_fd is not None:
+                    _write_all(stdin_fd, payload)
+                elif channel == CHANNEL_STDIN_CLOSE and stdin_fd is not None:
+                    if tty:
+                        _write_all(stdin_fd, "\x04")
+                    else:
+                        os.close(stdin_fd)
+                        stdin_fd = None
+                elif channel == CHANNEL_SIGNAL:
+                    _signal_worker(pid, int(payload))
+                elif channel == CHANNEL_WINSIZE and tty:
+                    _set_winsize(stdin_fd, json.loads(payload))
+                    _signal_worker(pid, signal.SIGWINCH)
+
+        for fd in outputs.keys():
+
+            if fd not in readable:
+                continue
+
+            try:
+                data = os.read(fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                # EIO: the terminal's last writer is gone
+                data = ""
+
+            if not data:
+                del outputs[fd]
+                if fd != stdin_fd:
+                    os.close(fd)
+                continue
+
+            if connected:
+                try:
+                    send_frame(conn, outputs[fd], data)
+                except socket.error:
+                    connected = False
+                    _signal_worker(pid, signal.SIGHUP)
+
+    return connected
+
+# -----------------------------------------------------------------------------
+def _redirect_std_fds(stdin_fd, stdout_fd, stderr_fd):
+
+    os.dup2(stdin_fd, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+
+    for fd in set([stdin_fd, stdout_fd, stderr_fd]):
+        if fd > 2:
+            os.close(fd)
+
+# -----------------------------------------------------------------------------
+def _set_environ(env):
+
+    os.environ.clear()
+    os.environ.update(env)
+
+# -----------------------------------------------------------------------------
+def _set_winsize(fd, winsize):
+
+    if not winsize:
+        return
+
+    (rows, cols) = winsize
+    try:
+        fcntl.ioctl(fd, termios.TIOCSWINSZ,
+            struct.pack("HHHH", rows, cols, 0, 0))
+    except IOError:
+        pass
+
+# -----------------------------------------------------------------------------
+def _signal_worker(pid, signum):
+
+    # workers lead their own process group
+    try:
+        os.killpg(pid, signum)
+    except OSError:
+        pass
+
+# -----------------------------------------------------------------------------
+def _stat_key(path):
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path + ":missing\n"
+
+    return "{p}:{m!r}:{s}\n".format(p=path, m=stat.st_mtime, s=stat.st_size)
+
+# -----------------------------------------------------------------------------
+def _wait_status(pid):
+
+    while True:
+        try:
+            (_, status) = os.waitpid(pid, 0)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            return 1
+        break
+
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+# -----------------------------------------------------------------------------
+def _write_all(fd, data):
+
+    while data:
+        try:
+            written = os.write(fd, data)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            if e.errno == errno.EPIPE:
+                return
+            raise
+        data = data[written:]
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
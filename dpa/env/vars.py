@@ -235,3 +235,68 @@ class DpaVars(object):
 
     """
 
+
+    cmd_server = staticmethod(
+        lambda default="": EnvVar('DPA_CMD_SERVER', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_CMD_SERVER``
+
+    When set to a non-empty value, the ``dpa`` command line forwards commands
+    to a persistent, per-user command server rather than starting the
+    pipeline from scratch on every invocation. The server is started on
+    demand.
+
+    """
+
+    cmd_server_idle = staticmethod(
+        lambda default=1800: EnvVar('DPA_CMD_SERVER_IDLE', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_CMD_SERVER_IDLE``
+
+    The number of idle seconds after which the dpa command server shuts
+    itself down.
+
+    """
+
+    stats_db = staticmethod(
+        lambda default="~/.dpa_stats.db": EnvVar('DPA_STATS_DB', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_STATS_DB``
+
+    The path to the SQLite database storing production stats snapshots,
+    used to report trends over time.
+
+    """
+
+    sync_slots = staticmethod(
+        lambda default=4: EnvVar('DPA_SYNC_SLOTS', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_SYNC_SLOTS``
+
+    The maximum number of concurrent syncs to or from any one remote host,
+    across all processes sharing the sync directory. Set to 0 for no limit.
+
+    """
+
+    sync_dir = staticmethod(
+        lambda default="": EnvVar('DPA_SYNC_DIR', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_SYNC_DIR``
+
+    The directory holding sync job records, rsync output and the slot locks
+    limiting concurrent syncs. Defaults to a local temp directory, so slots
+    only limit the syncs of a single host. Set it to a directory on shared
+    storage to limit the syncs of every host sharing it.
+
+    """
+
+    action_timing = staticmethod(
+        lambda default="": EnvVar('DPA_ACTION_TIMING', default)
+    )
+    """Returns an instance of :py:obj:`dpa.env.EnvVar` for ``$DPA_ACTION_TIMING``
+
+    When set to a non-empty value, interactive actions print a tree of the
+    time spent in each of their phases (and nested actions) when they
+    complete. The tree is always written to the action log.
+
+    """
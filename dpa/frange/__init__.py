@@ -120,16 +120,17 @@ class Frange(object):
 
         """
         
-        matched = False
+        # a set for membership, so adding many frames stays linear
+        existing = set(self._frames)
+
         if isinstance(frames, basestring):            
             parts = frames.split(',')
             for i in range(len(parts)):
-                #print "".join(parts[i].split())
-                self._add_single_range(parts[i].strip())
+                self._add_single_range(parts[i].strip(), existing)
         else:
             for i in range(len(frames)):
                 part = str(frames[i])
-                self._add_single_range(part.strip())
+                self._add_single_range(part.strip(), existing)
                     
     def remove(self, frames):
         """ Remove specified frames from the range
@@ -243,11 +244,11 @@ class Frange(object):
         else:
             raise FrangeError(" invalid syntax for frame range")
      
-    def _add_single_range(self, single_range):
+    def _add_single_range(self, single_range, existing):
         """ Add a single frame range. 
 
             Call _parsesingle_range to parse the frame range and add valid 
-            frame range.
+            frame range. existing is the set of frames already in the range.
         """
         groups = self._parse_single_range(single_range)
         length = len(groups)
@@ -264,7 +265,7 @@ class Frange(object):
             step = int(groups[2])
             frames = xrange(start, end+1, step)
 
-        _f = [f for f in frames if f not in self._frames]
+        _f = [f for f in frames if f not in existing and not existing.add(f)]
         self._frames.extend(_f)
 
     def _remove_single_range(self, single_range):
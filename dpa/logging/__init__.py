@@ -3,14 +3,28 @@
 # Imports:
 # ----------------------------------------------------------------------------
 
+import atexit
 import logging
 import os
 import platform
+import Queue
+import sys
 import tempfile
+import threading
 
 from dpa.env.vars import DpaVars
 from dpa.user import current_username
 
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# max seconds to wait for queued records to be written when flushing
+FLUSH_TIMEOUT = 5.0
+
+# max number of queued records written per batch
+WRITE_BATCH_SIZE = 1000
+
 # ----------------------------------------------------------------------------
 # Private functions:
 # ----------------------------------------------------------------------------
@@ -19,6 +33,10 @@ def _create_log_file(path):
         f.write("")
     os.chmod(path, 0660)
 
+# ----------------------------------------------------------------------------
+def _flush_at_exit():
+    _LogWriter.flush_current()
+
 # ----------------------------------------------------------------------------
 def _log_level_from_name(level_name):
     return getattr(logging, level_name.upper())
@@ -92,12 +110,11 @@ class Logger(object):
             log_file = name + ".log"
             log_path = os.path.join(cls.log_dir, log_file)
 
-            # ensure path exists with proper permissions first
-            if not os.path.exists(log_path):
-                _create_log_file(log_path)
-
-            # create a handler to output to a log file, set the level to INFO
-            logfile_handler = logging.FileHandler(filename=log_path)
+            # create a handler to output to a log file, set the level to INFO.
+            # records are queued and written by a background thread so that
+            # callers never wait on the (often network) log directory. the
+            # file itself is created when the first record is written.
+            logfile_handler = _QueueHandler(log_path)
             logfile_handler.setLevel(_log_level_from_name('INFO'))
             logfile_handler.setFormatter(cls._logfile_formatter)
 
@@ -112,6 +129,17 @@ class Logger(object):
 
         return cls._logger_cache[name]
 
+    # ------------------------------------------------------------------------
+    @classmethod
+    def flush(cls, timeout=FLUSH_TIMEOUT):
+        """Wait for all queued records to be written to their log files.
+
+        Called automatically at exit. Processes exiting via os._exit should
+        call this first.
+
+        """
+        _LogWriter.flush_current(timeout=timeout)
+
     # ------------------------------------------------------------------------
     @classmethod
     def set_level(cls, level):
@@ -119,3 +147,152 @@ class Logger(object):
         cls.log_level = level
         cls._stdout_handler.setLevel(_log_level_from_name(level))
 
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _QueueHandler(logging.Handler):
+    """Formats records in the caller and queues them to be written."""
+
+    # ------------------------------------------------------------------------
+    def __init__(self, path):
+        logging.Handler.__init__(self)
+        self.path = path
+
+    # ------------------------------------------------------------------------
+    def emit(self, record):
+
+        # format now, in the caller. the record's args may change later.
+        try:
+            line = self.format(record) + "\n"
+            if isinstance(line, unicode):
+                line = line.encode('utf-8')
+        except Exception:
+            self.handleError(record)
+            return
+
+        _LogWriter.current().put(self.path, line)
+
+# ----------------------------------------------------------------------------
+class _LogWriter(object):
+    """Writes queued log records to their files from a background thread."""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    _instance_lock_pid = os.getpid()
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def current(cls):
+        """Returns the writer for this process, starting it if necessary."""
+
+        writer = cls._instance
+
+        # threads don't survive a fork. each process gets its own writer.
+        if writer is None or writer.pid != os.getpid():
+            if cls._instance_lock_pid != os.getpid():
+                cls._instance_lock = threading.Lock()
+                cls._instance_lock_pid = os.getpid()
+            with cls._instance_lock:
+                writer = cls._instance
+                if writer is None or writer.pid != os.getpid():
+                    writer = cls()
+                    cls._instance = writer
+
+        return writer
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def flush_current(cls, timeout=FLUSH_TIMEOUT):
+        """Flush this process' writer, if one has been started."""
+
+        writer = cls._instance
+        if writer is not None and writer.pid == os.getpid():
+            writer.flush(timeout=timeout)
+
+    # ------------------------------------------------------------------------
+    def __init__(self):
+
+        self.pid = os.getpid()
+        self._files = {}
+        self._queue = Queue.Queue()
+
+        self._thread = threading.Thread(
+            target=self._run, name="dpa-log-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Wait until everything queued so far has been written."""
+
+        if not self._thread.is_alive():
+            return
+
+        written = threading.Event()
+        self._queue.put((None, written))
+        written.wait(timeout)
+
+    # ------------------------------------------------------------------------
+    def put(self, path, line):
+        self._queue.put((path, line))
+
+    # ------------------------------------------------------------------------
+    def _open(self, path):
+
+        # ensure path exists with proper permissions first
+        if not os.path.exists(path):
+            _create_log_file(path)
+
+        log_fh = open(path, 'a')
+        self._files[path] = log_fh
+
+        return log_fh
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+
+        while True:
+
+            # block for the first record, then take whatever else is queued
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < WRITE_BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except Queue.Empty:
+                pass
+
+            self._write(batch)
+
+    # ------------------------------------------------------------------------
+    def _write(self, batch):
+
+        lines_by_path = {}
+        path_order = []
+        flush_events = []
+
+        for (path, item) in batch:
+            if path is None:
+                flush_events.append(item)
+                continue
+            if path not in lines_by_path:
+                lines_by_path[path] = []
+                path_order.append(path)
+            lines_by_path[path].append(item)
+
+        for path in path_order:
+            try:
+                log_fh = self._files.get(path) or self._open(path)
+                log_fh.write("".join(lines_by_path[path]))
+                log_fh.flush()
+            except (IOError, OSError) as e:
+                sys.stderr.write(
+                    "Unable to write log file {p}: {e}\n".format(p=path, e=e))
+                self._files.pop(path, None)
+
+        for event in flush_events:
+            event.set()
+
+# ----------------------------------------------------------------------------
+
+# write any buffered records before the interpreter exits
+atexit.register(_flush_at_exit)
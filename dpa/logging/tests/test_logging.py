@@ -0,0 +1,82 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.logging.tests.test_logging
+# -----------------------------------------------------------------------------
+"""Unit tests for dpa logging."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from dpa.logging import Logger
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all logging tests."""
+
+    return unittest.TestSuite([
+        LoggerTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class LoggerTestCase(unittest.TestCase):
+    """Logger file output tests."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.orig_log_dir = Logger.log_dir
+        self.log_dir = tempfile.mkdtemp()
+        Logger.log_dir = self.log_dir
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        Logger.flush()
+        Logger.log_dir = self.orig_log_dir
+        shutil.rmtree(self.log_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_file_created_on_first_record(self):
+        """Logger log file is only created when a record is written"""
+
+        logger = Logger.get("test_logging.lazy")
+        log_path = os.path.join(self.log_dir, "dpa.test_logging.lazy.log")
+
+        Logger.flush()
+        self.assertFalse(os.path.exists(log_path))
+
+        logger.info("first")
+        Logger.flush()
+        self.assertTrue(os.path.exists(log_path))
+        self.assertEqual(stat.S_IMODE(os.stat(log_path).st_mode), 0660)
+
+    # -------------------------------------------------------------------------
+    def test_records_written_in_order(self):
+        """Logger records are all written, in order, once flushed"""
+
+        logger = Logger.get("test_logging.order")
+        log_path = os.path.join(self.log_dir, "dpa.test_logging.order.log")
+
+        for i in range(500):
+            logger.info("record %d", i)
+        logger.debug("below the file level")
+        Logger.flush()
+
+        with open(log_path) as log_fh:
+            lines = log_fh.readlines()
+
+        self.assertEqual(len(lines), 500)
+        for (i, line) in enumerate(lines):
+            self.assertTrue(line.endswith("record {i}\n".format(i=i)))
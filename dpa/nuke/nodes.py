@@ -2,13 +2,14 @@
 
 from collections import defaultdict
 import os
-import re
 
 import nuke
 
+from dpa.product.representation.manifest import RepresentationManifest
 from dpa.ptask import PTask
 from dpa.ptask.area import PTaskArea, PTaskAreaError
 from dpa.ptask.spec import PTaskSpec
+from dpa.sync.manifest import ManifestError
 
 # -----------------------------------------------------------------------------
 
@@ -144,20 +145,20 @@ def read_sub_knob_changed(node=None, knob=None):
 
         repr_dir = PRODUCT_REPR_STR_TO_PATH[product_repr_str]
 
-        # populate the possible file names
-        file_specs = {}
-        frame_regex = re.compile('([,\w]+).(\d{4})\.(\w+)')
-        for file_name in os.listdir(repr_dir):
-            
-            matches = frame_regex.search(file_name)
-            if matches:
-                (file_base, frame_num, file_ext) = matches.groups()
-                spec = file_base + '.####.' + file_ext
-                file_specs[spec] = None
-
-        file_specs = sorted(file_specs.keys())
+        # populate the possible file names from the recorded sequences
+        try:
+            manifest = RepresentationManifest.load(repr_dir)
+        except ManifestError:
+            file_specs = []
+        else:
+            file_specs = [s.spec for s in manifest.sequences]
+
         node['product_seq_select'].setValues(file_specs)
 
+        if not file_specs:
+            node['file'].setValue('')
+            return
+
         file_str = os.path.join(repr_dir, file_specs[0]) 
         node['file'].setValue(file_str)
 
@@ -5,15 +5,12 @@ import os
 
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.location import current_location_code
-from dpa.product import Product, ProductError, validate_product_name
-from dpa.product.version import ProductVersion, ProductVersionError
-from dpa.product.representation import (
-    ProductRepresentation,
-    ProductRepresentationError,
-)
-from dpa.product.representation.status import (
-    ProductRepresentationStatus,
-    ProductRepresentationStatusError,
+from dpa.product import Product, validate_product_name
+from dpa.product.dependency import record_product_version
+from dpa.product.representation.manifest import RepresentationManifest
+from dpa.product.publish import (
+    PRODUCT, PRODUCT_REPR, PRODUCT_REPR_STATUS, PRODUCT_VERSION,
+    ProductPublishError, ensure_product_representation,
 )
 from dpa.ptask import PTask, PTaskError
 from dpa.ptask.area import PTaskArea, PTaskAreaError
@@ -21,6 +18,8 @@ from dpa.ptask.cli import ParsePTaskSpecArg
 from dpa.ptask.spec import PTaskSpec
 from dpa.shell.output import Output, Style
 from dpa.sync.action import SyncAction
+from dpa.sync.job import ENGINE_NATIVE
+from dpa.sync.manifest import ManifestError
 from dpa.user import current_username
 
 # -----------------------------------------------------------------------------
@@ -135,11 +134,8 @@ class ProductCreateAction(Action):
     # -------------------------------------------------------------------------
     def execute(self):
 
-        # create the product
-        self._create_product()
-        self._create_version()
-        self._create_representation()
-        self._create_status() 
+        # find or create the product, version, representation and status
+        self._ensure_representation()
         self._create_area()
         self._sync_path()
 
@@ -359,133 +355,57 @@ class ProductCreateAction(Action):
         return self._note
 
     # -------------------------------------------------------------------------
-    def _create_product(self):
-
-        existing = Product.list(
-            name=self._name,
-            category=self._category,
-            ptask=self._ptask.spec,
-        )
+    def _create_area(self):
         
-        if len(existing) == 1:
-            self._product = existing.pop()
-            self._product.update(description=self._description)
-            if self.interactive:
-                print "\nBase product exists: " + \
-                    Style.bright + self._product.spec + Style.reset
-        else:
-            try:
-                self._product = Product.create(
-                    ptask=self._ptask.spec,
-                    name=self._name,
-                    category=self._category,
-                    description=self._description,
-                    creator=current_username(),
-                )
-            except ProductError as e:
-                raise ActionError("Unable to create product: " + str(e))
-            else:
-                if self.interactive:
-                    print "\nCreated base product: " + \
-                        Style.bright + self._product.spec + Style.reset
+        try:
+            self._product_area = PTaskArea.create(self.product_repr)
+        except PTaskAreaError as e:
+            raise ActionError(
+                "Unable to create product area on disk: " + str(e))
 
     # -------------------------------------------------------------------------
-    def _create_version(self):
-
-        existing = ProductVersion.list(
-            ptask_version=self._ptask_version.spec,
-            product=self._product.spec,
-        )
+    def _ensure_representation(self):
 
-        if len(existing) == 1:
-            self._product_version = existing.pop()
-            self._product_version.update(release_note=self._note)
-            if self.interactive:
-                print "\nProduct version exists: " + \
-                    Style.bright + self._product_version.spec + Style.reset
-        else:
-            try:
-                self._product_version = ProductVersion.create(
-                    ptask_version=self._ptask_version.spec,
-                    product=self._product.spec,
-                    release_note=self._note,
-                    creator=current_username(),
-                )
-            except ProductVersionError as e:
-                raise ActionError("Unable to create product version: " + str(e))
-            else:
-                if self.interactive:
-                    print "\nCreated product version: " + \
-                        Style.bright + self._product_version.spec + Style.reset
+        try:
+            publish = ensure_product_representation(
+                ptask_version_spec=self._ptask_version.spec,
+                name=self._name,
+                category=self._category,
+                description=self._description,
+                resolution=self._resolution,
+                file_type=self._file_type,
+                release_note=self._note,
+                location_code=current_location_code(),
+                creator=current_username(),
+            )
+        except ProductPublishError as e:
+            raise ActionError(str(e))
 
-    # -------------------------------------------------------------------------
-    def _create_representation(self):
+        self._product = publish.product
+        self._product_version = publish.product_version
+        self._product_repr = publish.product_repr
+        self._product_repr_status = publish.product_repr_status
 
-        existing = ProductRepresentation.list(
-            product_version=self._product_version.spec,
-            resolution=self._resolution,
-            representation_type=self._file_type,
-        )
+        if PRODUCT_VERSION in publish.created:
+            record_product_version(self._product_version.spec,
+                self._ptask_version.spec)
 
-        if len(existing) == 1:
-            self._product_repr = existing.pop()
-            if self.interactive:
-                print "\nProduct representation exists: " + \
-                    Style.bright + self._product_repr.spec + Style.reset
-        else:
-            try:
-                self._product_repr = ProductRepresentation.create(
-                     product_version=self._product_version.spec,
-                     resolution=self._resolution,
-                     representation_type=self._file_type,
-                     creation_location=current_location_code(),
-                     creator=current_username(),
-                )
-            except ProductRepresentationError as e:
-                raise ActionError(
-                    "Unable to create product representation: " + str(e))
-            else:
-                if self.interactive:
-                    print "\nCreated product representation: " + \
-                        Style.bright + self._product_repr.spec + Style.reset
-    
-    # -------------------------------------------------------------------------
-    def _create_status(self):
-        
-        existing = ProductRepresentationStatus.list(
-            product_representation=self._product_repr.spec,
-            location=current_location_code(),
-        )
+        if not self.interactive:
+            return
 
-        if len(existing) == 1:
-            self._product_repr_status = existing.pop()
-            if self.interactive:
-                print "\nProduct representation status exists: " + \
-                    Style.bright + self._product_repr_status.spec + Style.reset
-        else:
-            try:
-                self._product_repr_status = ProductRepresentationStatus.create(
-                    product_representation=self._product_repr.spec,
-                    location=current_location_code(),
-                    status=1,
-                )
-            except ProductRepresentationStatusError as e:
-                raise ActionError(
-                    "Unable to create product representation status: " + str(e))
+        for (key, obj, label) in [
+            (PRODUCT, self._product, "base product"),
+            (PRODUCT_VERSION, self._product_version, "product version"),
+            (PRODUCT_REPR, self._product_repr, "product representation"),
+            (PRODUCT_REPR_STATUS, self._product_repr_status,
+                "product representation status"),
+        ]:
+            if key in publish.created:
+                print "\nCreated " + label + ": " + \
+                    Style.bright + obj.spec + Style.reset
             else:
-                if self.interactive:
-                    print "\nCreated product representation status: " + \
-                        Style.bright + self._product_repr_status.spec + \
-                        Style.reset
-
-    # -------------------------------------------------------------------------
-    def _create_area(self):
-        
-        try:
-            self._product_area = PTaskArea.create(self.product_repr)
-        except PTaskAreaError as e:
-            raise ActionError(
-                "Unable to create product area on disk: " + str(e))
+                print "\n" + label[0].upper() + label[1:] + " exists: " + \
+                    Style.bright + obj.spec + Style.reset
 
     # -------------------------------------------------------------------------
     def _parse_product(self):
@@ -547,9 +467,12 @@ class ProductCreateAction(Action):
         if not self._path:
             return
 
+        # representation areas aren't edited in place, so the manifest the
+        # native engine records there is kept up to date
         sync = SyncAction(
             source=self._path,
             destination=self._product_area.path,
+            engine=ENGINE_NATIVE,
         )
 
         try:
@@ -557,3 +480,9 @@ class ProductCreateAction(Action):
         except ActionError as e:
             raise ActionError("Failed to sync product source: " + str(e))
 
+        try:
+            RepresentationManifest.record(self._product_area.path)
+        except ManifestError as e:
+            self.logger.warning(
+                "Unable to record representation files: " + str(e))
+
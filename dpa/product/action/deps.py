@@ -0,0 +1,160 @@
+
+# -----------------------------------------------------------------------------
+
+from dpa.action import Action, ActionError
+from dpa.product.dependency import DependencyGraph, DependencyGraphError
+from dpa.ptask.area import PTaskArea
+from dpa.ptask.spec import PTaskSpec
+from dpa.shell.output import Output, Style
+
+# -----------------------------------------------------------------------------
+class ProductDependenciesAction(Action):
+    """List what depends on a product, or what a ptask depends on."""
+
+    name = "deps"
+    target_type = "product"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "spec",
+            nargs="?",
+            default="",
+            help="A product, product version, ptask or ptask version spec.",
+        )
+
+        parser.add_argument(
+            "-d", "--depth",
+            default=None,
+            metavar="<n>",
+            type=int,
+            help="Follow at most this many levels of subscriptions. " + \
+                 "Default is all of them.",
+        )
+
+        parser.add_argument(
+            "-u", "--upstream",
+            action="store_true",
+            help="List what the spec depends on, rather than what " + \
+                 "depends on it.",
+        )
+
+        parser.add_argument(
+            "-r", "--refresh",
+            action="store_true",
+            help="Rebuild the cached dependency index first.",
+        )
+
+    # -------------------------------------------------------------------------
+    def __init__(self, spec, depth=None, upstream=False, refresh=False):
+
+        super(ProductDependenciesAction, self).__init__(spec, depth=depth,
+            upstream=upstream, refresh=refresh)
+
+        self._spec = spec
+        self._depth = depth
+        self._upstream = upstream
+        self._refresh = refresh
+
+        self._dependencies = {}
+
+    # -------------------------------------------------------------------------
+    def execute(self):
+
+        # dependencies may cross into other projects
+        try:
+            graph = DependencyGraph.load_connected(self.spec,
+                upstream=self.upstream, depth=self.depth, refresh=self.refresh)
+        except DependencyGraphError as e:
+            raise ActionError(str(e))
+
+        if self.upstream:
+            self._dependencies = graph.upstream(self.spec, depth=self.depth)
+        else:
+            self._dependencies = graph.downstream(self.spec, depth=self.depth)
+
+        if self.interactive:
+            self._dependency_table()
+
+    # -------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        if self._depth is not None and self._depth < 1:
+            raise ActionError("Depth must be at least 1.")
+
+        cur_spec = PTaskArea.current().spec
+        self._spec = PTaskSpec.get(self._spec, relative_to=cur_spec)
+        if not self._spec:
+            raise ActionError("No spec to list dependencies for.")
+
+    # -------------------------------------------------------------------------
+    @property
+    def spec(self):
+        return self._spec
+
+    # -------------------------------------------------------------------------
+    @property
+    def depth(self):
+        return self._depth
+
+    # -------------------------------------------------------------------------
+    @property
+    def upstream(self):
+        return self._upstream
+
+    # -------------------------------------------------------------------------
+    @property
+    def refresh(self):
+        return self._refresh
+
+    # -------------------------------------------------------------------------
+    @property
+    def dependencies(self):
+        """Specs reached, mapped to their depth, once executed."""
+        return self._dependencies
+
+    # -------------------------------------------------------------------------
+    def _dependency_table(self):
+
+        if not self._dependencies:
+            print "\nNo {d} dependencies found for: {s}\n".format(
+                d="upstream" if self.upstream else "downstream", s=self.spec)
+            return
+
+        depth = "Depth"
+        kind = "Kind"
+        spec = "Spec"
+
+        output = Output()
+        output.vertical_padding = 0
+        output.vertical_separator = None
+        output.table_header_separator = "-"
+        output.header_names = [depth, kind, spec]
+        output.set_header_alignment({depth: "right"})
+        output.title = " {d} of {s} ".format(
+            d="Upstream" if self.upstream else "Downstream", s=self.spec)
+
+        for (dep_spec, dep_depth) in sorted(self._dependencies.iteritems(),
+            key=lambda (s, d): (d, s)):
+
+            is_product = PTaskSpec.PRODUCT_SEPARATOR in \
+                dep_spec.split(PTaskSpec.SEPARATOR)
+
+            output.add_item(
+                {
+                    depth: str(dep_depth),
+                    kind: "product" if is_product else "ptask",
+                    spec: dep_spec,
+                },
+                colors={
+                    spec: Style.bright,
+                },
+            )
+
+        output.dump(output_format='table')
@@ -1,5 +1,7 @@
 # -----------------------------------------------------------------------------
 
+import os
+
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.notify import Notification
 from dpa.shell.output import Output, Style, Fg
@@ -7,6 +9,7 @@ from dpa.product import Product, ProductError
 from dpa.product.version import ProductVersion, ProductVersionError
 from dpa.ptask.area import PTaskArea
 from dpa.ptask.spec import PTaskSpec
+from dpa.sync.manifest import Manifest, ManifestError
 from dpa.user import User
 
 # -----------------------------------------------------------------------------
@@ -149,6 +152,8 @@ class ProductUpdateAction(Action):
                 for (key, value) in data.iteritems():
                     print "  " + key + "=" + str(value)
                 version.update(**data)
+                if data.get('published'):
+                    self._record_manifests(version)
 
         if self.official:
             self.product.set_official(self.official)
@@ -427,6 +432,29 @@ class ProductUpdateAction(Action):
 
         return versions
 
+    # -------------------------------------------------------------------------
+    def _record_manifests(self, version):
+        """Record the checksum manifests of the version's local
+        representations.
+
+        Published versions shouldn't change, so later syncs of them can rely
+        on the manifest rather than walking the files, and copies at other
+        locations can be verified against its checksums.
+
+        """
+
+        for rep in version.representations:
+            rep_dir = rep.area.path
+            if not os.path.isdir(rep_dir):
+                continue
+            try:
+                Manifest.record(rep_dir, checksum=True)
+            except ManifestError as e:
+                self.logger.warning(
+                    "Unable to record manifest for {r}: {e}".format(
+                        r=rep.spec, e=e)
+                )
+
     # -------------------------------------------------------------------------
     def _version_table(self, versions, title='Versions'):
 
@@ -0,0 +1,240 @@
+
+# -----------------------------------------------------------------------------
+
+import os
+
+from dpa.action import Action, ActionError
+from dpa.product import Product, ProductError
+from dpa.product.representation import (
+    ProductRepresentation, ProductRepresentationError,
+)
+from dpa.product.version import ProductVersion, ProductVersionError
+from dpa.ptask.area import PTaskArea
+from dpa.ptask.spec import PTaskSpec
+from dpa.shell.output import Output, Style, Fg
+from dpa.sync.manifest import ManifestError
+from dpa.sync.verify import verify_tree
+
+# -----------------------------------------------------------------------------
+class ProductVerifyAction(Action):
+    """Verify product representations against their checksum manifests."""
+
+    name = "verify"
+    target_type = "product"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "spec",
+            nargs="?",
+            default="",
+            help="The product, product version or representation to verify.",
+        )
+
+        parser.add_argument(
+            "-v", "--version",
+            default=None,
+            metavar="<v>",
+            type=str,
+            help="The version of the product to verify. Default is the " + \
+                 "official version, otherwise the latest published.",
+        )
+
+        parser.add_argument(
+            "-w", "--workers",
+            default=None,
+            metavar="<n>",
+            type=int,
+            help="Number of threads hashing files. Default is one per cpu.",
+        )
+
+    # -------------------------------------------------------------------------
+    def __init__(self, spec, version=None, workers=None):
+
+        super(ProductVerifyAction, self).__init__(spec, version=version,
+            workers=workers)
+
+        self._spec = spec
+        self._version = version
+        self._workers = workers
+
+        self._representations = []
+        self._mismatches = {}
+        self._unverified = []
+
+    # -------------------------------------------------------------------------
+    def execute(self):
+
+        for rep in self.representations:
+
+            rep_dir = rep.area.path
+            if not os.path.isdir(rep_dir):
+                self.logger.warning(
+                    "Representation not at this location: " + rep.spec)
+                self._unverified.append(rep)
+                continue
+
+            try:
+                mismatches = verify_tree(rep_dir, workers=self.workers)
+            except ManifestError as e:
+                self.logger.warning(
+                    "Unable to verify {r}: {e}".format(r=rep.spec, e=e))
+                self._unverified.append(rep)
+                continue
+
+            if mismatches:
+                self._mismatches[rep.spec] = mismatches
+
+        if self.interactive:
+            if self._mismatches:
+                self._mismatch_table()
+
+            verified = len(self.representations) - len(self._unverified)
+            print "\nVerified {v} of {t} representations: {m} with " \
+                "mismatches.\n".format(
+                    v=verified,
+                    t=len(self.representations),
+                    m=len(self._mismatches),
+                )
+
+        if self._mismatches:
+            raise ActionError(
+                "Mismatched files found in: " + \
+                ", ".join(sorted(self._mismatches.keys()))
+            )
+
+    # -------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        cur_spec = PTaskArea.current().spec
+        full_spec = PTaskSpec.get(self.spec, relative_to=cur_spec)
+
+        # a representation or version spec, most specific first
+        try:
+            self._representations = [ProductRepresentation.get(full_spec)]
+            return
+        except ProductRepresentationError:
+            pass
+
+        try:
+            version = ProductVersion.get(full_spec)
+        except ProductVersionError:
+            version = None
+
+        if not version:
+            try:
+                product = Product.get(full_spec)
+            except ProductError:
+                raise ActionError(
+                    'Could not determine product from: "{s}"'.format(
+                        s=self.spec
+                    )
+                )
+            version = self._product_version(product)
+
+        self._representations = version.representations
+        if not self._representations:
+            raise ActionError(
+                "No representations to verify for: " + version.spec)
+
+    # -------------------------------------------------------------------------
+    @property
+    def spec(self):
+        return self._spec
+
+    # -------------------------------------------------------------------------
+    @property
+    def version(self):
+        return self._version
+
+    # -------------------------------------------------------------------------
+    @property
+    def workers(self):
+        return self._workers
+
+    # -------------------------------------------------------------------------
+    @property
+    def representations(self):
+        return self._representations
+
+    # -------------------------------------------------------------------------
+    @property
+    def mismatches(self):
+        """Mismatched files, by representation spec."""
+        return self._mismatches
+
+    # -------------------------------------------------------------------------
+    def _product_version(self, product):
+
+        if self.version:
+            try:
+                matches = ProductVersion.list(
+                    product=product.spec,
+                    number=self.version,
+                )
+            except ProductVersionError:
+                matches = []
+            if len(matches) != 1:
+                raise ActionError(
+                    "Could not find a version {n} for '{s}'".format(
+                        n=self.version, s=product.spec
+                    )
+                )
+            return matches[0]
+
+        if product.official_version:
+            return product.official_version
+
+        published = [v for v in product.versions if v.published]
+        if not published:
+            raise ActionError(
+                "No official or published version of: " + product.spec)
+
+        return sorted(published, key=lambda v: v.number)[-1]
+
+    # -------------------------------------------------------------------------
+    def _mismatch_table(self):
+
+        path = "Path"
+        reason = "Mismatch"
+        expected = "Expected"
+        actual = "Actual"
+
+        for (rep_spec, mismatches) in sorted(self._mismatches.iteritems()):
+
+            output = Output()
+            output.vertical_padding = 0
+            output.vertical_separator = None
+            output.table_header_separator = "-"
+            output.header_names = [
+                path,
+                reason,
+                expected,
+                actual,
+            ]
+            output.title = " {s} ".format(s=rep_spec)
+
+            for mismatch in mismatches:
+                output.add_item(
+                    {
+                        path: mismatch.path,
+                        reason: mismatch.reason,
+                        expected: _value(mismatch.expected),
+                        actual: _value(mismatch.actual),
+                    },
+                    colors={
+                        reason: Style.bright + Fg.red,
+                    },
+                )
+
+            output.dump(output_format='table')
+
+# -----------------------------------------------------------------------------
+def _value(value):
+    return "" if value is None else str(value)
@@ -0,0 +1,483 @@
+"""An index of which ptask versions depend on which product versions.
+
+The graph links each product version to the ptask versions subscribing to
+it, and each ptask version to the product versions it created. Following
+those links answers what is downstream of a product (everything that may
+need updating when it is republished) and what is upstream of a ptask (the
+products it is built from), to any depth.
+
+Graphs are built from two bulk listings per project and cached in the
+shared log directory. The subscription and product actions record their
+changes in any cached graph as they make them, and a cached graph older
+than ``max_age`` is rebuilt the next time it is loaded. A project's graph
+includes subscriptions to and from other projects, but not what those
+projects created. :py:meth:`DependencyGraph.load_connected` merges in the
+graphs of the other projects reached.
+
+Classes
+-------
+DependencyGraph
+    Subscription and creation links between ptask and product versions.
+
+DependencyGraphError
+    Raised when a graph can't be built or cached.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import defaultdict
+from contextlib import contextmanager
+import errno
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+from dpa.logging import Logger
+from dpa.ptask.spec import PTaskSpec
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# cached graphs, by project, in the shared log directory
+CACHE_DIR = "product_deps"
+
+# seconds before a cached graph is rebuilt
+DEFAULT_MAX_AGE = 60 * 60
+
+# bumped when the cache format changes in an incompatible way
+CACHE_FORMAT = 1
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class DependencyGraph(object):
+    """Subscription and creation links between ptask and product versions.
+
+    Usage::
+
+        >>> graph = DependencyGraph.load("show")
+        >>> graph.downstream("show=asset=char=products=hero=rig")
+        {'show=shot010=anim@0003': 1, 'show=shot010=anim=...=0002': 1, ...}
+        >>> graph.upstream("show=shot010=anim@0003", depth=1)
+
+    Queries take a product, product version, ptask or ptask version spec. A
+    product or ptask spec stands for all of its versions. Results map each
+    spec reached to its depth: the number of subscriptions followed to
+    reach it.
+
+    The scope is the spec of the ptask, usually a project, whose
+    subscriptions and product versions are indexed.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def build(cls, scope):
+        """Build the graph for the scope from bulk listings."""
+
+        from dpa.product.subscription import (
+            ProductSubscription, ProductSubscriptionError,
+        )
+        from dpa.product.version import ProductVersion, ProductVersionError
+
+        try:
+            subs = ProductSubscription.list(search=scope)
+            product_versions = ProductVersion.list(search=scope)
+        except (ProductSubscriptionError, ProductVersionError) as e:
+            raise DependencyGraphError(
+                "Unable to list dependencies: " + str(e))
+
+        # the search is a fuzzy match
+        in_scope = lambda spec: _in_scope(spec, scope)
+
+        return cls(
+            scope,
+            subscriptions=[
+                (s.ptask_version_spec, s.product_version_spec)
+                for s in subs if in_scope(s.ptask_version_spec) or
+                    in_scope(s.product_version_spec)
+            ],
+            product_versions=[
+                (v.spec, v.ptask_version_spec)
+                for v in product_versions if in_scope(v.spec)
+            ],
+        )
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def load(cls, scope, max_age=DEFAULT_MAX_AGE, refresh=False):
+        """The cached graph for the scope, rebuilt if missing or too old."""
+
+        graph = None
+        if not refresh:
+            graph = cls.read(_cache_path(scope))
+
+        if graph is None or graph.age > max_age:
+            graph = cls.build(scope)
+            path = _cache_path(scope)
+            try:
+                with _locked(path):
+                    graph.write(path)
+            except DependencyGraphError as e:
+                Logger.get().warning(str(e))
+
+        return graph
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def load_connected(cls, spec, upstream=False, depth=None,
+        max_age=DEFAULT_MAX_AGE, refresh=False):
+        """The spec's project graph, merged with the projects it reaches.
+
+        Follows the spec's dependencies, downstream unless ``upstream`` is
+        True, to at most ``depth``, loading the graph of each other project
+        reached until no new projects are found.
+
+        """
+
+        scopes = set([project_scope(spec)])
+        graph = cls.load(project_scope(spec), max_age=max_age,
+            refresh=refresh)
+
+        while True:
+            if upstream:
+                reached = graph.upstream(spec, depth=depth)
+            else:
+                reached = graph.downstream(spec, depth=depth)
+
+            new_scopes = set(project_scope(s) for s in reached) - scopes
+            if not new_scopes:
+                return graph
+
+            for scope in sorted(new_scopes):
+                graph.merge(cls.load(scope, max_age=max_age,
+                    refresh=refresh))
+            scopes.update(new_scopes)
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def read(cls, path):
+        """Read a cached graph. Returns None if it can't be read."""
+
+        try:
+            with open(path) as graph_fh:
+                data = json.load(graph_fh)
+        except (IOError, ValueError):
+            return None
+
+        if data.get('format') != CACHE_FORMAT:
+            return None
+
+        return cls(
+            data['scope'],
+            subscriptions=data['subscriptions'],
+            product_versions=data['product_versions'],
+            built=data['built'],
+        )
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, scope, subscriptions=None, product_versions=None,
+        built=None):
+
+        self._scope = scope
+        self._built = built or time.time()
+
+        # product version -> subscribing ptask versions, and back
+        self._subscribers = defaultdict(set)
+        self._subscriptions = defaultdict(set)
+
+        # ptask version -> product versions it created, and back
+        self._created = defaultdict(set)
+        self._creator = {}
+
+        for (ptask_version_spec, product_version_spec) in subscriptions or []:
+            self.add_subscription(ptask_version_spec, product_version_spec)
+
+        for (product_version_spec, ptask_version_spec) in \
+            product_versions or []:
+            self.add_product_version(product_version_spec, ptask_version_spec)
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def add_product_version(self, product_version_spec, ptask_version_spec):
+
+        self._created[ptask_version_spec].add(product_version_spec)
+        self._creator[product_version_spec] = ptask_version_spec
+
+    # ------------------------------------------------------------------------
+    def add_subscription(self, ptask_version_spec, product_version_spec):
+
+        self._subscribers[product_version_spec].add(ptask_version_spec)
+        self._subscriptions[ptask_version_spec].add(product_version_spec)
+
+    # ------------------------------------------------------------------------
+    def merge(self, graph):
+        """Add the links of another graph, such as another project's."""
+
+        for (product_version_spec, ptask_version_specs) in \
+            graph._subscribers.iteritems():
+            for ptask_version_spec in ptask_version_specs:
+                self.add_subscription(ptask_version_spec, product_version_spec)
+
+        for (product_version_spec, ptask_version_spec) in \
+            graph._creator.iteritems():
+            self.add_product_version(product_version_spec, ptask_version_spec)
+
+    # ------------------------------------------------------------------------
+    def remove_subscription(self, ptask_version_spec, product_version_spec):
+
+        self._subscribers[product_version_spec].discard(ptask_version_spec)
+        self._subscriptions[ptask_version_spec].discard(product_version_spec)
+
+    # ------------------------------------------------------------------------
+    def downstream(self, spec, depth=None):
+        """Ptask and product versions depending on the spec.
+
+        Depth 1 is the ptask versions subscribing to the spec's product
+        versions, and the product versions they created. Depth 2 follows the
+        subscriptions to those, and so on, to at most ``depth`` if supplied.
+
+        """
+
+        (product_versions, ptask_versions) = self._versions_of(spec)
+        frontier = set(product_versions)
+        for ptask_version in ptask_versions:
+            frontier.update(self._created.get(ptask_version, []))
+
+        reached = {}
+        level = 1
+        while frontier and (depth is None or level <= depth):
+            next_frontier = set()
+            for product_version in frontier:
+                for ptask_version in self._subscribers.get(
+                    product_version, []):
+                    if ptask_version in reached:
+                        continue
+                    reached[ptask_version] = level
+                    for created in self._created.get(ptask_version, []):
+                        if created not in reached:
+                            reached[created] = level
+                            next_frontier.add(created)
+            frontier = next_frontier
+            level += 1
+
+        return reached
+
+    # ------------------------------------------------------------------------
+    def upstream(self, spec, depth=None):
+        """Product and ptask versions the spec depends on.
+
+        Depth 1 is the product versions the spec's ptask versions subscribe
+        to, and the ptask versions that created them. Depth 2 follows those
+        ptask versions' subscriptions, and so on, to at most ``depth`` if
+        supplied.
+
+        """
+
+        (product_versions, ptask_versions) = self._versions_of(spec)
+        frontier = set(ptask_versions)
+        for product_version in product_versions:
+            if product_version in self._creator:
+                frontier.add(self._creator[product_version])
+
+        reached = {}
+        level = 1
+        while frontier and (depth is None or level <= depth):
+            next_frontier = set()
+            for ptask_version in frontier:
+                for product_version in self._subscriptions.get(
+                    ptask_version, []):
+                    if product_version in reached:
+                        continue
+                    reached[product_version] = level
+                    creator = self._creator.get(product_version)
+                    if creator and creator not in reached:
+                        reached[creator] = level
+                        next_frontier.add(creator)
+            frontier = next_frontier
+            level += 1
+
+        return reached
+
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+
+        return {
+            'format': CACHE_FORMAT,
+            'scope': self._scope,
+            'built': self._built,
+            'subscriptions': sorted(
+                [ptv, pv] for (pv, ptvs) in self._subscribers.iteritems()
+                for ptv in ptvs
+            ),
+            'product_versions': sorted(
+                [pv, ptv] for (pv, ptv) in self._creator.iteritems()),
+        }
+
+    # ------------------------------------------------------------------------
+    def write(self, path=None):
+        """Write the graph to the cache, or the path supplied."""
+
+        path = path or _cache_path(self._scope)
+
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(
+                prefix="." + os.path.basename(path),
+                dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w') as graph_fh:
+                json.dump(self.to_dict(), graph_fh, separators=(',', ':'))
+            os.chmod(tmp_path, 0666)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            raise DependencyGraphError(
+                "Unable to write dependency graph: " + str(e))
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def age(self):
+        """Seconds since the graph was built from the listings."""
+        return time.time() - self._built
+
+    # ------------------------------------------------------------------------
+    @property
+    def scope(self):
+        return self._scope
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _versions_of(self, spec):
+
+        product_versions = set(self._subscribers) | set(self._creator)
+        ptask_versions = set(self._subscriptions) | set(self._created)
+
+        if spec in product_versions or spec in ptask_versions:
+            return ([spec] if spec in product_versions else [],
+                [spec] if spec in ptask_versions else [])
+
+        # all versions of a product or ptask
+        product_prefix = spec + PTaskSpec.SEPARATOR
+        ptask_prefix = spec + PTaskSpec.VERSION
+
+        return (
+            [v for v in product_versions if v.startswith(product_prefix) and
+                _is_version_number(v[len(product_prefix):])],
+            [v for v in ptask_versions if v.startswith(ptask_prefix) and
+                _is_version_number(v[len(ptask_prefix):])],
+        )
+
+# ----------------------------------------------------------------------------
+class DependencyGraphError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def project_scope(spec):
+    """The scope a spec's dependencies are indexed under: its project."""
+    return spec.split(PTaskSpec.SEPARATOR)[0].split(PTaskSpec.VERSION)[0]
+
+# ----------------------------------------------------------------------------
+def record_product_version(product_version_spec, ptask_version_spec):
+    """Add a new product version to the cached graph, if there is one."""
+
+    _update_cache(product_version_spec,
+        lambda g: g.add_product_version(
+            product_version_spec, ptask_version_spec))
+
+# ----------------------------------------------------------------------------
+def record_subscription(ptask_version_spec, product_version_spec):
+    """Add a new subscription to the cached graphs, if there are any."""
+
+    for spec in set([ptask_version_spec, product_version_spec]):
+        _update_cache(spec,
+            lambda g: g.add_subscription(
+                ptask_version_spec, product_version_spec))
+
+# ----------------------------------------------------------------------------
+def forget_subscription(ptask_version_spec, product_version_spec):
+    """Remove a subscription from the cached graphs, if there are any."""
+
+    for spec in set([ptask_version_spec, product_version_spec]):
+        _update_cache(spec,
+            lambda g: g.remove_subscription(
+                ptask_version_spec, product_version_spec))
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _cache_path(scope):
+
+    cache_dir = os.path.join(Logger.log_dir, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        # shared by everyone
+        try:
+            os.makedirs(cache_dir)
+            os.chmod(cache_dir, 0777)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                cache_dir = tempfile.gettempdir()
+
+    return os.path.join(cache_dir, (scope or "_all") + ".json")
+
+# ----------------------------------------------------------------------------
+def _in_scope(spec, scope):
+
+    return not scope or spec == scope or \
+        spec.startswith(scope + PTaskSpec.SEPARATOR) or \
+        spec.startswith(scope + PTaskSpec.VERSION)
+
+# ----------------------------------------------------------------------------
+def _is_version_number(text):
+    return text.isdigit()
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def _locked(path):
+    """Hold an exclusive lock on the cache file while updating it."""
+
+    try:
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0666)
+    except OSError as e:
+        Logger.get().warning(
+            "Unable to lock dependency graph: " + str(e))
+        fd = None
+
+    try:
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+# ----------------------------------------------------------------------------
+def _update_cache(spec, update):
+
+    # a change made by this process. only graphs that are already cached are
+    # updated; a missing graph is built with it included. the lock keeps
+    # concurrent updates from losing each other's changes.
+    path = _cache_path(project_scope(spec))
+    with _locked(path):
+        graph = DependencyGraph.read(path)
+        if graph is None:
+            return
+
+        update(graph)
+        try:
+            graph.write(path)
+        except DependencyGraphError as e:
+            Logger.get().warning(str(e))
@@ -0,0 +1,250 @@
+"""Ensure a product representation exists, creating whatever is missing.
+
+Publishing a product needs the product, a version of it for the ptask
+version, a representation of that version and the representation's status
+at the current location. Each may already exist from an earlier publish, so
+the whole chain is upserted: existing objects are reused and only missing
+ones are created.
+
+The data server's ``ensure`` request does this in a single round trip. If
+the server doesn't support it, the chain is resolved with individual
+requests for the rest of the process: the product and version are looked
+up concurrently, and lookups of objects that can't exist yet, below one
+that was just created, are skipped.
+
+Classes
+-------
+ProductPublish
+    The objects of an ensured product representation.
+
+ProductPublishError
+    Raised when the chain can't be ensured.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from dpa.product import Product, ProductError
+from dpa.product.representation import (
+    ProductRepresentation, ProductRepresentationError,
+)
+from dpa.product.representation.availability import STATUS_AVAILABLE
+from dpa.product.representation.status import (
+    ProductRepresentationStatus, ProductRepresentationStatusError,
+)
+from dpa.product.version import ProductVersion, ProductVersionError
+from dpa.ptask.spec import PTaskSpec
+from dpa.restful.client import RestfulClient, RestfulClientError
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# the data type of the server's single request upsert
+DATA_TYPE = 'product-publishes'
+
+# keys of the objects in the chain, as returned by the server
+PRODUCT = 'product'
+PRODUCT_VERSION = 'product_version'
+PRODUCT_REPR = 'product_representation'
+PRODUCT_REPR_STATUS = 'product_representation_status'
+
+# http statuses from servers without the ensure request
+_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+# set once the server turns out not to support the ensure request
+_ensure_supported = True
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class ProductPublish(namedtuple('ProductPublish',
+    'product product_version product_repr product_repr_status created')):
+    """The objects of an ensured product representation.
+
+    ``created`` lists the keys of the objects that were created rather than
+    found: PRODUCT, PRODUCT_VERSION, PRODUCT_REPR and PRODUCT_REPR_STATUS.
+
+    """
+    __slots__ = ()
+
+# ----------------------------------------------------------------------------
+class ProductPublishError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def ensure_product_representation(ptask_version_spec, name, category,
+    description, resolution, file_type, release_note, location_code,
+    creator):
+    """Find or create the product chain for a representation.
+
+    The description and release note of an existing product and version are
+    updated if they differ. Returns a :py:class:`ProductPublish`.
+
+    """
+
+    global _ensure_supported
+
+    data = {
+        'ptask_version': ptask_version_spec,
+        'name': name,
+        'category': category,
+        'description': description,
+        'resolution': resolution,
+        'representation_type': file_type,
+        'release_note': release_note,
+        'location': location_code,
+        'creator': creator,
+        'status': STATUS_AVAILABLE,
+    }
+
+    if _ensure_supported:
+        try:
+            return _ensure_remote(data)
+        except RestfulClientError as e:
+            # no status means no url is configured for the request
+            if e.status_code is not None and \
+                e.status_code not in _UNSUPPORTED_STATUSES:
+                raise ProductPublishError(
+                    "Unable to ensure product representation: " + str(e))
+            _ensure_supported = False
+
+    return _ensure_local(data)
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _call(lookup):
+
+    try:
+        return lookup()
+    except (ProductError, ProductVersionError) as e:
+        raise ProductPublishError("Unable to look up product: " + str(e))
+
+# ----------------------------------------------------------------------------
+def _ensure_local(data):
+
+    ptask_version_spec = data['ptask_version']
+    ptask_spec = ptask_version_spec.split(PTaskSpec.VERSION)[0]
+    product_spec = PTaskSpec.SEPARATOR.join(
+        [ptask_spec, PTaskSpec.PRODUCT_SEPARATOR, data['name'],
+            data['category']])
+
+    created = []
+
+    # the product's spec is known up front, so both are looked up at once
+    lookups = [
+        lambda: Product.list(name=data['name'], category=data['category'],
+            ptask=ptask_spec),
+        lambda: ProductVersion.list(ptask_version=ptask_version_spec,
+            product=product_spec),
+    ]
+    pool = ThreadPool(len(lookups))
+    try:
+        (products, product_versions) = pool.map(_call, lookups)
+    finally:
+        pool.close()
+        pool.join()
+
+    try:
+        if len(products) == 1:
+            product = products[0]
+            if data['description'] and \
+                product.description != data['description']:
+                product.update(description=data['description'])
+        else:
+            product = Product.create(
+                ptask=ptask_spec,
+                name=data['name'],
+                category=data['category'],
+                description=data['description'],
+                creator=data['creator'],
+            )
+            created.append(PRODUCT)
+            product_versions = []
+    except ProductError as e:
+        raise ProductPublishError("Unable to create product: " + str(e))
+
+    try:
+        if len(product_versions) == 1:
+            product_version = product_versions[0]
+            if data['release_note'] and \
+                product_version.release_note != data['release_note']:
+                product_version.update(release_note=data['release_note'])
+        else:
+            product_version = ProductVersion.create(
+                ptask_version=ptask_version_spec,
+                product=product.spec,
+                release_note=data['release_note'],
+                creator=data['creator'],
+            )
+            created.append(PRODUCT_VERSION)
+    except ProductVersionError as e:
+        raise ProductPublishError(
+            "Unable to create product version: " + str(e))
+
+    try:
+        product_reprs = []
+        if PRODUCT_VERSION not in created:
+            product_reprs = ProductRepresentation.list(
+                product_version=product_version.spec,
+                resolution=data['resolution'],
+                representation_type=data['representation_type'],
+            )
+        if len(product_reprs) == 1:
+            product_repr = product_reprs[0]
+        else:
+            product_repr = ProductRepresentation.create(
+                product_version=product_version.spec,
+                resolution=data['resolution'],
+                representation_type=data['representation_type'],
+                creation_location=data['location'],
+                creator=data['creator'],
+            )
+            created.append(PRODUCT_REPR)
+    except ProductRepresentationError as e:
+        raise ProductPublishError(
+            "Unable to create product representation: " + str(e))
+
+    try:
+        statuses = []
+        if PRODUCT_REPR not in created:
+            statuses = ProductRepresentationStatus.list(
+                product_representation=product_repr.spec,
+                location=data['location'],
+            )
+        if len(statuses) == 1:
+            product_repr_status = statuses[0]
+        else:
+            product_repr_status = ProductRepresentationStatus.create(
+                product_representation=product_repr.spec,
+                location=data['location'],
+                status=data['status'],
+            )
+            created.append(PRODUCT_REPR_STATUS)
+    except ProductRepresentationStatusError as e:
+        raise ProductPublishError(
+            "Unable to create product representation status: " + str(e))
+
+    return ProductPublish(product, product_version, product_repr,
+        product_repr_status, created)
+
+# ----------------------------------------------------------------------------
+def _ensure_remote(data):
+
+    result = RestfulClient().execute_request('ensure', DATA_TYPE, data=data)
+
+    return ProductPublish(
+        Product(result[PRODUCT]),
+        ProductVersion(result[PRODUCT_VERSION]),
+        ProductRepresentation(result[PRODUCT_REPR]),
+        ProductRepresentationStatus(result[PRODUCT_REPR_STATUS]),
+        list(result.get('created', [])),
+    )
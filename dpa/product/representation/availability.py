@@ -0,0 +1,257 @@
+"""Where product representations are available.
+
+A representation's status is recorded per location when it is created there
+or synced to it. Tools that need to know which representations they can
+use at a location would otherwise list the statuses of each representation
+in turn. An availability index lists the statuses of a whole ptask tree, or
+of every product subscribed to, up front with one request per ptask owning
+them, and answers lookups from memory.
+
+Classes
+-------
+AvailabilityIndex
+    The locations each representation of a set of specs is available at.
+
+Examples
+--------
+    >>> from dpa.product.representation.availability import AvailabilityIndex
+    >>> index = AvailabilityIndex.for_subscriptions(ptask_version.subscriptions)
+    >>> local_subs = index.filter(ptask_version.subscriptions,
+    ...     key=lambda s: s.product_version_spec)
+    >>> index.locations(product_repr.spec)
+    ['REMOTE_LOC', 'SITE_LOC']
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+from dpa.location import current_location_code
+from dpa.product.representation.status import ProductRepresentationStatus
+from dpa.ptask.spec import PTaskSpec
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# concurrent requests while fetching
+DEFAULT_WORKERS = 8
+
+# the representation status recorded for a location holding a copy
+STATUS_AVAILABLE = 1
+
+# separates a ptask's spec from the specs of its products
+_PRODUCTS = PTaskSpec.SEPARATOR + PTaskSpec.PRODUCT_SEPARATOR + \
+    PTaskSpec.SEPARATOR
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class AvailabilityIndex(object):
+    """The locations each representation of a set of specs is available at.
+
+    Lookups default to the location the index was built for, the current
+    location unless given. Representations the index has no status for are
+    not available anywhere.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def fetch(cls, specs, location_code=None, workers=DEFAULT_WORKERS):
+        """Index the representations below any of the specs.
+
+        The specs may be ptask, product, product version or representation
+        specs. Statuses are listed with one search per ptask owning the
+        specs, concurrently. The search may also match other ptasks, so the
+        results are filtered to the specs given.
+
+        A failed search raises ProductRepresentationStatusError rather than
+        leaving its representations unavailable everywhere.
+
+        """
+
+        specs = set(str(s) for s in specs)
+        roots = _search_roots(specs)
+
+        listings = []
+        if roots:
+            pool = ThreadPool(min(max(1, int(workers)), len(roots)))
+            try:
+                listings = pool.map(_list_statuses, roots)
+            finally:
+                pool.close()
+                pool.join()
+
+        statuses = [s for listing in listings for s in listing
+            if _below(s.product_representation_spec, specs)]
+
+        return cls(statuses, location_code=location_code)
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def for_ptask(cls, ptask_spec, location_code=None):
+        """Index every representation of a ptask and the ptasks below it."""
+        return cls.fetch([ptask_spec], location_code=location_code)
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def for_subscriptions(cls, subscriptions, location_code=None):
+        """Index the representations of the subscribed product versions."""
+
+        return cls.fetch([s.product_version_spec for s in subscriptions],
+            location_code=location_code)
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, statuses=None, location_code=None):
+
+        self._location_code = location_code or current_location_code()
+
+        # (representation spec, location code) -> status
+        self._statuses = {}
+
+        # representation spec -> codes of locations it is available at
+        self._available = defaultdict(set)
+
+        # product version spec -> representation specs
+        self._representations = defaultdict(set)
+
+        for status in statuses or []:
+            self.add(status)
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._statuses)
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def add(self, status):
+        """Add or replace a representation status.
+
+        Tools can keep the index current as they make copies, for example
+        after syncing a representation to a location.
+
+        """
+
+        repr_spec = status.product_representation_spec
+        location_code = status.location_code
+
+        self._statuses[(repr_spec, location_code)] = status.status
+        self._representations[_version_spec(repr_spec)].add(repr_spec)
+
+        if status.status == STATUS_AVAILABLE:
+            self._available[repr_spec].add(location_code)
+        else:
+            self._available[repr_spec].discard(location_code)
+
+    # ------------------------------------------------------------------------
+    def filter(self, items, location_code=None, key=None):
+        """The items available at the location, in their original order.
+
+        Items are representation or product version specs, or objects with
+        a ``spec``. A product version is available if any representation of
+        it is. ``key`` returns the spec for an item, for example the product
+        version spec of a subscription.
+
+        """
+
+        location_code = location_code or self._location_code
+        if key is None:
+            key = lambda item: getattr(item, 'spec', item)
+
+        return [i for i in items
+            if self._spec_available(str(key(i)), location_code)]
+
+    # ------------------------------------------------------------------------
+    def is_available(self, repr_spec, location_code=None):
+        """True if the representation is available at the location."""
+
+        return (location_code or self._location_code) in \
+            self._available.get(str(repr_spec), ())
+
+    # ------------------------------------------------------------------------
+    def locations(self, repr_spec):
+        """Sorted codes of the locations the representation is available at."""
+        return sorted(self._available.get(str(repr_spec), ()))
+
+    # ------------------------------------------------------------------------
+    def representations(self, product_version_spec, location_code=None):
+        """Sorted specs of the version's representations at the location."""
+
+        location_code = location_code or self._location_code
+
+        return sorted(r for r in
+            self._representations.get(str(product_version_spec), ())
+            if location_code in self._available.get(r, ()))
+
+    # ------------------------------------------------------------------------
+    def status(self, repr_spec, location_code=None):
+        """The representation's status at the location, or None."""
+
+        return self._statuses.get(
+            (str(repr_spec), location_code or self._location_code))
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def location_code(self):
+        """The location lookups default to."""
+        return self._location_code
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _spec_available(self, spec, location_code):
+
+        if location_code in self._available.get(spec, ()):
+            return True
+
+        return any(location_code in self._available.get(r, ())
+            for r in self._representations.get(spec, ()))
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _below(repr_spec, specs):
+
+    # the spec itself or any of its ancestors
+    parts = repr_spec.split(PTaskSpec.SEPARATOR)
+    for i in range(len(parts), 0, -1):
+        if PTaskSpec.SEPARATOR.join(parts[:i]) in specs:
+            return True
+
+    return False
+
+# ----------------------------------------------------------------------------
+def _list_statuses(ptask_spec):
+    return ProductRepresentationStatus.list(search=ptask_spec)
+
+# ----------------------------------------------------------------------------
+def _search_roots(specs):
+
+    # the ptask owning each spec, without those below another one
+    ptask_specs = sorted(set(
+        s.split(PTaskSpec.VERSION)[0].split(_PRODUCTS)[0] for s in specs))
+
+    roots = []
+    for spec in ptask_specs:
+        if not any(spec.startswith(r + PTaskSpec.SEPARATOR) for r in roots):
+            roots.append(spec)
+
+    return roots
+
+# ----------------------------------------------------------------------------
+def _version_spec(repr_spec):
+
+    # <product version spec>=<type>=<resolution>
+    return repr_spec.rsplit(PTaskSpec.SEPARATOR, 2)[0]
@@ -0,0 +1,268 @@
+"""Manifests of the files in product representation areas.
+
+Import dialogs need the files and frame sequences of a representation,
+usually read through the import directory's symlinks. Rather than listing
+the area and parsing every file name each time, the files are recorded in
+a manifest in the area when the product is created and published, along
+with the frame sequences found among them.
+
+The manifest is a :py:class:`dpa.sync.manifest.Manifest`, so syncs can use
+it too. After it is written, its modification time is set to the area's, so
+a manifest whose modification time no longer matches is stale: files were
+added, removed or renamed in the area since. Stale or missing manifests are
+regenerated when loaded. Checksum manifests recorded for verification keep
+their hashes: they are only ever extended with the sequences.
+
+Classes
+-------
+RepresentationManifest
+    The files and frame sequences of a representation area.
+
+Sequence
+    A frame sequence within a representation area.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import namedtuple
+import os
+
+from dpa.logging import Logger
+from dpa.sequence import find_sequences
+from dpa.sync.manifest import (
+    MANIFEST_FILE, Manifest, ManifestError, TYPE_FILE,
+)
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# modification times within this many seconds are considered the same
+_MTIME_TOLERANCE = 0.001
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class Sequence(namedtuple('Sequence', 'spec first last count size')):
+    """A frame sequence within a representation area.
+
+    ``spec`` is the file name with the frame number replaced by a '#' per
+    digit, for example ``beauty.####.exr``, as found by
+    :py:func:`dpa.sequence.find_sequences`. ``size`` is the total bytes of
+    the frames.
+
+    """
+    __slots__ = ()
+
+# ----------------------------------------------------------------------------
+class RepresentationManifest(object):
+    """The files and frame sequences of a representation area.
+
+    Usage::
+
+        >>> manifest = RepresentationManifest.load(product_repr.area.path)
+        >>> manifest.files
+        ['beauty.0001.exr', 'beauty.0002.exr']
+        >>> manifest.sequences
+        [Sequence(spec='beauty.####.exr', first=1, last=2, count=2, ...)]
+
+    Only the files at the top of the area are listed.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def load(cls, path, regenerate=True):
+        """The area's manifest, scanning the area if it is missing or stale.
+
+        If ``regenerate`` is True, a manifest from a scan is written to the
+        area for the next reader. Areas that can't be written to are still
+        scanned.
+
+        A checksum manifest, recorded when the version was published, is
+        never replaced by a scan: the sequences are added to it while the
+        area still holds the files it records. Otherwise the scan is only
+        returned, leaving the manifest for verification to report against.
+
+        """
+
+        try:
+            manifest = Manifest.read(path)
+        except ManifestError:
+            manifest = None
+
+        # a manifest recorded by a sync has no sequences
+        if manifest is not None and 'sequences' in manifest.info and \
+            _is_fresh(path):
+            return cls(manifest)
+
+        if manifest is not None and _has_hashes(manifest):
+            scanned = _scan(path)
+            if not _same_files(manifest, scanned):
+                return cls(scanned)
+            _add_sequences(manifest)
+            if regenerate:
+                try:
+                    _write(manifest)
+                except ManifestError as e:
+                    Logger.get().debug(str(e))
+            return cls(manifest)
+
+        if regenerate:
+            try:
+                return cls.record(path)
+            except ManifestError as e:
+                Logger.get().debug(str(e))
+
+        return cls(_scan(path))
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def record(cls, path):
+        """Scan the area and write its manifest.
+
+        Hashes in the area's existing manifest are kept for unchanged files
+        and the other files are hashed, so a checksum manifest stays one.
+
+        """
+
+        try:
+            previous = Manifest.read(path)
+        except ManifestError:
+            previous = None
+
+        manifest = _scan(path, previous=previous)
+        _write(manifest)
+
+        return cls(manifest)
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, manifest):
+        self._manifest = manifest
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def files(self):
+        """Sorted names of the files at the top of the area."""
+
+        return sorted(p for (p, e) in self._manifest.entries.iteritems()
+            if e['type'] == TYPE_FILE and "/" not in p)
+
+    # ------------------------------------------------------------------------
+    @property
+    def manifest(self):
+        return self._manifest
+
+    # ------------------------------------------------------------------------
+    @property
+    def path(self):
+        return self._manifest.root
+
+    # ------------------------------------------------------------------------
+    @property
+    def sequences(self):
+        """The frame sequences among the files, sorted by spec."""
+
+        return [
+            Sequence(str(s['spec']), s['first'], s['last'], s['count'],
+                s['size'])
+            for s in self._manifest.info['sequences']
+        ]
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def record_manifests(product_version):
+    """Write the manifest of each of the version's representation areas."""
+
+    for product_repr in product_version.representations:
+        path = product_repr.area.path
+        if not os.path.isdir(path):
+            continue
+        try:
+            RepresentationManifest.record(path)
+        except ManifestError as e:
+            Logger.get().warning(
+                "Unable to record representation files: " + str(e))
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _is_fresh(path):
+
+    try:
+        dir_mtime = os.stat(path).st_mtime
+        manifest_mtime = os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime
+    except OSError:
+        return False
+
+    return abs(dir_mtime - manifest_mtime) < _MTIME_TOLERANCE
+
+# ----------------------------------------------------------------------------
+def _add_sequences(manifest):
+
+    file_sizes = dict(
+        (p, e['size']) for (p, e) in manifest.entries.iteritems()
+        if e['type'] == TYPE_FILE and "/" not in p
+    )
+    (sequences, others) = find_sequences(file_sizes.keys())
+    manifest.info['sequences'] = [
+        Sequence(
+            spec=s.name,
+            first=s.first,
+            last=s.last,
+            count=s.count,
+            size=sum(file_sizes[f] for f in s.files),
+        )._asdict()
+        for s in sequences
+    ]
+
+# ----------------------------------------------------------------------------
+def _has_hashes(manifest):
+
+    return any('hash' in e for e in manifest.entries.itervalues()
+        if e['type'] == TYPE_FILE)
+
+# ----------------------------------------------------------------------------
+def _same_files(manifest, other):
+
+    # the same files, of the same sizes
+    files = lambda m: dict((p, e['size']) for (p, e) in m.entries.iteritems()
+        if e['type'] == TYPE_FILE)
+
+    return files(manifest) == files(other)
+
+# ----------------------------------------------------------------------------
+def _scan(path, previous=None):
+
+    # files that changed since a checksum manifest was recorded are hashed
+    checksum = previous is not None and _has_hashes(previous)
+
+    manifest = Manifest.scan(path, checksum=checksum, previous=previous)
+    if previous is not None:
+        manifest.info.update(previous.info)
+    _add_sequences(manifest)
+
+    return manifest
+
+# ----------------------------------------------------------------------------
+def _write(manifest):
+
+    manifest.write()
+
+    # the manifest's modification time marks the state it describes
+    manifest_path = os.path.join(manifest.root, MANIFEST_FILE)
+    try:
+        mtime = os.stat(manifest.root).st_mtime
+        os.utime(manifest_path, (mtime, mtime))
+    except OSError as e:
+        raise ManifestError("Unable to write manifest: " + str(e))
@@ -14,7 +14,7 @@ from dpa.user import User
 # Public Classes:
 # -----------------------------------------------------------------------------
 class ProductRepresentationStatus(CreateMixin, GetMixin, ListMixin,
-    RestfulObject): 
+    UpdateMixin, RestfulObject): 
     """Product Representation API.
 
     .product_representation
@@ -78,6 +78,17 @@ class ProductRepresentationStatus(CreateMixin, GetMixin, ListMixin,
         """:returns: Unique string represntation of the product."""
         return self.__class__.__name__ + "('" + self.spec + "')"
 
+    # -------------------------------------------------------------------------
+    # Public methods:
+    # -------------------------------------------------------------------------
+    def update(self, status=None):
+
+        data = {
+            "status": status,
+        }
+
+        return super(ProductRepresentationStatus, self).update(self.spec, data)
+
     # -------------------------------------------------------------------------
     @property
     def product_representation(self):
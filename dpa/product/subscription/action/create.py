@@ -4,6 +4,7 @@
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.action.registry import ActionRegistry
 from dpa.product import Product, ProductError
+from dpa.product.dependency import forget_subscription, record_subscription
 from dpa.product.version import ProductVersion, ProductVersionError
 from dpa.product.subscription import (
     ProductSubscription, 
@@ -91,6 +92,10 @@ class SubscriptionCreateAction(Action):
             except ProductSubscriptionError as e:
                 raise ActionError("Subscription removal failed: " + str(e))
             else:
+                forget_subscription(
+                    self.existing_sub.ptask_version_spec,
+                    self.existing_sub.product_version_spec,
+                )
                 if self.interactive:
                     print "\nExisting subscription removed.\n"
 
@@ -102,6 +107,8 @@ class SubscriptionCreateAction(Action):
         except ProductSubscriptionError as e:
             raise ActionError("Subscription failed: " + str(e))
         else:
+            record_subscription(sub.ptask_version_spec,
+                sub.product_version_spec)
             if self.interactive:
                 print "New subscription created."
 
@@ -1,9 +1,11 @@
 
 import os
-import shutil
 
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.env.vars import DpaVars
+from dpa.product.subscription.imports import (
+    ImportDirError, refresh_import_dir,
+)
 from dpa.ptask import PTask, PTaskError
 from dpa.ptask.area import PTaskArea, PTaskAreaError
 from dpa.ptask.spec import PTaskSpec
@@ -34,23 +36,32 @@ class SubscriptionRefreshAction(Action):
             help="The version of the ptask to refresh subs for.",
         )
 
+        parser.add_argument(
+            "-r", "--rebuild",
+            action="store_true",
+            help="Rebuild the import directory from scratch rather than " + \
+                 "only updating the links that changed.",
+        )
+
     # -------------------------------------------------------------------------
-    def __init__(self, ptask, version=None):
+    def __init__(self, ptask, version=None, rebuild=False):
 
-        super(SubscriptionRefreshAction, self).__init__(ptask, version=None)
+        super(SubscriptionRefreshAction, self).__init__(ptask, version=None,
+            rebuild=rebuild)
         self._ptask = ptask
         self._version = None
+        self._rebuild = rebuild
+        self._changes = None
 
     # -------------------------------------------------------------------------
     def execute(self):
 
         processed = dict()
         conflicts = []
+        links = dict()
 
         print ""
 
-        import_dir = self._prep_import_dir()
-
         for sub in self.ptask_version.subscriptions:
             product_version = sub.product_version
             product = product_version.product
@@ -59,9 +70,12 @@ class SubscriptionRefreshAction(Action):
                 conflicts.append(product_version)
                 continue
 
-            self._link_sub(sub, app='global')
+            (link_path, target) = self._sub_link(sub, app='global')
+            links[link_path] = target
             processed[name_spec] = sub
 
+        self._refresh_import_dir(links)
+
         print ""
 
         if conflicts:
@@ -149,34 +163,53 @@ class SubscriptionRefreshAction(Action):
         return self._version
 
     # -------------------------------------------------------------------------
-    def _prep_import_dir(self):
+    @property
+    def rebuild(self):
+        return self._rebuild
+
+    # -------------------------------------------------------------------------
+    @property
+    def changes(self):
+        """The import links changed by the refresh, once executed."""
+        return self._changes
+
+    # -------------------------------------------------------------------------
+    def _refresh_import_dir(self, links):
 
         area = PTaskArea(self.ptask.spec, version=self.version)
         import_dir = area.dir(dir_name="import", verify=False, path=True)
 
-        if os.path.exists(import_dir):
-            print "Cleaning up existing import directory."
-            try:
-                shutil.rmtree(import_dir)
-            except Exception as e:
-                raise ActionError("Failed to remove old import dir: " + str(e))
-
-        global_import_dir = os.path.join('import', 'global')
+        try:
+            self._changes = refresh_import_dir(import_dir, links,
+                rebuild=self.rebuild)
+        except ImportDirError as e:
+            raise ActionError(str(e))
 
         try:
-            print "Provisioning new import directory."
-            area.provision('import')
-            area.provision(global_import_dir)
+            area.provision(os.path.join('import', 'global'))
         except PTaskAreaError as e:
             raise ActionError(
                 "Failed to provision global import directory: " + str(e))
 
-        return area.dir(dir_name=global_import_dir, path=True)
+        if self._changes.rebuilt:
+            print "Rebuilt import directory with {n} subscription " \
+                "links.".format(n=len(self._changes.created))
+            return
 
-    # -------------------------------------------------------------------------
-    def _link_sub(self, sub, app):
+        for (label, link_paths) in [
+            ("Created", self._changes.created),
+            ("Retargeted", self._changes.retargeted),
+            ("Removed", self._changes.removed)]:
+            for link_path in link_paths:
+                print "{l} subscription link: {p}".format(
+                    l=label, p=link_path)
 
-        area = PTaskArea(self.ptask.spec, version=self.version)
+        if not self._changes.changed:
+            print "Subscription links are up to date."
+
+    # -------------------------------------------------------------------------
+    def _sub_link(self, sub, app):
+        """Returns the import link path and target for a subscription."""
 
         product_ver = sub.product_version
 
@@ -187,24 +220,8 @@ class SubscriptionRefreshAction(Action):
                 "Unable to locate product directory for: " + product_ver.spec
             )
 
-        product_ver_path = product_ver_area.path
-
         product = product_ver.product
 
-        product_ver_import_dir = os.path.join('import', app, product.name)
-            
-        try:
-            area.provision(product_ver_import_dir)
-        except PTaskAreaError as e:
-            raise ActionError(
-                "Failed to provision product import dir: " + str(e))
-        
-        link_name = os.path.join(area.path,
-            product_ver_import_dir, product.category)
-
-        print "Creating subscription {a} link for: {pv}".format(
-            a=app, pv=product_ver.spec)
-
-        os.symlink(product_ver_path, link_name)
+        link_path = os.path.join(app, product.name, product.category)
 
-        product_ver_area = PTaskArea(product_ver.spec)
+        return (link_path, product_ver_area.path)
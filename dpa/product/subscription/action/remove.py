@@ -1,6 +1,7 @@
 
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.action.registry import ActionRegistry
+from dpa.product.dependency import forget_subscription
 from dpa.product.subscription import (
     ProductSubscription, 
     ProductSubscriptionError
@@ -50,6 +51,10 @@ class SubscriptionRemoveAction(Action):
         except ProductSubscriptionError as e:
             raise ActionError("Subscription removal failed: " + str(e))
         else:
+            forget_subscription(
+                self.subscription.ptask_version_spec,
+                self.subscription.product_version_spec,
+            )
             if self.interactive:
                 print "\nSubscription removed.\n"
 
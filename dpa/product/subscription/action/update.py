@@ -1,13 +1,15 @@
 
 # -----------------------------------------------------------------------------
 
-from collections import defaultdict
-
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.action.registry import ActionRegistry
+from dpa.product import ProductError
+from dpa.product.dependency import forget_subscription, record_subscription
 from dpa.product.subscription import (
     ProductSubscription, ProductSubscriptionError
 )
+from dpa.product.subscription.resolver import SubscriptionResolver
+from dpa.product.version import ProductVersionError
 from dpa.ptask import PTask, PTaskError
 from dpa.ptask.area import PTaskArea
 from dpa.ptask.spec import PTaskSpec
@@ -84,12 +86,15 @@ class SubscriptionUpdateAction(Action):
                    self._ptask_version.spec, cur_ver.spec)
             except ProductSubscriptionError as e:
                 raise ActionError("Unsubscribe failed: " + str(e))
+            forget_subscription(self._ptask_version.spec, cur_ver.spec)
 
             # subscribe to the new version
             try:
                 sub = ProductSubscription.create(self._ptask_version, new_ver)
             except ProductSubscriptionError as e:
                 raise ActionError("Subscribe failed: " + str(e))
+            record_subscription(sub.ptask_version_spec,
+                sub.product_version_spec)
 
         if not self._no_refresh:
 
@@ -188,64 +193,14 @@ class SubscriptionUpdateAction(Action):
 
         self._subs = subs
 
-        update_map = defaultdict(dict)
-
-        for sub in subs:
-            
-            sub_product_ver = sub.product_version
-            
-            update_map[sub.id]['old'] = sub_product_ver
-
-            if sub.locked:
-                update_map[sub.id]['new'] = None
-                update_map[sub.id]['note'] = 'Subscription locked'
-                continue 
-
-            if sub_product_ver.is_official:
-                update_map[sub.id]['new'] = None
-                update_map[sub.id]['note'] = 'Already subscribed to official'
-                continue 
-
-            sub_product = sub_product_ver.product
-
-            official_ver = sub_product.official_version
-
-            if official_ver and official_ver.number > sub_product_ver.number:
-                update_map[sub.id]['new'] = official_ver
-                update_map[sub.id]['note'] = 'Official version'
-                continue 
-
-            if sub.product_version.product.ptask.spec == self.ptask.spec:
-                all_vers = [v for v in sub_product.versions]
-            else:
-                all_vers = [v for v in sub_product.versions if v.published]
-
-            all_vers.sort(key=lambda v: v.number_padded)
-
-            if all_vers:
-                latest = all_vers[-1]
-                if latest.number > sub_product_ver.number:
-                    update_map[sub.id]['new'] = latest 
-                    if latest.published:
-                        update_map[sub.id]['note'] = 'Latest published version'
-                    else:
-                        update_map[sub.id]['note'] = 'Latest version'
-                    continue 
-                else:
-                    update_map[sub.id]['new'] = None
-                    if sub_product_ver.published:
-                        update_map[sub.id]['note'] = \
-                            'Already using latest published'
-                    else:
-                        update_map[sub.id]['note'] = 'Already using latest'
-                    continue 
-                    
-            else:
-                update_map[sub.id]['new'] = None
-                update_map[sub.id]['note'] = 'No new versions'
-                continue 
-
-        self._update_map = update_map
+        # products and versions of all the subs at once, rather than
+        # several requests per sub
+        self._resolver = SubscriptionResolver(subs)
+        try:
+            self._update_map = self._resolver.update_map(self.ptask.spec)
+        except (ProductError, ProductVersionError) as e:
+            raise ActionError(
+                "Unable to determine subscription updates: " + str(e))
                     
     # -------------------------------------------------------------------------
     def verify(self):
@@ -277,7 +232,7 @@ class SubscriptionUpdateAction(Action):
             
             update_map = self._update_map[sub.id]
             cur_ver = update_map['old']
-            cur_product = cur_ver.product
+            cur_product = self._resolver.product(cur_ver.product_spec)
             new_ver = update_map['new']
             update_note = update_map['note']
 
@@ -289,7 +244,7 @@ class SubscriptionUpdateAction(Action):
 
             output.add_item(
                 {
-                    source: cur_product.ptask.spec,
+                    source: cur_product.ptask_spec,
                     product: cur_product.name_spec,
                     current: cur_ver.number_padded,
                     new: new_ver_disp,
@@ -0,0 +1,231 @@
+"""Maintain the subscription links of a ptask version's import directory.
+
+A ptask version's import directory holds a symlink to each subscribed
+product version, at ``<app>/<product name>/<category>``. DCC sessions read
+through these links while they are open, so refreshing them never removes
+the whole directory. Only the links that changed are created, retargeted
+or removed, and each change replaces a single link atomically. When the
+directory is rebuilt from scratch, it is built beside the existing one and
+renamed into place.
+
+Classes
+-------
+ImportChanges
+    The links changed by a refresh.
+
+ImportDirError
+    Raised when the import directory can't be refreshed.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import namedtuple
+import errno
+import os
+import shutil
+import tempfile
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# import directory permissions, as provisioned by the ptask area
+DIR_MODE = 0770
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class ImportChanges(
+    namedtuple('ImportChanges', 'created retargeted removed rebuilt')):
+    """The links changed by a refresh, as sorted relative paths.
+
+    ``rebuilt`` is True if the import directory was built from scratch, in
+    which case every link is listed as created.
+
+    """
+    __slots__ = ()
+
+    # ------------------------------------------------------------------------
+    @property
+    def changed(self):
+        return bool(self.created or self.retargeted or self.removed)
+
+# ----------------------------------------------------------------------------
+class ImportDirError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def refresh_import_dir(import_dir, links, rebuild=False):
+    """Bring the links in the import directory in line with ``links``.
+
+    ``links`` maps link paths, relative to the import directory, to the
+    paths they should point to. Existing links that point elsewhere are
+    retargeted, links that aren't wanted are removed along with directories
+    they leave empty, and anything else in the directory is left alone. The
+    app directories at the top of the import directory are never removed.
+
+    If the import directory doesn't exist, or ``rebuild`` is True, it is
+    built in a temporary sibling directory and renamed into place.
+
+    Returns an :py:class:`ImportChanges`.
+
+    """
+
+    import_dir = os.path.abspath(import_dir)
+
+    if rebuild or not os.path.isdir(import_dir):
+        _rebuild(import_dir, links)
+        return ImportChanges(sorted(links), [], [], True)
+
+    existing = _read_links(import_dir)
+
+    created = []
+    retargeted = []
+    removed = []
+
+    try:
+        for rel_path in sorted(set(existing) - set(links)):
+            link_path = os.path.join(import_dir, rel_path)
+            os.remove(link_path)
+            _prune_dirs(import_dir, os.path.dirname(link_path))
+            removed.append(rel_path)
+
+        for (rel_path, target) in sorted(links.iteritems()):
+
+            if existing.get(rel_path) == target:
+                continue
+
+            link_path = os.path.join(import_dir, rel_path)
+            if os.path.lexists(link_path):
+                _replace_link(link_path, target)
+                retargeted.append(rel_path)
+            else:
+                _make_dirs(import_dir, os.path.dirname(link_path))
+                os.symlink(target, link_path)
+                created.append(rel_path)
+
+    except OSError as e:
+        raise ImportDirError(
+            "Unable to refresh import directory links: " + str(e))
+
+    return ImportChanges(created, retargeted, removed, False)
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _make_dirs(import_dir, dir_path):
+
+    # create each missing directory below the import dir with its mode
+    missing = []
+    while dir_path != import_dir and not os.path.isdir(dir_path):
+        missing.append(dir_path)
+        dir_path = os.path.dirname(dir_path)
+
+    for dir_path in reversed(missing):
+        os.mkdir(dir_path)
+        os.chmod(dir_path, DIR_MODE)
+
+# ----------------------------------------------------------------------------
+def _prune_dirs(import_dir, dir_path):
+
+    # remove directories left empty, keeping the app directories
+    while os.path.dirname(dir_path) != import_dir and \
+        dir_path.startswith(import_dir + os.path.sep):
+        try:
+            os.rmdir(dir_path)
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                return
+            raise
+        dir_path = os.path.dirname(dir_path)
+
+# ----------------------------------------------------------------------------
+def _read_links(import_dir):
+
+    links = {}
+    for (dir_path, dir_names, file_names) in os.walk(import_dir):
+        for name in dir_names + file_names:
+            full_path = os.path.join(dir_path, name)
+            if os.path.islink(full_path):
+                rel_path = os.path.relpath(full_path, import_dir)
+                links[rel_path] = os.readlink(full_path)
+
+    return links
+
+# ----------------------------------------------------------------------------
+def _rebuild(import_dir, links):
+
+    parent_dir = os.path.dirname(import_dir)
+    name = os.path.basename(import_dir)
+
+    try:
+        if not os.path.isdir(parent_dir):
+            os.makedirs(parent_dir)
+        build_dir = tempfile.mkdtemp(prefix="." + name + ".", dir=parent_dir)
+    except OSError as e:
+        raise ImportDirError("Unable to create import directory: " + str(e))
+
+    try:
+        os.chmod(build_dir, DIR_MODE)
+        for (rel_path, target) in sorted(links.iteritems()):
+            link_path = os.path.join(build_dir, rel_path)
+            _make_dirs(build_dir, os.path.dirname(link_path))
+            os.symlink(target, link_path)
+    except OSError as e:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise ImportDirError("Unable to build import directory: " + str(e))
+
+    if not os.path.lexists(import_dir):
+        try:
+            os.rename(build_dir, import_dir)
+        except OSError as e:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise ImportDirError(
+                "Unable to move import directory into place: " + str(e))
+        return
+
+    # a directory can't be renamed over a non-empty one. move the old one
+    # aside first, so the import directory is only missing between the two
+    # renames rather than for the whole rebuild.
+    old_dir = build_dir + ".old"
+    try:
+        os.rename(import_dir, old_dir)
+    except OSError as e:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise ImportDirError(
+            "Unable to replace import directory: " + str(e))
+
+    try:
+        os.rename(build_dir, import_dir)
+    except OSError as e:
+        os.rename(old_dir, import_dir)
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise ImportDirError(
+            "Unable to move import directory into place: " + str(e))
+
+    if os.path.isdir(old_dir) and not os.path.islink(old_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.remove(old_dir)
+
+# ----------------------------------------------------------------------------
+def _replace_link(link_path, target):
+
+    if os.path.islink(link_path) or not os.path.isdir(link_path):
+        # a new link renamed over the old one, so readers always see one
+        tmp_path = os.path.join(os.path.dirname(link_path),
+            ".{n}.{p}.tmp".format(n=os.path.basename(link_path),
+                p=os.getpid()))
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.symlink(target, tmp_path)
+        os.rename(tmp_path, link_path)
+    else:
+        # a directory in the way of the link
+        shutil.rmtree(link_path)
+        os.symlink(target, link_path)
@@ -0,0 +1,345 @@
+"""Resolve the versions a set of subscriptions could be updated to.
+
+Deciding whether a subscription can be updated needs its product, the
+product's official version and the product's other versions. Fetching those
+one subscription at a time costs several requests per subscription. The
+resolver instead fetches the products and versions of every subscription up
+front, with two requests per ptask the subscribed products belong to, and
+answers everything else in memory. The representations of the subscribed
+versions are fetched the same way, with one more request per ptask, when
+first asked for.
+
+Classes
+-------
+SubscriptionResolver
+    Fetches the products of a set of subscriptions and resolves updates.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+from dpa.product import Product, ProductError
+from dpa.product.representation import (
+    ProductRepresentation, ProductRepresentationError,
+)
+from dpa.product.version import ProductVersion, ProductVersionError
+from dpa.ptask.spec import PTaskSpec
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# concurrent requests while fetching
+DEFAULT_WORKERS = 8
+
+# update notes, as displayed when updating subscriptions
+NOTE_LOCKED = 'Subscription locked'
+NOTE_OFFICIAL = 'Already subscribed to official'
+NOTE_NEW_OFFICIAL = 'Official version'
+NOTE_LATEST_PUBLISHED = 'Latest published version'
+NOTE_LATEST = 'Latest version'
+NOTE_USING_LATEST_PUBLISHED = 'Already using latest published'
+NOTE_USING_LATEST = 'Already using latest'
+NOTE_NO_VERSIONS = 'No new versions'
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class SubscriptionResolver(object):
+    """Fetches the products of a set of subscriptions and resolves updates.
+
+    Usage::
+
+        >>> resolver = SubscriptionResolver(ptask_version.subscriptions)
+        >>> update_map = resolver.update_map(ptask.spec)
+        >>> product = resolver.product(sub.product_version_spec)
+
+    Products and versions are fetched with a search on the spec of each ptask
+    owning a subscribed product, which may also match other ptasks, so the
+    results are filtered to the exact products subscribed to. Any product or
+    version the search didn't return is fetched individually.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, subscriptions, workers=DEFAULT_WORKERS):
+
+        self._subscriptions = list(subscriptions)
+        self._workers = max(1, int(workers))
+
+        self._products = {}
+        self._versions = defaultdict(list)
+        self._fetched = False
+
+        self._representations = defaultdict(list)
+        self._representations_fetched = False
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def fetch(self):
+        """Fetch the subscribed products and their versions.
+
+        Called automatically on first use.
+
+        """
+
+        # subscribed version numbers, by product
+        subscribed = defaultdict(set)
+        for sub in self._subscriptions:
+            version_spec = sub.product_version_spec
+            subscribed[_product_spec(version_spec)].add(
+                _version_number(version_spec))
+        product_specs = set(subscribed.keys())
+
+        ptask_specs = sorted(set(
+            PTaskSpec(s).base_spec for s in product_specs))
+
+        results = self._map(_search_ptask, ptask_specs)
+
+        for (products, versions) in results:
+            for product in products:
+                if product.spec in product_specs:
+                    self._products[product.spec] = product
+            for version in versions:
+                if version.product_spec in product_specs:
+                    self._versions[version.product_spec].append(version)
+
+        # anything the searches missed
+        missing_products = [s for s in product_specs
+            if s not in self._products]
+        for product in self._map(Product.get, missing_products):
+            self._products[product.spec] = product
+
+        missing_versions = [s for (s, numbers) in subscribed.iteritems()
+            if any(not self._version_numbered(s, n) for n in numbers)]
+        for (spec, versions) in zip(missing_versions,
+            self._map(_product_versions, missing_versions)):
+            self._versions[spec] = versions
+
+        self._fetched = True
+
+    # ------------------------------------------------------------------------
+    def fetch_representations(self):
+        """Fetch the representations of the subscribed product versions.
+
+        Called automatically on first use of :py:meth:`representations`.
+        Raises ProductRepresentationError if a listing fails, rather than
+        leaving the versions without representations.
+
+        """
+
+        version_specs = set(s.product_version_spec
+            for s in self._subscriptions)
+
+        ptask_specs = sorted(set(
+            PTaskSpec(_product_spec(s)).base_spec for s in version_specs))
+
+        for product_reprs in self._map(_search_representations, ptask_specs):
+            for product_repr in product_reprs:
+                if product_repr.product_version_spec in version_specs:
+                    self._representations[
+                        product_repr.product_version_spec].append(product_repr)
+
+        self._representations_fetched = True
+
+    # ------------------------------------------------------------------------
+    def official_version(self, product_spec):
+        """The official version of the product, or None."""
+
+        product = self.product(product_spec)
+        if product.official_version_number < 1:
+            return None
+
+        return self._version_numbered(product.spec,
+            product.official_version_number)
+
+    # ------------------------------------------------------------------------
+    def product(self, spec):
+        """The product of a product or product version spec."""
+
+        self._fetch_once()
+        return self._products[_product_spec(spec)]
+
+    # ------------------------------------------------------------------------
+    def product_version(self, spec):
+        """The product version for a subscribed product version spec."""
+
+        self._fetch_once()
+        product_spec = _product_spec(spec)
+        version = self._version_numbered(product_spec,
+            _version_number(spec))
+        if not version:
+            raise ProductVersionError("Unknown product version: " + spec)
+
+        return version
+
+    # ------------------------------------------------------------------------
+    def representations(self, product_version_spec):
+        """The representations of a subscribed product version."""
+
+        if not self._representations_fetched:
+            self.fetch_representations()
+
+        return list(self._representations.get(product_version_spec, []))
+
+    # ------------------------------------------------------------------------
+    def update_map(self, ptask_spec):
+        """The version each subscription can be updated to, by id.
+
+        Each value is a dict with the 'old' subscribed version, the 'new'
+        version to update to or None, and a 'note' explaining the choice.
+        Unpublished versions are only candidates for products of the
+        subscribing ptask.
+
+        """
+
+        update_map = defaultdict(dict)
+
+        for sub in self._subscriptions:
+
+            sub_product_ver = self.product_version(sub.product_version_spec)
+            sub_product = self.product(sub_product_ver.product_spec)
+
+            update = update_map[sub.id]
+            update['old'] = sub_product_ver
+
+            (update['new'], update['note']) = self._candidate(
+                sub, sub_product, sub_product_ver, ptask_spec)
+
+        return update_map
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def subscriptions(self):
+        return list(self._subscriptions)
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _candidate(self, sub, sub_product, sub_product_ver, ptask_spec):
+
+        if sub.locked:
+            return (None, NOTE_LOCKED)
+
+        if sub_product.official_version_number == sub_product_ver.number:
+            return (None, NOTE_OFFICIAL)
+
+        official_ver = self.official_version(sub_product.spec)
+        if official_ver and official_ver.number > sub_product_ver.number:
+            return (official_ver, NOTE_NEW_OFFICIAL)
+
+        all_vers = self._versions[sub_product.spec]
+        if sub_product.ptask_spec != ptask_spec:
+            all_vers = [v for v in all_vers if v.published]
+
+        if not all_vers:
+            return (None, NOTE_NO_VERSIONS)
+
+        latest = sorted(all_vers, key=lambda v: v.number_padded)[-1]
+        if latest.number > sub_product_ver.number:
+            if latest.published:
+                return (latest, NOTE_LATEST_PUBLISHED)
+            return (latest, NOTE_LATEST)
+
+        if sub_product_ver.published:
+            return (None, NOTE_USING_LATEST_PUBLISHED)
+
+        return (None, NOTE_USING_LATEST)
+
+    # ------------------------------------------------------------------------
+    def _fetch_once(self):
+
+        if not self._fetched:
+            self.fetch()
+
+    # ------------------------------------------------------------------------
+    def _map(self, function, items):
+
+        if not items:
+            return []
+
+        pool = ThreadPool(min(self._workers, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    # ------------------------------------------------------------------------
+    def _version_numbered(self, product_spec, number):
+
+        for version in self._versions.get(product_spec, []):
+            if version.number == number:
+                return version
+
+        return None
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _product_spec(spec):
+
+    # product version specs add the version number to the product spec:
+    # <ptask>=products=<name>=<category>=<version>
+    parts = spec.split(PTaskSpec.SEPARATOR)
+    product_index = parts.index(PTaskSpec.PRODUCT_SEPARATOR)
+
+    return PTaskSpec.SEPARATOR.join(parts[:product_index + 3])
+
+# ----------------------------------------------------------------------------
+def _product_versions(product_spec):
+
+    try:
+        return ProductVersion.list(product=product_spec)
+    except ProductVersionError:
+        return []
+
+# ----------------------------------------------------------------------------
+def _search_ptask(ptask_spec):
+
+    # the products and versions of a ptask, one request each
+    try:
+        products = [p for p in Product.list(search=ptask_spec)
+            if p.ptask_spec == ptask_spec]
+    except ProductError:
+        products = []
+
+    version_prefix = PTaskSpec.SEPARATOR.join(
+        [ptask_spec, PTaskSpec.PRODUCT_SEPARATOR, ""])
+
+    try:
+        versions = [v for v in ProductVersion.list(search=version_prefix)
+            if v.spec.startswith(version_prefix)]
+    except ProductVersionError:
+        versions = []
+
+    return (products, versions)
+
+# ----------------------------------------------------------------------------
+def _search_representations(ptask_spec):
+
+    version_prefix = PTaskSpec.SEPARATOR.join(
+        [ptask_spec, PTaskSpec.PRODUCT_SEPARATOR, ""])
+
+    try:
+        return [r for r in ProductRepresentation.list(search=version_prefix)
+            if r.spec.startswith(version_prefix)]
+    except ProductRepresentationError as e:
+        raise ProductRepresentationError(
+            "Unable to list representations of {p}: {e}".format(
+                p=ptask_spec, e=e))
+
+# ----------------------------------------------------------------------------
+def _version_number(spec):
+
+    return int(spec.split(PTaskSpec.SEPARATOR)[-1])
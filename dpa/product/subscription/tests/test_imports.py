@@ -0,0 +1,114 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.subscription.tests.test_imports
+# -----------------------------------------------------------------------------
+"""Unit tests for refreshing subscription import directories."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.product.subscription.imports import refresh_import_dir
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all import directory tests."""
+
+    return unittest.TestSuite([
+        RefreshImportDirTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class RefreshImportDirTestCase(unittest.TestCase):
+    """Incremental and full refreshes of an import directory."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.import_dir = os.path.join(self.tmp_dir, "import")
+        self.links = {
+            "global/char/model": "/products/char/model/v001",
+            "global/env/model": "/products/env/model/v003",
+        }
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_incremental(self):
+        """Only the links that changed are touched"""
+
+        changes = refresh_import_dir(self.import_dir, self.links)
+        self.assertTrue(changes.rebuilt)
+        self.assertEqual(self._links(), self.links)
+
+        changes = refresh_import_dir(self.import_dir, self.links)
+        self.assertFalse(changes.rebuilt)
+        self.assertFalse(changes.changed)
+
+        # an unchanged link keeps its inode
+        unchanged = os.path.join(self.import_dir, "global/env/model")
+        inode = os.lstat(unchanged).st_ino
+
+        links = {
+            "global/char/model": "/products/char/model/v002",
+            "global/prop/rig": "/products/prop/rig/v001",
+            "global/env/model": "/products/env/model/v003",
+        }
+        changes = refresh_import_dir(self.import_dir, links)
+        self.assertEqual(changes.created, ["global/prop/rig"])
+        self.assertEqual(changes.retargeted, ["global/char/model"])
+        self.assertEqual(changes.removed, [])
+        self.assertEqual(self._links(), links)
+        self.assertEqual(os.lstat(unchanged).st_ino, inode)
+
+        del links["global/prop/rig"]
+        changes = refresh_import_dir(self.import_dir, links)
+        self.assertEqual(changes.removed, ["global/prop/rig"])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.import_dir, "global/prop")))
+        self.assertTrue(
+            os.path.isdir(os.path.join(self.import_dir, "global")))
+
+    # -------------------------------------------------------------------------
+    def test_rebuild(self):
+        """A rebuild replaces the directory and leaves nothing behind"""
+
+        refresh_import_dir(self.import_dir, self.links)
+        stray = os.path.join(self.import_dir, "global", "stray.txt")
+        open(stray, 'w').close()
+
+        changes = refresh_import_dir(self.import_dir, self.links,
+            rebuild=True)
+        self.assertTrue(changes.rebuilt)
+        self.assertEqual(self._links(), self.links)
+        self.assertFalse(os.path.exists(stray))
+        self.assertEqual(os.listdir(self.tmp_dir), ["import"])
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _links(self):
+
+        links = {}
+        for (dir_path, dir_names, file_names) in os.walk(self.import_dir):
+            for name in dir_names + file_names:
+                path = os.path.join(dir_path, name)
+                if os.path.islink(path):
+                    links[os.path.relpath(path, self.import_dir)] = \
+                        os.readlink(path)
+        return links
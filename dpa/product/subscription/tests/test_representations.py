@@ -0,0 +1,103 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.subscription.tests.test_representations
+# -----------------------------------------------------------------------------
+"""Unit tests for fetching subscribed representations in bulk."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from collections import namedtuple
+import unittest
+
+from dpa.product.representation import ProductRepresentationError
+from dpa.product.subscription.resolver import SubscriptionResolver
+from dpa.restful.client import RestfulClient, RestfulClientError
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+LIGHT = "show=s010=light=products=beauty=render=0001"
+COMP = "show=s010=comp=products=final=render=0002"
+
+REPRESENTATIONS = [
+    LIGHT + "=exr=1920x1080",
+    LIGHT + "=jpg=960x540",
+    "show=s010=light=products=beauty=render=0002=exr=1920x1080",
+    COMP + "=exr=1920x1080",
+]
+
+Subscription = namedtuple('Subscription', 'product_version_spec')
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all subscribed representation tests."""
+
+    return unittest.TestSuite([
+        RepresentationsTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class RepresentationsTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.searches = []
+        self.fail_search = None
+        self.execute_request = RestfulClient.execute_request
+        RestfulClient.execute_request = \
+            lambda client, *args, **kwargs: self._request(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        RestfulClient.execute_request = self.execute_request
+
+    # -------------------------------------------------------------------------
+    def test_representations(self):
+
+        resolver = SubscriptionResolver(
+            [Subscription(LIGHT), Subscription(COMP)])
+
+        self.assertEqual(
+            [r.spec for r in resolver.representations(LIGHT)],
+            REPRESENTATIONS[:2])
+        self.assertEqual(
+            [r.spec for r in resolver.representations(COMP)],
+            REPRESENTATIONS[3:])
+
+        # one search per ptask, made once
+        self.assertEqual(sorted(self.searches),
+            ["show=s010=comp=products=", "show=s010=light=products="])
+
+    # -------------------------------------------------------------------------
+    def test_list_error(self):
+
+        # not mistaken for a version without representations
+        self.fail_search = "show=s010=comp=products="
+        resolver = SubscriptionResolver(
+            [Subscription(LIGHT), Subscription(COMP)])
+
+        self.assertRaises(ProductRepresentationError,
+            resolver.representations, LIGHT)
+
+    # -------------------------------------------------------------------------
+    def _request(self, action, data_type, primary_key=None, data=None,
+        params=None, headers=None):
+
+        self.searches.append(params['search'])
+        if params['search'] == self.fail_search:
+            raise RestfulClientError("Server unavailable")
+
+        return [
+            {
+                'spec': spec,
+                'product_version': spec.rsplit("=", 2)[0],
+            }
+            for spec in REPRESENTATIONS if params['search'] in spec
+        ]
@@ -0,0 +1,147 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.subscription.tests.test_resolver
+# -----------------------------------------------------------------------------
+"""Unit tests for resolving subscriptions in bulk."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from collections import namedtuple
+import unittest
+
+from dpa.product.subscription.resolver import (
+    NOTE_LATEST, NOTE_LATEST_PUBLISHED, NOTE_LOCKED, NOTE_NEW_OFFICIAL,
+    NOTE_NO_VERSIONS, NOTE_OFFICIAL, NOTE_USING_LATEST,
+    NOTE_USING_LATEST_PUBLISHED, SubscriptionResolver,
+)
+from dpa.restful.client import RestfulClient
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# the subscribing ptask, and another ptask whose products it subscribes to
+COMP_PTASK = "show=s010=comp"
+LIGHT_PTASK = "show=s010=light"
+
+# product name -> (owning ptask, official version number, versions as
+# (number, published))
+PRODUCTS = {
+    'locked': (LIGHT_PTASK, 0, [(1, True), (2, True)]),
+    'official': (LIGHT_PTASK, 2, [(1, True), (2, True), (3, True)]),
+    'new_official': (LIGHT_PTASK, 2, [(1, True), (2, True), (3, True)]),
+    'unpublished': (LIGHT_PTASK, 0, [(1, True), (2, False)]),
+    'published': (LIGHT_PTASK, 0, [(1, True), (2, True), (3, False)]),
+    'latest': (COMP_PTASK, 0, [(1, True), (2, False)]),
+    'using_latest': (COMP_PTASK, 0, [(1, False)]),
+    'none': (LIGHT_PTASK, 0, [(1, False)]),
+}
+
+Subscription = namedtuple('Subscription',
+    'id product_version_spec locked')
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all resolver tests."""
+
+    return unittest.TestSuite([
+        UpdateMapTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class UpdateMapTestCase(unittest.TestCase):
+    """The version each subscription is updated to, and why."""
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.execute_request = RestfulClient.execute_request
+        RestfulClient.execute_request = \
+            lambda client, *args, **kwargs: self._request(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        RestfulClient.execute_request = self.execute_request
+
+    # -------------------------------------------------------------------------
+    def test_update_map(self):
+
+        subscribed = [
+            ('locked', 1, True),
+            ('official', 2, False),
+            ('new_official', 1, False),
+            ('unpublished', 1, False),
+            ('published', 1, False),
+            ('latest', 1, False),
+            ('using_latest', 1, False),
+            ('none', 1, False),
+        ]
+        subs = [Subscription(name, _version_spec(name, number), locked)
+            for (name, number, locked) in subscribed]
+
+        update_map = SubscriptionResolver(subs).update_map(COMP_PTASK)
+
+        self.assertEqual(
+            dict((sub_id, (update['old'].number,
+                update['new'].number if update['new'] else None,
+                update['note']))
+                for (sub_id, update) in update_map.iteritems()),
+            {
+                'locked': (1, None, NOTE_LOCKED),
+                'official': (2, None, NOTE_OFFICIAL),
+                'new_official': (1, 2, NOTE_NEW_OFFICIAL),
+                # unpublished versions of another ptask's products are skipped
+                'unpublished': (1, None, NOTE_USING_LATEST_PUBLISHED),
+                'published': (1, 2, NOTE_LATEST_PUBLISHED),
+                # but not of the subscribing ptask's own
+                'latest': (1, 2, NOTE_LATEST),
+                'using_latest': (1, None, NOTE_USING_LATEST),
+                'none': (1, None, NOTE_NO_VERSIONS),
+            }
+        )
+
+    # -------------------------------------------------------------------------
+    def _request(self, action, data_type, primary_key=None, data=None,
+        params=None, headers=None):
+
+        search = params['search']
+
+        if data_type == 'products':
+            return [
+                {
+                    'spec': _product_spec(name),
+                    'ptask': ptask_spec,
+                    'official_version_number': official,
+                }
+                for (name, (ptask_spec, official, versions))
+                    in PRODUCTS.iteritems()
+                if search in _product_spec(name)
+            ]
+
+        return [
+            {
+                'spec': _version_spec(name, number),
+                'product': _product_spec(name),
+                'number': number,
+                'published': published,
+            }
+            for (name, (ptask_spec, official, versions))
+                in PRODUCTS.iteritems()
+            for (number, published) in versions
+            if search in _version_spec(name, number)
+        ]
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _product_spec(name):
+    return "=".join([PRODUCTS[name][0], "products", name, "cache"])
+
+# -----------------------------------------------------------------------------
+def _version_spec(name, number):
+    return _product_spec(name) + "=" + str(number).zfill(4)
@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.tests.test_availability
+# -----------------------------------------------------------------------------
+"""Unit tests for the representation availability index."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from collections import namedtuple
+import unittest
+
+from dpa.product.representation.availability import AvailabilityIndex
+from dpa.product.representation.status import (
+    ProductRepresentationStatus, ProductRepresentationStatusError,
+)
+from dpa.restful.client import RestfulClient, RestfulClientError
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+LIGHT = "show=s010=light=products=beauty=render=0001"
+COMP = "show=s010=comp=products=final=render=0002"
+OTHER = "show=s0100=light=products=beauty=render=0001"
+
+STATUSES = [
+    (LIGHT + "=exr=1920x1080", "site", 1),
+    (LIGHT + "=exr=1920x1080", "remote", 1),
+    (LIGHT + "=jpg=960x540", "remote", 1),
+    (COMP + "=exr=1920x1080", "site", 0),
+    (OTHER + "=exr=1920x1080", "site", 1),
+]
+
+Subscription = namedtuple('Subscription', 'spec product_version_spec')
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all availability tests."""
+
+    return unittest.TestSuite([
+        AvailabilityIndexTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class AvailabilityIndexTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.searches = []
+        self.fail_search = None
+        self.execute_request = RestfulClient.execute_request
+        RestfulClient.execute_request = \
+            lambda client, *args, **kwargs: self._request(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        RestfulClient.execute_request = self.execute_request
+
+    # -------------------------------------------------------------------------
+    def test_ptask(self):
+
+        index = AvailabilityIndex.for_ptask("show=s010", location_code="site")
+
+        self.assertEqual(self.searches, ["show=s010"])
+        self.assertEqual(len(index), 4)
+
+        self.assertTrue(index.is_available(LIGHT + "=exr=1920x1080"))
+        self.assertFalse(index.is_available(LIGHT + "=jpg=960x540"))
+        self.assertTrue(index.is_available(LIGHT + "=jpg=960x540", "remote"))
+        self.assertEqual(index.status(COMP + "=exr=1920x1080"), 0)
+        self.assertEqual(index.status(OTHER + "=exr=1920x1080"), None)
+        self.assertEqual(index.locations(LIGHT + "=exr=1920x1080"),
+            ["remote", "site"])
+        self.assertEqual(index.representations(LIGHT, "remote"),
+            [LIGHT + "=exr=1920x1080", LIGHT + "=jpg=960x540"])
+
+    # -------------------------------------------------------------------------
+    def test_subscriptions(self):
+
+        subs = [Subscription("a", COMP), Subscription("b", LIGHT)]
+
+        index = AvailabilityIndex.for_subscriptions(subs,
+            location_code="site")
+
+        self.assertEqual(sorted(self.searches),
+            ["show=s010=comp", "show=s010=light"])
+        self.assertEqual(
+            index.filter(subs, key=lambda s: s.product_version_spec),
+            [subs[1]])
+
+        # a copy synced to the site
+        index.add(ProductRepresentationStatus({
+            'product_representation': COMP + "=exr=1920x1080",
+            'location': "site",
+            'status': 1,
+        }))
+        self.assertEqual(index.filter([COMP, LIGHT]), [COMP, LIGHT])
+
+    # -------------------------------------------------------------------------
+    def test_nested_specs(self):
+
+        AvailabilityIndex.fetch(["show=s010", LIGHT, COMP],
+            location_code="site")
+
+        self.assertEqual(self.searches, ["show=s010"])
+
+    # -------------------------------------------------------------------------
+    def test_list_error(self):
+
+        # unknown, rather than unavailable everywhere
+        self.fail_search = "show=s010=comp"
+        subs = [Subscription("a", COMP), Subscription("b", LIGHT)]
+
+        self.assertRaises(ProductRepresentationStatusError,
+            AvailabilityIndex.for_subscriptions, subs, location_code="site")
+
+    # -------------------------------------------------------------------------
+    def test_unknown_representation(self):
+
+        index = AvailabilityIndex.for_ptask("show=s010", location_code="site")
+
+        # lookups don't add representations to the index
+        self.assertEqual(index.filter(["show=s020"]), [])
+        self.assertEqual(index.representations("show=s020"), [])
+        self.assertEqual(index.locations("show=s020"), [])
+        self.assertEqual(len(index), 4)
+
+    # -------------------------------------------------------------------------
+    def _request(self, action, data_type, primary_key=None, data=None,
+        params=None, headers=None):
+
+        # the search is a fuzzy match, as on the server
+        self.searches.append(params['search'])
+        if params['search'] == self.fail_search:
+            raise RestfulClientError("Server unavailable")
+
+        return [
+            {
+                'product_representation': r,
+                'location': l,
+                'status': s,
+                'spec': r + "," + l,
+            }
+            for (r, l, s) in STATUSES if params['search'] in r
+        ]
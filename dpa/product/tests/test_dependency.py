@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.tests.test_dependency
+# -----------------------------------------------------------------------------
+"""Unit tests for the product dependency graph."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.logging import Logger
+from dpa.product.dependency import (
+    DependencyGraph, record_subscription, _cache_path,
+)
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+RIG = "show=hero=rig=products=hero=rig"
+ANIM = "show=s010=anim"
+ANIM_CACHE = "show=s010=anim=products=hero=cache"
+LIGHT = "show=s010=light"
+COMP = "promo=s010=comp"
+COMP_RENDER = "promo=s010=comp=products=final=render"
+EDIT = "promo=edit"
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all dependency graph tests."""
+
+    return unittest.TestSuite([
+        DependencyGraphTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class DependencyGraphTestCase(unittest.TestCase):
+    """Downstream and upstream queries over a rig, anim and lighting chain."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.graph = DependencyGraph(
+            "show",
+            subscriptions=[
+                (ANIM + "@0001", RIG + "=0002"),
+                (LIGHT + "@0001", ANIM_CACHE + "=0001"),
+            ],
+            product_versions=[
+                (RIG + "=0002", "show=hero=rig@0002"),
+                (ANIM_CACHE + "=0001", ANIM + "@0001"),
+            ],
+        )
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_downstream(self):
+        """Everything built from the rig, limited by depth"""
+
+        self.assertEqual(self.graph.downstream(RIG), {
+            ANIM + "@0001": 1,
+            ANIM_CACHE + "=0001": 1,
+            LIGHT + "@0001": 2,
+        })
+        self.assertEqual(sorted(self.graph.downstream(RIG, depth=1)),
+            sorted([ANIM + "@0001", ANIM_CACHE + "=0001"]))
+        self.assertEqual(self.graph.downstream(LIGHT), {})
+
+    # -------------------------------------------------------------------------
+    def test_upstream(self):
+        """Everything lighting is built from, limited by depth"""
+
+        self.assertEqual(self.graph.upstream(LIGHT + "@0001"), {
+            ANIM_CACHE + "=0001": 1,
+            ANIM + "@0001": 1,
+            RIG + "=0002": 2,
+            "show=hero=rig@0002": 2,
+        })
+        self.assertEqual(len(self.graph.upstream(LIGHT, depth=1)), 2)
+
+    # -------------------------------------------------------------------------
+    def test_incremental(self):
+        """Changes are applied in memory and survive the cache"""
+
+        self.graph.remove_subscription(LIGHT + "@0001", ANIM_CACHE + "=0001")
+        self.graph.add_subscription(LIGHT + "@0002", RIG + "=0002")
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "show.json")
+            self.graph.write(path)
+            graph = DependencyGraph.read(path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertEqual(graph.downstream(RIG), {
+            ANIM + "@0001": 1,
+            ANIM_CACHE + "=0001": 1,
+            LIGHT + "@0002": 1,
+        })
+
+    # -------------------------------------------------------------------------
+    def test_connected(self):
+        """Subscribers in other projects are followed through their graphs"""
+
+        log_dir = Logger.log_dir
+        Logger.log_dir = tempfile.mkdtemp()
+        try:
+            self.graph.add_subscription(COMP + "@0001", ANIM_CACHE + "=0001")
+            self.graph.write(_cache_path("show"))
+            DependencyGraph(
+                "promo",
+                subscriptions=[
+                    (COMP + "@0001", ANIM_CACHE + "=0001"),
+                    (EDIT + "@0003", COMP_RENDER + "=0001"),
+                ],
+                product_versions=[
+                    (COMP_RENDER + "=0001", COMP + "@0001"),
+                ],
+            ).write(_cache_path("promo"))
+
+            # stops at the other project's subscriber
+            self.assertNotIn(EDIT + "@0003",
+                DependencyGraph.load("show").downstream(RIG))
+
+            graph = DependencyGraph.load_connected(RIG)
+            self.assertEqual(graph.downstream(RIG)[EDIT + "@0003"], 3)
+
+            graph = DependencyGraph.load_connected(EDIT, upstream=True)
+            self.assertEqual(graph.upstream(EDIT)[RIG + "=0002"], 3)
+
+            # updates are recorded in the cached graphs of both projects
+            record_subscription(LIGHT + "@0002", COMP_RENDER + "=0001")
+            for scope in ("show", "promo"):
+                graph = DependencyGraph.read(_cache_path(scope))
+                self.assertIn(LIGHT + "@0002",
+                    graph.downstream(COMP_RENDER))
+        finally:
+            shutil.rmtree(Logger.log_dir)
+            Logger.log_dir = log_dir
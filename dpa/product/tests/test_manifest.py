@@ -0,0 +1,134 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.tests.test_manifest
+# -----------------------------------------------------------------------------
+"""Unit tests for representation manifests."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from dpa.product.representation.manifest import (
+    RepresentationManifest, Sequence,
+)
+from dpa.sync.manifest import Manifest
+from dpa.sync.verify import WRONG_HASH, WRONG_SIZE, verify_tree
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all representation manifest tests."""
+
+    return unittest.TestSuite([
+        RepresentationManifestTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class RepresentationManifestTestCase(unittest.TestCase):
+    """Manifests of an area holding a frame sequence and a single file."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.area = tempfile.mkdtemp()
+        for frame in (101, 102, 104):
+            self._write("beauty.{f:04d}.exr".format(f=frame), 10)
+        self._write("notes.txt", 3)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.area)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_load(self):
+
+        manifest = RepresentationManifest.load(self.area)
+
+        self.assertEqual(manifest.files, [
+            "beauty.0101.exr", "beauty.0102.exr", "beauty.0104.exr",
+            "notes.txt",
+        ])
+        self.assertEqual(manifest.sequences,
+            [Sequence("beauty.####.exr", 101, 104, 3, 30)])
+
+        # written for the next reader, and read back the same
+        self.assertTrue(Manifest.read(self.area) is not None)
+        self.assertEqual(RepresentationManifest.load(self.area).sequences,
+            manifest.sequences)
+
+    # -------------------------------------------------------------------------
+    def test_stale(self):
+
+        RepresentationManifest.record(self.area)
+
+        # a new file changes the area's modification time
+        time.sleep(0.01)
+        self._write("beauty.0105.exr", 10)
+
+        manifest = RepresentationManifest.load(self.area)
+
+        self.assertEqual(manifest.sequences,
+            [Sequence("beauty.####.exr", 101, 105, 4, 40)])
+
+    # -------------------------------------------------------------------------
+    def test_checksummed(self):
+
+        # as recorded when the version is published
+        Manifest.record(self.area, checksum=True, workers=1)
+
+        # corrupt a frame without changing its size or modification time
+        path = os.path.join(self.area, "beauty.0102.exr")
+        info = os.stat(path)
+        with open(path, 'w') as fh:
+            fh.write("y" * 10)
+        os.utime(path, (info.st_atime, info.st_mtime))
+
+        manifest = RepresentationManifest.load(self.area)
+
+        # the sequences are added, the hashes are kept
+        self.assertEqual(manifest.sequences,
+            [Sequence("beauty.####.exr", 101, 104, 3, 30)])
+        recorded = Manifest.read(self.area)
+        self.assertTrue(recorded.checksummed)
+        self.assertTrue('sequences' in recorded.info)
+        self.assertEqual([(m.path, m.reason) for m in verify_tree(self.area)],
+            [("beauty.0102.exr", WRONG_HASH)])
+
+        # and kept when the manifest is recorded again
+        RepresentationManifest.record(self.area)
+        self.assertTrue(Manifest.read(self.area).checksummed)
+
+    # -------------------------------------------------------------------------
+    def test_checksummed_changed(self):
+
+        Manifest.record(self.area, checksum=True, workers=1)
+
+        # a truncated frame
+        self._write("beauty.0101.exr", 5)
+
+        manifest = RepresentationManifest.load(self.area)
+
+        # the area is described, the recorded manifest left to verify against
+        self.assertEqual(manifest.sequences,
+            [Sequence("beauty.####.exr", 101, 104, 3, 25)])
+        self.assertTrue(Manifest.read(self.area).checksummed)
+        self.assertEqual([(m.path, m.reason) for m in verify_tree(self.area)],
+            [("beauty.0101.exr", WRONG_SIZE)])
+
+    # -------------------------------------------------------------------------
+    def _write(self, name, size):
+
+        with open(os.path.join(self.area, name), 'w') as fh:
+            fh.write("x" * size)
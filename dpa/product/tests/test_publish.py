@@ -0,0 +1,230 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.product.tests.test_publish
+# -----------------------------------------------------------------------------
+"""Unit tests for ensuring product representations."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import copy
+import unittest
+
+from dpa.product import publish
+from dpa.product.publish import (
+    PRODUCT, PRODUCT_REPR, PRODUCT_REPR_STATUS, PRODUCT_VERSION,
+    ensure_product_representation,
+)
+from dpa.restful.client import RestfulClient, RestfulClientError
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+PTASK_VERSION = "show=s010=light@0003"
+
+ALL_CREATED = [PRODUCT, PRODUCT_VERSION, PRODUCT_REPR, PRODUCT_REPR_STATUS]
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all product publish tests."""
+
+    return unittest.TestSuite([
+        EnsureProductRepresentationTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class EnsureProductRepresentationTestCase(unittest.TestCase):
+    """Publishes against an in memory server without the ensure request."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.server = _StandInServer()
+        self.execute_request = RestfulClient.execute_request
+        RestfulClient.execute_request = \
+            lambda client, *args, **kwargs: self.server.request(
+                *args, **kwargs)
+        publish._ensure_supported = True
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        RestfulClient.execute_request = self.execute_request
+        publish._ensure_supported = True
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_create(self):
+
+        result = self._ensure()
+
+        self.assertEqual(result.created, ALL_CREATED)
+        self.assertEqual(result.product_repr_status.spec,
+            "show=s010=light=products=beauty=render=0001=exr=1920x1080," + \
+            "site")
+
+        # the ensure attempt, two concurrent lookups and four creates
+        self.assertEqual(self.server.actions, ['ensure', 'list', 'list'] + \
+            ['create'] * 4)
+        self.assertFalse(publish._ensure_supported)
+
+    # -------------------------------------------------------------------------
+    def test_existing(self):
+
+        first = self._ensure()
+        self.server.actions = []
+
+        result = self._ensure()
+
+        self.assertEqual(result.created, [])
+        self.assertEqual(result.product_repr.spec, first.product_repr.spec)
+        self.assertEqual(self.server.actions, ['list'] * 4)
+
+    # -------------------------------------------------------------------------
+    def test_new_representation(self):
+
+        self._ensure()
+        self.server.actions = []
+
+        result = self._ensure(file_type="jpg", note="Second pass")
+
+        self.assertEqual(result.created, [PRODUCT_REPR, PRODUCT_REPR_STATUS])
+        self.assertEqual(result.product_version.release_note, "Second pass")
+        self.assertEqual(self.server.actions,
+            ['list', 'list', 'update', 'list', 'create', 'create'])
+
+    # -------------------------------------------------------------------------
+    def test_remote(self):
+
+        self.server.ensure_supported = True
+
+        result = self._ensure()
+
+        self.assertEqual(result.created, ALL_CREATED)
+        self.assertEqual(self.server.actions, ['ensure'])
+
+    # -------------------------------------------------------------------------
+    def _ensure(self, file_type="exr", note="First pass"):
+
+        return ensure_product_representation(
+            ptask_version_spec=PTASK_VERSION,
+            name="beauty",
+            category="render",
+            description="Beauty pass",
+            resolution="1920x1080",
+            file_type=file_type,
+            release_note=note,
+            location_code="site",
+            creator="artist",
+        )
+
+# -----------------------------------------------------------------------------
+# Private Classes:
+# -----------------------------------------------------------------------------
+class _StandInServer(object):
+    """Keeps the chain's objects in memory and records each request."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self.ensure_supported = False
+        self.actions = []
+        self._objects = {
+            'products': [],
+            'product-versions': [],
+            'product-representations': [],
+            'product-representation-statuses': [],
+        }
+
+    # -------------------------------------------------------------------------
+    def request(self, action, data_type, primary_key=None, data=None,
+        params=None, headers=None):
+
+        self.actions.append(action)
+
+        if action == 'ensure':
+            if not self.ensure_supported:
+                raise RestfulClientError("Not found", status_code=404)
+            return self._ensure(data)
+
+        if action == 'list':
+            return [copy.deepcopy(o) for o in self._objects[data_type]
+                if all(o.get(k) == v for (k, v) in params.iteritems())]
+
+        if action == 'create':
+            return copy.deepcopy(self._create(data_type, data))
+
+        if action == 'update':
+            for obj in self._objects[data_type]:
+                if obj['spec'] == primary_key:
+                    obj.update(data)
+                    return copy.deepcopy(obj)
+
+        raise RestfulClientError("Bad request", status_code=400)
+
+    # -------------------------------------------------------------------------
+    def _create(self, data_type, data):
+
+        obj = dict(data)
+
+        if data_type == 'products':
+            obj['spec'] = "=".join(
+                [data['ptask'], "products", data['name'], data['category']])
+        elif data_type == 'product-versions':
+            number = 1 + len([v for v in self._objects[data_type]
+                if v['product'] == data['product']])
+            obj['number'] = number
+            obj['published'] = False
+            obj['deprecated'] = False
+            obj['spec'] = data['product'] + "=" + str(number).zfill(4)
+        elif data_type == 'product-representations':
+            obj['spec'] = "=".join([data['product_version'],
+                data['representation_type'], data['resolution']])
+        else:
+            obj['spec'] = ",".join(
+                [data['product_representation'], data['location']])
+
+        self._objects[data_type].append(obj)
+
+        return obj
+
+    # -------------------------------------------------------------------------
+    def _ensure(self, data):
+
+        ptask_spec = data['ptask_version'].split("@")[0]
+        product = self._create('products', {
+            'ptask': ptask_spec,
+            'name': data['name'],
+            'category': data['category'],
+            'description': data['description'],
+        })
+        version = self._create('product-versions', {
+            'product': product['spec'],
+            'ptask_version': data['ptask_version'],
+            'release_note': data['release_note'],
+        })
+        product_repr = self._create('product-representations', {
+            'product_version': version['spec'],
+            'representation_type': data['representation_type'],
+            'resolution': data['resolution'],
+        })
+        status = self._create('product-representation-statuses', {
+            'product_representation': product_repr['spec'],
+            'location': data['location'],
+            'status': data['status'],
+        })
+
+        return {
+            PRODUCT: product,
+            PRODUCT_VERSION: version,
+            PRODUCT_REPR: product_repr,
+            PRODUCT_REPR_STATUS: status,
+            'created': ALL_CREATED,
+        }
@@ -105,7 +105,9 @@ class ProductVersion(CreateMixin, GetMixin, ListMixin, UpdateMixin,
 
     # -------------------------------------------------------------------------
     def publish(self):
+        from dpa.product.representation.manifest import record_manifests
         self.update(published=True)
+        record_manifests(self)
 
     # -------------------------------------------------------------------------
     def unpublish(self):
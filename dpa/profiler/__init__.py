@@ -0,0 +1,411 @@
+"""Timing utilities for profiling pipeline startup.
+
+Classes
+-------
+TimingNode
+    A single timed node in a hierarchical timing tree.
+StartupProfiler
+    Records import and phase timings into a tree of TimingNodes.
+
+This module intentionally depends only on the standard library so that it can
+be imported before any other pipeline module when profiling startup.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import __builtin__
+from contextlib import contextmanager
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# (module, class, attribute, label) of the key startup phases. Each phase is
+# wrapped as soon as its module has been imported.
+STARTUP_PHASES = [
+    ('dpa.action.registry', 'ActionRegistry', 'init', 'ActionRegistry.init'),
+    ('dpa.config', 'Config', 'composite', 'Config.composite'),
+    ('dpa.config', 'Config', 'read', 'Config.read'),
+    ('dpa.logging', 'Logger', 'get', 'Logger.get'),
+    ('dpa.ptask.area', 'PTaskArea', 'current', 'PTaskArea.current'),
+    ('dpa.restful.client', 'RestfulClient', 'execute_request_url',
+        'RestfulClient.request'),
+]
+
+# -----------------------------------------------------------------------------
+# Classes:
+# -----------------------------------------------------------------------------
+class TimingNode(object):
+    """A timed node within a hierarchical timing tree."""
+
+    # -------------------------------------------------------------------------
+    # Class methods:
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a node (and its children) from its dict representation."""
+
+        node = cls(data['name'], kind=data.get('kind', 'phase'))
+        node.elapsed = data.get('elapsed', 0.0)
+        node.cpu = data.get('cpu', 0.0)
+        node.rest_calls = data.get('rest_calls', 0)
+        node.count = data.get('count', 1)
+        node.children = [cls.from_dict(c) for c in data.get('children', [])]
+        return node
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, name, kind='phase'):
+        self.name = name
+        self.kind = kind
+        self.elapsed = 0.0
+        self.cpu = 0.0
+        self.rest_calls = 0
+        self.count = 1
+        self.children = []
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def add_child(self, child, merge=True):
+        """Add a child node.
+
+        If ``merge`` is True, the child is merged with an identically named
+        sibling, adding up their times and counts.
+
+        """
+
+        for sibling in self.children:
+            if not merge:
+                break
+            if sibling.name == child.name and sibling.kind == child.kind:
+                sibling.elapsed += child.elapsed
+                if sibling.cpu is not None:
+                    sibling.cpu = None if child.cpu is None else \
+                        sibling.cpu + child.cpu
+                sibling.rest_calls += child.rest_calls
+                sibling.count += child.count
+                sibling.children.extend(child.children)
+                return sibling
+
+        self.children.append(child)
+        return child
+
+    # -------------------------------------------------------------------------
+    def flatten(self, prefix=None):
+        """Returns a dict of slash separated node paths to elapsed seconds."""
+
+        path = self.name if prefix is None else prefix + "/" + self.name
+        flat = {path: self.elapsed}
+        for child in self.children:
+            flat.update(child.flatten(prefix=path))
+        return flat
+
+    # -------------------------------------------------------------------------
+    def lines(self, total=None, depth=None, min_elapsed=0.0, indent=0,
+        details=False, ordered=False):
+        """Returns formatted lines for this node and its children.
+
+        If details is True, process cpu time and rest call counts are
+        included. Unknown cpu times are shown as '-'.
+        Children are sorted slowest first unless ordered is True, in which
+        case they are listed in the order they were added.
+
+        """
+
+        if total is None:
+            total = self.elapsed or 1.0
+
+        percent = 100.0 * self.elapsed / total if total else 0.0
+        name = self.name
+        if self.count > 1:
+            name += " (x{c})".format(c=self.count)
+
+        if details:
+            if self.cpu is None:
+                cpu = "{c:>10s}".format(c="-")
+            else:
+                cpu = "{c:10.1f}".format(c=self.cpu * 1000.0)
+            line = "{ms:10.1f} ms {cpu} ms proc cpu {rest:5d} rest  ".format(
+                ms=self.elapsed * 1000.0,
+                cpu=cpu,
+                rest=self.rest_calls,
+            )
+        else:
+            line = "{ms:10.1f} ms {pct:6.1f}%  ".format(
+                ms=self.elapsed * 1000.0,
+                pct=percent,
+            )
+
+        lines = [line + "  " * indent + name]
+
+        if depth is not None and indent >= depth:
+            return lines
+
+        children = self.children
+        if not ordered:
+            children = sorted(children, key=lambda c: -c.elapsed)
+
+        for child in children:
+            if child.elapsed < min_elapsed:
+                continue
+            lines.extend(
+                child.lines(total=total, depth=depth,
+                    min_elapsed=min_elapsed, indent=indent + 1,
+                    details=details, ordered=ordered)
+            )
+
+        return lines
+
+    # -------------------------------------------------------------------------
+    def to_dict(self):
+        """Returns a json serializable dict for this node and its children."""
+
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'elapsed': self.elapsed,
+            'cpu': self.cpu,
+            'rest_calls': self.rest_calls,
+            'count': self.count,
+            'children': [c.to_dict() for c in self.children],
+        }
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def self_elapsed(self):
+        """Time spent in this node, excluding time spent in its children."""
+        return max(0.0, self.elapsed - sum(c.elapsed for c in self.children))
+
+# -----------------------------------------------------------------------------
+class StartupProfiler(object):
+    """Records import and startup phase timings as a tree.
+
+    Usage::
+
+        >>> profiler = StartupProfiler()
+        >>> profiler.install()
+        >>> with profiler.phase("load registry"):
+        ...     from dpa.action.registry import ActionRegistry
+        ...     ActionRegistry()
+        >>> profiler.uninstall()
+        >>> print "\\n".join(profiler.root.lines())
+
+    While installed, every import that loads new modules is recorded as a
+    node in the tree, as are calls to the functions listed in
+    ``STARTUP_PHASES``.
+
+    """
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, name="startup", phases=None):
+
+        self._root = TimingNode(name)
+        self._stack = [self._root]
+        self._start = None
+        self._orig_import = None
+        self._pending_phases = list(STARTUP_PHASES if phases is None else phases)
+        self._wrapped = []
+        self._rest_calls = 0
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def install(self):
+        """Wrap the import machinery and start the root timer."""
+
+        if self._orig_import is not None:
+            return
+
+        self._orig_import = __builtin__.__import__
+        __builtin__.__import__ = self._timed_import
+        self._start = time.time()
+
+        # phases whose modules were imported before installation
+        self._wrap_loaded_phases()
+
+    # -------------------------------------------------------------------------
+    def uninstall(self):
+        """Restore the import machinery and wrapped phases. Stop the timer."""
+
+        if self._orig_import is None:
+            return
+
+        __builtin__.__import__ = self._orig_import
+        self._orig_import = None
+
+        for (owner, attr_name, original) in reversed(self._wrapped):
+            setattr(owner, attr_name, original)
+        self._wrapped = []
+
+        self._root.elapsed = time.time() - self._start
+
+    # -------------------------------------------------------------------------
+    @contextmanager
+    def phase(self, name, kind='phase'):
+        """Context manager that times the enclosed block as a child node."""
+
+        node = TimingNode(name, kind=kind)
+        parent = self._stack[-1]
+        self._stack.append(node)
+        start = time.time()
+        try:
+            yield node
+        finally:
+            node.elapsed = time.time() - start
+            self._stack.pop()
+            parent.add_child(node)
+
+    # -------------------------------------------------------------------------
+    def results(self):
+        """Returns a json serializable dict describing the profiled run."""
+
+        from dpa import __version__
+
+        return {
+            'version': __version__,
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'created': datetime.datetime.now().strftime("%Y/%m/%d-%H:%M:%S"),
+            'total': self._root.elapsed,
+            'rest_calls': self._rest_calls,
+            'phases': self._root.flatten(),
+            'tree': self._root.to_dict(),
+        }
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def root(self):
+        return self._root
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None,
+        level=-1):
+
+        num_modules = len(sys.modules)
+        node = TimingNode("import " + name, kind='import')
+        parent = self._stack[-1]
+        self._stack.append(node)
+        start = time.time()
+        try:
+            return self._orig_import(name, globals, locals, fromlist, level)
+        finally:
+            node.elapsed = time.time() - start
+            self._stack.pop()
+
+            # only keep imports that actually loaded something
+            if len(sys.modules) != num_modules:
+                parent.add_child(node)
+                if self._pending_phases:
+                    self._wrap_loaded_phases()
+
+    # -------------------------------------------------------------------------
+    def _wrap_loaded_phases(self):
+
+        pending = []
+
+        for phase_info in self._pending_phases:
+            (module_name, class_name, attr_name, label) = phase_info
+            module = sys.modules.get(module_name)
+            owner = getattr(module, class_name, None) if module else None
+            if owner is None or attr_name not in owner.__dict__:
+                pending.append(phase_info)
+                continue
+            self._wrap_phase(owner, attr_name, label)
+
+        self._pending_phases = pending
+
+    # -------------------------------------------------------------------------
+    def _wrap_phase(self, owner, attr_name, label):
+
+        original = owner.__dict__[attr_name]
+        profiler = self
+
+        if isinstance(original, (classmethod, staticmethod)):
+            func = original.__func__
+        else:
+            func = original
+
+        def _timed(*args, **kwargs):
+            phase_label = label
+            if label == 'RestfulClient.request':
+                profiler._rest_calls += 1
+                if profiler._rest_calls == 1:
+                    phase_label = "RestfulClient.request (first)"
+            with profiler.phase(phase_label):
+                return func(*args, **kwargs)
+
+        _timed.__name__ = func.__name__
+        _timed.__doc__ = func.__doc__
+
+        if isinstance(original, classmethod):
+            wrapped = classmethod(_timed)
+        elif isinstance(original, staticmethod):
+            wrapped = staticmethod(_timed)
+        else:
+            wrapped = _timed
+
+        setattr(owner, attr_name, wrapped)
+        self._wrapped.append((owner, attr_name, original))
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def read_baseline(path):
+    """Returns the list of runs recorded in the supplied baseline file."""
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as fh:
+        return json.load(fh).get('runs', [])
+
+# -----------------------------------------------------------------------------
+def write_baseline(path, results):
+    """Append the supplied results to the runs in the baseline file."""
+
+    runs = read_baseline(path)
+    runs.append(results)
+
+    with open(path, 'w') as fh:
+        json.dump({'runs': runs}, fh, indent=2, sort_keys=True)
+
+# -----------------------------------------------------------------------------
+def compare_results(baseline, results, depth=1):
+    """Compare results to a baseline run.
+
+    Returns a list of (phase path, baseline secs, current secs) tuples for
+    phases up to the supplied depth below the root.
+
+    """
+
+    base_phases = baseline.get('phases', {})
+    cur_phases = results.get('phases', {})
+
+    comparison = []
+    for path in sorted(set(base_phases.keys()) | set(cur_phases.keys())):
+        if path.count("/") > depth:
+            continue
+        comparison.append(
+            (path, base_phases.get(path), cur_phases.get(path))
+        )
+
+    return comparison
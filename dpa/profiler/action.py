@@ -0,0 +1,302 @@
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from distutils.spawn import find_executable
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from dpa.action import Action, ActionError
+from dpa.profiler import (
+    TimingNode, compare_results, read_baseline, write_baseline,
+)
+from dpa.shell.output import Output, Style
+
+# -----------------------------------------------------------------------------
+# Classes:
+# -----------------------------------------------------------------------------
+class StartupProfileAction(Action):
+    """Profile the startup time of the pipeline in a fresh interpreter."""
+
+    name = "profile"
+    target_type = "startup"
+    logging = False
+
+    # -------------------------------------------------------------------------
+    # Class methods:
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "-c", "--command",
+            default=None,
+            help="A dpa command line to profile, ex: \"ptask env\".",
+            metavar='"command"',
+        )
+
+        parser.add_argument(
+            "-m", "--module",
+            dest="modules",
+            action="append",
+            default=None,
+            help="A module to profile the import of, ex: dpa.nuke.utils. " + \
+                 "Can be supplied multiple times.",
+        )
+
+        parser.add_argument(
+            "-p", "--pstats",
+            default=None,
+            help="Write a cProfile/pstats dump of the startup to this path.",
+        )
+
+        parser.add_argument(
+            "-b", "--baseline",
+            default=None,
+            help="Record the results to this baseline json file.",
+        )
+
+        parser.add_argument(
+            "--compare",
+            default=None,
+            help="Compare the results to the last run in this baseline file.",
+        )
+
+        parser.add_argument(
+            "-d", "--depth",
+            type=int,
+            default=None,
+            help="Maximum depth of the timing tree to display.",
+        )
+
+        parser.add_argument(
+            "--min_ms",
+            type=float,
+            default=1.0,
+            help="Hide nodes that took less than this many milliseconds.",
+        )
+
+        parser.add_argument(
+            "--no_rest",
+            action="store_true",
+            help="Don't time a first request to the data server.",
+        )
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, command=None, modules=None, pstats=None, baseline=None,
+        compare=None, depth=None, min_ms=1.0, no_rest=False):
+
+        super(StartupProfileAction, self).__init__(
+            command=command,
+            modules=modules,
+            pstats=pstats,
+            baseline=baseline,
+            compare=compare,
+            depth=depth,
+            min_ms=min_ms,
+            no_rest=no_rest,
+        )
+
+        self._command = command
+        self._modules = modules or []
+        self._pstats = pstats
+        self._baseline = baseline
+        self._compare = compare
+        self._depth = depth
+        self._min_ms = min_ms
+        self._no_rest = no_rest
+        self._results = None
+
+    # -------------------------------------------------------------------------
+    # Methods:
+    # -------------------------------------------------------------------------
+    def execute(self):
+
+        self._profile()
+
+        if self.interactive:
+            self._print_tree()
+
+        if self.compare:
+            self._print_comparison()
+
+        if self.baseline:
+            try:
+                write_baseline(self.baseline, self.results)
+            except (IOError, OSError) as e:
+                raise ActionError("Unable to write baseline: " + str(e))
+            if self.interactive:
+                print "\nRecorded baseline: " + \
+                    Style.bright + self.baseline + Style.reset
+
+        if self.pstats and self.interactive:
+            print "\nWrote pstats dump: " + \
+                Style.bright + self.pstats + Style.reset
+
+        if self.interactive:
+            print ""
+
+    # -------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        self._script = _find_cli_script()
+
+        if self.command and not self._script:
+            raise ActionError("Unable to locate the dpa command line script.")
+
+        if self.compare and not read_baseline(self.compare):
+            raise ActionError(
+                "No baseline runs to compare in: " + str(self.compare))
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def baseline(self):
+        return self._baseline
+
+    # -------------------------------------------------------------------------
+    @property
+    def command(self):
+        return self._command
+
+    # -------------------------------------------------------------------------
+    @property
+    def compare(self):
+        return self._compare
+
+    # -------------------------------------------------------------------------
+    @property
+    def depth(self):
+        return self._depth
+
+    # -------------------------------------------------------------------------
+    @property
+    def min_ms(self):
+        return self._min_ms
+
+    # -------------------------------------------------------------------------
+    @property
+    def modules(self):
+        return self._modules
+
+    # -------------------------------------------------------------------------
+    @property
+    def no_rest(self):
+        return self._no_rest
+
+    # -------------------------------------------------------------------------
+    @property
+    def pstats(self):
+        return self._pstats
+
+    # -------------------------------------------------------------------------
+    @property
+    def results(self):
+        return self._results
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _profile(self):
+
+        (fd, output_path) = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+
+        args = [sys.executable, "-m", "dpa.profiler.startup", output_path]
+
+        if self._script:
+            args.extend(["--script", self._script])
+        if self.command:
+            args.extend(["--command", self.command])
+        for module_name in self.modules:
+            args.extend(["--module", module_name])
+        if self.pstats:
+            args.extend(["--pstats", os.path.abspath(self.pstats)])
+        if self.no_rest:
+            args.append("--no_rest")
+
+        try:
+            subprocess.call(args)
+            with open(output_path) as fh:
+                self._results = json.load(fh)
+        except (OSError, IOError, ValueError) as e:
+            raise ActionError("Unable to profile startup: " + str(e))
+        finally:
+            os.remove(output_path)
+
+    # -------------------------------------------------------------------------
+    def _print_comparison(self):
+
+        baseline = read_baseline(self.compare)[-1]
+
+        phase = "Phase"
+        base = "Baseline ({v})".format(v=baseline.get('version'))
+        current = "Current ({v})".format(v=self.results.get('version'))
+        delta = "Delta"
+
+        output = Output()
+        output.title = "Startup comparison:"
+        output.header_names = [phase, base, current, delta]
+        output.set_header_alignment({
+            base: "right",
+            current: "right",
+            delta: "right",
+        })
+
+        for (path, base_secs, cur_secs) in compare_results(
+            baseline, self.results):
+
+            if base_secs is not None and cur_secs is not None:
+                delta_disp = "{d:+.1f} ms".format(
+                    d=(cur_secs - base_secs) * 1000.0)
+            else:
+                delta_disp = "----"
+
+            output.add_item({
+                phase: path,
+                base: _ms_disp(base_secs),
+                current: _ms_disp(cur_secs),
+                delta: delta_disp,
+            })
+
+        output.dump(output_format='table')
+
+    # -------------------------------------------------------------------------
+    def _print_tree(self):
+
+        root = TimingNode.from_dict(self.results['tree'])
+
+        print "\n" + Style.bright + "Startup timing:" + Style.reset + "\n"
+        print "\n".join(
+            root.lines(depth=self.depth, min_elapsed=self.min_ms / 1000.0))
+        print "\nREST calls: " + str(self.results.get('rest_calls', 0))
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _find_cli_script():
+
+    script = os.path.abspath(sys.argv[0]) if sys.argv else None
+    if script and os.path.basename(script) == "dpa" and os.path.isfile(script):
+        return script
+
+    return find_executable("dpa")
+
+# -----------------------------------------------------------------------------
+def _ms_disp(secs):
+
+    if secs is None:
+        return "----"
+
+    return "{ms:.1f} ms".format(ms=secs * 1000.0)
@@ -0,0 +1,113 @@
+"""Profile the startup of the dpa command line in a fresh interpreter.
+
+This module is executed as a script (``python -m dpa.profiler.startup``) by
+the ``dpa profile startup`` action. It writes its results as json to the
+supplied output path so that the profiled command's own output doesn't
+interfere with the results.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import argparse
+import cProfile
+import imp
+import json
+import shlex
+import sys
+
+from dpa.profiler import StartupProfiler
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def main(args=None):
+
+    parser = argparse.ArgumentParser(
+        description="Profile dpa startup. Used by 'dpa profile startup'.")
+    parser.add_argument("output", help="Path to write json results to.")
+    parser.add_argument("--script", help="Path to the dpa cli script.")
+    parser.add_argument("--command", help="dpa command line to run.")
+    parser.add_argument("--module", dest="modules", action="append",
+        default=[], help="Additional module to import.")
+    parser.add_argument("--pstats", help="Path to write a pstats dump to.")
+    parser.add_argument("--no_rest", action="store_true",
+        help="Don't time a first request to the data server.")
+    parsed = parser.parse_args(args)
+
+    profiler = StartupProfiler()
+    cprofiler = cProfile.Profile() if parsed.pstats else None
+
+    status = 0
+
+    if cprofiler:
+        cprofiler.enable()
+    profiler.install()
+
+    try:
+        status = _run(profiler, parsed)
+    finally:
+        profiler.uninstall()
+        if cprofiler:
+            cprofiler.disable()
+            cprofiler.dump_stats(parsed.pstats)
+
+    with open(parsed.output, 'w') as fh:
+        json.dump(profiler.results(), fh)
+
+    return status
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _run(profiler, parsed):
+
+    status = 0
+    dpa_cli = None
+
+    for module_name in parsed.modules:
+        with profiler.phase("module: " + module_name):
+            try:
+                __import__(module_name)
+            except Exception as e:
+                sys.stderr.write(
+                    "Unable to import {m}: {e}\n".format(m=module_name, e=e))
+
+    if parsed.script:
+        with profiler.phase("load cli script"):
+            dpa_cli = imp.load_source('_dpa_cli', parsed.script)
+
+        with profiler.phase("build cli parser"):
+            dpa_cli.DPA.get_cl_parser()
+
+    with profiler.phase("current ptask area"):
+        from dpa.ptask.area import PTaskArea
+        PTaskArea.current()
+
+    with profiler.phase("logger setup"):
+        from dpa.logging import Logger
+        Logger.get()
+
+    if parsed.command and dpa_cli:
+        with profiler.phase("command: " + parsed.command):
+            sys.argv = [parsed.script] + shlex.split(parsed.command)
+            try:
+                status = dpa_cli.DPA.cli()
+            except SystemExit as e:
+                # ex: --help or invalid args. still record the timings.
+                status = e.code
+    elif not parsed.no_rest:
+        with profiler.phase("first rest request"):
+            from dpa.location import Location
+            try:
+                Location.current()
+            except Exception as e:
+                sys.stderr.write("First rest request failed: {e}\n".format(e=e))
+
+    return status
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ from dpa.action.registry import ActionRegistry
 from dpa.cli import ParseDateArg
 from dpa.config import Config
 from dpa.location import current_location_code
+from dpa.product.dependency import record_subscription
 from dpa.product.subscription import (
     ProductSubscription, 
     ProductSubscriptionError,
@@ -20,6 +21,7 @@ from dpa.ptask.cli import ParsePTaskSpecArg
 from dpa.ptask.spec import PTaskSpec
 from dpa.ptask.version import PTaskVersion, PTaskVersionError
 from dpa.shell.output import Output, Style
+from dpa.sync.batch import SyncBatch
 from dpa.user import current_username
 
 # ----------------------------------------------------------------------------
@@ -113,7 +115,8 @@ class PTaskCreateAction(Action):
     # Special methods:
     # -------------------------------------------------------------------------
     def __init__(self, spec, ptask_type=None, description=None, creator=None,
-        start_date=None, due_date=None, source=None, force=True):
+        start_date=None, due_date=None, source=None, force=True,
+        sync_batch=None):
         super(PTaskCreateAction, self).__init__(
             spec,
             ptask_type=ptask_type,
@@ -163,6 +166,10 @@ class PTaskCreateAction(Action):
         self._ptask_area = None
         self._ptask_version = None
 
+        # when sourcing, the files of this ptask and all of its children are
+        # synced together by the outermost create
+        self._sync_batch = sync_batch
+
     # -------------------------------------------------------------------------
     # Methods:
     # -------------------------------------------------------------------------
@@ -416,6 +423,12 @@ class PTaskCreateAction(Action):
     def force(self):
         return self._force
 
+    # -------------------------------------------------------------------------
+    @property
+    def sync_batch(self):
+        """The batch syncing the sourced files, shared with child creates."""
+        return self._sync_batch
+
     # -------------------------------------------------------------------------
     @property
     def ptask(self):
@@ -518,18 +531,30 @@ class PTaskCreateAction(Action):
         if not source_action_class:
             raise ActionError("Could not find ptask source action.")
 
+        # the outermost create syncs the files for the whole tree of sourced
+        # ptasks at the end, in as few transfers as possible
+        owns_batch = self._sync_batch is None
+        if owns_batch:
+            self._sync_batch = SyncBatch()
+
+        # the source action adds its sync to the batch rather than running
+        # it. it logs its own validation errors, leaving the batch as it was.
+        queued = len(self._sync_batch)
         try:
             source_action = source_action_class(
                 source=self.source,
                 destination=self.ptask, 
                 force=True,
+                sync_batch=self._sync_batch,
             )
             source_action.interactive = False
             source_action()
-
         except ActionError as e:
             raise ActionError("Failed to source ptask: " + str(e))
 
+        if len(self._sync_batch) == queued:
+            raise ActionError("Failed to source ptask: " + self.source.spec)
+
         exceptions = []
 
         # copy the subscriptions from the source ptask
@@ -550,11 +575,21 @@ class PTaskCreateAction(Action):
                     due_date=self.due_date,
                     source=source_child,
                     force=True,
+                    sync_batch=self._sync_batch,
                 )
                 child_create.interactive = False
                 child_create()
             except ActionError as e:
                 exceptions.append(e)
+
+        if owns_batch:
+            self._sync_batch.run()
+            for result in self._sync_batch.failed:
+                exceptions.append(
+                    ActionError("Failed to sync: " + str(result.error)))
+            if self.interactive and not self._sync_batch.failed:
+                print "\nSuccessfully sourced: " + Style.bright + \
+                    self.source.spec + Style.reset
         
         if exceptions:
             msg = "\n".join([str(e) for e in exceptions])
@@ -580,6 +615,8 @@ class PTaskCreateAction(Action):
             except ProductSubscriptionError as e:
                 exceptions.append((sub, e))
             else:
+                record_subscription(new_sub.ptask_version_spec,
+                    new_sub.product_version_spec)
                 print "  " + Style.bright + \
                     str(sub.product_version_spec) + Style.normal
 
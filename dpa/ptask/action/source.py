@@ -21,14 +21,18 @@ class PTaskSourceAction(_PTaskSyncAction):
             super(PTaskSourceAction, self).execute()
         except ActionError as e:
             raise ActionError("Unable to source ptask: " + str(e))
+
+        # nothing has been synced yet. the batch's owner reports on it.
+        if self.sync_batch is not None:
+            return
+
+        print "\nSuccessfully sourced: ",
+        if self.source_version:
+            print Style.bright + str(self.source_version.spec) + \
+                Style.reset + "\n"
         else:
-            print "\nSuccessfully sourced: ",
-            if self.source_version:
-                print Style.bright + str(self.source_version.spec) + \
-                    Style.reset + "\n"
-            else:
-                print Style.bright + str(self.source.spec) + " [latest]" + \
-                    Style.reset + "\n"
+            print Style.bright + str(self.source.spec) + " [latest]" + \
+                Style.reset + "\n"
 
     # ------------------------------------------------------------------------
     def validate(self):
@@ -3,6 +3,7 @@
 # ----------------------------------------------------------------------------
 
 import os
+import re
 
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.config import Config
@@ -14,13 +15,20 @@ from dpa.ptask.cli import ParsePTaskSpecArg
 from dpa.ptask.version import PTaskVersion
 from dpa.shell.output import Output, Fg, Bg, Style
 from dpa.sync.action import SyncAction
+from dpa.sync.job import ENGINE_AUTO, ENGINE_NATIVE, remote_host
+from dpa.sync.manifest import FILTER_RULES_CONFIG_PATH, MANIFEST_FILE
+from dpa.sync.scheduler import SyncScheduler
 from dpa.user import current_username
 
 # ----------------------------------------------------------------------------
 # Globals
 # ----------------------------------------------------------------------------
 
-FILTER_RULES_CONFIG_PATH = "config/ptask/sync.cfg"
+# concurrent version syncs when not specified in the sync config
+DEFAULT_SYNC_WORKERS = 4
+
+# version directory names within a ptask area
+VERSION_DIR_REGEX = re.compile(r"^\.(\d{4,})$")
 
 # ----------------------------------------------------------------------------
 # Public classes:
@@ -92,7 +100,8 @@ class _PTaskSyncAction(Action):
     # ------------------------------------------------------------------------
     def __init__(self, source, destination, source_version=None, 
         destination_version=None, source_directory=None, 
-        destination_directory=None, wait=False, force=False, delete=False):
+        destination_directory=None, wait=False, force=False, delete=False,
+        sync_batch=None):
 
         super(_PTaskSyncAction, self).__init__(self,
             source,
@@ -122,19 +131,37 @@ class _PTaskSyncAction(Action):
         self._force = force
         self._delete = delete
 
+        self._sync_batch = sync_batch
+        self._sync_action = None
+        self._engine = ENGINE_AUTO
+        self._link_dest = None
+        self._reflink = False
+
     # ------------------------------------------------------------------------
     def execute(self):
 
+        if self.sync_batch is not None:
+            self.sync_batch.add(
+                self.source_path,
+                self.destination_path,
+                includes=self.includes,
+                excludes=self.excludes,
+            )
+            return
+
         try:
-            sync_action = SyncAction(
+            self._sync_action = SyncAction(
                 source=self.source_path,
                 destination=self.destination_path,
                 wait=self.wait,
                 includes=self.includes,
                 excludes=self.excludes,
                 delete=self.delete,
+                engine=self.engine,
+                link_dest=self.link_dest,
+                reflink=self.reflink,
             )
-            sync_action()
+            self._sync_action()
         except ActionError as e:
             raise ActionError("Unable to sync ptask: " + str(e))
 
@@ -248,16 +275,48 @@ class _PTaskSyncAction(Action):
 
         # ---- get the includes/excludes based on filter rules
 
-        (includes, excludes) = self._get_filter_rules(self.destination)
+        sync_config = self._get_sync_config(self.destination)
+        (includes, excludes) = self._get_filter_rules(sync_config)
 
         # exclude child ptask directories from the source
         for child in self.source.children:
             child_dir = os.path.sep + child.name
             excludes.append(child_dir)
 
+        # version manifests describe the version directory only
+        if not self.destination_version:
+            excludes.append(os.path.sep + MANIFEST_FILE)
+
         self._includes = includes
         self._excludes = excludes
 
+        # ---- local version directories are synced with the native engine.
+        #      it records the version's manifest as it copies, and re-syncs
+        #      and later syncs out of the version reuse it rather than
+        #      re-hashing or re-walking with rsync. the work directory is
+        #      left to rsync so that it doesn't get a manifest of its own.
+
+        if (self.destination_version and
+            not remote_host(self.source_path) and
+            not remote_host(self.destination_path)):
+            self._engine = ENGINE_NATIVE
+
+        # ---- snapshot local version directories. files unchanged since the
+        #      previous local version are linked to it rather than copied,
+        #      the rest are cloned. only the native engine does either.
+
+        if self._engine == ENGINE_NATIVE:
+
+            snapshots = sync_config.get('snapshots', {})
+            self._reflink = bool(snapshots.get('reflink', False))
+
+            if snapshots.get('hardlink', False):
+                self._link_dest = self._get_link_dest(
+                    self.destination,
+                    self.destination_version,
+                    self.destination_directory,
+                )
+
     # ------------------------------------------------------------------------
     def verify(self):
 
@@ -392,17 +451,63 @@ class _PTaskSyncAction(Action):
     def destination_latest_version(self):
         return self._destination_latest_version
 
+    # ------------------------------------------------------------------------
+    @property
+    def engine(self):
+        return self._engine
+
+    # ------------------------------------------------------------------------
+    @property
+    def link_dest(self):
+        """Previous version directory to hard link unchanged files to."""
+        return self._link_dest
+
+    # ------------------------------------------------------------------------
+    @property
+    def reflink(self):
+        return self._reflink
+
+    # ------------------------------------------------------------------------
+    @property
+    def sync_batch(self):
+        """If set, the sync is added to this batch rather than run. The
+        batch's own engine and delete options apply."""
+        return self._sync_batch
+
+    # ------------------------------------------------------------------------
+    @property
+    def sync_action(self):
+        """The underlying path sync. None until the action executes."""
+        return self._sync_action
+
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        if self.sync_action:
+            return self.sync_action.bytes_transferred
+        return None
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_transferred(self):
+        if self.sync_action:
+            return self.sync_action.files_transferred
+        return None
+
     # ------------------------------------------------------------------------
     # Private methods:
     # ------------------------------------------------------------------------
-    def _get_filter_rules(self, ptask):
+    def _get_sync_config(self, ptask):
 
         ptask_area = PTaskArea(ptask.spec, validate=False) 
-        filter_config = ptask_area.config(
+        return ptask_area.config(
             FILTER_RULES_CONFIG_PATH,
             composite_ancestors=True,
         )
-        
+
+    # ------------------------------------------------------------------------
+    def _get_filter_rules(self, filter_config):
+
         includes = []
         excludes = []
 
@@ -414,6 +519,31 @@ class _PTaskSyncAction(Action):
     
         return (includes, excludes)
 
+    # ------------------------------------------------------------------------
+    def _get_link_dest(self, ptask, version, directory=None):
+        """Returns the closest earlier version directory at this location."""
+
+        try:
+            names = os.listdir(ptask.area.path)
+        except OSError:
+            return None
+
+        earlier = []
+        for name in names:
+            match = VERSION_DIR_REGEX.match(name)
+            if match and int(match.group(1)) < version.number:
+                earlier.append(int(match.group(1)))
+
+        if not earlier:
+            return None
+
+        link_dest = ptask.area.dir(version=max(earlier), dir_name=directory,
+            verify=False)
+        if not os.path.isdir(link_dest):
+            return None
+
+        return link_dest
+
     # ------------------------------------------------------------------------
     def _get_path(self, ptask, version=None, latest_version=None, 
         directory=None, location_override=None):
@@ -503,26 +633,57 @@ class PTaskSyncAction(Action):
     # ------------------------------------------------------------------------
     def execute(self):
 
-        try:
+        (workers, limits) = self._get_worker_limits()
 
-            # sync the list of remote versions to this location
-            for version in self.versions:
-                print "\nSyncing version: " + \
-                    Style.bright + version.number_padded + Style.reset
-                _sync_action = _PTaskSyncAction(
-                    source=self.ptask,
-                    destination=self.ptask,
-                    source_version=version,
-                    destination_version=version,
+        scheduler = SyncScheduler(
+            workers=workers,
+            limits=limits,
+            callback=self._report_version,
+        )
+
+        # loggers aren't created thread safely. make sure they exist before
+        # the versions sync in threads.
+        _PTaskSyncAction.get_logger()
+        SyncAction.get_logger()
+
+        # sync the list of remote versions to this location. each version
+        # directory is independent, so they sync concurrently.
+        for version in self.versions:
+            scheduler.add(
+                version.number_padded,
+                self._version_job(version),
+                key=version.location_code,
+            )
+
+        if self.interactive:
+            print "\nSyncing {n} version(s), {w} at a time...".format(
+                n=len(self.versions), w=min(workers, len(self.versions)))
+
+        scheduler.run()
+
+        if self.interactive:
+            print "\nTransferred: " + Style.bright + \
+                "{f} files, {b} bytes".format(
+                    f=scheduler.files_transferred,
+                    b=scheduler.bytes_transferred,
+                ) + Style.reset
+
+        if scheduler.failed or scheduler.cancelled:
+            errors = [
+                "{v}: {e}".format(v=r.name, e=r.error)
+                for r in scheduler.failed
+            ]
+            if scheduler.cancelled:
+                errors.append(
+                    "Cancelled: " + ", ".join(
+                        [r.name for r in scheduler.cancelled])
                 )
-                _sync_action()
+            raise ActionError(
+                "Unable to sync ptask version(s): " + "; ".join(errors))
 
-        except ActionError as e:
-            raise ActionError("Unable to sync ptask version: " + str(e))
-        else:
-            if self.interactive:
-                print "\nSuccessfully synced: " + \
-                    Style.bright + str(self.ptask.spec) + Style.reset + "\n"
+        if self.interactive:
+            print "\nSuccessfully synced: " + \
+                Style.bright + str(self.ptask.spec) + Style.reset + "\n"
 
     # ------------------------------------------------------------------------
     def verify(self):
@@ -625,6 +786,86 @@ class PTaskSyncAction(Action):
     def force(self):
         return self._force
 
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _get_worker_limits(self):
+        """Returns the total workers and per location code limits.
+
+        Read from the 'workers' section of the ptask's sync config::
+
+            workers:
+                default: 4
+                remote_loc: 2
+
+        """
+
+        ptask_area = PTaskArea(self.ptask.spec, validate=False)
+        sync_config = ptask_area.config(
+            FILTER_RULES_CONFIG_PATH,
+            composite_ancestors=True,
+        )
+
+        workers = DEFAULT_SYNC_WORKERS
+        limits = {}
+
+        if 'workers' in sync_config:
+            for (key, value) in sync_config.workers.iteritems():
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    self.logger.warning(
+                        "Invalid sync workers for '{k}': {v}".format(
+                            k=key, v=value)
+                    )
+                    continue
+                if key == 'default':
+                    workers = value
+                else:
+                    limits[key] = value
+
+        return (workers, limits)
+
+    # ------------------------------------------------------------------------
+    def _report_version(self, result):
+
+        if not self.interactive:
+            return
+
+        if result.succeeded:
+            print "  " + Style.bright + result.name + Style.reset + \
+                ": synced {f} files, {b} bytes in {e:.1f}s".format(
+                    f=result.files_transferred,
+                    b=result.bytes_transferred,
+                    e=result.elapsed,
+                )
+        else:
+            print "  " + Style.bright + result.name + Style.reset + \
+                ": FAILED: " + str(result.error)
+
+    # ------------------------------------------------------------------------
+    def _version_job(self, version):
+
+        def _job():
+
+            sync_action = _PTaskSyncAction(
+                source=self.ptask,
+                destination=self.ptask,
+                source_version=version,
+                destination_version=version,
+                wait=True,
+            )
+            sync_action()
+
+            # validation errors are logged rather than raised by the action.
+            # without a sync, the version wasn't synced.
+            if sync_action.sync_action is None:
+                raise ActionError("Unable to sync version. See the logs.")
+
+            return sync_action
+
+        return _job
+
 # ----------------------------------------------------------------------------
 # Utility functions:
 # ----------------------------------------------------------------------------
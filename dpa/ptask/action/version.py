@@ -5,6 +5,7 @@
 from dpa.action import Action, ActionError, ActionAborted
 from dpa.action.registry import ActionRegistry
 from dpa.location import current_location_code
+from dpa.product.dependency import record_subscription
 from dpa.product.subscription import (
     ProductSubscription, 
     ProductSubscriptionError,
@@ -14,6 +15,7 @@ from dpa.ptask.area import PTaskAreaError
 from dpa.ptask.cli import ParsePTaskSpecArg
 from dpa.ptask.version import PTaskVersion, PTaskVersionError
 from dpa.shell.output import Output, Bg, Fg, Style
+from dpa.sync.manifest import Manifest, ManifestError
 from dpa.user import current_username
 
 # -----------------------------------------------------------------------------
@@ -251,6 +253,7 @@ class PTaskVersionAction(Action):
                 source_version=self.source_version,
                 destination=self.ptask,
                 delete=True,
+                wait=True,
             )
             source_action.interactive = False
             source_action()
@@ -269,12 +272,11 @@ class PTaskVersionAction(Action):
         # make sure the destination directory exists. it should be there
         # and empty, but just in case...
 
+        version_dir = self.ptask.area.dir(
+            version=self.latest_version.number, verify=False)
+
         try:
-            self.ptask.area.provision(
-                self.ptask.area.dir(
-                    version=self.latest_version.number, verify=False
-                )
-            )
+            self.ptask.area.provision(version_dir)
         except PTaskAreaError as e:
             raise ActionError(
                 "Unable to create missing destination directory."
@@ -291,7 +293,8 @@ class PTaskVersionAction(Action):
             source_action = source_action_class(
                 source=self.ptask,
                 destination=self.ptask,
-                destination_version=self.latest_version
+                destination_version=self.latest_version,
+                wait=True,
             )
             source_action.interactive = False
             source_action()
@@ -301,6 +304,16 @@ class PTaskVersionAction(Action):
                     format(v=self.latest_version.number)
             )
 
+        # record the version's manifest so later syncs of the version only
+        # transfer what has changed. local syncs use the native engine, which
+        # writes one as it copies. this covers a work directory synced from
+        # another location with rsync.
+        try:
+            if Manifest.read(version_dir) is None:
+                Manifest.record(version_dir)
+        except ManifestError as e:
+            self.logger.warning("Unable to record version manifest: " + str(e))
+
     # ------------------------------------------------------------------------
     def _update_description(self):
 
@@ -327,6 +340,8 @@ class PTaskVersionAction(Action):
             except ProductSubscriptionError as e:
                 exceptions.append((sub, e))
             else:
+                record_subscription(new_sub.ptask_version_spec,
+                    new_sub.product_version_spec)
                 print "  " + Style.bright + \
                     str(sub.product_version_spec) + Style.normal
 
@@ -0,0 +1,257 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.ptask.tests.test_sync
+# -----------------------------------------------------------------------------
+"""Unit tests for syncing ptask areas."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.config import Config
+from dpa.ptask.action import sync
+from dpa.ptask.action.sync import _PTaskSyncAction
+from dpa.sync.batch import SyncBatch
+from dpa.sync.job import ENGINE_AUTO, ENGINE_NATIVE
+from dpa.sync.manifest import Manifest, MANIFEST_FILE
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+LOCATION = "local"
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all ptask sync tests."""
+
+    return unittest.TestSuite([
+        PTaskSyncTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test actions:
+# -----------------------------------------------------------------------------
+class _SyncAction(_PTaskSyncAction):
+    """Syncs with a supplied sync config."""
+
+    logging = False
+    sync_config = None
+
+    def _get_sync_config(self, ptask):
+        return Config(self.__class__.sync_config)
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class PTaskSyncTestCase(unittest.TestCase):
+    """Syncs between the work and version directories of a local ptask."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sync_dir = os.environ.get('DPA_SYNC_DIR')
+        os.environ['DPA_SYNC_DIR'] = os.path.join(self.tmp_dir, "sync")
+
+        self.ptask = _FakePTask(os.path.join(self.tmp_dir, "s010"))
+        self.work_file = os.path.join(self.ptask.area.path, "scene.ma")
+        _write(self.work_file, "scene")
+
+        self.patched = (sync.Location, sync.PTask, sync.current_location_code)
+        sync.Location = _FakeLocationClass()
+        sync.PTask = _FakePTaskClass(self.ptask)
+        sync.current_location_code = lambda: LOCATION
+
+        _SyncAction.sync_config = {'excludes': ["/.[0-9]*/"]}
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        (sync.Location, sync.PTask, sync.current_location_code) = \
+            self.patched
+
+        if self.sync_dir is None:
+            os.environ.pop('DPA_SYNC_DIR', None)
+        else:
+            os.environ['DPA_SYNC_DIR'] = self.sync_dir
+
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_version_engine(self):
+        """Local version syncs use the native engine and record a manifest"""
+
+        self.ptask.add_version(1)
+
+        action = self._sync(destination_version=1)
+
+        self.assertEqual(action.engine, ENGINE_NATIVE)
+        version_dir = self.ptask.area.dir(version=1, verify=False)
+        self.assertTrue(os.path.isfile(os.path.join(version_dir, "scene.ma")))
+        self.assertTrue("scene.ma" in Manifest.read(version_dir))
+
+        # the work directory is left to rsync, without the version manifest
+        action = _SyncAction(source=self.ptask, source_version=1,
+            destination=self.ptask, wait=True)
+        action.validate()
+
+        self.assertEqual(action.engine, ENGINE_AUTO)
+        self.assertTrue(os.path.sep + MANIFEST_FILE in action.excludes)
+
+    # -------------------------------------------------------------------------
+    def test_snapshot(self):
+        """Unchanged files are linked to the previous local version"""
+
+        _SyncAction.sync_config['snapshots'] = {
+            'hardlink': True, 'reflink': True}
+        self.ptask.add_version(1)
+        self._sync(destination_version=1)
+
+        changed_file = os.path.join(self.ptask.area.path, "notes.txt")
+        _write(changed_file, "first")
+        self.ptask.add_version(2)
+        _write(changed_file, "second")
+
+        action = self._sync(destination_version=2)
+
+        first = self.ptask.area.dir(version=1)
+        second = self.ptask.area.dir(version=2)
+        self.assertEqual(action.link_dest, first)
+        self.assertTrue(action.reflink)
+        self.assertEqual(action.sync_action.job.files_linked, 1)
+
+        self.assertEqual(
+            os.stat(os.path.join(first, "scene.ma")).st_ino,
+            os.stat(os.path.join(second, "scene.ma")).st_ino)
+        with open(os.path.join(second, "notes.txt")) as fh:
+            self.assertEqual(fh.read(), "second")
+
+        # the work directory is never linked or cloned into
+        action = _SyncAction(source=self.ptask, source_version=1,
+            destination=self.ptask, wait=True)
+        action.validate()
+
+        self.assertEqual(action.link_dest, None)
+        self.assertFalse(action.reflink)
+
+    # -------------------------------------------------------------------------
+    def test_batch(self):
+        """Syncs given a batch are added to it rather than run"""
+
+        self.ptask.add_version(1)
+        batch = SyncBatch(engine=ENGINE_NATIVE)
+
+        action = self._sync(destination_version=1, sync_batch=batch)
+
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(action.sync_action, None)
+        version_dir = self.ptask.area.dir(version=1)
+        self.assertEqual(os.listdir(version_dir), [])
+
+        batch.run()
+
+        self.assertEqual(batch.failed, [])
+        self.assertTrue(os.path.isfile(os.path.join(version_dir, "scene.ma")))
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _sync(self, **kwargs):
+
+        action = _SyncAction(source=self.ptask, destination=self.ptask,
+            wait=True, **kwargs)
+        action.interactive = False
+        action()
+
+        return action
+
+# -----------------------------------------------------------------------------
+# Fakes:
+# -----------------------------------------------------------------------------
+class _FakeArea(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def dir(self, version=None, dir_name=None, verify=True, root=None):
+
+        path = self.path
+        if version:
+            path = os.path.join(path, '.' + str(version).zfill(4))
+        if dir_name:
+            path = os.path.join(path, dir_name)
+
+        return path
+
+# -----------------------------------------------------------------------------
+class _FakeLocationClass(object):
+
+    code = LOCATION
+
+    def current(self):
+        return self
+
+# -----------------------------------------------------------------------------
+class _FakePTask(object):
+
+    def __init__(self, path):
+
+        os.makedirs(path)
+        self.spec = "show=" + os.path.basename(path)
+        self.type = "shot"
+        self.area = _FakeArea(path)
+        self.children = []
+        self.versions = []
+
+    def add_version(self, number):
+
+        version = _FakeVersion(self, number)
+        self.versions.append(version)
+        os.makedirs(self.area.dir(version=number))
+
+        return version
+
+    @property
+    def latest_version(self):
+        return self.versions[-1] if self.versions else _FakeVersion(self, 1)
+
+    def version(self, number):
+        return [v for v in self.versions if v.number == number][0]
+
+# -----------------------------------------------------------------------------
+class _FakePTaskClass(object):
+
+    def __init__(self, ptask):
+        self._ptask = ptask
+
+    def get(self, spec):
+        return self._ptask
+
+# -----------------------------------------------------------------------------
+class _FakeVersion(object):
+
+    def __init__(self, ptask, number):
+
+        self.ptask = ptask
+        self.number = number
+        self.location_code = LOCATION
+        self.spec = ptask.spec + "@" + str(number)
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _write(path, contents):
+
+    with open(path, 'w') as fh:
+        fh.write(contents)
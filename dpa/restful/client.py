@@ -15,9 +15,11 @@ from collections import defaultdict
 
 import errno
 import json
+import os
 import requests
 from requests.exceptions import ConnectionError
 import select
+import threading
 import yaml
 
 # -----------------------------------------------------------------------------
@@ -58,8 +60,22 @@ class RestfulClient(object):
 
     _url_cache = {}
 
+    # pooled connections to the data server, shared by all clients in the
+    # process. tracked by pid so forked processes never share sockets.
+    _session = None
+    _session_pid = None
+
+    # the number of requests made by each thread
+    _request_counts = threading.local()
+
     # -------------------------------------------------------------------------
     # Class methods:
+    # -------------------------------------------------------------------------
+    @classmethod
+    def request_count(cls):
+        """Returns the number of requests made so far by the current thread."""
+        return getattr(RestfulClient._request_counts, 'count', 0)
+
     # -------------------------------------------------------------------------
     def execute_request(self, action, data_type, primary_key=None, data=None,
         params=None, headers=None):
@@ -95,14 +111,18 @@ class RestfulClient(object):
         # it *should* be a 1 to 1 lc mapping. (GET==get, PUT==put, etc.)
         requests_method_name = http_method.lower()
 
-        # see if the requests api has a method that matches
+        # see if the requests api has a method that matches. requests are
+        # made through the pooled session to reuse connections.
+        session = self._get_session()
         try:
-            requests_method = getattr(requests, requests_method_name)
+            requests_method = getattr(session, requests_method_name)
         except AttributeError:
             raise RestfulClientError(
                 "Unknown method for requests: " + str(requests_method_name))
 
         # execute the request
+        counts = RestfulClient._request_counts
+        counts.count = getattr(counts, 'count', 0) + 1
         response = self._try_request(requests_method, url, params=params,
             data=data, headers=headers)
 
@@ -110,7 +130,8 @@ class RestfulClient(object):
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            raise RestfulClientError(e.response.text)
+            raise RestfulClientError(e.response.text,
+                status_code=e.response.status_code)
 
         # deserialize the returned data. may want to flesh this out at some
         # point to allow for additional data formats
@@ -123,6 +144,17 @@ class RestfulClient(object):
 
     # -------------------------------------------------------------------------
     # Private class methods:
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _get_session(cls):
+
+        pid = os.getpid()
+        if cls._session is None or cls._session_pid != pid:
+            RestfulClient._session = requests.Session()
+            RestfulClient._session_pid = pid
+
+        return cls._session
+
     # -------------------------------------------------------------------------
     def _try_request(self, requests_method, url, params=None, data=None,
         headers=None):
@@ -146,7 +178,8 @@ class RestfulClient(object):
         data_format = self.data_format
 
         # some hacky caching based on data type, method name, and primary key.
-        cache_str = data_type + action + str(primary_key)
+        cache_str = str(self.data_server) + data_type + action + \
+            str(primary_key)
         if cache_str in self._url_cache.keys():
             return self._url_cache[cache_str]
 
@@ -208,7 +241,12 @@ class RestfulClient(object):
 # Public exception classes:
 # -----------------------------------------------------------------------------
 class RestfulClientError(Exception):
-    pass
+
+    # -------------------------------------------------------------------------
+    def __init__(self, *args, **kwargs):
+        # the http status of a failed request, if there was a response
+        self.status_code = kwargs.pop('status_code', None)
+        super(RestfulClientError, self).__init__(*args, **kwargs)
 
 # -----------------------------------------------------------------------------
 # Private Functions:
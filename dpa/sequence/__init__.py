@@ -0,0 +1,426 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sequence
+# -----------------------------------------------------------------------------
+"""Detect file sequences in directories.
+
+Files named ``<base><frame><ext>``, where the base ends in a '.' or '_' and
+the frame is the last number before the extension, are grouped into
+sequences in a single pass over the file names. Frame numbers are grouped
+the way printf style padding renders them, so ``1`` to ``100`` is one
+sequence with a padding of 1, and ``10000`` belongs with ``0001`` to
+``9999``.
+
+A sequence's path can be written with any of the frame tokens used by the
+pipeline's applications: hashes, printf, houdini's ``$F4``, or the UDIM
+tokens used for texture maps (``<UDIM>``, ``$UDIM`` and ``_MAPID_``).
+Paths containing a token can be matched back to the sequence on disk.
+
+Classes
+-------
+FileSequence
+    A sequence of numbered files in a directory.
+
+SequenceScan
+    The sequences and other files in a directory.
+
+SequenceError
+    Raised when a directory can't be scanned.
+
+Examples
+--------
+    >>> from dpa.sequence import scan, TOKEN_MAPID
+    >>> for seq in scan("/path/to/maps").sequences:
+    ...     print seq.pattern(TOKEN_MAPID), seq.frange, seq.missing
+    diffuse._MAPID_.tex 1001-1004,1011 [1005, 1006, 1007, 1008, 1009, 1010]
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from collections import defaultdict
+import os
+import re
+import threading
+
+from dpa.frange import Frange
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# frame tokens
+TOKEN_HASH = "#"
+TOKEN_PRINTF = "%d"
+TOKEN_HOUDINI = "$F"
+TOKEN_UDIM = "<UDIM>"
+TOKEN_MARI = "$UDIM"
+TOKEN_MAPID = "_MAPID_"
+TOKENS = [TOKEN_HASH, TOKEN_PRINTF, TOKEN_HOUDINI, TOKEN_UDIM, TOKEN_MARI,
+    TOKEN_MAPID]
+
+# the first UDIM tile
+UDIM_START = 1001
+
+# <base><frame><ext>. the base is greedy so the frame is the last number
+FRAME_FILE_REGEX = re.compile(r"^(.*[._])(\d+)(\.[^.]+)$")
+
+# a path with a frame token in place of the frame number
+TOKEN_PATH_REGEX = re.compile(
+    r"^(.*[._])(#+|@+|%0?(\d*)d|\$F(\d*)|<UDIM>|<udim>|\$UDIM|_MAPID_)" + \
+    r"(\.[^.]+)$"
+)
+
+# scans by directory path, with the directory's modification time
+_scan_cache = {}
+_scan_cache_lock = threading.Lock()
+
+# -----------------------------------------------------------------------------
+# Public Classes:
+# -----------------------------------------------------------------------------
+class FileSequence(object):
+    """A sequence of numbered files in a directory.
+
+    ``base`` includes the separator before the frame number and ``ext``
+    includes the leading '.', so each file is ``base + frame + ext``.
+
+    """
+
+    # -------------------------------------------------------------------------
+    # Special methods:
+    # -------------------------------------------------------------------------
+    def __init__(self, directory, base, padding, ext, frames):
+
+        self._directory = directory
+        self._base = base
+        self._padding = padding
+        self._ext = ext
+        self._frames = sorted(frames)
+
+    # -------------------------------------------------------------------------
+    def __eq__(self, other):
+        return isinstance(other, FileSequence) and \
+            self._key() == other._key()
+
+    # -------------------------------------------------------------------------
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        return "{c}('{p}', {f})".format(c=self.__class__.__name__,
+            p=self.name, f=self.frange)
+
+    # -------------------------------------------------------------------------
+    # Instance methods:
+    # -------------------------------------------------------------------------
+    def file_name(self, frame):
+        """The name of the file for a frame."""
+        return "{b}{f:0{p}d}{e}".format(b=self._base, f=frame,
+            p=self._padding, e=self._ext)
+
+    # -------------------------------------------------------------------------
+    def path(self, frame):
+        """The full path of the file for a frame."""
+        return os.path.join(self._directory, self.file_name(frame))
+
+    # -------------------------------------------------------------------------
+    def pattern(self, token=TOKEN_HASH, full_path=False):
+        """The sequence's file name with a token in place of the frame."""
+
+        name = format_pattern(self._base, self._ext, padding=self._padding,
+            token=token)
+
+        if full_path:
+            return os.path.join(self._directory, name)
+
+        return name
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def base(self):
+        return self._base
+
+    # -------------------------------------------------------------------------
+    @property
+    def count(self):
+        return len(self._frames)
+
+    # -------------------------------------------------------------------------
+    @property
+    def directory(self):
+        return self._directory
+
+    # -------------------------------------------------------------------------
+    @property
+    def ext(self):
+        return self._ext
+
+    # -------------------------------------------------------------------------
+    @property
+    def files(self):
+        """The file names, in frame order."""
+        return [self.file_name(f) for f in self._frames]
+
+    # -------------------------------------------------------------------------
+    @property
+    def first(self):
+        return self._frames[0]
+
+    # -------------------------------------------------------------------------
+    @property
+    def frames(self):
+        """The frame numbers, sorted."""
+        return list(self._frames)
+
+    # -------------------------------------------------------------------------
+    @property
+    def frange(self):
+        """The frames as a :py:class:`dpa.frange.Frange`."""
+        return Frange(self._frames)
+
+    # -------------------------------------------------------------------------
+    @property
+    def is_udim(self):
+        """True if the frames could be UDIM tiles.
+
+        Texture tiles and frames can't be told apart by name. This only says
+        every number is a 4 digit tile number.
+
+        """
+        return self._padding == 4 and self.first >= UDIM_START and \
+            self.last <= 9999
+
+    # -------------------------------------------------------------------------
+    @property
+    def last(self):
+        return self._frames[-1]
+
+    # -------------------------------------------------------------------------
+    @property
+    def missing(self):
+        """The frames missing between the first and last frames."""
+
+        present = set(self._frames)
+        return [f for f in xrange(self.first, self.last + 1)
+            if f not in present]
+
+    # -------------------------------------------------------------------------
+    @property
+    def name(self):
+        """The file name with a '#' per digit of padding."""
+        return self.pattern(TOKEN_HASH)
+
+    # -------------------------------------------------------------------------
+    @property
+    def padding(self):
+        return self._padding
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _key(self):
+        return (self._directory, self._base, self._padding, self._ext,
+            self._frames)
+
+# -----------------------------------------------------------------------------
+class SequenceScan(object):
+    """The sequences and other files in a directory."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, directory, sequences, others, mtime=None):
+
+        self._directory = directory
+        self._sequences = sequences
+        self._others = others
+        self._mtime = mtime
+
+    # -------------------------------------------------------------------------
+    def match(self, path):
+        """The sequence a path containing a frame token refers to, or None.
+
+        For example ``diffuse._MAPID_.tex`` or ``beauty.####.exr``. The path
+        may be just a file name or in the scanned directory.
+
+        """
+
+        parsed = parse_pattern(os.path.basename(path))
+        if not parsed:
+            return None
+
+        (base, padding, ext) = parsed
+
+        candidates = [s for s in self._sequences
+            if s.base == base and s.ext == ext]
+        if padding is not None:
+            candidates = [s for s in candidates if s.padding == padding]
+
+        return candidates[0] if candidates else None
+
+    # -------------------------------------------------------------------------
+    @property
+    def directory(self):
+        return self._directory
+
+    # -------------------------------------------------------------------------
+    @property
+    def mtime(self):
+        """The directory's modification time when it was scanned."""
+        return self._mtime
+
+    # -------------------------------------------------------------------------
+    @property
+    def others(self):
+        """Sorted names of the files that aren't part of a sequence."""
+        return self._others
+
+    # -------------------------------------------------------------------------
+    @property
+    def sequences(self):
+        """The sequences, sorted by name."""
+        return self._sequences
+
+# -----------------------------------------------------------------------------
+class SequenceError(Exception):
+    pass
+
+# -----------------------------------------------------------------------------
+# Public Functions:
+# -----------------------------------------------------------------------------
+def find_sequences(file_names, directory=""):
+    """Group file names into sequences in a single pass.
+
+    Returns a tuple of the :py:class:`FileSequence` list, sorted by name,
+    and the sorted names that aren't numbered.
+
+    """
+
+    # (base, ext) -> padding -> frames, and whether any are zero padded
+    groups = defaultdict(lambda: defaultdict(list))
+    zero_padded = set()
+    others = []
+
+    match = FRAME_FILE_REGEX.match
+    for file_name in file_names:
+        parsed = match(file_name)
+        if not parsed:
+            others.append(file_name)
+            continue
+        (base, digits, ext) = parsed.groups()
+        padding = len(digits)
+        groups[(base, ext)][padding].append(int(digits))
+        if digits[0] == "0" and padding > 1:
+            zero_padded.add((base, ext, padding))
+
+    sequences = []
+    for ((base, ext), by_padding) in groups.iteritems():
+        # numbers longer than the padding, without leading zeros, render
+        # the same under a shorter padding. they join the closest one.
+        merged = {}
+        for padding in sorted(by_padding):
+            target = None
+            if merged and (base, ext, padding) not in zero_padded:
+                target = max(merged)
+            if target is None:
+                merged[padding] = list(by_padding[padding])
+            else:
+                merged[target].extend(by_padding[padding])
+
+        for (padding, frames) in merged.iteritems():
+            sequences.append(
+                FileSequence(directory, base, padding, ext, frames))
+
+    sequences.sort(key=lambda s: (s.name, s.padding))
+    others.sort()
+
+    return (sequences, others)
+
+# -----------------------------------------------------------------------------
+def format_pattern(base, ext, padding=4, token=TOKEN_HASH):
+    """A file name with a frame token between the base and extension.
+
+    ``base`` should end with its separator and ``ext`` start with a '.'.
+    Hash, printf and houdini tokens carry the padding. UDIM tokens always
+    stand for 4 digits.
+
+    """
+
+    if token == TOKEN_HASH:
+        frame = "#" * padding
+    elif token == TOKEN_PRINTF:
+        frame = "%0{p}d".format(p=padding)
+    elif token == TOKEN_HOUDINI:
+        frame = "$F" + str(padding)
+    elif token in (TOKEN_UDIM, TOKEN_MARI, TOKEN_MAPID):
+        frame = token
+    else:
+        raise ValueError("Unknown frame token: " + str(token))
+
+    return base + frame + ext
+
+# -----------------------------------------------------------------------------
+def parse_pattern(file_name):
+    """Split a file name containing a frame token.
+
+    Returns a tuple of the base, padding and extension, or None if there is
+    no token. The padding is None for printf and houdini tokens without one.
+
+    """
+
+    match = TOKEN_PATH_REGEX.match(file_name)
+    if not match:
+        return None
+
+    (base, token, printf_padding, houdini_padding, ext) = match.groups()
+
+    if token[0] in "#@":
+        padding = len(token)
+    elif token.startswith("%"):
+        padding = int(printf_padding) if printf_padding else None
+    elif token.startswith("$F"):
+        padding = int(houdini_padding) if houdini_padding else None
+    else:
+        padding = 4
+
+    return (base, padding, ext)
+
+# -----------------------------------------------------------------------------
+def scan(directory, cache=True):
+    """Scan a directory and return a :py:class:`SequenceScan`.
+
+    The directory is listed once. Scans are cached by directory and reused
+    while the directory's modification time is unchanged, which happens
+    until files are added, removed or renamed in it. Use ``cache=False`` to
+    list the directory regardless.
+
+    """
+
+    directory = os.path.abspath(directory)
+
+    try:
+        mtime = os.stat(directory).st_mtime
+    except OSError as e:
+        raise SequenceError("Unable to scan: " + str(e))
+
+    if cache:
+        with _scan_cache_lock:
+            cached = _scan_cache.get(directory)
+        if cached and cached.mtime == mtime:
+            return cached
+
+    try:
+        names = os.listdir(directory)
+    except OSError as e:
+        raise SequenceError("Unable to scan: " + str(e))
+
+    (sequences, others) = find_sequences(names, directory=directory)
+    result = SequenceScan(directory, sequences, others, mtime=mtime)
+
+    if cache:
+        with _scan_cache_lock:
+            _scan_cache[directory] = result
+
+    return result
@@ -0,0 +1,124 @@
+"""Benchmark sequence detection on a large generated directory.
+
+Run as a script::
+
+    python -m dpa.sequence.benchmark --files 100000
+
+Creates a temporary directory of empty files, made up of frame sequences,
+UDIM texture tiles and unnumbered files, then times:
+
+* the ad hoc approach this module replaces: listing the directory and
+  searching each name with a regex,
+* a scan, listing the directory once and grouping in a single pass,
+* a cached scan of the unchanged directory.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from dpa.sequence import find_sequences, scan
+
+# -----------------------------------------------------------------------------
+# Public functions:
+# -----------------------------------------------------------------------------
+def main(args=None):
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark sequence detection.")
+    parser.add_argument("--files", type=int, default=100000,
+        help="Number of files to generate. Default is 100000.")
+    parser.add_argument("--sequences", type=int, default=50,
+        help="Number of frame sequences to spread them over. Default is 50.")
+    parser.add_argument("--repeat", type=int, default=3,
+        help="Number of times to time each approach. Default is 3.")
+    parser.add_argument("--dir", help="Directory to generate files in. " + \
+        "Default is a temporary directory, removed afterwards.")
+    parsed = parser.parse_args(args)
+
+    directory = parsed.dir or tempfile.mkdtemp(prefix="dpa_sequence_bench.")
+
+    try:
+        print "Generating {n} files in {d} ...".format(n=parsed.files,
+            d=directory)
+        _generate(directory, parsed.files, parsed.sequences)
+
+        results = [
+            ("listdir + regex per file",
+                lambda: _ad_hoc(directory)),
+            ("scan",
+                lambda: scan(directory, cache=False)),
+            ("scan, cached",
+                lambda: scan(directory)),
+            ("find_sequences only",
+                lambda: find_sequences(os.listdir(directory))),
+        ]
+
+        # prime the cache for the cached timing
+        scan(directory)
+
+        for (label, function) in results:
+            timings = []
+            for i in range(parsed.repeat):
+                start = time.time()
+                function()
+                timings.append(time.time() - start)
+            print "{l:<28} best {b:8.4f}s  mean {m:8.4f}s".format(
+                l=label, b=min(timings), m=sum(timings) / len(timings))
+
+        result = scan(directory)
+        print "\n{s} sequences, {o} other files.".format(
+            s=len(result.sequences), o=len(result.others))
+
+    finally:
+        if not parsed.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return 0
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _ad_hoc(directory):
+
+    # as nuke's ReadSub did it
+    file_specs = {}
+    frame_regex = re.compile(r'([,\w]+).(\d{4})\.(\w+)')
+    for file_name in os.listdir(directory):
+        matches = frame_regex.search(file_name)
+        if matches:
+            (file_base, frame_num, file_ext) = matches.groups()
+            file_specs[file_base + '.####.' + file_ext] = None
+
+    return sorted(file_specs.keys())
+
+# -----------------------------------------------------------------------------
+def _generate(directory, files, sequences):
+
+    # a tenth unnumbered, a tenth udim tiles, the rest frames
+    others = files // 10
+    tiles = files // 10
+    frames = files - others - tiles
+    per_sequence = max(1, frames // max(1, sequences))
+
+    names = ["notes_{i}x.txt".format(i=i) for i in range(others)]
+    names.extend("diffuse_{m}.{t}.tex".format(m=i // 100, t=1001 + i % 100)
+        for i in range(tiles))
+    names.extend("layer{s}.beauty.{f:04d}.exr".format(
+        s=i // per_sequence, f=i % per_sequence + 1) for i in range(frames))
+
+    for name in names:
+        open(os.path.join(directory, name), 'w').close()
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sequence.tests.test_sequence
+# -----------------------------------------------------------------------------
+"""Unit tests for file sequence detection."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.sequence import (
+    TOKEN_HASH, TOKEN_HOUDINI, TOKEN_MAPID, TOKEN_PRINTF, TOKEN_UDIM,
+    find_sequences, format_pattern, parse_pattern, scan,
+)
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all sequence tests."""
+
+    return unittest.TestSuite([
+        FindSequencesTestCase,
+        PatternTestCase,
+        ScanTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class FindSequencesTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    def test_padding(self):
+
+        names = ["beauty.{f:04d}.exr".format(f=f) for f in range(1, 6)]
+        names += ["beauty.10000.exr", "notes.txt", "shot_v1.ma", "shot_2.ma"]
+
+        (sequences, others) = find_sequences(names)
+
+        self.assertEqual(others, ["notes.txt", "shot_v1.ma"])
+        self.assertEqual([s.name for s in sequences],
+            ["beauty.####.exr", "shot_#.ma"])
+        self.assertEqual(sequences[0].frames, [1, 2, 3, 4, 5, 10000])
+        self.assertEqual(sequences[0].file_name(10000), "beauty.10000.exr")
+
+    # -------------------------------------------------------------------------
+    def test_unpadded(self):
+
+        names = ["cache_{f}.bgeo".format(f=f) for f in range(1, 120)]
+
+        (sequences, others) = find_sequences(names)
+
+        self.assertEqual(len(sequences), 1)
+        self.assertEqual(sequences[0].padding, 1)
+        self.assertEqual((sequences[0].first, sequences[0].last), (1, 119))
+
+    # -------------------------------------------------------------------------
+    def test_zero_padded_groups(self):
+
+        (sequences, others) = find_sequences(
+            ["a.01.exr", "a.02.exr", "a.0001.exr", "a.0002.exr"])
+
+        self.assertEqual([s.name for s in sequences],
+            ["a.####.exr", "a.##.exr"])
+
+    # -------------------------------------------------------------------------
+    def test_missing(self):
+
+        names = ["diffuse.{t}.tex".format(t=t) for t in [1001, 1002, 1005]]
+
+        (sequences, others) = find_sequences(names)
+
+        self.assertEqual(sequences[0].missing, [1003, 1004])
+        self.assertTrue(sequences[0].is_udim)
+
+# -----------------------------------------------------------------------------
+class PatternTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    def test_format(self):
+
+        self.assertEqual(format_pattern("beauty.", ".exr"), "beauty.####.exr")
+        self.assertEqual(format_pattern("beauty.", ".exr", 3, TOKEN_PRINTF),
+            "beauty.%03d.exr")
+        self.assertEqual(format_pattern("beauty.", ".ifd",
+            token=TOKEN_HOUDINI), "beauty.$F4.ifd")
+        self.assertEqual(format_pattern("diffuse.", ".tex", token=TOKEN_UDIM),
+            "diffuse.<UDIM>.tex")
+        self.assertRaises(ValueError, format_pattern, "a.", ".b", 4, "*")
+
+    # -------------------------------------------------------------------------
+    def test_parse(self):
+
+        self.assertEqual(parse_pattern("beauty.####.exr"),
+            ("beauty.", 4, ".exr"))
+        self.assertEqual(parse_pattern("beauty.%04d.exr"),
+            ("beauty.", 4, ".exr"))
+        self.assertEqual(parse_pattern("beauty.$F.exr"),
+            ("beauty.", None, ".exr"))
+        self.assertEqual(parse_pattern("diffuse._MAPID_.tex"),
+            ("diffuse.", 4, ".tex"))
+        self.assertEqual(parse_pattern("beauty.0001.exr"), None)
+
+# -----------------------------------------------------------------------------
+class ScanTestCase(unittest.TestCase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp(prefix="dpa_test_sequence.")
+        for tile in [1001, 1002, 1011]:
+            self._touch("diffuse.{t}.tex".format(t=tile))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_match(self):
+
+        result = scan(self.directory, cache=False)
+
+        sequence = result.match("diffuse." + TOKEN_MAPID + ".tex")
+        self.assertEqual(sequence.frames, [1001, 1002, 1011])
+        self.assertEqual(sequence.pattern(TOKEN_HASH, full_path=True),
+            os.path.join(self.directory, "diffuse.####.tex"))
+        self.assertEqual(result.match("specular.<UDIM>.tex"), None)
+
+    # -------------------------------------------------------------------------
+    def test_cache(self):
+
+        first = scan(self.directory)
+        self.assertTrue(scan(self.directory) is first)
+
+        # a new file changes the directory's modification time
+        self._touch("diffuse.1012.tex")
+        os.utime(self.directory, (first.mtime + 10, first.mtime + 10))
+
+        second = scan(self.directory)
+        self.assertFalse(second is first)
+        self.assertEqual(second.sequences[0].last, 1012)
+
+    # -------------------------------------------------------------------------
+    def _touch(self, name):
+        open(os.path.join(self.directory, name), 'w').close()
@@ -1,7 +1,12 @@
 
 # -----------------------------------------------------------------------------
 
-from threading import Lock
+from threading import RLock
+
+# -----------------------------------------------------------------------------
+
+# guards creation and initialization of singletons accessed from threads
+_lock = RLock()
 
 # -----------------------------------------------------------------------------
 class Singleton(object):
@@ -12,8 +17,7 @@ class Singleton(object):
     # -------------------------------------------------------------------------
     def __new__(cls):
         
-        lock = Lock()
-        with lock:
+        with _lock:
             
             if cls._instance is None:
                 cls._instance = super(Singleton, cls).__new__(cls)
@@ -23,9 +27,10 @@ class Singleton(object):
     # -------------------------------------------------------------------------
     def __init__(self):
 
-        if self.__class__._initialized:
-            return
+        with _lock:
 
-        self.init()
-        self.__class__._initialized = True
+            if self.__class__._initialized:
+                return
 
+            self.init()
+            self.__class__._initialized = True
@@ -1,13 +1,40 @@
 
 from collections import defaultdict
+import csv
+import json
+from multiprocessing.pool import ThreadPool
 import os
+import sys
+import time
 
 from dpa.action import Action, ActionError
-from dpa.product import Product
+from dpa.product import Product, ProductError
+from dpa.product.representation import (
+    ProductRepresentation, ProductRepresentationError,
+)
+from dpa.product.subscription import (
+    ProductSubscription, ProductSubscriptionError,
+)
+from dpa.product.version import ProductVersion, ProductVersionError
 from dpa.ptask import PTask, PTaskError
-from dpa.ptask.area import PTaskArea
+from dpa.ptask.area import PTaskArea, PTaskAreaError
 from dpa.ptask.spec import PTaskSpec
+from dpa.ptask.version import PTaskVersion, PTaskVersionError
 from dpa.shell.output import Output, Style
+from dpa.stats.snapshot import (
+    INTERVAL_WEEK, INTERVALS, StatsStore, StatsStoreError,
+)
+from dpa.stats.usage import (
+    DEFAULT_WORKERS, DiskUsageScanner, GROUP_CATEGORY, GROUP_PTASK,
+    GROUP_TYPE, GROUPS,
+)
+
+# -----------------------------------------------------------------------------
+
+FORMAT_CSV = "csv"
+FORMAT_JSON = "json"
+FORMAT_TABLE = "table"
+FORMATS = [FORMAT_TABLE, FORMAT_JSON, FORMAT_CSV]
 
 # -----------------------------------------------------------------------------
 class ProductionStats(object):
@@ -24,7 +51,20 @@ class ProductionStats(object):
         self.product_representations = defaultdict(int)
         self.product_repr_files = defaultdict(int)
         self.product_repr_files_by_type = defaultdict(int)
-     
+        self.ptask_versions_by_location = defaultdict(int)
+        self.product_reprs_by_location = defaultdict(int)
+        self.bytes_by_category = defaultdict(int)
+        self.bytes_by_type = defaultdict(int)
+
+    # -------------------------------------------------------------------------
+    def counters(self):
+        """Every counter, by name, as stored in a snapshot."""
+
+        return dict(
+            (name, dict(values)) for (name, values) in vars(self).iteritems()
+            if values
+        )
+
 # -----------------------------------------------------------------------------
 class ProductionStatsAction(Action):
     
@@ -44,23 +84,199 @@ class ProductionStatsAction(Action):
                  "relative to the project root.",
         )
 
+        parser.add_argument(
+            "-a", "--aggregate",
+            action="store_true",
+            help="List each kind of object once for the whole tree and " + \
+                 "count them in memory, rather than walking the tree.",
+        )
+
+        parser.add_argument(
+            "-p", "--parallel",
+            type=int,
+            default=1,
+            metavar="<n>",
+            help="Number of threads counting representation files on " + \
+                 "disk. Aggregate mode only.",
+        )
+
+        parser.add_argument(
+            "-q", "--quiet",
+            action="store_true",
+            help="Only print the totals, not each object processed.",
+        )
+
+        parser.add_argument(
+            "-u", "--usage",
+            action="store_true",
+            help="Also total the bytes on disk by category and file " + \
+                 "type. Only directories changed since the last scan " + \
+                 "are listed.",
+        )
+
+        parser.add_argument(
+            "-n", "--no-snapshot",
+            dest="snapshot",
+            action="store_false",
+            help="Don't store the counts in the stats database.",
+        )
+
     # -----------------------------------------------------------------------------
-    def __init__(self, ptask):
-        super(ProductionStatsAction, self).__init__(ptask)
+    def __init__(self, ptask, aggregate=False, parallel=1, quiet=False,
+        usage=False, snapshot=True):
+        super(ProductionStatsAction, self).__init__(ptask,
+            aggregate=aggregate, parallel=parallel, quiet=quiet, usage=usage,
+            snapshot=snapshot)
         self._ptask = ptask
+        self._aggregate = aggregate
+        self._parallel = parallel
+        self._quiet = quiet
+        self._usage = usage
+        self._snapshot = snapshot
 
     # -----------------------------------------------------------------------------
     def execute(self):
 
         self._data = ProductionStats()
-        self._process_ptask(self.ptask)
+        if self.aggregate:
+            self._process_aggregate(self.ptask)
+        else:
+            self._process_ptask(self.ptask)
+        if self.usage:
+            self._process_usage(self.ptask)
         self._print_ptask_stats()
         self._print_product_stats()
+        if self.snapshot:
+            self._store_snapshot()
+
+    # -----------------------------------------------------------------------------
+    def _process_aggregate(self, ptask):
+        """Count the tree from one listing per kind of object."""
+
+        root_spec = ptask.spec
+        in_tree = lambda spec: spec == root_spec or \
+            spec.startswith(root_spec + PTaskSpec.SEPARATOR)
+
+        # ptask type by spec
+        ptask_types = {}
+        for child in self._list(PTask, PTaskError, root_spec):
+            if in_tree(child.spec):
+                ptask_types[child.spec] = child.type
+                self._progress(" PTASK: " + child.spec)
+        ptask_types[root_spec] = ptask.type
+
+        for ptask_type in ptask_types.itervalues():
+            self._data.ptasks[ptask_type] += 1
+
+        for ptask_ver in self._list(PTaskVersion, PTaskVersionError,
+            root_spec):
+            if ptask_ver.ptask_spec in ptask_types:
+                self._progress("  VER: " + ptask_ver.spec)
+                self._data.ptask_versions[
+                    ptask_types[ptask_ver.ptask_spec]] += 1
+                self._data.ptask_versions_by_location[
+                    ptask_ver.location_code] += 1
+
+        # subscriptions by the subscribing ptask
+        for sub in self._list(ProductSubscription, ProductSubscriptionError,
+            root_spec):
+            sub_ptask_spec = sub.ptask_version_spec.split(PTaskSpec.VERSION)[0]
+            if sub_ptask_spec in ptask_types:
+                self._progress("   SUB: " + sub.product_version_spec)
+                self._data.ptask_subscriptions[
+                    ptask_types[sub_ptask_spec]] += 1
+
+        # product (ptask type, category) by spec
+        products = {}
+        for product in self._list(Product, ProductError, root_spec):
+            if product.ptask_spec in ptask_types:
+                self._progress("  PRODUCT: " + product.spec)
+                ptask_type = ptask_types[product.ptask_spec]
+                products[product.spec] = (ptask_type, product.category)
+                self._data.ptask_products[ptask_type] += 1
+                self._data.products[product.category] += 1
+
+        # product version category by spec
+        product_versions = {}
+        for product_ver in self._list(ProductVersion, ProductVersionError,
+            root_spec):
+            if product_ver.product_spec in products:
+                self._progress("   PRODUCT VER: " + product_ver.spec)
+                (ptask_type, category) = products[product_ver.product_spec]
+                product_versions[product_ver.spec] = category
+                self._data.ptask_product_versions[ptask_type] += 1
+                self._data.product_versions[category] += 1
+
+        product_reprs = []
+        for product_repr in self._list(ProductRepresentation,
+            ProductRepresentationError, root_spec):
+            if product_repr.product_version_spec in product_versions:
+                self._progress("    PRODUCT REPR: " + product_repr.spec)
+                category = product_versions[product_repr.product_version_spec]
+                self._data.product_representations[category] += 1
+                self._data.product_reprs_by_location[
+                    product_repr.creation_location_code] += 1
+                product_reprs.append((product_repr, category))
+
+        # the files on disk, a thread per directory being listed
+        pool = ThreadPool(max(1, self.parallel))
+        try:
+            repr_files = pool.map(_repr_files,
+                [r for (r, c) in product_reprs])
+        finally:
+            pool.close()
+            pool.join()
+
+        for ((product_repr, category), file_names) in \
+            zip(product_reprs, repr_files):
+            for file_name in file_names:
+                self._progress("          FILE: " + file_name)
+                self._data.product_repr_files[category] += 1
+                self._data.product_repr_files_by_type[product_repr.type] += 1
+
+    # -----------------------------------------------------------------------------
+    def _list(self, cls, error_cls, root_spec):
+
+        # the search is a fuzzy match. callers filter to the tree.
+        try:
+            return cls.list(search=root_spec)
+        except error_cls as e:
+            raise ActionError(
+                "Unable to list {t}: {e}".format(t=cls.data_type, e=e))
+
+    # -----------------------------------------------------------------------------
+    def _process_usage(self, ptask):
+
+        try:
+            root = PTaskArea(ptask.spec).path
+        except PTaskAreaError:
+            raise ActionError(
+                "Could not find a directory for: {p}".format(p=ptask.spec))
+
+        # unchanged directories are read from the scanner's cache
+        scanner = DiskUsageScanner(ptask.spec, root,
+            workers=max(self.parallel, DEFAULT_WORKERS))
+        scanner.scan()
+
+        for (category, usage) in scanner.usage(GROUP_CATEGORY).iteritems():
+            self._data.bytes_by_category[category] = usage.bytes
+
+        for (file_type, usage) in scanner.usage(GROUP_TYPE).iteritems():
+            self._data.bytes_by_type[file_type] = usage.bytes
+
+        self._progress(" USAGE: {s} directories scanned, {c} unchanged".format(
+            s=scanner.scanned, c=scanner.cached))
+
+    # -----------------------------------------------------------------------------
+    def _progress(self, msg):
+
+        if not self.quiet:
+            print msg
 
     # -----------------------------------------------------------------------------
     def _process_ptask(self, ptask):
 
-        print " PTASK: " + ptask.spec + " ..."
+        self._progress(" PTASK: " + ptask.spec + " ...")
 
         ptask_type = ptask.type
 
@@ -70,20 +286,21 @@ class ProductionStatsAction(Action):
 
             #if ptask_ver.number > 2: continue  # speed up testing XXX
 
-            print "  VER: " + ptask_ver.spec
+            self._progress("  VER: " + ptask_ver.spec)
 
             self._data.ptask_versions[ptask_type] += 1
+            self._data.ptask_versions_by_location[ptask_ver.location_code] += 1
             
             for sub in ptask_ver.subscriptions:
 
-                print "   SUB: " + sub.product_version_spec
+                self._progress("   SUB: " + sub.product_version_spec)
 
                 sub_product = sub.product_version.product
                 self._data.ptask_subscriptions[ptask_type] += 1 
 
         for product in Product.list(ptask=ptask.spec):
 
-            print "  PRODUCT: " + product.name_spec
+            self._progress("  PRODUCT: " + product.name_spec)
 
             category = product.category
             self._data.ptask_products[ptask_type] += 1
@@ -91,22 +308,24 @@ class ProductionStatsAction(Action):
 
             for product_ver in product.versions:
 
-                print "   PRODUCT VER: " + product_ver.spec
+                self._progress("   PRODUCT VER: " + product_ver.spec)
 
                 self._data.ptask_product_versions[ptask_type] += 1
                 self._data.product_versions[category] += 1
         
                 for product_repr in product_ver.representations:
 
-                    print "    PRODUCT REPR: " + product_repr.spec
+                    self._progress("    PRODUCT REPR: " + product_repr.spec)
                     
                     file_type = product_repr.type
                     self._data.product_representations[category] += 1
+                    self._data.product_reprs_by_location[
+                        product_repr.creation_location_code] += 1
 
                     if os.path.exists(product_repr.area.path):
                         for file_name in os.listdir(product_repr.area.path):
                             if file_name.endswith(file_type):
-                                print "          FILE: " + file_name
+                                self._progress("          FILE: " + file_name)
                                 self._data.product_repr_files[category] += 1
                                 self._data.product_repr_files_by_type[file_type] += 1
 
@@ -448,6 +667,21 @@ class ProductionStatsAction(Action):
         cat_out.dump(output_format='table')
         types_out.dump(output_format='table')
         
+    # -------------------------------------------------------------------------
+    def _store_snapshot(self):
+
+        try:
+            store = StatsStore()
+            try:
+                store.record(self.ptask.spec, self._data.counters())
+            finally:
+                store.close()
+        except StatsStoreError as e:
+            raise ActionError(str(e))
+
+        if self.interactive:
+            print "Stored a snapshot in: " + store.path + "\n"
+
     # -------------------------------------------------------------------------
     def undo(self):
         pass
@@ -455,6 +689,9 @@ class ProductionStatsAction(Action):
     # -------------------------------------------------------------------------
     def validate(self):
 
+        if self._parallel < 1:
+            raise ActionError("Parallel must be at least 1.")
+
         if not isinstance(self._ptask, PTask):
             try:
                 cur_spec = PTaskArea.current().spec
@@ -469,3 +706,463 @@ class ProductionStatsAction(Action):
     def ptask(self):
         return self._ptask
 
+    # ------------------------------------------------------------------------
+    @property
+    def aggregate(self):
+        return self._aggregate
+
+    # ------------------------------------------------------------------------
+    @property
+    def parallel(self):
+        return self._parallel
+
+    # ------------------------------------------------------------------------
+    @property
+    def quiet(self):
+        return self._quiet
+
+    # ------------------------------------------------------------------------
+    @property
+    def usage(self):
+        return self._usage
+
+    # ------------------------------------------------------------------------
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+# -----------------------------------------------------------------------------
+class DiskUsageAction(Action):
+    """Report the bytes and files on disk below a ptask."""
+
+    name = "du"
+    target_type = "none"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "ptask",
+            nargs="?",
+            default=".",
+            help="Report disk usage below this ptask spec.",
+        )
+
+        parser.add_argument(
+            "-g", "--group",
+            choices=GROUPS,
+            default=GROUP_PTASK,
+            help="Total by ptask, ptask version, product category or " + \
+                 "file type. Default is ptask.",
+        )
+
+        parser.add_argument(
+            "-f", "--format",
+            choices=FORMATS,
+            default=FORMAT_TABLE,
+            help="Output format. Default is table.",
+        )
+
+        parser.add_argument(
+            "-w", "--workers",
+            type=int,
+            default=DEFAULT_WORKERS,
+            metavar="<n>",
+            help="Number of directories scanned at once. Default is " + \
+                 str(DEFAULT_WORKERS) + ".",
+        )
+
+        parser.add_argument(
+            "-r", "--rescan",
+            action="store_true",
+            help="Rescan every directory rather than reusing the totals " + \
+                 "of directories unchanged since the last scan.",
+        )
+
+    # -------------------------------------------------------------------------
+    def __init__(self, ptask, group=GROUP_PTASK, format=FORMAT_TABLE,
+        workers=DEFAULT_WORKERS, rescan=False):
+
+        super(DiskUsageAction, self).__init__(ptask, group=group,
+            format=format, workers=workers, rescan=rescan)
+
+        self._ptask = ptask
+        self._group = group
+        self._format = format
+        self._workers = workers
+        self._rescan = rescan
+
+        self._scanner = None
+        self._usage = {}
+
+    # -------------------------------------------------------------------------
+    def execute(self):
+
+        self._scanner = DiskUsageScanner(
+            self._spec,
+            self._root,
+            workers=self.workers,
+            cache=not self.rescan,
+        )
+        self._scanner.scan()
+        self._usage = self._scanner.usage(self.group)
+
+        if not self.interactive:
+            return
+
+        if self.format == FORMAT_JSON:
+            self._print_json()
+        elif self.format == FORMAT_CSV:
+            self._print_csv()
+        else:
+            self._print_table()
+
+    # -------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        if self._group not in GROUPS:
+            raise ActionError("Unknown group: " + str(self._group))
+
+        if self._format not in FORMATS:
+            raise ActionError("Unknown format: " + str(self._format))
+
+        if self._workers < 1:
+            raise ActionError("Workers must be at least 1.")
+
+        cur_spec = PTaskArea.current().spec
+        self._spec = PTaskSpec.get(self._ptask, relative_to=cur_spec)
+
+        try:
+            self._root = PTaskArea(self._spec).path
+        except PTaskAreaError:
+            raise ActionError(
+                "Could not find a directory for: {p}".format(p=self._ptask))
+
+    # -------------------------------------------------------------------------
+    @property
+    def ptask(self):
+        return self._ptask
+
+    # -------------------------------------------------------------------------
+    @property
+    def group(self):
+        return self._group
+
+    # -------------------------------------------------------------------------
+    @property
+    def format(self):
+        return self._format
+
+    # -------------------------------------------------------------------------
+    @property
+    def workers(self):
+        return self._workers
+
+    # -------------------------------------------------------------------------
+    @property
+    def rescan(self):
+        return self._rescan
+
+    # -------------------------------------------------------------------------
+    @property
+    def scanner(self):
+        """The disk usage scanner, once executed."""
+        return self._scanner
+
+    # -------------------------------------------------------------------------
+    @property
+    def usage(self):
+        """Usage totals by group key, once executed."""
+        return self._usage
+
+    # -------------------------------------------------------------------------
+    def _sorted_usage(self):
+
+        # biggest first
+        return sorted(self._usage.iteritems(),
+            key=lambda (k, u): (-u.bytes, k))
+
+    # -------------------------------------------------------------------------
+    def _print_csv(self):
+
+        writer = csv.writer(sys.stdout)
+        writer.writerow([self.group, "bytes", "files"])
+        for (key, usage) in self._sorted_usage():
+            writer.writerow([key, usage.bytes, usage.files])
+
+    # -------------------------------------------------------------------------
+    def _print_json(self):
+
+        print json.dumps(
+            {
+                'spec': self._spec,
+                'root': self._scanner.root,
+                'group': self.group,
+                'total': self._scanner.total.to_dict(),
+                'usage': dict(
+                    (k, u.to_dict()) for (k, u) in self._usage.iteritems()),
+            },
+            indent=2,
+            sort_keys=True,
+        )
+
+    # -------------------------------------------------------------------------
+    def _print_table(self):
+
+        key_name = self.group.title()
+        size = "Bytes"
+        files = "Files"
+
+        output = Output()
+        output.title = "Disk usage for : {p} (by {g})".format(
+            p=self._spec, g=self.group)
+        output.header_names = [key_name, size, files]
+        output.set_header_alignment({size: "right", files: "right"})
+
+        for (key, usage) in self._sorted_usage():
+            output.add_item(
+                {
+                    key_name: key or "(none)",
+                    size: usage.bytes,
+                    files: usage.files,
+                },
+                color_all=Style.bright,
+            )
+
+        output.dump(output_format='table')
+
+        total = self._scanner.total
+        print "\nTotal: {b} bytes in {f} files. Scanned {s} directories, " \
+            "{c} unchanged since the last scan.\n".format(
+                b=total.bytes,
+                f=total.files,
+                s=self._scanner.scanned,
+                c=self._scanner.cached,
+            )
+
+# -----------------------------------------------------------------------------
+class ProductionTrendsAction(Action):
+    """Report how production stats changed between stored snapshots."""
+
+    name = "trends"
+    target_type = "stats"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "ptask",
+            nargs="?",
+            default=".",
+            help="Report trends for this ptask spec, as stored by " + \
+                 "'dpa info stats'.",
+        )
+
+        parser.add_argument(
+            "-m", "--metric",
+            metavar="<metric>",
+            help="Counter to report, e.g. product_versions or " + \
+                 "bytes_by_category. Lists the latest counters if omitted.",
+        )
+
+        parser.add_argument(
+            "-k", "--key",
+            metavar="<key>",
+            help="Only report this key of the counter, e.g. a category. " + \
+                 "Keys are summed otherwise.",
+        )
+
+        parser.add_argument(
+            "-i", "--interval",
+            choices=sorted(INTERVALS.keys()),
+            default=INTERVAL_WEEK,
+            help="Period to report changes over. Default is week.",
+        )
+
+        parser.add_argument(
+            "-s", "--since",
+            type=int,
+            metavar="<days>",
+            help="Only use snapshots from the last number of days.",
+        )
+
+    # -------------------------------------------------------------------------
+    def __init__(self, ptask, metric=None, key=None, interval=INTERVAL_WEEK,
+        since=None):
+
+        super(ProductionTrendsAction, self).__init__(ptask, metric=metric,
+            key=key, interval=interval, since=since)
+
+        self._ptask = ptask
+        self._metric = metric
+        self._key = key
+        self._interval = interval
+        self._since = since
+
+        self._trend = []
+
+    # -------------------------------------------------------------------------
+    def execute(self):
+
+        since = None
+        if self.since is not None:
+            since = time.time() - self.since * INTERVALS["day"]
+
+        try:
+            store = StatsStore()
+            try:
+                if self.metric:
+                    self._trend = store.trend(self._spec, self.metric,
+                        key=self.key, interval=self.interval, since=since)
+                else:
+                    latest = store.latest(self._spec)
+            finally:
+                store.close()
+        except StatsStoreError as e:
+            raise ActionError(str(e))
+
+        if not self.interactive:
+            return
+
+        if self.metric:
+            self._print_trend()
+        else:
+            self._print_latest(latest)
+
+    # -------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+
+        if self._interval not in INTERVALS:
+            raise ActionError("Unknown interval: " + str(self._interval))
+
+        if self._since is not None and self._since < 1:
+            raise ActionError("Since must be at least 1 day.")
+
+        if self._key and not self._metric:
+            raise ActionError("A key requires a metric.")
+
+        cur_spec = PTaskArea.current().spec
+        self._spec = PTaskSpec.get(self._ptask, relative_to=cur_spec)
+
+    # -------------------------------------------------------------------------
+    @property
+    def ptask(self):
+        return self._ptask
+
+    # -------------------------------------------------------------------------
+    @property
+    def metric(self):
+        return self._metric
+
+    # -------------------------------------------------------------------------
+    @property
+    def key(self):
+        return self._key
+
+    # -------------------------------------------------------------------------
+    @property
+    def interval(self):
+        return self._interval
+
+    # -------------------------------------------------------------------------
+    @property
+    def since(self):
+        return self._since
+
+    # -------------------------------------------------------------------------
+    @property
+    def trend(self):
+        """The metric's trend points, once executed."""
+        return self._trend
+
+    # -------------------------------------------------------------------------
+    def _print_latest(self, latest):
+
+        if not latest:
+            print "\nNo snapshots stored for: " + self._spec + "\n"
+            return
+
+        metric_name = "Metric"
+        key_name = "Key"
+        value_name = "Value"
+
+        output = Output()
+        output.title = "Latest snapshot for : {p}".format(p=self._spec)
+        output.header_names = [metric_name, key_name, value_name]
+        output.set_header_alignment({value_name: "right"})
+
+        for (metric, values) in sorted(latest.iteritems()):
+            for (key, value) in sorted(values.iteritems()):
+                output.add_item(
+                    {
+                        metric_name: metric,
+                        key_name: key or "(none)",
+                        value_name: value,
+                    },
+                    color_all=Style.bright,
+                )
+
+        output.dump(output_format='table')
+
+    # -------------------------------------------------------------------------
+    def _print_trend(self):
+
+        if not self._trend:
+            print "\nNo snapshots of {m} stored for: {p}\n".format(
+                m=self.metric, p=self._spec)
+            return
+
+        period_name = self.interval.title()
+        value_name = "Value"
+        change_name = "Change"
+
+        output = Output()
+        output.title = "{m}{k} for : {p} (by {i})".format(
+            m=self.metric,
+            k=" [" + self.key + "]" if self.key else "",
+            p=self._spec,
+            i=self.interval,
+        )
+        output.header_names = [period_name, value_name, change_name]
+        output.set_header_alignment(
+            {value_name: "right", change_name: "right"})
+
+        for point in self._trend:
+            if point.change is None:
+                change = "-"
+            else:
+                change = "{0:+d}".format(point.change)
+            output.add_item(
+                {
+                    period_name: time.strftime("%Y-%m-%d",
+                        time.localtime(point.start)),
+                    value_name: point.value,
+                    change_name: change,
+                },
+                color_all=Style.bright,
+            )
+
+        output.dump(output_format='table')
+
+# -----------------------------------------------------------------------------
+def _repr_files(product_repr):
+    """The files of the representation's type in its directory."""
+
+    path = product_repr.area.path
+    file_type = product_repr.type
+
+    try:
+        return [f for f in os.listdir(path) if f.endswith(file_type)]
+    except OSError:
+        return []
+
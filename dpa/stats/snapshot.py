@@ -0,0 +1,225 @@
+"""Production stats snapshots stored over time.
+
+Each snapshot stores the counters of a stats run, for example the number of
+product versions in each category, with the time it was taken. Snapshots
+are kept in a local SQLite database, ``$DPA_STATS_DB``, so trends such as
+versions created per week or storage growth are read from the stored series
+rather than recomputed.
+
+Classes
+-------
+StatsStore
+    The SQLite database of snapshots.
+
+StatsStoreError
+    Raised when the database can't be read or written.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import namedtuple
+import os
+import sqlite3
+import time
+
+from dpa.env.vars import DpaVars
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# trend intervals, in seconds
+INTERVAL_DAY = "day"
+INTERVAL_WEEK = "week"
+INTERVAL_MONTH = "month"
+INTERVALS = {
+    INTERVAL_DAY: 24 * 60 * 60,
+    INTERVAL_WEEK: 7 * 24 * 60 * 60,
+    INTERVAL_MONTH: 30 * 24 * 60 * 60,
+}
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        id INTEGER PRIMARY KEY,
+        scope TEXT NOT NULL,
+        taken REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS snapshots_scope ON snapshots (scope, taken);
+    CREATE TABLE IF NOT EXISTS counters (
+        snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+        metric TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS counters_metric
+        ON counters (metric, key, snapshot);
+"""
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class TrendPoint(namedtuple('TrendPoint', 'start value change')):
+    """A counter's value at the end of an interval, and its change.
+
+    ``start`` is the time the interval starts. ``change`` is the difference
+    from the previous interval with a snapshot, or None for the first.
+
+    """
+    __slots__ = ()
+
+# ----------------------------------------------------------------------------
+class StatsStore(object):
+    """The SQLite database of snapshots.
+
+    Usage::
+
+        >>> store = StatsStore()
+        >>> store.record("show", {'product_versions': {'model': 120}})
+        >>> for point in store.trend("show", 'product_versions'):
+        ...     print point.start, point.value, point.change
+
+    Counters are stored as metric, key and value. A metric's keys are
+    summed unless a key is supplied.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, path=None):
+
+        if path is None:
+            path = DpaVars.stats_db().get()
+
+        self._path = os.path.expanduser(path)
+
+        try:
+            self._connection = sqlite3.connect(self._path)
+            self._connection.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            raise StatsStoreError(
+                "Unable to open stats database: " + str(e))
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def close(self):
+        self._connection.close()
+
+    # ------------------------------------------------------------------------
+    def latest(self, scope):
+        """The counters of the latest snapshot, by metric and key."""
+
+        counters = {}
+        rows = self._query(
+            "SELECT c.metric, c.key, c.value FROM counters c "
+            "WHERE c.snapshot = (SELECT id FROM snapshots WHERE scope = ? "
+            "ORDER BY taken DESC LIMIT 1)",
+            (scope,),
+        )
+        for (metric, key, value) in rows:
+            counters.setdefault(metric, {})[key] = value
+
+        return counters
+
+    # ------------------------------------------------------------------------
+    def record(self, scope, counters, taken=None):
+        """Store a snapshot of the counters, by metric and key.
+
+        Returns the time the snapshot was taken.
+
+        """
+
+        taken = time.time() if taken is None else taken
+
+        try:
+            with self._connection:
+                cursor = self._connection.execute(
+                    "INSERT INTO snapshots (scope, taken) VALUES (?, ?)",
+                    (scope, taken),
+                )
+                snapshot_id = cursor.lastrowid
+                self._connection.executemany(
+                    "INSERT INTO counters (snapshot, metric, key, value) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(snapshot_id, metric, str(key), int(value))
+                        for (metric, values) in counters.iteritems()
+                        for (key, value) in values.iteritems()],
+                )
+        except sqlite3.Error as e:
+            raise StatsStoreError("Unable to store stats: " + str(e))
+
+        return taken
+
+    # ------------------------------------------------------------------------
+    def series(self, scope, metric, key=None, since=None):
+        """A list of (time, value) for each snapshot of the metric."""
+
+        sql = "SELECT s.taken, SUM(c.value) FROM snapshots s " \
+            "JOIN counters c ON c.snapshot = s.id " \
+            "WHERE s.scope = ? AND c.metric = ?"
+        params = [scope, metric]
+
+        if key is not None:
+            sql += " AND c.key = ?"
+            params.append(key)
+
+        if since is not None:
+            sql += " AND s.taken >= ?"
+            params.append(since)
+
+        sql += " GROUP BY s.id ORDER BY s.taken"
+
+        return [(taken, value) for (taken, value) in self._query(sql, params)]
+
+    # ------------------------------------------------------------------------
+    def trend(self, scope, metric, key=None, interval=INTERVAL_WEEK,
+        since=None):
+        """The metric at the end of each interval, and how much it changed.
+
+        Returns a list of :py:class:`TrendPoint`, oldest first, for each
+        interval with a snapshot.
+
+        """
+
+        seconds = INTERVALS[interval]
+
+        # the last snapshot of each interval
+        values = {}
+        for (taken, value) in self.series(scope, metric, key=key,
+            since=since):
+            values[int(taken // seconds) * seconds] = value
+
+        points = []
+        previous = None
+        for start in sorted(values):
+            value = values[start]
+            change = None if previous is None else value - previous
+            points.append(TrendPoint(start, value, change))
+            previous = value
+
+        return points
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def path(self):
+        return self._path
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _query(self, sql, params):
+
+        try:
+            return self._connection.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise StatsStoreError("Unable to read stats: " + str(e))
+
+# ----------------------------------------------------------------------------
+class StatsStoreError(Exception):
+    pass
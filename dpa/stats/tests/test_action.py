@@ -0,0 +1,469 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.stats.tests.test_action
+# -----------------------------------------------------------------------------
+"""Unit tests for the stats actions' aggregation and output."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+from StringIO import StringIO
+import sys
+import tempfile
+import unittest
+
+from dpa.action import ActionError
+from dpa.ptask import PTaskError
+from dpa.stats import action
+from dpa.stats.action import (
+    DiskUsageAction, FORMAT_CSV, FORMAT_JSON, FORMAT_TABLE, ProductionStats,
+    ProductionStatsAction, ProductionTrendsAction,
+)
+from dpa.stats.snapshot import INTERVAL_DAY, INTERVALS, StatsStore
+from dpa.stats.usage import GROUP_CATEGORY, GROUP_PTASK
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# the module level classes listed in aggregate mode
+LISTED = [
+    'PTask', 'PTaskVersion', 'ProductSubscription', 'Product',
+    'ProductVersion', 'ProductRepresentation',
+]
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all stats action tests."""
+
+    return unittest.TestSuite([
+        ProductionStatsActionTestCase,
+        DiskUsageActionTestCase,
+        ProductionTrendsActionTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class ProductionStatsActionTestCase(unittest.TestCase):
+    """Aggregate stats of a show with a shot and a neighbouring show."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repr_dir = os.path.join(self.tmp_dir, "abc")
+        os.makedirs(self.repr_dir)
+        for file_name in ["hero.abc", "hero_proxy.abc", "notes.txt"]:
+            open(os.path.join(self.repr_dir, file_name), "w").close()
+
+        self.old_stats_db = os.environ.get("DPA_STATS_DB")
+        os.environ["DPA_STATS_DB"] = os.path.join(self.tmp_dir, "stats.db")
+
+        # the search matches "showcase" too. it is not in the tree.
+        self.listings = {
+            'PTask': [
+                _Record(spec="show=shot010", type="shot"),
+                _Record(spec="showcase", type="show"),
+            ],
+            'PTaskVersion': [
+                _Record(spec="show@0001", ptask_spec="show",
+                    location_code="LOC1"),
+                _Record(spec="show=shot010@0001", ptask_spec="show=shot010",
+                    location_code="LOC1"),
+                _Record(spec="show=shot010@0002", ptask_spec="show=shot010",
+                    location_code="LOC2"),
+                _Record(spec="showcase@0001", ptask_spec="showcase",
+                    location_code="LOC1"),
+            ],
+            'ProductSubscription': [
+                _Record(ptask_version_spec="show=shot010@0002",
+                    product_version_spec="show=hero=model@0001"),
+                _Record(ptask_version_spec="showcase@0001",
+                    product_version_spec="show=hero=model@0001"),
+            ],
+            'Product': [
+                _Record(spec="show=hero=model", ptask_spec="show",
+                    category="model"),
+                _Record(spec="show=shot010=cam=camera",
+                    ptask_spec="show=shot010", category="camera"),
+                _Record(spec="showcase=hero=model", ptask_spec="showcase",
+                    category="model"),
+            ],
+            'ProductVersion': [
+                _Record(spec="show=hero=model@0001",
+                    product_spec="show=hero=model"),
+                _Record(spec="show=hero=model@0002",
+                    product_spec="show=hero=model"),
+                _Record(spec="show=shot010=cam=camera@0001",
+                    product_spec="show=shot010=cam=camera"),
+                _Record(spec="showcase=hero=model@0001",
+                    product_spec="showcase=hero=model"),
+            ],
+            'ProductRepresentation': [
+                _Record(spec="show=hero=model@0001=abc",
+                    product_version_spec="show=hero=model@0001",
+                    creation_location_code="LOC1", type="abc",
+                    area=_Record(path=self.repr_dir)),
+                _Record(spec="showcase=hero=model@0001=abc",
+                    product_version_spec="showcase=hero=model@0001",
+                    creation_location_code="LOC1", type="abc",
+                    area=_Record(path=self.repr_dir)),
+            ],
+        }
+
+        self.saved = dict((name, getattr(action, name)) for name in LISTED)
+        for name in LISTED:
+            setattr(action, name, _listing_class(name, self.listings[name]))
+
+        self.ptask = _Record(spec="show", type="show")
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        sys.stdout = self.stdout
+
+        for (name, cls) in self.saved.iteritems():
+            setattr(action, name, cls)
+
+        if self.old_stats_db is None:
+            os.environ.pop("DPA_STATS_DB", None)
+        else:
+            os.environ["DPA_STATS_DB"] = self.old_stats_db
+
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_aggregate(self):
+        """Only objects in the tree are counted, by type and category"""
+
+        stats_action = _ProductionStatsAction(self.ptask, aggregate=True,
+            parallel=2, quiet=True, snapshot=False)
+        stats_action()
+
+        data = stats_action._data
+        self.assertEqual(dict(data.ptasks), {"show": 1, "shot": 1})
+        self.assertEqual(dict(data.ptask_versions), {"show": 1, "shot": 2})
+        self.assertEqual(dict(data.ptask_versions_by_location),
+            {"LOC1": 2, "LOC2": 1})
+        self.assertEqual(dict(data.ptask_subscriptions), {"shot": 1})
+        self.assertEqual(dict(data.ptask_products), {"show": 1, "shot": 1})
+        self.assertEqual(dict(data.products), {"model": 1, "camera": 1})
+        self.assertEqual(dict(data.ptask_product_versions),
+            {"show": 2, "shot": 1})
+        self.assertEqual(dict(data.product_versions),
+            {"model": 2, "camera": 1})
+        self.assertEqual(dict(data.product_representations), {"model": 1})
+        self.assertEqual(dict(data.product_reprs_by_location), {"LOC1": 1})
+
+        # only the files of the representation's type
+        self.assertEqual(dict(data.product_repr_files), {"model": 2})
+        self.assertEqual(dict(data.product_repr_files_by_type), {"abc": 2})
+
+    # -------------------------------------------------------------------------
+    def test_print(self):
+        """The totals are printed by type and category"""
+
+        _ProductionStatsAction(self.ptask, aggregate=True, quiet=True,
+            snapshot=False)()
+
+        output = sys.stdout.getvalue()
+        self.assertIn("PTask Totals for : show (by type)", output)
+        self.assertIn("shot", output)
+        self.assertIn("camera", output)
+        self.assertNotIn("PRODUCT", output)
+
+    # -------------------------------------------------------------------------
+    def test_progress(self):
+        """Each object processed is printed unless quiet"""
+
+        _ProductionStatsAction(self.ptask, aggregate=True,
+            snapshot=False)()
+
+        output = sys.stdout.getvalue()
+        self.assertIn(" PTASK: show=shot010", output)
+        self.assertIn("    PRODUCT REPR: show=hero=model@0001=abc", output)
+        self.assertNotIn("showcase", output)
+
+    # -------------------------------------------------------------------------
+    def test_snapshot(self):
+        """The counters are stored in the stats database"""
+
+        _ProductionStatsAction(self.ptask, aggregate=True, quiet=True)()
+
+        store = StatsStore()
+        try:
+            latest = store.latest("show")
+        finally:
+            store.close()
+
+        self.assertEqual(latest['product_versions'],
+            {"model": 2, "camera": 1})
+        self.assertEqual(latest['product_repr_files_by_type'], {"abc": 2})
+        self.assertNotIn('bytes_by_category', latest)
+
+    # -------------------------------------------------------------------------
+    def test_list_error(self):
+        """A failed listing fails the action"""
+
+        def fail(search=None):
+            raise PTaskError("server unavailable")
+        action.PTask.list = staticmethod(fail)
+
+        stats_action = _ProductionStatsAction(self.ptask, aggregate=True,
+            quiet=True, snapshot=False)
+        stats_action.validate()
+
+        with self.assertRaises(ActionError) as context:
+            stats_action.execute()
+        self.assertIn("server unavailable", str(context.exception))
+
+    # -------------------------------------------------------------------------
+    def test_counters(self):
+        """Only counters with values are stored"""
+
+        data = ProductionStats()
+        data.products["model"] += 3
+
+        self.assertEqual(data.counters(), {'products': {"model": 3}})
+
+# -----------------------------------------------------------------------------
+class DiskUsageActionTestCase(unittest.TestCase):
+    """Disk usage of a ptask with a product, in each format."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self._write("scene.ma", 100)
+        self._write("seq010/.ptask_type", 0)
+        self._write("seq010/products/hero/model/0001/abc/hero.abc", 500)
+        self._write("seq010/products/cam/camera/0001/abc/cam.abc", 50)
+
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.root)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_csv(self):
+        """A row per key, biggest first"""
+
+        self._execute(GROUP_CATEGORY, FORMAT_CSV)
+
+        self.assertEqual(sys.stdout.getvalue().splitlines(), [
+            "category,bytes,files",
+            "model,500,1",
+            "camera,50,1",
+        ])
+
+    # -------------------------------------------------------------------------
+    def test_json(self):
+        """The totals and usage by key"""
+
+        self._execute(GROUP_PTASK, FORMAT_JSON)
+
+        output = json.loads(sys.stdout.getvalue())
+        self.assertEqual(output['spec'], "show")
+        self.assertEqual(output['group'], GROUP_PTASK)
+        self.assertEqual(output['total'], {'bytes': 650, 'files': 4})
+        self.assertEqual(output['usage'], {
+            "show": {'bytes': 100, 'files': 1},
+            "show=seq010": {'bytes': 550, 'files': 3},
+        })
+
+    # -------------------------------------------------------------------------
+    def test_table(self):
+        """A row per key and the scan totals"""
+
+        usage_action = self._execute(GROUP_CATEGORY, FORMAT_TABLE)
+
+        output = sys.stdout.getvalue()
+        self.assertIn("Disk usage for : show (by category)", output)
+        self.assertIn("model", output)
+        self.assertIn("camera", output)
+        self.assertIn(
+            "Total: 650 bytes in 4 files. Scanned {s} directories".format(
+                s=usage_action.scanner.scanned),
+            output)
+
+    # -------------------------------------------------------------------------
+    def test_sorted(self):
+        """Usage is sorted by bytes, then key"""
+
+        usage_action = self._execute(GROUP_PTASK, FORMAT_CSV)
+
+        self.assertEqual([k for (k, u) in usage_action._sorted_usage()],
+            ["show=seq010", "show"])
+
+    # -------------------------------------------------------------------------
+    def _execute(self, group, output_format):
+
+        usage_action = DiskUsageAction("show", group=group,
+            format=output_format, rescan=True)
+        usage_action.interactive = True
+
+        # validate resolves the spec from the current ptask area
+        usage_action._spec = "show"
+        usage_action._root = self.root
+        usage_action.execute()
+
+        return usage_action
+
+    # -------------------------------------------------------------------------
+    def _write(self, rel_path, size):
+
+        path = os.path.join(self.root, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as fh:
+            fh.write("x" * size)
+
+# -----------------------------------------------------------------------------
+class ProductionTrendsActionTestCase(unittest.TestCase):
+    """Trends of a show's snapshots on three days."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.old_stats_db = os.environ.get("DPA_STATS_DB")
+        os.environ["DPA_STATS_DB"] = os.path.join(self.tmp_dir, "stats.db")
+
+        day = INTERVALS[INTERVAL_DAY]
+        start = 1000 * day
+
+        store = StatsStore()
+        try:
+            store.record("show", {
+                'product_versions': {'model': 10, 'rig': 2},
+            }, taken=start)
+            store.record("show", {
+                'product_versions': {'model': 15, 'rig': 3},
+            }, taken=start + day * 2)
+        finally:
+            store.close()
+
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        sys.stdout = self.stdout
+
+        if self.old_stats_db is None:
+            os.environ.pop("DPA_STATS_DB", None)
+        else:
+            os.environ["DPA_STATS_DB"] = self.old_stats_db
+
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_trend(self):
+        """A row per day with a snapshot, with the change"""
+
+        trends_action = self._execute("show", metric="product_versions",
+            interval=INTERVAL_DAY)
+
+        self.assertEqual([(p.value, p.change) for p in trends_action.trend],
+            [(12, None), (18, 6)])
+
+        output = sys.stdout.getvalue()
+        self.assertIn("product_versions for : show (by day)", output)
+        self.assertIn("+6", output)
+
+    # -------------------------------------------------------------------------
+    def test_trend_key(self):
+        """The key is shown in the title"""
+
+        self._execute("show", metric="product_versions", key="rig",
+            interval=INTERVAL_DAY)
+
+        self.assertIn("product_versions [rig] for : show (by day)",
+            sys.stdout.getvalue())
+
+    # -------------------------------------------------------------------------
+    def test_latest(self):
+        """Each counter of the latest snapshot"""
+
+        self._execute("show")
+
+        output = sys.stdout.getvalue()
+        self.assertIn("Latest snapshot for : show", output)
+        self.assertIn("rig", output)
+        self.assertIn("15", output)
+
+    # -------------------------------------------------------------------------
+    def test_empty(self):
+        """A message rather than an empty table"""
+
+        self._execute("other")
+        self.assertIn("No snapshots stored for: other",
+            sys.stdout.getvalue())
+
+        self._execute("other", metric="product_versions")
+        self.assertIn("No snapshots of product_versions stored for: other",
+            sys.stdout.getvalue())
+
+    # -------------------------------------------------------------------------
+    def _execute(self, spec, **kwargs):
+
+        trends_action = ProductionTrendsAction(spec, **kwargs)
+        trends_action.interactive = True
+
+        # validate resolves the spec from the current ptask area
+        trends_action._spec = spec
+        trends_action.execute()
+
+        return trends_action
+
+# -----------------------------------------------------------------------------
+# Helpers:
+# -----------------------------------------------------------------------------
+class _ProductionStatsAction(ProductionStatsAction):
+    logging = False
+
+    # -------------------------------------------------------------------------
+    def validate(self):
+        # the fake ptask is not a PTask. skip resolving it.
+        pass
+
+# -----------------------------------------------------------------------------
+class _Record(object):
+    """An object with the supplied attributes."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+# -----------------------------------------------------------------------------
+def _listing_class(data_type, records):
+    """A class listing the supplied records for any search."""
+
+    return type(data_type, (object,), {
+        'data_type': data_type,
+        'list': staticmethod(lambda search=None: list(records)),
+    })
+
@@ -0,0 +1,91 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.stats.tests.test_snapshot
+# -----------------------------------------------------------------------------
+"""Unit tests for the stats snapshot store."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.stats.snapshot import INTERVAL_DAY, INTERVALS, StatsStore
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all stats snapshot tests."""
+
+    return unittest.TestSuite([
+        StatsStoreTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class StatsStoreTestCase(unittest.TestCase):
+    """Snapshots of a show recorded on three days."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = StatsStore(os.path.join(self.tmp_dir, "stats.db"))
+
+        day = INTERVALS[INTERVAL_DAY]
+        self.start = 1000 * day
+
+        self.store.record("show", {
+            'product_versions': {'model': 10, 'rig': 2},
+        }, taken=self.start)
+        self.store.record("show", {
+            'product_versions': {'model': 12, 'rig': 2},
+        }, taken=self.start + day / 2)
+        self.store.record("show", {
+            'product_versions': {'model': 15, 'rig': 3},
+        }, taken=self.start + day * 2)
+        self.store.record("other", {
+            'product_versions': {'model': 99},
+        }, taken=self.start)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_series(self):
+
+        self.assertEqual(
+            [v for (t, v) in self.store.series("show", 'product_versions')],
+            [12, 14, 18])
+        self.assertEqual(
+            [v for (t, v) in self.store.series(
+                "show", 'product_versions', key='rig')],
+            [2, 2, 3])
+
+    # -------------------------------------------------------------------------
+    def test_trend(self):
+
+        points = self.store.trend("show", 'product_versions',
+            interval=INTERVAL_DAY)
+
+        # the last snapshot of each day
+        self.assertEqual([p.value for p in points], [14, 18])
+        self.assertEqual([p.change for p in points], [None, 4])
+        self.assertEqual(points[0].start, self.start)
+
+    # -------------------------------------------------------------------------
+    def test_latest(self):
+
+        self.assertEqual(self.store.latest("show"),
+            {'product_versions': {'model': 15, 'rig': 3}})
+        self.assertEqual(self.store.latest("missing"), {})
@@ -0,0 +1,367 @@
+"""Disk usage and file counts of ptask areas.
+
+The scanner walks a ptask's directory tree with a pool of threads, one
+directory per task, and totals the bytes and files in each directory by
+file type. Totals are then grouped by the ptask, ptask version or product
+category each directory belongs to, worked out from the layout on disk:
+child ptask directories hold a ptask type file, version directories are
+named ``.NNNN``, and products live under ``products/<name>/<category>``.
+
+Each directory's totals are cached with its modification time, so a later
+scan only lists the directories that gained, lost or renamed entries since.
+A file rewritten in place doesn't change its directory's modification
+time. Use ``cache=False`` to rescan everything.
+
+Classes
+-------
+DiskUsageScanner
+    Scans a ptask's directory tree and groups the totals.
+
+Usage
+    Bytes and files in a group.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import defaultdict
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import stat
+import tempfile
+
+from dpa.logging import Logger
+from dpa.ptask.spec import PTaskSpec
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# ways to group the totals
+GROUP_PTASK = "ptask"
+GROUP_VERSION = "version"
+GROUP_CATEGORY = "category"
+GROUP_TYPE = "type"
+GROUPS = [GROUP_PTASK, GROUP_VERSION, GROUP_CATEGORY, GROUP_TYPE]
+
+# concurrent directory listings
+DEFAULT_WORKERS = 8
+
+# per directory totals, by scan root, in the shared log directory
+CACHE_DIR = "disk_usage"
+
+# bumped when the cache format changes in an incompatible way
+CACHE_FORMAT = 1
+
+# identifies a child ptask directory
+PTASK_TYPE_FILE = ".ptask_type"
+
+VERSION_DIR_REGEX = re.compile(r"^\.(\d{4,})$")
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class Usage(object):
+    """Bytes and files in a group."""
+
+    __slots__ = ('bytes', 'files')
+
+    # ------------------------------------------------------------------------
+    def __init__(self, bytes=0, files=0):
+        self.bytes = bytes
+        self.files = files
+
+    # ------------------------------------------------------------------------
+    def add(self, bytes, files):
+        self.bytes += bytes
+        self.files += files
+
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+        return {'bytes': self.bytes, 'files': self.files}
+
+# ----------------------------------------------------------------------------
+class DiskUsageScanner(object):
+    """Scans a ptask's directory tree and groups the totals.
+
+    Usage::
+
+        >>> scanner = DiskUsageScanner("show=seq010", "/projects/show/seq010")
+        >>> scanner.scan()
+        >>> for (spec, usage) in scanner.usage(GROUP_PTASK).iteritems():
+        ...     print spec, usage.bytes, usage.files
+
+    Symlinks are neither followed nor counted, so import directories don't
+    count the products they link to.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, spec, root, workers=DEFAULT_WORKERS, cache=True):
+
+        self._spec = spec
+        self._root = os.path.abspath(root)
+        self._workers = max(1, int(workers))
+        self._cache = cache
+
+        self._entries = {}
+        self._scanned = 0
+        self._cached = 0
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def scan(self):
+        """Scan the tree, listing only directories changed since the cache."""
+
+        cached = self._read_cache() if self._cache else {}
+
+        self._entries = {}
+        self._scanned = 0
+        self._cached = 0
+
+        pool = ThreadPool(self._workers)
+        try:
+            # a level of the tree at a time
+            frontier = [""]
+            while frontier:
+                results = pool.map(
+                    lambda rel_dir: _scan_dir(self._root, rel_dir,
+                        cached.get(rel_dir)),
+                    frontier,
+                )
+                frontier = self._collect(results)
+        finally:
+            pool.close()
+            pool.join()
+
+        if self._cache:
+            self._write_cache()
+
+    # ------------------------------------------------------------------------
+    def usage(self, group):
+        """Totals for each ptask, version, category or file type.
+
+        Versions are keyed by ptask version spec, with the ptask's working
+        area keyed by the ptask spec. Only directories below a product are
+        grouped by category.
+
+        """
+
+        if group not in GROUPS:
+            raise ValueError("Unknown disk usage group: " + str(group))
+
+        totals = defaultdict(Usage)
+
+        for (rel_dir, entry) in self._entries.iteritems():
+
+            if group == GROUP_TYPE:
+                for (file_type, (files, bytes)) in entry['types'].iteritems():
+                    totals[file_type].add(bytes, files)
+                continue
+
+            key = self._keys(rel_dir)[group]
+            if key is not None:
+                totals[key].add(entry['bytes'], entry['files'])
+
+        return dict(totals)
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def cached(self):
+        """Number of directories whose cached totals were reused."""
+        return self._cached
+
+    # ------------------------------------------------------------------------
+    @property
+    def root(self):
+        return self._root
+
+    # ------------------------------------------------------------------------
+    @property
+    def scanned(self):
+        """Number of directories listed by the last scan."""
+        return self._scanned
+
+    # ------------------------------------------------------------------------
+    @property
+    def spec(self):
+        return self._spec
+
+    # ------------------------------------------------------------------------
+    @property
+    def total(self):
+        total = Usage()
+        for entry in self._entries.itervalues():
+            total.add(entry['bytes'], entry['files'])
+        return total
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _cache_path(self):
+
+        cache_dir = os.path.join(Logger.log_dir, CACHE_DIR)
+        if not os.path.isdir(cache_dir):
+            # shared by everyone
+            try:
+                os.makedirs(cache_dir)
+                os.chmod(cache_dir, 0777)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    cache_dir = tempfile.gettempdir()
+
+        key = hashlib.md5(self._root).hexdigest()
+        return os.path.join(cache_dir, key + ".json")
+
+    # ------------------------------------------------------------------------
+    def _collect(self, results):
+
+        frontier = []
+        for (rel_dir, entry, rescanned) in results:
+            self._entries[rel_dir] = entry
+            if rescanned:
+                self._scanned += 1
+            else:
+                self._cached += 1
+            frontier.extend(os.path.join(rel_dir, d) for d in entry['dirs'])
+
+        return frontier
+
+    # ------------------------------------------------------------------------
+    def _keys(self, rel_dir):
+
+        parts = rel_dir.split(os.path.sep) if rel_dir else []
+
+        # leading child ptask directories
+        ptask_spec = self._spec
+        index = 0
+        while index < len(parts):
+            entry = self._entries.get(os.path.join(*parts[:index + 1]))
+            if not entry or not entry['ptask']:
+                break
+            ptask_spec = PTaskSpec.SEPARATOR.join([ptask_spec, parts[index]])
+            index += 1
+
+        rest = parts[index:]
+        version = ptask_spec
+        category = None
+
+        if rest:
+            match = VERSION_DIR_REGEX.match(rest[0])
+            if match:
+                version = ptask_spec + PTaskSpec.VERSION + match.group(1)
+            elif rest[0] == PTaskSpec.PRODUCT_SEPARATOR and len(rest) >= 3:
+                category = rest[2]
+
+        return {
+            GROUP_PTASK: ptask_spec,
+            GROUP_VERSION: version,
+            GROUP_CATEGORY: category,
+        }
+
+    # ------------------------------------------------------------------------
+    def _read_cache(self):
+
+        try:
+            with open(self._cache_path()) as cache_fh:
+                data = json.load(cache_fh)
+        except (IOError, ValueError):
+            return {}
+
+        if data.get('format') != CACHE_FORMAT or \
+            data.get('root') != self._root:
+            return {}
+
+        return data['entries']
+
+    # ------------------------------------------------------------------------
+    def _write_cache(self):
+
+        path = self._cache_path()
+        data = {
+            'format': CACHE_FORMAT,
+            'root': self._root,
+            'entries': self._entries,
+        }
+
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(
+                prefix="." + os.path.basename(path),
+                dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w') as cache_fh:
+                json.dump(data, cache_fh, separators=(',', ':'))
+            os.chmod(tmp_path, 0666)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            # the cache only saves time on the next scan
+            Logger.get().warning(
+                "Unable to write disk usage cache: " + str(e))
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _file_type(name):
+
+    (base, ext) = os.path.splitext(name)
+    return ext[1:].lower()
+
+# ----------------------------------------------------------------------------
+def _scan_dir(root, rel_dir, cached):
+    """Returns the directory, its totals and whether it was listed."""
+
+    path = os.path.join(root, rel_dir)
+
+    try:
+        mtime = os.lstat(path).st_mtime
+    except OSError:
+        mtime = None
+
+    if cached and mtime is not None and cached['mtime'] == mtime:
+        return (rel_dir, cached, False)
+
+    entry = {
+        'mtime': mtime,
+        'bytes': 0,
+        'files': 0,
+        'types': {},
+        'dirs': [],
+        'ptask': False,
+    }
+
+    try:
+        names = os.listdir(path)
+    except OSError:
+        # rescanned next time
+        entry['mtime'] = None
+        return (rel_dir, entry, True)
+
+    entry['ptask'] = PTASK_TYPE_FILE in names
+
+    for name in names:
+        try:
+            info = os.lstat(os.path.join(path, name))
+        except OSError:
+            continue
+
+        if stat.S_ISDIR(info.st_mode):
+            entry['dirs'].append(name)
+        elif stat.S_ISREG(info.st_mode):
+            entry['bytes'] += info.st_size
+            entry['files'] += 1
+            type_totals = entry['types'].setdefault(_file_type(name), [0, 0])
+            type_totals[0] += 1
+            type_totals[1] += info.st_size
+
+    entry['dirs'].sort()
+
+    return (rel_dir, entry, True)
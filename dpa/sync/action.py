@@ -4,10 +4,19 @@
 # ----------------------------------------------------------------------------
 
 import os
-import shlex
-from subprocess import CalledProcessError, Popen, PIPE
 
 from dpa.action import Action, ActionError
+from dpa.frange import Frange, FrangeError
+from dpa.location import current_location_code
+from dpa.ptask.area import PTaskArea
+from dpa.ptask.spec import PTaskSpec
+from dpa.shell.output import Output, Style
+from dpa.sync.frames import FramePattern, FramePatternError
+from dpa.sync.job import (
+    ENGINE_AUTO, ENGINE_NATIVE, ENGINE_RSYNC, ENGINES, SyncJob,
+    SyncJobManager, remote_host,
+)
+from dpa.sync.plan import SyncPlan, SyncPlanError
 
 # ----------------------------------------------------------------------------
 class SyncAction(Action):
@@ -55,9 +64,58 @@ class SyncAction(Action):
             action="store_true",
         )
 
+        parser.add_argument(
+            "--engine",
+            choices=ENGINES,
+            default=ENGINE_AUTO,
+            help="How to sync. 'native' copies only the files that " + \
+                 "changed since the last sync using manifests, writing " + \
+                 "one to the destination, and only works for local " + \
+                 "paths. Meant for version and representation " + \
+                 "directories. Default is rsync.",
+        )
+
+        parser.add_argument(
+            "--link_dest",
+            default=None,
+            help="Hard link files unchanged relative to this directory " + \
+                 "rather than copying them.",
+        )
+
+        parser.add_argument(
+            "--reflink",
+            action="store_true",
+            help="Clone files rather than copying them, where the " + \
+                 "filesystem supports it. Native engine only.",
+        )
+
+        parser.add_argument(
+            "-f", "--frames",
+            default=None,
+            help="Sync only these frames of the image sequence given by " + \
+                 "--pattern. Example: 1001-1050,1100",
+        )
+
+        parser.add_argument(
+            "-p", "--pattern",
+            default=None,
+            help="Image sequence file pattern, relative to the source " + \
+                 "directory, for syncing --frames. Example: " + \
+                 "exr/layer.####.exr",
+        )
+
+        parser.add_argument(
+            "-s", "--streams",
+            type=int,
+            default=None,
+            help="Send large files to a remote destination as chunks " + \
+                 "over this many parallel streams. Rsync engine only.",
+        )
+
     # ------------------------------------------------------------------------
     def __init__(self, source, destination, includes=None, excludes=None, 
-        wait=True, delete=False):
+        wait=True, delete=False, engine=ENGINE_AUTO, link_dest=None,
+        reflink=False, frames=None, pattern=None, streams=None):
 
         super(SyncAction, self).__init__(
             source, 
@@ -65,6 +123,13 @@ class SyncAction(Action):
             includes=includes,
             excludes=excludes,
             wait=wait,
+            delete=delete,
+            engine=engine,
+            link_dest=link_dest,
+            reflink=reflink,
+            frames=frames,
+            pattern=pattern,
+            streams=streams,
         )
 
         self._source_path = source
@@ -73,50 +138,130 @@ class SyncAction(Action):
         self._excludes = excludes
         self._wait = wait
         self._delete = delete
+        self._engine = engine
+        self._link_dest = link_dest
+        self._reflink = reflink
+        self._frames = frames
+        self._pattern = pattern
+        self._streams = streams
+
+        self._job = None
 
     # ------------------------------------------------------------------------
     def execute(self):
 
-        options = ["-a", "-v", "-O"] 
+        source = self.source_path
+        destination = self.destination_path
+        files_from = None
 
-        if self.includes:
-            for include in self.includes:
-                options.append('--include="{i}"'.format(i=include))
+        if self.frames is not None:
+            files_from = self.pattern.paths(self.frames)
 
-        if self.excludes:
-            for exclude in self.excludes:
-                options.append('--exclude="{i}"'.format(i=exclude))
+            # listed frames are relative to the source directory. a source
+            # without a trailing slash syncs the directory itself.
+            if not source.endswith("/"):
+                destination = os.path.join(destination,
+                    os.path.basename(source))
+                source += "/"
 
-        if self.delete:
-            options.append("--delete-after")
+        self._job = SyncJobManager().submit(
+            source,
+            destination,
+            includes=self.includes,
+            excludes=self.excludes,
+            delete=self.delete,
+            engine=self.engine,
+            link_dest=self.link_dest,
+            reflink=self.reflink,
+            files_from=files_from,
+            streams=self.streams,
+            detach=not self.wait,
+        )
 
-        options = " ".join(options)
+        if not self.wait:
+            self.logger.info(
+                "Started sync job {j}: {s} to {d}".format(
+                    j=self._job.id, s=self.source_path,
+                    d=self.destination_path)
+            )
+            return
 
-        command = "rsync {o} {s} {d}".format(
-            o=options, 
-            s=self.source_path, 
-            d=self.destination_path,
-        )
+        status = self._job.wait()
 
-        args = shlex.split(command)
+        if status == SyncJob.CANCELLED:
+            raise ActionError("Sync cancelled.")
+        elif status != SyncJob.SUCCESS:
+            raise ActionError(self._job.error)
 
-        if self.wait:
-            try:
-                msg = Popen(args,
-                    stdout=PIPE)
-                self.logger.info(msg)
-            except CalledProcessError as e:
-                raise ActionError(str(e))
-        else:
-            try:
-                proc = Popen(args)
-            except OSError as e:
-                raise ActionError(str(e))
+        if self._job.warning:
+            self.logger.warning(self._job.warning + " " + self.source_path)
+
+        self.logger.info(
+            "Synced {s} to {d} ({e}): {f} files, {b} bytes, " \
+            "{t} bytes/s".format(
+                s=self.source_path,
+                d=self.destination_path,
+                e=self.engine,
+                f=self.files_transferred,
+                b=self.bytes_transferred,
+                t=self._job.throughput,
+            )
+        )
+
+        if self._job.files_linked or self._job.files_cloned:
+            self.logger.info(
+                "Snapshot of {d}: {l} files linked, {c} files cloned".format(
+                    d=self.destination_path,
+                    l=self._job.files_linked,
+                    c=self._job.files_cloned,
+                )
+            )
 
     # ------------------------------------------------------------------------
     def undo(self):
         pass
 
+    # ------------------------------------------------------------------------
+    def validate(self):
+
+        if self._engine not in ENGINES:
+            raise ActionError("Unknown sync engine: " + str(self._engine))
+
+        if (self._frames is None) != (self._pattern is None):
+            raise ActionError(
+                "Frames and a sequence pattern must be supplied together.")
+
+        if self._frames is not None:
+
+            if not isinstance(self._pattern, FramePattern):
+                try:
+                    self._pattern = FramePattern(self._pattern)
+                except FramePatternError as e:
+                    raise ActionError(str(e))
+
+            if not isinstance(self._frames, Frange):
+                try:
+                    self._frames = Frange(self._frames)
+                except FrangeError:
+                    raise ActionError(
+                        "Invalid frame range: " + str(self._frames))
+
+            if not self._frames.count:
+                raise ActionError("No frames to sync.")
+
+        if self._streams is not None and self._streams < 1:
+            raise ActionError("Streams must be at least 1.")
+
+        local = not (remote_host(self.source_path) or
+            remote_host(self.destination_path))
+
+        # native syncs leave a manifest in the destination, which doesn't
+        # belong in work areas, so they are only used when asked for
+        if self._engine == ENGINE_AUTO:
+            self._engine = ENGINE_RSYNC
+        elif self._engine == ENGINE_NATIVE and not local:
+            raise ActionError("The native sync engine requires local paths.")
+
     # ------------------------------------------------------------------------
     # Properties:
     # ------------------------------------------------------------------------
@@ -149,3 +294,292 @@ class SyncAction(Action):
     def delete(self):
         return self._delete
 
+    # ------------------------------------------------------------------------
+    @property
+    def link_dest(self):
+        return self._link_dest
+
+    # ------------------------------------------------------------------------
+    @property
+    def reflink(self):
+        return self._reflink
+
+    # ------------------------------------------------------------------------
+    @property
+    def frames(self):
+        """The frames to sync, or None to sync everything."""
+        return self._frames
+
+    # ------------------------------------------------------------------------
+    @property
+    def pattern(self):
+        """The image sequence pattern the frames are synced for."""
+        return self._pattern
+
+    # ------------------------------------------------------------------------
+    @property
+    def streams(self):
+        """Parallel streams for large files sent to a remote destination."""
+        return self._streams
+
+    # ------------------------------------------------------------------------
+    @property
+    def engine(self):
+        """The sync engine. Resolved from 'auto' once validated."""
+        return self._engine
+
+    # ------------------------------------------------------------------------
+    @property
+    def job(self):
+        """The handle of the running sync job, once executed."""
+        return self._job
+
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        """Bytes transferred by the sync. None unless it was waited on."""
+        if self._job and self.wait:
+            return self._job.bytes_transferred
+        return None
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_transferred(self):
+        """Files transferred by the sync. None unless it was waited on."""
+        if self._job and self.wait:
+            return self._job.files_transferred
+        return None
+
+# ----------------------------------------------------------------------------
+class SyncPlanAction(Action):
+    """Plan the transfers that bring a location up to date with a ptask."""
+
+    name = 'plan'
+    target_type = 'sync'
+    description = 'Plan the syncs to bring a location up to date.'
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def setup_cl_args(cls, parser):
+
+        parser.add_argument(
+            "spec",
+            nargs="?",
+            default="",
+            help="The ptask to plan syncs for, including its children. " + \
+                 "Default is the current ptask.",
+        )
+
+        parser.add_argument(
+            "-l", "--location",
+            default=None,
+            metavar="<code>",
+            help="The location to bring up to date. Default is this " + \
+                 "location.",
+        )
+
+        parser.add_argument(
+            "-r", "--read",
+            default=None,
+            metavar="<path>",
+            help="Read a previously written plan rather than planning.",
+        )
+
+        parser.add_argument(
+            "-o", "--output",
+            default=None,
+            metavar="<path>",
+            help="Write the plan as json to this path.",
+        )
+
+        parser.add_argument(
+            "-x", "--execute",
+            action="store_true",
+            help="Run the planned syncs. The location must be this one.",
+        )
+
+        parser.add_argument(
+            "-w", "--workers",
+            type=int,
+            default=4,
+            metavar="<n>",
+            help="Number of concurrent queries, and of syncs when " + \
+                 "executing. Default is 4.",
+        )
+
+    # ------------------------------------------------------------------------
+    def __init__(self, spec, location=None, read=None, output=None,
+        execute=False, workers=4):
+
+        super(SyncPlanAction, self).__init__(spec, location=location,
+            read=read, output=output, execute=execute, workers=workers)
+
+        self._spec = spec
+        self._location = location
+        self._read = read
+        self._output = output
+        self._execute = execute
+        self._workers = workers
+
+        self._plan = None
+        self._results = []
+
+    # ------------------------------------------------------------------------
+    def execute(self):
+
+        try:
+            if self._read:
+                self._plan = SyncPlan.read(self._read)
+            else:
+                self._plan = SyncPlan.build(self._spec,
+                    location=self.location, workers=self.workers)
+        except SyncPlanError as e:
+            raise ActionError(str(e))
+
+        if self.interactive:
+            self._plan_table()
+
+        if self.output:
+            try:
+                self._plan.write(self.output)
+            except SyncPlanError as e:
+                raise ActionError(str(e))
+
+        if not self.execute_plan or not len(self._plan):
+            return
+
+        if self._plan.location_code != current_location_code():
+            raise ActionError(
+                "Only a plan for this location can be executed here: " + \
+                self._plan.location_code)
+
+        try:
+            self._results = self._plan.execute(workers=self.workers,
+                callback=self._report)
+        except SyncPlanError as e:
+            raise ActionError(str(e))
+
+        failed = [r for r in self._results if not r.succeeded]
+        if failed:
+            raise ActionError(
+                "{f} of {t} syncs failed: {s}".format(
+                    f=len(failed),
+                    t=len(self._results),
+                    s=", ".join(r.name for r in failed),
+                )
+            )
+
+    # ------------------------------------------------------------------------
+    def undo(self):
+        pass
+
+    # ------------------------------------------------------------------------
+    def validate(self):
+
+        if self._workers < 1:
+            raise ActionError("Workers must be at least 1.")
+
+        if self._read:
+            return
+
+        cur_spec = PTaskArea.current().spec
+        self._spec = PTaskSpec.get(self._spec, relative_to=cur_spec)
+        if not self._spec:
+            raise ActionError("No ptask to plan syncs for.")
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def spec(self):
+        return self._spec
+
+    # ------------------------------------------------------------------------
+    @property
+    def location(self):
+        return self._location
+
+    # ------------------------------------------------------------------------
+    @property
+    def output(self):
+        return self._output
+
+    # ------------------------------------------------------------------------
+    @property
+    def execute_plan(self):
+        return self._execute
+
+    # ------------------------------------------------------------------------
+    @property
+    def workers(self):
+        return self._workers
+
+    # ------------------------------------------------------------------------
+    @property
+    def plan(self):
+        """The sync plan, once executed."""
+        return self._plan
+
+    # ------------------------------------------------------------------------
+    @property
+    def results(self):
+        """The results of the planned syncs, if they were run."""
+        return self._results
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _plan_table(self):
+
+        order = "#"
+        kind = "Kind"
+        spec = "Spec"
+        source = "From"
+        size = "Bytes"
+
+        output = Output()
+        output.vertical_padding = 0
+        output.vertical_separator = None
+        output.table_header_separator = "-"
+        output.header_names = [order, kind, spec, source, size]
+        output.set_header_alignment({size: "right"})
+        output.title = " Sync plan: {s} to {l} ".format(
+            s=self._plan.ptask_spec, l=self._plan.location_code)
+
+        for (i, transfer) in enumerate(self._plan.transfers):
+            output.add_item(
+                {
+                    order: str(i + 1),
+                    kind: transfer.kind,
+                    spec: transfer.spec,
+                    source: transfer.source_location,
+                    size: "?" if transfer.bytes_estimate is None \
+                        else str(transfer.bytes_estimate),
+                },
+                colors={
+                    spec: Style.bright,
+                },
+            )
+
+        if len(self._plan):
+            output.dump(output_format='table')
+
+        unestimated = len(self._plan.unestimated)
+        print "\n{n} syncs, {b} bytes{u}.\n".format(
+            n=len(self._plan),
+            b=self._plan.total_bytes,
+            u=" plus {u} not estimated".format(u=unestimated) \
+                if unestimated else "",
+        )
+
+    # ------------------------------------------------------------------------
+    def _report(self, result):
+
+        if result.succeeded:
+            self.logger.info(
+                "Synced {n}: {b} bytes".format(
+                    n=result.name, b=result.bytes_transferred))
+        else:
+            self.logger.warning(
+                "Sync of {n} {s}: {e}".format(
+                    n=result.name, s=result.status, e=result.error))
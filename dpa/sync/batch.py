@@ -0,0 +1,336 @@
+"""Sync many related source/destination pairs in as few transfers as possible.
+
+Classes
+-------
+SyncBatch
+    Coalesces sync pairs that share roots into single transfers.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import os
+
+from dpa.sync.job import (
+    ENGINE_AUTO, ENGINE_NATIVE, ENGINE_RSYNC, SyncJob, SyncJobError,
+    SyncJobManager, remote_host,
+)
+from dpa.sync.scheduler import SyncScheduler
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# concurrent transfers when running a batch
+DEFAULT_BATCH_WORKERS = 4
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class SyncBatch(object):
+    """Coalesces sync pairs that share roots into single transfers.
+
+    Usage::
+
+        >>> batch = SyncBatch()
+        >>> batch.add("host:/proj/seq/shot1/", "/proj/seq2/shot1/")
+        >>> batch.add("host:/proj/seq/shot1/anim/", "/proj/seq2/shot1/anim/")
+        >>> batch.run()
+        >>> print batch.transfers, [r.error for r in batch.failed]
+
+    Sources are synced into their destinations as with a trailing '/' on
+    the source. For each pair, the longest common trailing portion of the
+    source and destination paths is the pair's relative path, and the rest
+    are its roots. Pairs with the same roots (and the same unanchored filter
+    patterns) become a single rsync transfer, using --files-from to list the
+    relative paths, so the remote session is only set up once. Anchored
+    filter patterns are rewritten relative to the transfer's roots.
+
+    With the native engine, pairs that are both local are synced
+    individually, since it has no per transfer setup cost. It writes a
+    manifest to each destination, so it is only used when asked for rather
+    than for any local pair: work areas should be left as rsync leaves them.
+
+    Transfers run concurrently, up to ``workers`` at a time, and the batch
+    waits for all of them to complete.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, delete=False, engine=ENGINE_AUTO,
+        workers=DEFAULT_BATCH_WORKERS):
+
+        self._delete = delete
+        self._engine = engine
+        self._workers = workers
+
+        self._pairs = []
+        self._scheduler = None
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._pairs)
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def add(self, source, destination, includes=None, excludes=None):
+        """Add a source/destination pair to the batch."""
+
+        # syncing a directory without a trailing slash syncs the directory
+        # itself into the destination
+        if not source.endswith("/"):
+            destination = os.path.join(destination, os.path.basename(source))
+            source += "/"
+
+        self._pairs.append(
+            _SyncPair(source, destination, includes or [], excludes or []))
+
+    # ------------------------------------------------------------------------
+    def run(self):
+        """Run the batch. Returns the result of each transfer.
+
+        See :py:class:`dpa.sync.scheduler.SyncResult`. Failed transfers
+        don't stop the others.
+
+        """
+
+        self._scheduler = SyncScheduler(
+            workers=self._workers,
+            stop_on_failure=False,
+        )
+
+        for (name, job_kwargs) in self._plan():
+            self._scheduler.add(name, _job_runner(job_kwargs))
+
+        return self._scheduler.run()
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def transfers(self):
+        """The number of transfers the batch ran."""
+
+        if not self._scheduler:
+            return 0
+
+        return len(self._scheduler.results)
+
+    # ------------------------------------------------------------------------
+    @property
+    def failed(self):
+
+        if not self._scheduler:
+            return []
+
+        return self._scheduler.failed
+
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+
+        if not self._scheduler:
+            return 0
+
+        return self._scheduler.bytes_transferred
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _plan(self):
+        """Returns a list of (name, SyncJob kwargs), one per transfer."""
+
+        transfers = []
+        groups = {}
+        group_order = []
+
+        for pair in self._pairs:
+
+            local = not (remote_host(pair.source) or
+                remote_host(pair.destination))
+
+            if self._engine == ENGINE_NATIVE and local:
+                transfers.append((pair.destination, dict(
+                    source=pair.source,
+                    destination=pair.destination,
+                    includes=pair.includes,
+                    excludes=pair.excludes,
+                    delete=self._delete,
+                    engine=ENGINE_NATIVE,
+                )))
+                continue
+
+            key = pair.group_key
+            if key not in groups:
+                groups[key] = []
+                group_order.append(key)
+            groups[key].append(pair)
+
+        for key in group_order:
+            pairs = groups[key]
+            transfers.append(
+                (pairs[0].dest_root, self._group_kwargs(pairs)))
+
+        return transfers
+
+    # ------------------------------------------------------------------------
+    def _group_kwargs(self, pairs):
+
+        first = pairs[0]
+
+        if len(pairs) == 1:
+            return dict(
+                source=first.source,
+                destination=first.destination,
+                includes=first.includes,
+                excludes=first.excludes,
+                delete=self._delete,
+                engine=ENGINE_RSYNC,
+            )
+
+        rel_paths = sorted(set(p.rel_path for p in pairs))
+
+        includes = []
+        excludes = []
+
+        # a pair's parent usually excludes it, to sync it separately. in the
+        # batch it is part of the same transfer, so include it explicitly.
+        # rsync uses the first matching rule, so these come first.
+        for rel_path in rel_paths:
+            if rel_path != ".":
+                includes.append("/" + rel_path + "/")
+
+        for pair in pairs:
+            includes.extend(pair.rooted_includes)
+            excludes.extend(pair.rooted_excludes)
+
+        return dict(
+            source=first.source_root,
+            destination=first.dest_root,
+            includes=_unique(includes),
+            excludes=_unique(excludes),
+            delete=self._delete,
+            engine=ENGINE_RSYNC,
+            files_from=rel_paths,
+        )
+
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _SyncPair(object):
+
+    # ------------------------------------------------------------------------
+    def __init__(self, source, destination, includes, excludes):
+
+        self.source = source
+        self.destination = destination
+        self.includes = list(includes)
+        self.excludes = list(excludes)
+
+        (self.source_root, self.dest_root, self.rel_path) = \
+            _split_roots(source, destination)
+
+    # ------------------------------------------------------------------------
+    @property
+    def group_key(self):
+
+        # anchored patterns are rewritten per pair. unanchored patterns apply
+        # to the whole transfer, so they must match to share one.
+        return (
+            self.source_root,
+            self.dest_root,
+            tuple(p for p in self.includes if not p.startswith("/")),
+            tuple(p for p in self.excludes if not p.startswith("/")),
+        )
+
+    # ------------------------------------------------------------------------
+    @property
+    def rooted_includes(self):
+        return [self._rooted(p) for p in self.includes]
+
+    # ------------------------------------------------------------------------
+    @property
+    def rooted_excludes(self):
+        return [self._rooted(p) for p in self.excludes]
+
+    # ------------------------------------------------------------------------
+    def _rooted(self, pattern):
+
+        if pattern.startswith("/") and self.rel_path != ".":
+            return "/" + self.rel_path + pattern
+
+        return pattern
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _job_runner(job_kwargs):
+
+    def _run():
+
+        job = SyncJobManager().submit(**job_kwargs)
+        job.wait()
+
+        if job.status == SyncJob.CANCELLED:
+            raise SyncJobError("Sync cancelled.")
+        elif job.status != SyncJob.SUCCESS:
+            raise SyncJobError(job.error)
+
+        return job
+
+    return _run
+
+# ----------------------------------------------------------------------------
+def _split_path(path):
+    """Returns the [user@]host: prefix (or '') and the path."""
+
+    if remote_host(path):
+        (prefix, path) = path.split(":", 1)
+        return (prefix + ":", path)
+
+    return ("", path)
+
+# ----------------------------------------------------------------------------
+def _split_roots(source, destination):
+    """Returns the source root, destination root and relative path."""
+
+    (source_prefix, source_path) = _split_path(source)
+    (dest_prefix, dest_path) = _split_path(destination)
+
+    source_parts = source_path.rstrip("/").split("/")
+    dest_parts = dest_path.rstrip("/").split("/")
+
+    # the roots always keep at least their first component
+    common = 0
+    while (common < min(len(source_parts), len(dest_parts)) - 1 and
+        source_parts[-1 - common] == dest_parts[-1 - common]):
+        common += 1
+
+    if common:
+        rel_path = "/".join(source_parts[-common:])
+        source_parts = source_parts[:-common]
+        dest_parts = dest_parts[:-common]
+    else:
+        rel_path = "."
+
+    source_root = source_prefix + "/".join(source_parts) + "/"
+    dest_root = dest_prefix + "/".join(dest_parts) + "/"
+
+    return (source_root, dest_root, rel_path)
+
+# ----------------------------------------------------------------------------
+def _unique(items):
+
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+
+    return unique
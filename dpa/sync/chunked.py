@@ -0,0 +1,622 @@
+"""Transfer very large files as chunks over parallel streams.
+
+A single ssh stream is limited by per-connection throughput, so large caches
+(alembic, vdb, mari archives) dominate the time to sync to another location.
+A chunked transfer splits a file into fixed size chunks and writes them into
+a partial file at the destination over several streams at once. Each chunk
+is verified against the source once written, and the completed chunks are
+recorded in a journal so an interrupted transfer resumes where it left off.
+Once every chunk is in place, the partial file is renamed over the
+destination and given the source's modification time.
+
+Classes
+-------
+ChunkedTransfer
+    Transfers a single local file to a destination in parallel chunks.
+
+LocalTransport
+    Reads and writes chunks of locally mounted files.
+
+SshTransport
+    Reads and writes chunks of files on a remote host over ssh.
+
+ThrottledTransport
+    Limits the throughput of each stream of another transport.
+
+ChunkedTransferError
+    Raised when a chunked transfer fails.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import errno
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import pipes
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from dpa.logging import Logger
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# files at least this large are transferred in chunks by rsync sync jobs
+DEFAULT_CHUNK_THRESHOLD = 256 * 1024 * 1024
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_STREAMS = 4
+
+# bytes read from the source and written to a stream at a time
+BLOCK_SIZE = 1024 * 1024
+
+# attempts to write a chunk that fails verification before giving up
+CHUNK_ATTEMPTS = 2
+
+# appended to the destination path while the transfer is in progress
+PART_SUFFIX = ".dpa_part"
+
+# directory below the shared log directory holding transfer journals
+JOURNAL_DIR = "sync_chunks"
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class ChunkedTransfer(object):
+    """Transfers a single local file to a destination in parallel chunks.
+
+    Usage::
+
+        >>> transfer = ChunkedTransfer("/path/to/cache.abc",
+        ...     "host:/path/to/cache.abc", streams=8)
+        >>> transfer.run()
+        >>> print transfer.bytes_transferred, transfer.chunks_resumed
+
+    The destination may be a local path or an rsync style [user@]host:path,
+    in which case chunks are written over ssh. Another transport may be
+    supplied, for example a :py:class:`ThrottledTransport` standing in for a
+    slow link when testing.
+
+    A destination that already has the source's size and modification time
+    is considered up to date and is not transferred, as with rsync.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, source, destination, transport=None,
+        streams=DEFAULT_STREAMS, chunk_size=DEFAULT_CHUNK_SIZE):
+
+        if transport is None:
+            (transport, destination) = transport_for(destination)
+
+        self._source = source
+        self._destination = destination
+        self._transport = transport
+        self._streams = max(1, int(streams))
+        self._chunk_size = max(BLOCK_SIZE, int(chunk_size))
+
+        self._bytes_transferred = 0
+        self._chunks_transferred = 0
+        self._chunks_resumed = 0
+        self._up_to_date = False
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def run(self):
+        """Transfer the file. Resumes a previously interrupted transfer."""
+
+        try:
+            info = os.stat(self._source)
+        except OSError as e:
+            raise ChunkedTransferError("Unable to read source: " + str(e))
+
+        size = info.st_size
+        mtime = int(info.st_mtime)
+
+        dest_info = self._transport.stat(self._destination)
+        if dest_info and dest_info[0] == size and int(dest_info[1]) == mtime:
+            self._up_to_date = True
+            return
+
+        part_path = self._destination + PART_SUFFIX
+        journal = _Journal(self._source,
+            self._transport.address(self._destination), size, mtime,
+            self._chunk_size)
+
+        # chunks recorded as complete are only trusted if the partial file
+        # they were written to is still there
+        part_info = self._transport.stat(part_path)
+        if part_info is None or part_info[0] != size:
+            journal.reset()
+        self._transport.prepare(part_path, size)
+
+        chunks = []
+        for offset in xrange(0, size, self._chunk_size):
+            if journal.done(offset):
+                self._chunks_resumed += 1
+            else:
+                chunks.append((offset, min(self._chunk_size, size - offset)))
+
+        def _transfer(chunk):
+            (offset, length) = chunk
+            digest = self._send_chunk(part_path, offset, length)
+            with self._lock:
+                journal.complete(offset, digest)
+                self._chunks_transferred += 1
+                self._bytes_transferred += length
+
+        if self._streams > 1 and len(chunks) > 1:
+            pool = ThreadPool(min(self._streams, len(chunks)))
+            try:
+                for _ in pool.imap_unordered(_transfer, chunks):
+                    pass
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for chunk in chunks:
+                _transfer(chunk)
+
+        self._transport.commit(part_path, self._destination, mtime)
+        journal.remove()
+
+    # ------------------------------------------------------------------------
+    def cancel(self):
+        """Stop the transfer after the chunks currently being sent.
+
+        The transfer raises ChunkedTransferError. Completed chunks are kept
+        for the next attempt to resume from.
+
+        """
+        self._cancelled = True
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        return self._bytes_transferred
+
+    # ------------------------------------------------------------------------
+    @property
+    def chunks_transferred(self):
+        return self._chunks_transferred
+
+    # ------------------------------------------------------------------------
+    @property
+    def chunks_resumed(self):
+        """Chunks skipped because an earlier attempt transferred them."""
+        return self._chunks_resumed
+
+    # ------------------------------------------------------------------------
+    @property
+    def up_to_date(self):
+        """True if the destination already matched the source."""
+        return self._up_to_date
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _send_chunk(self, part_path, offset, length):
+        """Write and verify a chunk. Returns the chunk's md5 hex digest."""
+
+        for attempt in range(CHUNK_ATTEMPTS):
+
+            if self._cancelled:
+                raise ChunkedTransferError("Transfer cancelled.")
+
+            digest = hashlib.md5()
+            self._transport.write(part_path, offset,
+                self._read_blocks(offset, length, digest))
+            digest = digest.hexdigest()
+
+            if self._transport.checksum(part_path, offset, length) == digest:
+                return digest
+
+            Logger.get("sync").warning(
+                "Chunk at {o} of {d} failed verification.".format(
+                    o=offset, d=self._destination))
+
+        raise ChunkedTransferError(
+            "Unable to verify chunk at {o} of {d}".format(
+                o=offset, d=self._destination))
+
+    # ------------------------------------------------------------------------
+    def _read_blocks(self, offset, length, digest):
+
+        try:
+            source_fh = open(self._source, 'rb')
+        except IOError as e:
+            raise ChunkedTransferError("Unable to read source: " + str(e))
+
+        with source_fh:
+            source_fh.seek(offset)
+            remaining = length
+            while remaining:
+                if self._cancelled:
+                    raise ChunkedTransferError("Transfer cancelled.")
+                try:
+                    block = source_fh.read(min(BLOCK_SIZE, remaining))
+                except IOError as e:
+                    raise ChunkedTransferError(
+                        "Unable to read source: " + str(e))
+                if not block:
+                    raise ChunkedTransferError(
+                        "Source changed during transfer: " + self._source)
+                digest.update(block)
+                remaining -= len(block)
+                yield block
+
+# ----------------------------------------------------------------------------
+class LocalTransport(object):
+    """Reads and writes chunks of locally mounted files.
+
+    Transports implement ``address``, ``stat``, ``prepare``, ``write``,
+    ``checksum``, ``commit`` and ``remove``. Each method may be called from
+    several streams at once.
+
+    """
+
+    # ------------------------------------------------------------------------
+    def address(self, path):
+        """The path qualified by its host, as host:path."""
+        return socket.gethostname() + ":" + path
+
+    # ------------------------------------------------------------------------
+    def stat(self, path):
+        """Returns the (size, mtime) of the path, or None if it's missing."""
+
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+
+        return (info.st_size, info.st_mtime)
+
+    # ------------------------------------------------------------------------
+    def prepare(self, part_path, size):
+        """Create the partial file at its final size, keeping contents."""
+
+        try:
+            _make_dirs(os.path.dirname(part_path))
+            with open(part_path, 'ab') as part_fh:
+                part_fh.truncate(size)
+        except (IOError, OSError) as e:
+            raise ChunkedTransferError(
+                "Unable to create partial file: " + str(e))
+
+    # ------------------------------------------------------------------------
+    def write(self, part_path, offset, blocks):
+        """Write the blocks to the partial file, starting at the offset."""
+
+        try:
+            with open(part_path, 'r+b') as part_fh:
+                part_fh.seek(offset)
+                for block in blocks:
+                    part_fh.write(block)
+        except (IOError, OSError) as e:
+            raise ChunkedTransferError("Unable to write chunk: " + str(e))
+
+    # ------------------------------------------------------------------------
+    def checksum(self, part_path, offset, length):
+        """Returns the md5 hex digest of a range of the partial file."""
+
+        digest = hashlib.md5()
+        try:
+            with open(part_path, 'rb') as part_fh:
+                part_fh.seek(offset)
+                remaining = length
+                while remaining:
+                    block = part_fh.read(min(BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    digest.update(block)
+                    remaining -= len(block)
+        except IOError as e:
+            raise ChunkedTransferError("Unable to verify chunk: " + str(e))
+
+        return digest.hexdigest()
+
+    # ------------------------------------------------------------------------
+    def commit(self, part_path, path, mtime):
+        """Move the completed partial file into place."""
+
+        try:
+            os.utime(part_path, (time.time(), mtime))
+            os.rename(part_path, path)
+        except OSError as e:
+            raise ChunkedTransferError(
+                "Unable to complete transfer: " + str(e))
+
+    # ------------------------------------------------------------------------
+    def remove(self, path):
+
+        try:
+            os.remove(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise ChunkedTransferError("Unable to remove: " + str(e))
+
+# ----------------------------------------------------------------------------
+class SshTransport(object):
+    """Reads and writes chunks of files on a remote host over ssh.
+
+    Each call runs a command on the host with ssh, so each stream is a
+    separate connection. Chunks are written and read with GNU dd.
+
+    """
+
+    # ------------------------------------------------------------------------
+    def __init__(self, host):
+        """The host may include a user, as user@host."""
+        self._host = host
+
+    # ------------------------------------------------------------------------
+    def address(self, path):
+        return self._host + ":" + path
+
+    # ------------------------------------------------------------------------
+    def stat(self, path):
+
+        (status, output) = self._run(
+            "stat -c '%s %Y' " + pipes.quote(path), check=False)
+        if status != 0:
+            return None
+
+        try:
+            (size, mtime) = output.split()
+            return (int(size), int(mtime))
+        except ValueError:
+            raise ChunkedTransferError(
+                "Unexpected stat output: " + output.strip())
+
+    # ------------------------------------------------------------------------
+    def prepare(self, part_path, size):
+
+        self._run("mkdir -p {d} && touch {p} && truncate -s {s} {p}".format(
+            d=pipes.quote(os.path.dirname(part_path)),
+            p=pipes.quote(part_path),
+            s=int(size),
+        ))
+
+    # ------------------------------------------------------------------------
+    def write(self, part_path, offset, blocks):
+
+        command = ("dd of={p} bs={b} oflag=seek_bytes seek={o} " + \
+            "conv=notrunc status=none").format(
+            p=pipes.quote(part_path), b=BLOCK_SIZE, o=int(offset))
+
+        proc = subprocess.Popen(self._ssh_args(command),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+
+        try:
+            for block in blocks:
+                proc.stdin.write(block)
+        except IOError:
+            # the remote side went away. its exit status says why.
+            pass
+        except:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            try:
+                proc.stdin.close()
+            except IOError:
+                pass
+
+        output = proc.stdout.read()
+        if proc.wait() != 0:
+            raise ChunkedTransferError(
+                "Unable to write chunk to {h}: {o}".format(
+                    h=self._host, o=output.strip()))
+
+    # ------------------------------------------------------------------------
+    def checksum(self, part_path, offset, length):
+
+        command = ("dd if={p} bs={b} iflag=skip_bytes,count_bytes " + \
+            "skip={o} count={l} status=none | md5sum").format(
+            p=pipes.quote(part_path), b=BLOCK_SIZE, o=int(offset),
+            l=int(length))
+
+        (status, output) = self._run(command)
+        return output.split()[0] if output.split() else None
+
+    # ------------------------------------------------------------------------
+    def commit(self, part_path, path, mtime):
+
+        self._run("touch -m -d @{m} {p} && mv -f {p} {d}".format(
+            m=int(mtime), p=pipes.quote(part_path), d=pipes.quote(path)))
+
+    # ------------------------------------------------------------------------
+    def remove(self, path):
+        self._run("rm -f " + pipes.quote(path))
+
+    # ------------------------------------------------------------------------
+    def _run(self, command, check=True):
+
+        proc = subprocess.Popen(self._ssh_args(command),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (output, error) = proc.communicate()
+
+        if check and proc.returncode != 0:
+            raise ChunkedTransferError("Command failed on {h}: {e}".format(
+                h=self._host, e=error.strip()))
+
+        return (proc.returncode, output)
+
+    # ------------------------------------------------------------------------
+    def _ssh_args(self, command):
+        return ["ssh", "-o", "BatchMode=yes", self._host, command]
+
+# ----------------------------------------------------------------------------
+class ThrottledTransport(object):
+    """Limits the throughput of each stream of another transport.
+
+    Stands in for a slow link when testing against localhost: with a per
+    stream limit, as with a single ssh connection over a long distance,
+    more streams means more throughput.
+
+    """
+
+    # ------------------------------------------------------------------------
+    def __init__(self, transport, bytes_per_second):
+
+        self._transport = transport
+        self._rate = float(bytes_per_second)
+
+    # ------------------------------------------------------------------------
+    def __getattr__(self, name):
+        return getattr(self._transport, name)
+
+    # ------------------------------------------------------------------------
+    def write(self, part_path, offset, blocks):
+        self._transport.write(part_path, offset, self._throttle(blocks))
+
+    # ------------------------------------------------------------------------
+    def _throttle(self, blocks):
+
+        start = time.time()
+        sent = 0
+        for block in blocks:
+            yield block
+            sent += len(block)
+            delay = sent / self._rate - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+# ----------------------------------------------------------------------------
+class ChunkedTransferError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def transport_for(path):
+    """Returns the transport and path for a local or [user@]host:path."""
+
+    # same rules as dpa.sync.job.remote_host
+    if ":" in path and "/" not in path.split(":", 1)[0]:
+        (host, path) = path.split(":", 1)
+        return (SshTransport(host), path)
+
+    return (LocalTransport(), path)
+
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _Journal(object):
+    """The chunks of a transfer that are complete.
+
+    Kept in the shared log directory rather than at the destination so that
+    recording a chunk never needs a round trip to a remote host. The
+    destination is given as host:path.
+
+    """
+
+    # ------------------------------------------------------------------------
+    def __init__(self, source, destination, size, mtime, chunk_size):
+
+        self._key = {
+            'source': source,
+            'destination': destination,
+            'size': size,
+            'mtime': mtime,
+            'chunk_size': chunk_size,
+        }
+        self._chunks = {}
+
+        # the destination includes its host. the same path on different
+        # hosts is a different file.
+        name = hashlib.md5(destination).hexdigest() + ".json"
+        self._path = os.path.join(_journal_dir(), name)
+
+        try:
+            with open(self._path) as journal_fh:
+                data = json.load(journal_fh)
+        except (IOError, ValueError):
+            return
+
+        # a journal for a different version of the source is useless
+        if data.get('key') == self._key:
+            self._chunks = data.get('chunks', {})
+
+    # ------------------------------------------------------------------------
+    def done(self, offset):
+        return str(offset) in self._chunks
+
+    # ------------------------------------------------------------------------
+    def complete(self, offset, digest):
+
+        self._chunks[str(offset)] = digest
+        self._write()
+
+    # ------------------------------------------------------------------------
+    def reset(self):
+        self._chunks = {}
+
+    # ------------------------------------------------------------------------
+    def remove(self):
+
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------------
+    def _write(self):
+
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(
+                prefix="." + os.path.basename(self._path),
+                dir=os.path.dirname(self._path))
+            with os.fdopen(fd, 'w') as journal_fh:
+                json.dump({'key': self._key, 'chunks': self._chunks},
+                    journal_fh)
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError) as e:
+            # the journal only saves time when resuming
+            Logger.get("sync").warning(
+                "Unable to write transfer journal: " + str(e))
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _journal_dir():
+
+    journal_dir = os.path.join(Logger.log_dir, JOURNAL_DIR)
+    if os.path.isdir(journal_dir):
+        return journal_dir
+
+    # shared by everyone syncing
+    try:
+        _make_dirs(journal_dir)
+        os.chmod(journal_dir, 0777)
+    except OSError:
+        return tempfile.gettempdir()
+
+    return journal_dir
+
+# ----------------------------------------------------------------------------
+def _make_dirs(path):
+
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
@@ -0,0 +1,108 @@
+"""Sync only some of the frames of an image sequence.
+
+Image sequences are described by a file name pattern with a frame number
+placeholder, either a run of '#' characters (one per digit, as in Nuke) or a
+printf style '%04d'. Any other token read by
+:py:func:`dpa.sequence.parse_pattern` works too. The placeholder sits
+between the base, ending in a '.' or '_', and the extension. Paths may
+include directories, relative to the root of the sync.
+
+Classes
+-------
+FramePattern
+    An image sequence file name pattern.
+
+FramePatternError
+    Raised for a pattern without a valid frame placeholder.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from dpa.frange import Frange
+from dpa.sequence import parse_pattern
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class FramePattern(object):
+    """An image sequence file name pattern.
+
+    Usage::
+
+        >>> pattern = FramePattern("exr/layer.####.exr")
+        >>> pattern.path(1001)
+        'exr/layer.1001.exr'
+        >>> pattern.paths(Frange("1001-1003"))
+        ['exr/layer.1001.exr', 'exr/layer.1002.exr', 'exr/layer.1003.exr']
+
+    Negative frames are padded to the same width, including the sign, as
+    with printf.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, pattern):
+
+        parsed = parse_pattern(pattern)
+
+        # the base is greedy. a second placeholder would be left in it.
+        if not parsed or "#" in parsed[0] or "%" in parsed[0]:
+            raise FramePatternError(
+                "Pattern must have exactly one frame placeholder " + \
+                "('####' or '%04d'): " + pattern
+            )
+
+        (base, padding, ext) = parsed
+
+        self._pattern = pattern
+        self._padding = padding or 0
+        self._prefix = base
+        self._suffix = ext
+
+    # ------------------------------------------------------------------------
+    def __str__(self):
+        return self._pattern
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def path(self, frame):
+        """The path of a single frame."""
+
+        return "{p}{f:0{w}d}{s}".format(
+            p=self._prefix, f=int(frame), w=self._padding, s=self._suffix)
+
+    # ------------------------------------------------------------------------
+    def paths(self, frames):
+        """The sorted, unique paths of the frames.
+
+        ``frames`` may be a Frange, a frame range string such as
+        '1001-1050:2', or a list of frame numbers.
+
+        """
+
+        if not isinstance(frames, Frange):
+            frames = Frange(frames)
+
+        return [self.path(f) for f in sorted(set(frames.frames))]
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def padding(self):
+        return self._padding
+
+    # ------------------------------------------------------------------------
+    @property
+    def pattern(self):
+        return self._pattern
+
+# ----------------------------------------------------------------------------
+class FramePatternError(Exception):
+    pass
@@ -0,0 +1,1135 @@
+"""Sync jobs with handles, progress, throughput and job records.
+
+Classes
+-------
+SyncJob
+    A single sync running in the background.
+
+SyncJobManager
+    Starts and tracks the sync jobs of the current process.
+
+Each job writes a json record, updated as it progresses, to the user's
+directory below ``sync_jobs`` in the sync directory (``$DPA_SYNC_DIR``, a
+local temp directory by default). Records are removed after a week. Syncs to
+and from a remote host can be limited to a number of concurrent jobs across
+all processes sharing the sync directory (``$DPA_SYNC_SLOTS``), so many syncs
+at once don't saturate the link to a single location.
+
+With the default, local sync directory, slots limit the syncs of a single
+workstation. To limit the syncs of every workstation at a location, set
+``$DPA_SYNC_DIR`` to a directory on shared storage that supports flock.
+
+The shared directories are sticky, so users can only remove or replace
+their own slots and records. Each user's records are kept in a directory
+only they can write to.
+
+A job started detached runs in its own session, in a separate process, so
+it completes after the process starting it exits.
+
+The rsync engine reports progress and skips missing ``files_from`` paths
+with options added in rsync 3.1. With older versions of rsync, percent
+complete is only known once the job finishes and missing paths are skipped
+only for local sources.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import errno
+import fcntl
+import itertools
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from dpa.env.vars import DpaVars
+from dpa.logging import Logger
+from dpa.singleton import Singleton
+from dpa.sync.chunked import (
+    ChunkedTransfer, ChunkedTransferError, DEFAULT_CHUNK_THRESHOLD,
+)
+from dpa.sync.manifest import FilterRules, Manifest, ManifestError, TYPE_FILE
+from dpa.sync.native import NativeSync, NativeSyncError
+from dpa.user import current_username
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# sync engines. auto currently resolves to rsync, the native engine is only
+# used when asked for. jobs must be given a resolved engine.
+ENGINE_AUTO = "auto"
+ENGINE_NATIVE = "native"
+ENGINE_RSYNC = "rsync"
+ENGINES = [ENGINE_AUTO, ENGINE_NATIVE, ENGINE_RSYNC]
+
+# directories below the sync directory
+JOB_RECORD_DIR = "sync_jobs"
+SLOT_DIR = "sync_slots"
+
+# the sync directory below the temp directory, unless $DPA_SYNC_DIR is set
+DEFAULT_SYNC_DIR = "dpa_sync"
+
+# seconds after which finished jobs' records and output are removed
+RECORD_MAX_AGE = 7 * 24 * 60 * 60
+
+# seconds between checks on a running rsync, or for a free slot
+POLL_INTERVAL = 0.5
+
+# seconds between updates of a running job's record
+RECORD_INTERVAL = 5.0
+
+# rsync exit status when source files vanished during the transfer. the rest
+# of the transfer completed normally.
+RSYNC_VANISHED_STATUS = 24
+
+# patterns for rsync --stats totals. older versions of rsync don't include
+# the 'regular' or separate thousands with commas.
+_FILES_STAT_REGEX = re.compile(
+    r"Number of (?:regular )?files transferred: ([\d,]+)")
+_BYTES_STAT_REGEX = re.compile(
+    r"Total transferred file size: ([\d,]+) bytes")
+
+# rsync --info=progress2 lines: bytes so far, percent, rate, eta, ...
+_PROGRESS_REGEX = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s")
+
+# the first line of rsync --version
+_VERSION_REGEX = re.compile(r"version\s+(\d+)\.(\d+)")
+
+# the rsync version adding --info=progress2 and --ignore-missing-args
+_RSYNC_INFO_VERSION = (3, 1)
+
+# the installed rsync's (major, minor) version, once checked
+_rsync_version = None
+
+# run by the process of a detached job. the job's arguments are read from
+# stdin.
+_DETACHED_SCRIPT = "from dpa.sync.job import _run_detached; _run_detached()"
+
+# unique job ids within the process
+_job_counter = itertools.count(1)
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class SyncJob(object):
+    """A single sync running in the background.
+
+    Usage::
+
+        >>> job = SyncJob("/path/to/source/", "user@host:/path/to/dest/")
+        >>> job.start()
+        >>> while job.poll() is None:
+        ...     print job.percent
+        >>> print job.status, job.throughput
+
+    If ``files_from`` is a list of paths relative to the source, only those
+    paths (and, for directories, everything below them) are synced, as with
+    rsync's --files-from. Relative paths are recreated below the destination.
+    Listed paths missing from the source are skipped rather than failing the
+    job, so sparse frame ranges can be listed in full.
+
+    If ``streams`` is more than 1, an rsync job from a local source to a
+    remote destination first sends files of at least ``chunk_threshold``
+    bytes as chunks over that many parallel ssh streams (see
+    :py:mod:`dpa.sync.chunked`), then rsyncs the smaller files.
+
+    Jobs that need a slot wait for one before starting. A job waiting for a
+    slot or running may be cancelled. An rsync job keeps its slot until rsync
+    exits.
+
+    A job runs on a background thread of this process, which must wait for
+    it before exiting, unless started with ``detach=True``. A detached job
+    runs in a separate process that outlives this one. Its status and
+    progress are read from its record.
+
+    """
+
+    PENDING = 'pending'
+    WAITING = 'waiting'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, source, destination, includes=None, excludes=None,
+        delete=False, engine=ENGINE_RSYNC, link_dest=None, reflink=False,
+        slot_key=None, slots=None, files_from=None, streams=None,
+        chunk_threshold=DEFAULT_CHUNK_THRESHOLD):
+
+        self._source = source
+        self._destination = destination
+        self._includes = includes or []
+        self._excludes = excludes or []
+        self._delete = delete
+        self._engine = engine
+        self._link_dest = link_dest
+        self._reflink = reflink
+        self._slot_key = slot_key
+        self._slots = slots
+        self._files_from = files_from
+        self._streams = streams
+        self._chunk_threshold = chunk_threshold
+
+        self._id = "{t}-{h}-{p}-{n}".format(
+            t=time.strftime("%Y%m%d%H%M%S"),
+            h=socket.gethostname().split(".")[0],
+            p=os.getpid(),
+            n=next(_job_counter),
+        )
+
+        self._status = self.__class__.PENDING
+        self._cancel = threading.Event()
+        self._thread = None
+        self._detached = None
+        self._proc = None
+        self._native = None
+        self._chunked = None
+        self._chunked_bytes = 0
+        self._chunked_files = 0
+        self._max_size = None
+
+        self._start_time = None
+        self._end_time = None
+        self._returncode = None
+        self._error = None
+        self._warning = None
+        self._percent = None
+        self._bytes_done = 0
+        self._bytes_transferred = None
+        self._files_transferred = None
+        self._files_linked = 0
+        self._files_cloned = 0
+        self._last_record = 0
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def start(self, detach=False):
+        """Start the job in the background.
+
+        If ``detach`` is True, the job runs in a separate process that keeps
+        running if this process exits.
+
+        """
+
+        if self._thread or self._detached:
+            raise SyncJobError("Job already started: " + self.id)
+
+        if detach:
+            self._start_detached()
+            return
+
+        # a daemon thread, so an interrupted wait doesn't hang the exit.
+        # the thread is waited on, anything else should detach.
+        self._thread = threading.Thread(target=self._run, name=self.id)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def wait(self, timeout=None):
+        """Wait for the job to finish. Returns the status, or None if the
+        timeout expires first."""
+
+        if not self._thread and not self._detached:
+            raise SyncJobError("Job not started: " + self.id)
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        if self._detached:
+            while self._detached.poll() is None:
+                remaining = POLL_INTERVAL
+                if deadline is not None:
+                    remaining = min(remaining, deadline - time.time())
+                    if remaining <= 0:
+                        return None
+                time.sleep(remaining)
+            self._read_record()
+            return self._status
+
+        # joining in short intervals keeps the main thread responsive to
+        # keyboard interrupts
+        while self._thread.is_alive():
+            remaining = POLL_INTERVAL
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.time())
+                if remaining <= 0:
+                    return None
+            self._thread.join(remaining)
+
+        return self._status
+
+    # ------------------------------------------------------------------------
+    def poll(self):
+        """Returns the status if the job has finished, otherwise None."""
+
+        if self._detached and not self.done:
+            self._detached.poll()
+            self._read_record()
+
+        if self.done:
+            return self._status
+
+        return None
+
+    # ------------------------------------------------------------------------
+    def cancel(self):
+        """Cancel the job if it is waiting for a slot or running."""
+
+        self._cancel.set()
+
+        # the detached process cancels the job when terminated
+        detached = self._detached
+        if detached and detached.poll() is None:
+            try:
+                detached.terminate()
+            except OSError:
+                pass
+
+        if self._native:
+            self._native.cancel()
+
+        if self._chunked:
+            self._chunked.cancel()
+
+        proc = self._proc
+        if proc and proc.poll() is None:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+        """Returns a json serializable record of the job."""
+
+        return {
+            'id': self.id,
+            'source': self._source,
+            'destination': self._destination,
+            'engine': self._engine,
+            'slot_key': self._slot_key,
+            'status': self._status,
+            'user': current_username(),
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'rsync_pid': self._proc.pid if self._proc else None,
+            'start': self._start_time,
+            'end': self._end_time,
+            'elapsed': self.elapsed,
+            'percent': self._percent,
+            'bytes_transferred': self.bytes_transferred,
+            'files_transferred': self._files_transferred,
+            'files_linked': self._files_linked,
+            'files_cloned': self._files_cloned,
+            'throughput': self.throughput,
+            'returncode': self._returncode,
+            'error': self._error,
+            'warning': self._warning,
+        }
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def id(self):
+        return self._id
+
+    # ------------------------------------------------------------------------
+    @property
+    def status(self):
+        return self._status
+
+    # ------------------------------------------------------------------------
+    @property
+    def done(self):
+        return self._status in (
+            self.__class__.SUCCESS,
+            self.__class__.FAILED,
+            self.__class__.CANCELLED,
+        )
+
+    # ------------------------------------------------------------------------
+    @property
+    def succeeded(self):
+        return self._status == self.__class__.SUCCESS
+
+    # ------------------------------------------------------------------------
+    @property
+    def error(self):
+        return self._error
+
+    # ------------------------------------------------------------------------
+    @property
+    def warning(self):
+        return self._warning
+
+    # ------------------------------------------------------------------------
+    @property
+    def returncode(self):
+        """The rsync exit status. None for native jobs."""
+        return self._returncode
+
+    # ------------------------------------------------------------------------
+    @property
+    def percent(self):
+        """Percent complete, if known."""
+        return self._percent
+
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        """Bytes transferred. While running, the bytes transferred so far."""
+
+        if self._bytes_transferred is not None:
+            return self._bytes_transferred
+
+        if self._native:
+            return self._native.bytes_transferred
+
+        chunked_bytes = self._chunked_bytes
+        if self._chunked:
+            chunked_bytes += self._chunked.bytes_transferred
+
+        return chunked_bytes + self._bytes_done
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_transferred(self):
+        return self._files_transferred
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_linked(self):
+        return self._files_linked
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_cloned(self):
+        return self._files_cloned
+
+    # ------------------------------------------------------------------------
+    @property
+    def elapsed(self):
+        """Seconds spent running, not including waiting for a slot."""
+
+        if self._start_time is None:
+            return None
+
+        return (self._end_time or time.time()) - self._start_time
+
+    # ------------------------------------------------------------------------
+    @property
+    def throughput(self):
+        """Bytes transferred per second."""
+
+        elapsed = self.elapsed
+        if not elapsed:
+            return None
+
+        return int(self.bytes_transferred / elapsed)
+
+    # ------------------------------------------------------------------------
+    @property
+    def record_path(self):
+        return os.path.join(_job_record_dir(), self.id + ".json")
+
+    # ------------------------------------------------------------------------
+    @property
+    def _chunking(self):
+        """True if large files are sent in chunks before running rsync."""
+
+        return bool(self._streams and self._streams > 1 and
+            self._engine == ENGINE_RSYNC and
+            not remote_host(self._source) and
+            remote_host(self._destination))
+
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _run(self):
+
+        slot_fd = None
+
+        try:
+            if self._slot_key and self._slots:
+                self._status = self.__class__.WAITING
+                self._write_record()
+                slot_fd = _acquire_slot(self._slot_key, self._slots,
+                    self._cancel)
+
+            if self._cancel.is_set():
+                self._status = self.__class__.CANCELLED
+                return
+
+            self._status = self.__class__.RUNNING
+            self._start_time = time.time()
+            self._write_record()
+
+            if self._engine == ENGINE_NATIVE:
+                self._run_native()
+            else:
+                if self._chunking:
+                    self._run_chunked()
+                if not self._cancel.is_set():
+                    self._run_rsync(slot_fd)
+                else:
+                    self._status = self.__class__.CANCELLED
+
+        except Exception as e:
+            self._error = str(e)
+            self._status = self.__class__.FAILED
+
+        finally:
+            if slot_fd is not None:
+                os.close(slot_fd)
+            if self._start_time is not None:
+                self._end_time = time.time()
+            self._write_record()
+
+    # ------------------------------------------------------------------------
+    def _run_native(self):
+
+        self._native = NativeSync(
+            self._source,
+            self._destination,
+            includes=self._includes,
+            excludes=self._excludes,
+            delete=self._delete,
+            link_dest=self._link_dest,
+            reflink=self._reflink,
+            files_from=self._files_from,
+        )
+
+        try:
+            self._native.run()
+        except NativeSyncError as e:
+            if self._cancel.is_set():
+                self._status = self.__class__.CANCELLED
+                return
+            raise
+
+        self._bytes_transferred = self._native.bytes_transferred
+        self._files_transferred = self._native.files_transferred
+        self._files_linked = self._native.files_linked
+        self._files_cloned = self._native.files_cloned
+        self._percent = 100
+        self._status = self.__class__.SUCCESS
+
+    # ------------------------------------------------------------------------
+    def _run_rsync(self, slot_fd):
+
+        info = _installed_rsync_version() >= _RSYNC_INFO_VERSION
+
+        args = ["rsync", "-a", "-O", "--stats"]
+        if info:
+            args.append("--info=progress2")
+
+        for include in self._includes:
+            args.append('--include={i}'.format(i=include))
+
+        for exclude in self._excludes:
+            args.append('--exclude={i}'.format(i=exclude))
+
+        if self._delete:
+            args.append("--delete-after")
+
+        if self._link_dest:
+            args.append('--link-dest={d}'.format(d=self._link_dest))
+
+        # large files have already been sent in chunks
+        if self._max_size is not None:
+            args.append('--max-size={s}'.format(s=self._max_size))
+
+        # rsync's output goes to a file rather than a pipe so that it can
+        # outlive this process without being killed by a broken pipe.
+        out_path = os.path.join(_job_record_dir(), self.id + ".out")
+
+        # --files-from doesn't recurse into listed directories without -r
+        files_path = None
+        if self._files_from:
+            files_from = self._files_from
+            if info:
+                args.append("--ignore-missing-args")
+            elif not remote_host(self._source):
+                files_from = [f for f in files_from
+                    if os.path.lexists(os.path.join(self._source, f))]
+            files_path = os.path.join(_job_record_dir(), self.id + ".files")
+            with open(files_path, 'w') as files_fh:
+                files_fh.write("\n".join(files_from) + "\n")
+            args.extend(["-r", '--files-from={f}'.format(f=files_path)])
+
+        args.extend([self._source, self._destination])
+
+        # the slot lock is inherited by rsync so the slot stays held until
+        # rsync exits, even if this process doesn't wait around.
+        def _inherit_slot():
+            if slot_fd is not None:
+                fcntl.fcntl(slot_fd, fcntl.F_SETFD, 0)
+
+        with open(out_path, 'w') as out_fh:
+            try:
+                self._proc = subprocess.Popen(args, stdout=out_fh,
+                    stderr=subprocess.STDOUT, preexec_fn=_inherit_slot)
+            except OSError as e:
+                os.remove(out_path)
+                if files_path:
+                    os.remove(files_path)
+                raise SyncJobError("Unable to run rsync: " + str(e))
+
+        # read with os.read. a file object won't see data appended after it
+        # has reached the end of the file.
+        tail = ""
+        read_fd = os.open(out_path, os.O_RDONLY)
+        try:
+            while True:
+                finished = self._proc.poll() is not None
+                data = _read_all(read_fd)
+                if data:
+                    tail = (tail + data)[-16384:]
+                    self._parse_progress(tail)
+                if finished:
+                    break
+                if time.time() - self._last_record > RECORD_INTERVAL:
+                    self._write_record()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            os.close(read_fd)
+
+        self._returncode = self._proc.returncode
+
+        if files_path:
+            os.remove(files_path)
+
+        if self._cancel.is_set():
+            self._status = self.__class__.CANCELLED
+            return
+
+        if self._returncode not in (0, RSYNC_VANISHED_STATUS):
+            self._error = "rsync exited with status {s}: {e}".format(
+                s=self._returncode, e=_last_lines(tail))
+            self._status = self.__class__.FAILED
+            return
+
+        if self._returncode == RSYNC_VANISHED_STATUS:
+            self._warning = "Source files vanished during the sync."
+
+        self._parse_stats(tail)
+        self._bytes_transferred += self._chunked_bytes
+        self._files_transferred += self._chunked_files
+        self._percent = 100
+        self._status = self.__class__.SUCCESS
+
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------------
+    def _run_chunked(self):
+        """Send the large files in chunks over parallel streams."""
+
+        (source_root, dest_root, names) = self._chunk_roots()
+        if names == []:
+            return
+
+        if names is None:
+            filter_rules = FilterRules(self._includes, self._excludes)
+            try:
+                if self._files_from:
+                    manifest = Manifest.scan_paths(source_root,
+                        self._files_from, filter_rules=filter_rules)
+                else:
+                    manifest = Manifest.scan(source_root,
+                        filter_rules=filter_rules)
+            except ManifestError as e:
+                raise SyncJobError(str(e))
+
+            names = [(p, p) for (p, e) in sorted(manifest.entries.items())
+                if e['type'] == TYPE_FILE and
+                    e['size'] >= self._chunk_threshold]
+
+        for (source_name, dest_name) in names:
+
+            if self._cancel.is_set():
+                return
+
+            self._chunked = ChunkedTransfer(
+                os.path.join(source_root, source_name),
+                os.path.join(dest_root, dest_name),
+                streams=self._streams,
+            )
+
+            try:
+                self._chunked.run()
+            except ChunkedTransferError as e:
+                if self._cancel.is_set():
+                    return
+                raise SyncJobError(str(e))
+            finally:
+                self._chunked_bytes += self._chunked.bytes_transferred
+                if self._chunked.bytes_transferred:
+                    self._chunked_files += 1
+                self._chunked = None
+
+        # leave the rest to rsync
+        self._max_size = self._chunk_threshold - 1
+
+    # ------------------------------------------------------------------------
+    def _chunk_roots(self):
+        """Returns the source root, destination root and large file names.
+
+        Follows rsync's trailing slash rules. The names are a list of
+        (source name, destination name) if the source is a single file,
+        empty if it shouldn't be chunked, otherwise None.
+
+        """
+
+        source = self._source
+        destination = self._destination
+
+        if os.path.isdir(source):
+            if source.endswith("/") or self._files_from:
+                return (source, destination, None)
+            return (source, os.path.join(destination,
+                os.path.basename(os.path.normpath(source))), None)
+
+        # a single file is copied into the destination if it's an existing
+        # directory, which can't be checked remotely. only chunk if the
+        # destination is explicitly a directory.
+        (source_root, name) = os.path.split(source)
+        if (not destination.endswith("/") or
+            os.path.getsize(source) < self._chunk_threshold):
+            return (source_root, destination, [])
+
+        return (source_root, destination, [(name, name)])
+
+    # ------------------------------------------------------------------------
+    def _parse_progress(self, output):
+
+        # progress lines are separated by carriage returns
+        for line in reversed(re.split(r"[\r\n]", output)):
+            match = _PROGRESS_REGEX.match(line)
+            if match:
+                self._bytes_done = int(match.group(1).replace(",", ""))
+                self._percent = int(match.group(2))
+                return
+
+    # ------------------------------------------------------------------------
+    def _parse_stats(self, output):
+
+        self._bytes_transferred = 0
+        self._files_transferred = 0
+
+        match = _BYTES_STAT_REGEX.search(output)
+        if match:
+            self._bytes_transferred = int(match.group(1).replace(",", ""))
+
+        match = _FILES_STAT_REGEX.search(output)
+        if match:
+            self._files_transferred = int(match.group(1).replace(",", ""))
+
+    # ------------------------------------------------------------------------
+    def _read_record(self):
+        """Update a detached job's status and progress from its record."""
+
+        try:
+            with open(self.record_path) as record_fh:
+                record = json.load(record_fh)
+        except (IOError, OSError, ValueError):
+            record = None
+
+        if record:
+            self._status = record['status']
+            self._percent = record['percent']
+            self._start_time = record['start']
+            self._end_time = record['end']
+            self._bytes_transferred = record['bytes_transferred']
+            self._files_transferred = record['files_transferred']
+            self._files_linked = record['files_linked']
+            self._files_cloned = record['files_cloned']
+            self._returncode = record['returncode']
+            self._error = record['error']
+            self._warning = record['warning']
+
+        # the process exited without finishing the record
+        exit_status = self._detached.returncode
+        if exit_status is not None and not self.done:
+            self._error = "Detached sync exited with status {s}. " \
+                "See {p}".format(s=exit_status, p=_detached_output(self.id))
+            self._status = self.__class__.FAILED
+
+    # ------------------------------------------------------------------------
+    def _start_detached(self):
+
+        kwargs = {
+            'job_id': self.id,
+            'source': self._source,
+            'destination': self._destination,
+            'includes': self._includes,
+            'excludes': self._excludes,
+            'delete': self._delete,
+            'engine': self._engine,
+            'link_dest': self._link_dest,
+            'reflink': self._reflink,
+            'slot_key': self._slot_key,
+            'slots': self._slots,
+            'files_from': self._files_from,
+            'streams': self._streams,
+            'chunk_threshold': self._chunk_threshold,
+        }
+
+        # the process's own output is kept in case it fails to start the job.
+        # a new session keeps it from being hung up with the terminal.
+        out_path = _detached_output(self.id)
+        with open(out_path, 'w') as out_fh:
+            try:
+                self._detached = subprocess.Popen(
+                    [sys.executable, "-c", _DETACHED_SCRIPT],
+                    stdin=subprocess.PIPE, stdout=out_fh,
+                    stderr=subprocess.STDOUT, close_fds=True,
+                    preexec_fn=os.setsid)
+            except OSError as e:
+                os.remove(out_path)
+                raise SyncJobError("Unable to start detached sync: " + str(e))
+
+        self._detached.stdin.write(json.dumps(kwargs))
+        self._detached.stdin.close()
+
+    # ------------------------------------------------------------------------
+    def _write_record(self):
+
+        self._last_record = time.time()
+
+        try:
+            record_dir = _job_record_dir()
+            (fd, tmp_path) = tempfile.mkstemp(prefix="." + self.id,
+                dir=record_dir)
+            with os.fdopen(fd, 'w') as record_fh:
+                json.dump(self.to_dict(), record_fh, sort_keys=True)
+            os.chmod(tmp_path, 0664)
+            os.rename(tmp_path, self.record_path)
+        except (IOError, OSError) as e:
+            # the record is informational. never fail the sync over it.
+            Logger.get("sync").warning(
+                "Unable to write sync job record: " + str(e))
+
+# ----------------------------------------------------------------------------
+class SyncJobManager(Singleton):
+    """Starts and tracks the sync jobs of the current process."""
+
+    # ------------------------------------------------------------------------
+    def init(self):
+
+        self._jobs = []
+        self._lock = threading.Lock()
+
+        _remove_old_records()
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def submit(self, source, destination, **kwargs):
+        """Create and start a sync job. Returns the job.
+
+        If ``detach`` is True, the job runs in a separate process that
+        completes even if this one exits. Other keyword args are passed to
+        :py:class:`SyncJob`. Unless supplied, syncs to or from a remote host
+        use the host as the slot key, limited to ``$DPA_SYNC_SLOTS``
+        concurrent jobs.
+
+        """
+
+        if 'slot_key' not in kwargs:
+            kwargs['slot_key'] = remote_host(source) or \
+                remote_host(destination)
+
+        if 'slots' not in kwargs:
+            try:
+                kwargs['slots'] = int(DpaVars.sync_slots().get())
+            except ValueError:
+                kwargs['slots'] = None
+
+        detach = kwargs.pop('detach', False)
+
+        job = SyncJob(source, destination, **kwargs)
+        with self._lock:
+            self._jobs.append(job)
+        job.start(detach=detach)
+
+        return job
+
+    # ------------------------------------------------------------------------
+    def cancel_all(self):
+        """Cancel all unfinished jobs."""
+
+        for job in self.running:
+            job.cancel()
+
+    # ------------------------------------------------------------------------
+    def wait_all(self, timeout=None):
+        """Wait for all jobs to finish. Returns False on timeout."""
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        for job in self.jobs:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            if job.wait(remaining) is None:
+                return False
+
+        return True
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    # ------------------------------------------------------------------------
+    @property
+    def running(self):
+        return [j for j in self.jobs if not j.done]
+
+# ----------------------------------------------------------------------------
+class SyncJobError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def remote_host(path):
+    """Returns the host of an rsync [user@]host:path, or None if local."""
+
+    if ":" not in path:
+        return None
+
+    # a colon after a slash is part of a local path
+    prefix = path.split(":", 1)[0]
+    if "/" in prefix:
+        return None
+
+    return prefix.split("@")[-1]
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _acquire_slot(key, slots, cancel_event):
+    """Wait for one of the key's slots. Returns the locked file descriptor.
+
+    Returns None if the slot files can't be created, in which case the job
+    runs without a slot.
+
+    """
+
+    slot_dir = os.path.join(_sync_dir(), SLOT_DIR)
+    key = re.sub(r"[^\w.-]", "_", key)
+
+    try:
+        _make_shared_dir(slot_dir)
+    except OSError as e:
+        Logger.get("sync").warning("Unable to create sync slots: " + str(e))
+        return None
+
+    while not cancel_event.is_set():
+
+        for num in range(slots):
+            slot_path = os.path.join(slot_dir,
+                "{k}.{n}.lock".format(k=key, n=num))
+            try:
+                fd = os.open(slot_path,
+                    os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0666)
+            except OSError as e:
+                Logger.get("sync").warning(
+                    "Unable to open sync slot: " + str(e))
+                return None
+
+            # slots are shared by every user, whatever the creator's umask.
+            # the sticky directory keeps them from being replaced.
+            try:
+                os.fchmod(fd, 0666)
+            except OSError:
+                pass
+
+            # keep other subprocesses from inheriting the slot. rsync is
+            # explicitly given it when started.
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                os.close(fd)
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            else:
+                return fd
+
+        cancel_event.wait(POLL_INTERVAL)
+
+    return None
+
+# ----------------------------------------------------------------------------
+def _detached_output(job_id):
+    return os.path.join(_job_record_dir(), job_id + ".err")
+
+# ----------------------------------------------------------------------------
+def _installed_rsync_version():
+    """Returns the (major, minor) version of rsync, (0, 0) if unknown."""
+
+    global _rsync_version
+
+    if _rsync_version is None:
+        try:
+            output = subprocess.Popen(["rsync", "--version"],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            ).communicate()[0]
+        except OSError:
+            output = ""
+        match = _VERSION_REGEX.search(output)
+        _rsync_version = (int(match.group(1)), int(match.group(2))) \
+            if match else (0, 0)
+
+    return _rsync_version
+
+# ----------------------------------------------------------------------------
+def _job_record_dir():
+
+    shared_dir = os.path.join(_sync_dir(), JOB_RECORD_DIR)
+    record_dir = os.path.join(shared_dir, current_username())
+    try:
+        _make_shared_dir(shared_dir)
+        _make_user_dir(record_dir)
+    except OSError:
+        return tempfile.gettempdir()
+
+    return record_dir
+
+# ----------------------------------------------------------------------------
+def _last_lines(output, count=5):
+
+    lines = [l.strip() for l in re.split(r"[\r\n]", output)
+        if l.strip() and not _PROGRESS_REGEX.match(l)]
+
+    return " ".join(lines[-count:])
+
+# ----------------------------------------------------------------------------
+def _make_shared_dir(path):
+    """Create a directory any user can add to, but only remove their own."""
+
+    if os.path.isdir(path):
+        return
+
+    # the sync directory itself is shared too
+    parent = os.path.dirname(path)
+    if parent != path:
+        _make_shared_dir(parent)
+
+    try:
+        os.mkdir(path)
+        os.chmod(path, 01777)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+# ----------------------------------------------------------------------------
+def _make_user_dir(path):
+    """Create a directory only the current user can write to."""
+
+    try:
+        os.mkdir(path, 0755)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # someone else may have created it first in the shared parent
+    stat = os.lstat(path)
+    if stat.st_uid != os.geteuid() or not os.path.isdir(path) or \
+        os.path.islink(path) or stat.st_mode & 022:
+        raise OSError(errno.EPERM, "Not a private directory", path)
+
+# ----------------------------------------------------------------------------
+def _read_all(fd):
+
+    chunks = []
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            break
+        chunks.append(data)
+
+    return "".join(chunks)
+
+# ----------------------------------------------------------------------------
+def _remove_old_records(max_age=RECORD_MAX_AGE):
+    """Remove the current user's job files older than max_age seconds.
+
+    Running jobs keep updating their records, so only the files of finished
+    jobs are that old.
+
+    """
+
+    record_dir = _job_record_dir()
+    if record_dir == tempfile.gettempdir():
+        return
+
+    cutoff = time.time() - max_age
+
+    try:
+        names = os.listdir(record_dir)
+    except OSError:
+        return
+
+    for name in names:
+        path = os.path.join(record_dir, name)
+        try:
+            if os.path.isfile(path) and os.lstat(path).st_mtime < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+# ----------------------------------------------------------------------------
+def _run_detached():
+    """Run a detached job to completion. Its arguments are read from stdin.
+
+    Terminating the process cancels the job.
+
+    """
+
+    kwargs = dict((str(k), v) for (k, v) in json.load(sys.stdin).items())
+    job_id = kwargs.pop('job_id')
+
+    job = SyncJob(**kwargs)
+    job._id = job_id
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: job.cancel())
+
+    job.start()
+    job.wait()
+
+    # the outcome is in the record
+    try:
+        os.remove(_detached_output(job_id))
+    except OSError:
+        pass
+
+    sys.exit(0 if job.succeeded else 1)
+
+# ----------------------------------------------------------------------------
+def _sync_dir():
+    return DpaVars.sync_dir(default=os.path.join(tempfile.gettempdir(),
+        DEFAULT_SYNC_DIR)).get()
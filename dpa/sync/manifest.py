@@ -0,0 +1,570 @@
+"""Records of the files within a directory tree.
+
+A manifest records the relative path, type, size and modification time of
+each file, directory and symlink below a root directory, and optionally a
+hash of each file's contents. Manifests are written to the root directory
+they describe and are used to determine what needs to be transferred when
+syncing one tree to another without walking both of them.
+
+Classes
+-------
+Manifest
+    The recorded state of a directory tree.
+
+FilterRules
+    Rsync style include/exclude patterns.
+
+ManifestError
+    Raised when a manifest can't be read, scanned or written.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import errno
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import stat
+import tempfile
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# name of the manifest file written to the root of the tree it describes
+MANIFEST_FILE = ".dpa_manifest"
+
+# the ptask config with the includes and excludes of ptask syncs
+FILTER_RULES_CONFIG_PATH = "config/ptask/sync.cfg"
+
+# bumped when the file format changes in an incompatible way
+MANIFEST_FORMAT = 1
+
+# entry types
+TYPE_DIR = 'd'
+TYPE_FILE = 'f'
+TYPE_LINK = 'l'
+
+# bytes read at a time when hashing file contents
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# seconds to wait on a hashing pool. effectively forever.
+_POOL_TIMEOUT = 60 * 60 * 24 * 7
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class Manifest(object):
+    """The recorded state of a directory tree.
+
+    Entries are keyed by path relative to the root, using '/' separators.
+    Each entry is a dict with a 'type' key (one of TYPE_DIR, TYPE_FILE or
+    TYPE_LINK). Files also have 'size' and 'mtime' and, if the contents were
+    hashed, 'hash'. Links have the 'link' target. The ``info`` dict holds any
+    other details about the tree its writer wants to record with it.
+
+    Scan a tree, write its manifest and compare it to another::
+
+        >>> manifest = Manifest.scan("/path/to/version")
+        >>> manifest.write()
+        >>> (changed, removed) = manifest.diff(Manifest.read(dest_dir))
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def scan(cls, root, filter_rules=None, checksum=False, previous=None,
+        workers=None):
+        """Scan a directory tree and return its manifest.
+
+        Hashes are reused from the ``previous`` manifest of the tree for
+        files whose size and modification time haven't changed. If
+        ``checksum`` is True, the contents of the remaining files are hashed
+        by ``workers`` threads (see :py:func:`hash_files`).
+
+        """
+
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            raise ManifestError("Not a directory: " + root)
+
+        manifest = cls(root)
+        previous_entries = previous.entries if previous else {}
+        to_hash = []
+
+        def _walk_error(error):
+            raise ManifestError("Unable to scan: " + str(error))
+
+        for (dir_path, dir_names, file_names) in os.walk(root,
+            onerror=_walk_error):
+
+            rel_dir = os.path.relpath(dir_path, root)
+            if rel_dir == os.curdir:
+                rel_dir = ""
+
+            # prune excluded directories. symlinks to directories are
+            # recorded as links rather than followed.
+            for name in list(dir_names):
+                rel_path = _join(rel_dir, name)
+                full_path = os.path.join(dir_path, name)
+                if filter_rules and filter_rules.excluded(rel_path, True):
+                    dir_names.remove(name)
+                elif os.path.islink(full_path):
+                    dir_names.remove(name)
+                    file_names.append(name)
+                else:
+                    manifest.entries[rel_path] = {'type': TYPE_DIR}
+
+            for name in file_names:
+
+                if not rel_dir and name == MANIFEST_FILE:
+                    continue
+
+                rel_path = _join(rel_dir, name)
+                if filter_rules and filter_rules.excluded(rel_path, False):
+                    continue
+
+                full_path = os.path.join(dir_path, name)
+                try:
+                    info = os.lstat(full_path)
+                except OSError as e:
+                    # vanished since the directory was listed
+                    if e.errno == errno.ENOENT:
+                        continue
+                    raise ManifestError("Unable to scan: " + str(e))
+
+                entry = _stat_entry(full_path, info)
+                if entry is None:
+                    continue
+
+                if entry['type'] == TYPE_FILE:
+                    old_entry = previous_entries.get(rel_path)
+                    if (old_entry and 'hash' in old_entry and
+                        _same_stat(entry, old_entry)):
+                        entry['hash'] = old_entry['hash']
+                    elif checksum:
+                        to_hash.append(rel_path)
+
+                manifest.entries[rel_path] = entry
+
+        for (rel_path, digest) in hash_files(root, to_hash,
+            workers=workers).iteritems():
+            manifest.entries[rel_path]['hash'] = digest
+
+        return manifest
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def scan_paths(cls, root, rel_paths, filter_rules=None):
+        """Return the manifest of just the listed paths below the root.
+
+        Listed directories are scanned in full, and the parents of each
+        listed path are recorded as directories. Paths that don't exist are
+        skipped, so only the stat of each listed path is needed to build a
+        manifest of part of a large tree.
+
+        """
+
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            raise ManifestError("Not a directory: " + root)
+
+        manifest = cls(root)
+
+        for rel_path in rel_paths:
+
+            rel_path = os.path.normpath(rel_path).strip("/")
+            if rel_path in ("", os.curdir) or rel_path.startswith(".."):
+                continue
+
+            if filter_rules and filter_rules.excluded(rel_path, False):
+                continue
+
+            full_path = os.path.join(root, rel_path)
+            try:
+                info = os.lstat(full_path)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise ManifestError("Unable to scan: " + str(e))
+
+            if stat.S_ISDIR(info.st_mode):
+                sub_manifest = cls.scan(full_path, filter_rules=filter_rules)
+                manifest.entries[rel_path] = {'type': TYPE_DIR}
+                for (sub_path, entry) in sub_manifest.entries.iteritems():
+                    manifest.entries[_join(rel_path, sub_path)] = entry
+            else:
+                entry = _stat_entry(full_path, info)
+                if entry is None:
+                    continue
+                manifest.entries[rel_path] = entry
+
+            parent = os.path.dirname(rel_path)
+            while parent and parent not in manifest.entries:
+                manifest.entries[parent] = {'type': TYPE_DIR}
+                parent = os.path.dirname(parent)
+
+        return manifest
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def read(cls, root):
+        """Read the manifest recorded in the root directory.
+
+        Returns None if there is no manifest, or it is in an older format.
+
+        """
+
+        root = os.path.abspath(root)
+        manifest_path = os.path.join(root, MANIFEST_FILE)
+
+        try:
+            with open(manifest_path) as manifest_fh:
+                text = manifest_fh.read()
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise ManifestError("Unable to read manifest: " + str(e))
+
+        return cls.parse(root, text)
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def parse(cls, root, text):
+        """Parse the contents of a manifest file recorded in the root.
+
+        Returns None if the manifest is in an older format. Used to read
+        manifests of trees that aren't mounted locally.
+
+        """
+
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ManifestError(
+                "Invalid manifest: {r}: {e}".format(r=root, e=e))
+
+        if data.get('format') != MANIFEST_FORMAT:
+            return None
+
+        manifest = cls(root, info=data.get('info'))
+        for (rel_path, entry) in data.get('entries', {}).iteritems():
+            if 'link' in entry:
+                entry['link'] = entry['link'].encode('utf-8')
+            if 'hash' in entry:
+                entry['hash'] = str(entry['hash'])
+            entry['type'] = str(entry['type'])
+            manifest.entries[rel_path.encode('utf-8')] = entry
+
+        return manifest
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def record(cls, root, filter_rules=None, checksum=False,
+        workers=None):
+        """Scan the tree, write its manifest and return it."""
+
+        previous = None
+        if checksum:
+            try:
+                previous = cls.read(root)
+            except ManifestError:
+                pass
+
+        manifest = cls.scan(root, filter_rules=filter_rules,
+            checksum=checksum, previous=previous, workers=workers)
+        manifest.write()
+
+        return manifest
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, root, entries=None, info=None):
+
+        self._root = root
+        self._entries = entries if entries is not None else {}
+        self._info = info if info is not None else {}
+
+    # ------------------------------------------------------------------------
+    def __contains__(self, rel_path):
+        return rel_path in self._entries
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def diff(self, other):
+        """Compare this manifest to another, older state of the tree.
+
+        Returns a tuple of sorted relative paths: those that are new or
+        changed in this manifest, and those in the other manifest that are no
+        longer present. Pass None for ``other`` when there is no older state.
+
+        Files are compared by hash if both entries have one, otherwise by
+        size and modification time (to the second, as rsync does).
+
+        """
+
+        other_entries = other.entries if other else {}
+
+        changed = []
+        for (rel_path, entry) in self._entries.iteritems():
+            other_entry = other_entries.get(rel_path)
+            if other_entry is None or not _same_entry(entry, other_entry):
+                changed.append(rel_path)
+
+        removed = [p for p in other_entries if p not in self._entries]
+
+        return (sorted(changed), sorted(removed))
+
+    # ------------------------------------------------------------------------
+    def write(self, root=None):
+        """Write the manifest to the root directory, or the one supplied.
+
+        The file is replaced atomically so readers never see a partial
+        manifest.
+
+        """
+
+        root = os.path.abspath(root or self.root)
+        data = {
+            'format': MANIFEST_FORMAT,
+            'entries': self._entries,
+        }
+        if self._info:
+            data['info'] = self._info
+
+        try:
+            (fd, tmp_path) = tempfile.mkstemp(
+                prefix=MANIFEST_FILE + ".", dir=root)
+            with os.fdopen(fd, 'w') as manifest_fh:
+                json.dump(data, manifest_fh, separators=(',', ':'))
+            os.chmod(tmp_path, 0664)
+            os.rename(tmp_path, os.path.join(root, MANIFEST_FILE))
+        except (IOError, OSError) as e:
+            raise ManifestError("Unable to write manifest: " + str(e))
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def entries(self):
+        return self._entries
+
+    # ------------------------------------------------------------------------
+    @property
+    def checksummed(self):
+        """True if every file in the manifest has a hash."""
+        return all('hash' in e for e in self._entries.itervalues()
+            if e['type'] == TYPE_FILE)
+
+    # ------------------------------------------------------------------------
+    @property
+    def info(self):
+        return self._info
+
+    # ------------------------------------------------------------------------
+    @property
+    def root(self):
+        return self._root
+
+    # ------------------------------------------------------------------------
+    @property
+    def total_size(self):
+        return sum(e.get('size', 0) for e in self._entries.itervalues())
+
+# ----------------------------------------------------------------------------
+class FilterRules(object):
+    """Rsync style include/exclude patterns.
+
+    Patterns are matched against paths relative to the root being synced.
+    Includes are checked before excludes, and the first matching pattern
+    decides. Paths matching no pattern are included. As with rsync:
+
+        * a leading '/' anchors the pattern to the root
+        * a trailing '/' matches only directories
+        * a pattern containing a '/' is matched against the full relative
+          path, otherwise just against the final component
+
+    Excluding a directory excludes everything below it.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, includes=None, excludes=None):
+
+        self._rules = []
+        for pattern in includes or []:
+            self._rules.append((True, _Pattern(pattern)))
+        for pattern in excludes or []:
+            self._rules.append((False, _Pattern(pattern)))
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def excluded(self, rel_path, is_dir):
+        """True if the relative path is excluded by the rules."""
+
+        for (include, pattern) in self._rules:
+            if pattern.matches(rel_path, is_dir):
+                return not include
+
+        return False
+
+# ----------------------------------------------------------------------------
+class ManifestError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def hash_file(path):
+    """Returns the md5 hex digest of the file's contents."""
+
+    digest = hashlib.md5()
+    try:
+        with open(path, 'rb') as file_fh:
+            for block in iter(lambda: file_fh.read(HASH_BLOCK_SIZE), ""):
+                digest.update(block)
+    except IOError as e:
+        raise ManifestError("Unable to hash file: " + str(e))
+
+    return digest.hexdigest()
+
+# ----------------------------------------------------------------------------
+def hash_files(root, rel_paths, workers=None):
+    """Hash files below the root in parallel. Returns {rel_path: digest}.
+
+    Files are hashed by a pool of threads, each file read a block at a
+    time. hashlib releases the GIL while hashing, so hashing isn't limited
+    to a single cpu, and unlike a process pool nothing is forked from
+    applications that may be running the pipeline. The pool defaults to
+    one thread per cpu. Few files, or a single worker, are hashed in the
+    calling thread.
+
+    """
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    jobs = [(rel_path, os.path.join(root, rel_path))
+        for rel_path in rel_paths]
+
+    if workers <= 1 or len(jobs) < 2:
+        return dict(_hash_job(job) for job in jobs)
+
+    pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        # a timeout keeps the wait interruptible
+        return dict(pool.map_async(_hash_job, jobs, chunksize=1).get(
+            _POOL_TIMEOUT))
+    finally:
+        pool.terminate()
+        pool.join()
+
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _Pattern(object):
+
+    # ------------------------------------------------------------------------
+    def __init__(self, pattern):
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        self.anchored = pattern.startswith("/")
+        pattern = pattern.lstrip("/")
+
+        self.full_path = self.anchored or "/" in pattern
+        self.pattern = pattern
+
+    # ------------------------------------------------------------------------
+    def matches(self, rel_path, is_dir):
+
+        if self.dir_only and not is_dir:
+            return False
+
+        if not self.full_path:
+            return fnmatch.fnmatchcase(rel_path.rsplit("/", 1)[-1],
+                self.pattern)
+
+        if self.anchored:
+            return fnmatch.fnmatchcase(rel_path, self.pattern)
+
+        # unanchored patterns with a '/' match any trailing portion of the
+        # path on a component boundary
+        parts = rel_path.split("/")
+        for i in range(len(parts)):
+            if fnmatch.fnmatchcase("/".join(parts[i:]), self.pattern):
+                return True
+
+        return False
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _hash_job(job):
+
+    (rel_path, full_path) = job
+    return (rel_path, hash_file(full_path))
+
+# ----------------------------------------------------------------------------
+def _join(rel_dir, name):
+    return rel_dir + "/" + name if rel_dir else name
+
+# ----------------------------------------------------------------------------
+def _stat_entry(full_path, info):
+    """Returns the manifest entry for a non-directory, or None."""
+
+    if stat.S_ISLNK(info.st_mode):
+        return {
+            'type': TYPE_LINK,
+            'link': os.readlink(full_path),
+        }
+    elif stat.S_ISREG(info.st_mode):
+        return {
+            'type': TYPE_FILE,
+            'size': info.st_size,
+            'mtime': info.st_mtime,
+        }
+
+    # sockets, fifos, devices. nothing to sync.
+    return None
+
+# ----------------------------------------------------------------------------
+def _same_entry(entry, other):
+
+    if entry['type'] != other['type']:
+        return False
+
+    if entry['type'] == TYPE_LINK:
+        return entry['link'] == other['link']
+
+    if entry['type'] == TYPE_FILE:
+        if 'hash' in entry and 'hash' in other:
+            return (entry['size'] == other['size'] and
+                entry['hash'] == other['hash'])
+        return _same_stat(entry, other)
+
+    return True
+
+# ----------------------------------------------------------------------------
+def _same_stat(entry, other):
+
+    return (entry['size'] == other.get('size') and
+        int(entry['mtime']) == int(other.get('mtime', -1)))
@@ -0,0 +1,504 @@
+"""Manifest based sync between locally mounted directory trees.
+
+Classes
+-------
+NativeSync
+    Copies only the files that differ between two local trees.
+
+NativeSyncError
+    Raised when a native sync fails.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import errno
+import fcntl
+from multiprocessing.pool import ThreadPool
+import os
+import shutil
+import tempfile
+
+from dpa.sync.manifest import (
+    Manifest, ManifestError, FilterRules, TYPE_DIR, TYPE_LINK,
+)
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# concurrent file copies. copies are io bound, so this can comfortably exceed
+# the number of cpus, especially for nfs destinations.
+DEFAULT_COPY_WORKERS = 8
+
+# linux ioctl that clones a file's extents on copy-on-write filesystems
+# (btrfs, xfs with reflink=1). from linux/fs.h.
+FICLONE = 0x40049409
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class NativeSync(object):
+    """Copies only the files that differ between two local trees.
+
+    Source and destination follow rsync's trailing slash convention: a
+    source directory ending in '/' syncs its contents into the destination,
+    otherwise the directory itself is synced into the destination. A source
+    file is copied into the destination directory.
+
+    Both trees are scanned (stat only) on every sync, so changes made
+    directly to the destination since the last sync are found and undone.
+    Hashes recorded in each tree's manifest are reused for files that
+    haven't changed. Only new and changed files are copied, in parallel.
+    Once complete, the source manifest is written to the destination for
+    next time.
+
+    If ``files_from`` is a list of paths relative to the source root, only
+    those paths (and everything below listed directories) are synced, as
+    with rsync's --files-from. Only the listed paths are stat'ed, so a few
+    frames of a large image sequence can be synced without scanning the
+    rest. Listed paths missing from the source are skipped. Deletion is
+    limited to the contents of listed directories.
+
+    Snapshots: if ``link_dest`` is a directory, files that are unchanged
+    relative to the same path below it are hard linked to it rather than
+    copied, as with rsync's --link-dest. Only link to directories whose
+    files are never modified in place, such as previous version directories.
+    If ``reflink`` is True, files are cloned rather than copied where the
+    filesystem supports it, so their data is shared until either copy is
+    modified. Unsupported filesystems fall back to a normal copy.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, source, destination, includes=None, excludes=None,
+        delete=False, workers=DEFAULT_COPY_WORKERS, link_dest=None,
+        reflink=False, files_from=None):
+
+        self._source = source
+        self._destination = destination
+        self._filter_rules = FilterRules(includes, excludes)
+        self._delete = delete
+        self._workers = max(1, int(workers))
+        self._link_dest = link_dest
+        self._reflink = reflink
+        self._files_from = files_from
+
+        self._bytes_transferred = 0
+        self._files_transferred = 0
+        self._files_deleted = 0
+        self._files_linked = 0
+        self._files_cloned = 0
+        self._cancelled = False
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def run(self):
+        """Sync the destination with the source."""
+
+        (source_root, dest_root, single_file) = self._resolve_roots()
+
+        if single_file:
+            (source_name, dest_name) = single_file
+            self._copy_files(source_root, dest_root,
+                [(source_name, dest_name)])
+            return
+
+        try:
+            source_manifest = self._scan_source(source_root)
+        except ManifestError as e:
+            raise NativeSyncError(str(e))
+
+        _make_dirs(dest_root)
+
+        try:
+            recorded = Manifest.read(dest_root)
+        except ManifestError:
+            recorded = None
+
+        # a partial sync can't describe the rest of an unrecorded
+        # destination, so it leaves the destination unrecorded
+        write_manifest = not (self._files_from and recorded is None)
+
+        # the recorded manifest is out of date if the destination was
+        # modified directly, so the files themselves are compared
+        try:
+            dest_manifest = self._scan_dest(dest_root, recorded)
+        except ManifestError as e:
+            raise NativeSyncError(str(e))
+
+        (changed, removed) = source_manifest.diff(dest_manifest)
+
+        deleted = []
+        if self._delete:
+            deleted = self._deletable(source_manifest, removed)
+            self._remove(dest_root, dest_manifest, deleted)
+
+        dirs = []
+        links = []
+        files = []
+        for rel_path in changed:
+            entry_type = source_manifest.entries[rel_path]['type']
+            if entry_type == TYPE_DIR:
+                dirs.append(rel_path)
+            elif entry_type == TYPE_LINK:
+                links.append(rel_path)
+            else:
+                files.append(rel_path)
+
+        # sorted, so parents are created before their children
+        for rel_path in dirs:
+            dest_path = os.path.join(dest_root, rel_path)
+            if os.path.islink(dest_path) or os.path.isfile(dest_path):
+                _remove_path(dest_path)
+            _make_dirs(dest_path)
+
+        for rel_path in links:
+            self._copy_link(source_manifest, dest_root, rel_path)
+
+        if self._link_dest:
+            files = self._link_files(source_manifest, dest_root, files)
+
+        self._copy_files(source_root, dest_root, [(p, p) for p in files])
+
+        # the destination now matches the source. the destination may still
+        # have files the source doesn't, if they weren't deleted or weren't
+        # part of a partial sync, so keep recording those.
+        deleted = set(deleted)
+        for rel_path in removed:
+            if rel_path not in deleted:
+                source_manifest.entries[rel_path] = \
+                    dest_manifest.entries[rel_path]
+
+        # paths a partial sync didn't list are as recorded
+        if self._files_from and recorded is not None:
+            for (rel_path, entry) in recorded.entries.iteritems():
+                if (rel_path not in dest_manifest and
+                    rel_path not in source_manifest):
+                    source_manifest.entries[rel_path] = entry
+
+        if not write_manifest:
+            return
+
+        try:
+            source_manifest.write(dest_root)
+        except ManifestError as e:
+            raise NativeSyncError(str(e))
+
+    # ------------------------------------------------------------------------
+    def cancel(self):
+        """Stop the sync before copying any more files.
+
+        The sync raises NativeSyncError. Files already copied are left in
+        place, and the destination manifest is not updated.
+
+        """
+        self._cancelled = True
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        return self._bytes_transferred
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_transferred(self):
+        return self._files_transferred
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_deleted(self):
+        return self._files_deleted
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_linked(self):
+        """Files hard linked to the link destination rather than copied."""
+        return self._files_linked
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_cloned(self):
+        """Files reflink cloned rather than copied."""
+        return self._files_cloned
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _copy_files(self, source_root, dest_root, rel_paths):
+        """Copy the (source, destination) relative paths."""
+
+        if not rel_paths:
+            return
+
+        def _copy(paths):
+            if self._cancelled:
+                raise NativeSyncError("Sync cancelled.")
+            (source_rel_path, dest_rel_path) = paths
+            return _copy_file(
+                os.path.join(source_root, source_rel_path),
+                os.path.join(dest_root, dest_rel_path),
+                reflink=self._reflink,
+            )
+
+        def _count(result):
+            (size, cloned) = result
+            self._files_transferred += 1
+            if cloned:
+                self._files_cloned += 1
+            else:
+                self._bytes_transferred += size
+
+        # totals are updated as each copy completes, so they can be used to
+        # monitor progress
+        if self._workers > 1 and len(rel_paths) > 1:
+            pool = ThreadPool(min(self._workers, len(rel_paths)))
+            try:
+                for result in pool.imap_unordered(_copy, rel_paths):
+                    _count(result)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for paths in rel_paths:
+                _count(_copy(paths))
+
+    # ------------------------------------------------------------------------
+    def _deletable(self, source_manifest, removed):
+        """The removed paths that the sync may delete."""
+
+        if not self._files_from:
+            return removed
+
+        # only the contents of listed directories, as with rsync
+        listed_dirs = [
+            os.path.normpath(p).strip("/") + "/" for p in self._files_from
+            if source_manifest.entries.get(
+                os.path.normpath(p).strip("/"), {}).get('type') == TYPE_DIR
+        ]
+
+        return [p for p in removed
+            if any(p.startswith(d) for d in listed_dirs)]
+
+    # ------------------------------------------------------------------------
+    def _scan_source(self, source_root):
+
+        if self._files_from:
+            return Manifest.scan_paths(source_root, self._files_from,
+                filter_rules=self._filter_rules)
+
+        try:
+            previous = Manifest.read(source_root)
+        except ManifestError:
+            previous = None
+
+        return Manifest.scan(source_root, filter_rules=self._filter_rules,
+            previous=previous)
+
+    # ------------------------------------------------------------------------
+    def _scan_dest(self, dest_root, recorded):
+
+        if self._files_from:
+            return Manifest.scan_paths(dest_root, self._files_from,
+                filter_rules=self._filter_rules)
+
+        return Manifest.scan(dest_root, filter_rules=self._filter_rules,
+            previous=recorded)
+
+    # ------------------------------------------------------------------------
+    def _link_files(self, source_manifest, dest_root, rel_paths):
+        """Link files unchanged in the link destination. Returns the rest."""
+
+        to_copy = []
+
+        for rel_path in rel_paths:
+
+            entry = source_manifest.entries[rel_path]
+            link_path = os.path.join(self._link_dest, rel_path)
+
+            try:
+                info = os.lstat(link_path)
+            except OSError:
+                to_copy.append(rel_path)
+                continue
+
+            if (not os.path.isfile(link_path) or os.path.islink(link_path) or
+                info.st_size != entry['size'] or
+                int(info.st_mtime) != int(entry['mtime'])):
+                to_copy.append(rel_path)
+                continue
+
+            try:
+                _link_file(link_path, os.path.join(dest_root, rel_path))
+            except OSError as e:
+                # different filesystem or too many links. just copy.
+                if e.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM):
+                    raise NativeSyncError("Unable to link file: " + str(e))
+                to_copy.append(rel_path)
+            else:
+                self._files_linked += 1
+
+        return to_copy
+
+    # ------------------------------------------------------------------------
+    def _copy_link(self, source_manifest, dest_root, rel_path):
+
+        dest_path = os.path.join(dest_root, rel_path)
+        link = source_manifest.entries[rel_path]['link']
+
+        try:
+            _remove_path(dest_path)
+            os.symlink(link, dest_path)
+        except OSError as e:
+            raise NativeSyncError("Unable to create link: " + str(e))
+
+        self._files_transferred += 1
+
+    # ------------------------------------------------------------------------
+    def _remove(self, dest_root, dest_manifest, removed):
+
+        # reverse order removes directory contents before the directories
+        for rel_path in reversed(removed):
+            dest_path = os.path.join(dest_root, rel_path)
+            entry_type = dest_manifest.entries[rel_path]['type']
+            try:
+                if entry_type == TYPE_DIR:
+                    # directories holding excluded files are left alone
+                    os.rmdir(dest_path)
+                else:
+                    _remove_path(dest_path)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTEMPTY, errno.ENOTDIR):
+                    continue
+                raise NativeSyncError("Unable to delete: " + str(e))
+            self._files_deleted += 1
+
+    # ------------------------------------------------------------------------
+    def _resolve_roots(self):
+        """Returns the source root, destination root and single file names.
+
+        The single file names are a (source name, destination name) tuple if
+        the source is a file rather than a directory, otherwise None.
+
+        """
+
+        source = self._source
+        destination = self._destination
+
+        if not os.path.exists(source):
+            raise NativeSyncError("Source does not exist: " + source)
+
+        if os.path.isdir(source):
+            if source.endswith(os.path.sep):
+                return (source, destination, None)
+            name = os.path.basename(os.path.normpath(source))
+            return (source, os.path.join(destination, name), None)
+
+        (source_root, name) = os.path.split(source)
+        if destination.endswith(os.path.sep) or os.path.isdir(destination):
+            return (source_root, destination, (name, name))
+
+        # copying to a new file name
+        (dest_root, dest_name) = os.path.split(destination)
+        return (source_root, dest_root, (name, dest_name))
+
+# ----------------------------------------------------------------------------
+class NativeSyncError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _clone_file(source_path, dest_path):
+    """Reflink clone the file. Returns False if the filesystem can't."""
+
+    try:
+        with open(source_path, 'rb') as source_fh:
+            with open(dest_path, 'wb') as dest_fh:
+                fcntl.ioctl(dest_fh.fileno(), FICLONE, source_fh.fileno())
+    except IOError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+            errno.EINVAL, errno.ENOSYS):
+            return False
+        raise
+
+    return True
+
+# ----------------------------------------------------------------------------
+def _copy_file(source_path, dest_path, reflink=False):
+    """Copy the file, preserving its mode and times.
+
+    Returns a tuple of the file's size and whether it was reflink cloned.
+
+    The copy is written to a temporary file next to the destination and
+    renamed into place, so readers never see a partially copied file.
+
+    """
+
+    dest_dir = os.path.dirname(dest_path)
+    _make_dirs(dest_dir)
+
+    cloned = False
+
+    try:
+        (fd, tmp_path) = tempfile.mkstemp(
+            prefix="." + os.path.basename(dest_path) + ".", dir=dest_dir)
+        os.close(fd)
+        try:
+            if reflink:
+                cloned = _clone_file(source_path, tmp_path)
+            if not cloned:
+                shutil.copyfile(source_path, tmp_path)
+            shutil.copystat(source_path, tmp_path)
+            if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+                shutil.rmtree(dest_path)
+            os.rename(tmp_path, dest_path)
+        except:
+            _remove_path(tmp_path)
+            raise
+    except (IOError, OSError) as e:
+        raise NativeSyncError("Unable to copy file: " + str(e))
+
+    return (os.path.getsize(dest_path), cloned)
+
+# ----------------------------------------------------------------------------
+def _link_file(link_path, dest_path):
+    """Hard link the destination to the link path, replacing it atomically."""
+
+    dest_dir = os.path.dirname(dest_path)
+    _make_dirs(dest_dir)
+
+    tmp_path = os.path.join(dest_dir,
+        "." + os.path.basename(dest_path) + ".link" + str(os.getpid()))
+    _remove_path(tmp_path)
+    os.link(link_path, tmp_path)
+    try:
+        os.rename(tmp_path, dest_path)
+    except OSError:
+        _remove_path(tmp_path)
+        raise
+
+# ----------------------------------------------------------------------------
+def _make_dirs(path):
+
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise NativeSyncError("Unable to create directory: " + str(e))
+
+# ----------------------------------------------------------------------------
+def _remove_path(path):
+
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
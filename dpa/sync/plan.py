@@ -0,0 +1,740 @@
+"""Plan the transfers that bring a location up to date.
+
+A plan covers a ptask and everything below it. It lists one transfer for
+each ptask version directory and each product representation directory
+that the location is missing, ordered so that the products subscribed to
+by the ptasks come first, then the other published products, then the ptask
+versions themselves. Plans can be written out as json and executed later,
+or somewhere else, with the concurrent sync scheduler.
+
+Classes
+-------
+SyncPlan
+    The ordered transfers needed to bring a location up to date.
+
+SyncTransfer
+    A single directory transfer within a plan.
+
+SyncPlanError
+    Raised when a plan can't be built, read or executed.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+import errno
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import pipes
+import subprocess
+
+from dpa.env.vars import DpaVars
+from dpa.location import Location, current_location_code
+from dpa.logging import Logger
+from dpa.product import Product, ProductError
+from dpa.product.representation import (
+    ProductRepresentation, ProductRepresentationError,
+)
+from dpa.product.representation.availability import (
+    AvailabilityIndex, STATUS_AVAILABLE,
+)
+from dpa.product.representation.status import (
+    ProductRepresentationStatus, ProductRepresentationStatusError,
+)
+from dpa.product.subscription import ProductSubscriptionError
+from dpa.product.version import ProductVersionError
+from dpa.ptask import PTask, PTaskError
+from dpa.ptask.area import PTaskArea
+from dpa.ptask.spec import PTaskSpec
+from dpa.ptask.version import PTaskVersionError
+from dpa.sync.job import SyncJob, SyncJobError, SyncJobManager
+from dpa.sync.manifest import (
+    FILTER_RULES_CONFIG_PATH, Manifest, ManifestError, MANIFEST_FILE,
+)
+from dpa.sync.scheduler import SyncScheduler
+from dpa.user import current_username
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# transfer kinds, in the order they are planned
+KIND_SUBSCRIBED = "subscribed"
+KIND_PRODUCT = "product"
+KIND_PTASK = "ptask"
+KINDS = [KIND_SUBSCRIBED, KIND_PRODUCT, KIND_PTASK]
+
+# concurrent queries and manifest reads while building a plan
+DEFAULT_QUERY_WORKERS = 8
+
+# bumped when the plan file format changes in an incompatible way
+PLAN_FORMAT = 1
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class SyncTransfer(object):
+    """A single directory transfer within a plan.
+
+    Paths are absolute paths at their location. They are turned into rsync
+    style remote paths when the plan is executed, relative to the location
+    executing it.
+
+    ``bytes_estimate`` is the size of the files that differ between the
+    source and destination manifests, or None if the source manifest wasn't
+    available.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**dict((str(k), v) for (k, v) in data.iteritems()))
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, kind, spec, source_location, source_path,
+        destination_location, destination_path, includes=None,
+        excludes=None, bytes_estimate=None, representation=None):
+
+        self.kind = kind
+        self.spec = spec
+        self.source_location = source_location
+        self.source_path = source_path
+        self.destination_location = destination_location
+        self.destination_path = destination_path
+        self.includes = includes or []
+        self.excludes = excludes or []
+        self.bytes_estimate = bytes_estimate
+        self.representation = representation
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+
+        return {
+            'kind': self.kind,
+            'spec': self.spec,
+            'source_location': self.source_location,
+            'source_path': self.source_path,
+            'destination_location': self.destination_location,
+            'destination_path': self.destination_path,
+            'includes': self.includes,
+            'excludes': self.excludes,
+            'bytes_estimate': self.bytes_estimate,
+            'representation': self.representation,
+        }
+
+# ----------------------------------------------------------------------------
+class SyncPlan(object):
+    """The ordered transfers needed to bring a location up to date.
+
+    Build, write and later execute a plan::
+
+        >>> plan = SyncPlan.build("show=seq010", location="REMOTE_LOC")
+        >>> print len(plan), plan.total_bytes
+        >>> plan.write("/tmp/seq010.plan")
+        >>> plan = SyncPlan.read("/tmp/seq010.plan")
+        >>> results = plan.execute(workers=8)
+
+    Transfers are deduplicated by destination, and each is sourced from the
+    location that created it, or for representations, any location holding
+    a copy.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Class methods:
+    # ------------------------------------------------------------------------
+    @classmethod
+    def build(cls, ptask, location=None, estimate=True,
+        workers=DEFAULT_QUERY_WORKERS):
+        """Plan the transfers to bring the location up to date.
+
+        ``location`` is a location code, defaulting to this location. If
+        ``estimate`` is True, the manifests of each source and destination
+        are read to estimate the bytes to transfer, and transfers whose
+        destination already matches the source are left out.
+
+        """
+
+        return _PlanBuilder(ptask, location, estimate, workers).build()
+
+    # ------------------------------------------------------------------------
+    @classmethod
+    def read(cls, path):
+        """Read a plan written with :py:meth:`write`."""
+
+        try:
+            with open(path) as plan_fh:
+                data = json.load(plan_fh)
+        except (IOError, ValueError) as e:
+            raise SyncPlanError("Unable to read sync plan: " + str(e))
+
+        if data.get('format') != PLAN_FORMAT:
+            raise SyncPlanError("Unsupported sync plan format: " + path)
+
+        return cls(
+            data['ptask'],
+            data['location'],
+            [SyncTransfer.from_dict(t) for t in data['transfers']],
+        )
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, ptask_spec, location_code, transfers=None):
+
+        self._ptask_spec = ptask_spec
+        self._location_code = location_code
+        self._transfers = list(transfers or [])
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._transfers)
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def execute(self, workers=4, limits=None, callback=None):
+        """Run the transfers. Returns the list of results, in plan order.
+
+        See :py:class:`dpa.sync.scheduler.SyncScheduler` for the arguments.
+        Transfers are limited per remote location code. Unless ``limits`` is
+        given, each location is limited by the 'workers' section of the
+        ptask's sync config, as for a ptask sync, or else to
+        ``$DPA_SYNC_SLOTS``. A representation successfully synced is
+        recorded as available at its destination.
+
+        Every transfer must be to or from this location.
+
+        """
+
+        cur_loc_code = current_location_code()
+        paths = _PathResolver(cur_loc_code)
+
+        jobs = []
+        for transfer in self._transfers:
+
+            if cur_loc_code not in (transfer.source_location,
+                transfer.destination_location):
+                raise SyncPlanError(
+                    "Unable to sync {s} from {f} to {t}: one of them must "
+                    "be this location.".format(s=transfer.spec,
+                        f=transfer.source_location,
+                        t=transfer.destination_location)
+                )
+
+            if transfer.source_location == cur_loc_code:
+                key = transfer.destination_location
+            else:
+                key = transfer.source_location
+
+            jobs.append((transfer, key, _transfer_job(
+                transfer,
+                paths.resolve(transfer.source_location,
+                    transfer.source_path),
+                paths.resolve(transfer.destination_location,
+                    transfer.destination_path),
+                transfer.destination_location == cur_loc_code,
+            )))
+
+        if limits is None:
+            limits = _location_limits(self._ptask_spec,
+                set(key for (transfer, key, job) in jobs))
+
+        scheduler = SyncScheduler(
+            workers=workers,
+            limits=limits,
+            stop_on_failure=False,
+            callback=callback,
+        )
+
+        for (transfer, key, job) in jobs:
+            scheduler.add(transfer.spec, job, key=key)
+
+        return scheduler.run()
+
+    # ------------------------------------------------------------------------
+    def to_dict(self):
+
+        return {
+            'format': PLAN_FORMAT,
+            'ptask': self._ptask_spec,
+            'location': self._location_code,
+            'transfers': [t.to_dict() for t in self._transfers],
+        }
+
+    # ------------------------------------------------------------------------
+    def write(self, path):
+        """Write the plan as json."""
+
+        try:
+            with open(path, 'w') as plan_fh:
+                json.dump(self.to_dict(), plan_fh, indent=2, sort_keys=True)
+        except IOError as e:
+            raise SyncPlanError("Unable to write sync plan: " + str(e))
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def location_code(self):
+        """The code of the location the plan brings up to date."""
+        return self._location_code
+
+    # ------------------------------------------------------------------------
+    @property
+    def ptask_spec(self):
+        return self._ptask_spec
+
+    # ------------------------------------------------------------------------
+    @property
+    def transfers(self):
+        return list(self._transfers)
+
+    # ------------------------------------------------------------------------
+    @property
+    def total_bytes(self):
+        """The estimated bytes to transfer, where known."""
+        return sum(t.bytes_estimate for t in self._transfers
+            if t.bytes_estimate is not None)
+
+    # ------------------------------------------------------------------------
+    @property
+    def unestimated(self):
+        """Transfers without an estimate, not counted in total_bytes."""
+        return [t for t in self._transfers if t.bytes_estimate is None]
+
+# ----------------------------------------------------------------------------
+class SyncPlanError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# Private classes:
+# ----------------------------------------------------------------------------
+class _PlanBuilder(object):
+    """Gathers the state of a ptask tree and plans its transfers."""
+
+    # ------------------------------------------------------------------------
+    def __init__(self, ptask, location, estimate, workers):
+
+        try:
+            self._ptask = PTask.get(ptask)
+        except PTaskError as e:
+            raise SyncPlanError("Unable to retrieve ptask: " + str(e))
+
+        self._location_code = location or current_location_code()
+        self._estimate = estimate
+        self._workers = max(1, int(workers))
+
+        self._cur_loc_code = current_location_code()
+        self._locations = {}
+        self._transfers = {}
+
+    # ------------------------------------------------------------------------
+    def build(self):
+
+        root_spec = self._ptask.spec
+
+        # ---- the ptask tree, its versions and the latest versions'
+        #      subscriptions. one query per ptask and version, concurrently.
+
+        ptasks = [self._ptask] + [p for p in self._ptask.children_recursive
+            if _in_tree(p.spec, root_spec)]
+
+        versions = self._map(_ptask_versions, ptasks)
+
+        latest_versions = [max(v, key=lambda v: v.number)
+            for v in versions if v]
+        subscribed_specs = set()
+        for subs in self._map(_subscriptions, latest_versions):
+            subscribed_specs.update(s.product_version_spec for s in subs)
+
+        # ---- published products of the tree
+
+        try:
+            products = [p for p in Product.list(search=root_spec)
+                if _in_tree(p.spec, root_spec)]
+        except ProductError as e:
+            raise SyncPlanError("Unable to list products: " + str(e))
+
+        published_specs = set()
+        for product_versions in self._map(_product_versions, products):
+            published_specs.update(v.spec for v in product_versions
+                if v.published and not v.deprecated)
+        published_specs -= subscribed_specs
+
+        # ---- representations and where they are available. the statuses
+        #      of the tree and of the subscribed products outside it are
+        #      listed up front rather than per representation.
+
+        version_specs = subscribed_specs | published_specs
+        ptask_specs = sorted(set(_product_ptask_spec(s)
+            for s in version_specs))
+        reps = []
+        for rep_list in self._map(_representations, ptask_specs):
+            reps.extend(r for r in rep_list
+                if r.product_version_spec in version_specs)
+        try:
+            availability = AvailabilityIndex.fetch(
+                [root_spec] + sorted(subscribed_specs),
+                location_code=self._location_code, workers=self._workers)
+        except ProductRepresentationStatusError as e:
+            raise SyncPlanError(
+                "Unable to list representation statuses: " + str(e))
+
+        for rep in reps:
+            kind = KIND_SUBSCRIBED \
+                if rep.product_version_spec in subscribed_specs \
+                else KIND_PRODUCT
+            self._plan_representation(kind, rep,
+                availability.locations(rep.spec))
+
+        # ---- ptask versions not created at the location
+
+        for (ptask, ptask_versions) in zip(ptasks, versions):
+            children = [p.name for p in ptasks if p.parent_spec == ptask.spec]
+            for version in ptask_versions:
+                if version.location_code != self._location_code:
+                    self._plan_ptask_version(ptask, version, children)
+
+        transfers = sorted(self._transfers.values(),
+            key=lambda t: (KINDS.index(t.kind), t.spec))
+
+        if self._estimate:
+            estimates = self._map(self._estimate_transfer, transfers)
+            transfers = [t for (t, needed) in zip(transfers, estimates)
+                if needed]
+
+        return SyncPlan(root_spec, self._location_code, transfers)
+
+    # ------------------------------------------------------------------------
+    def _add(self, transfer):
+
+        # the same directory may be reached more than once, for example a
+        # product subscribed to by several ptasks. keep the first.
+        key = (transfer.destination_location, transfer.destination_path)
+        if key not in self._transfers:
+            self._transfers[key] = transfer
+
+    # ------------------------------------------------------------------------
+    def _estimate_transfer(self, transfer):
+        """Estimate the bytes to transfer. Returns False if not needed."""
+
+        source = self._read_manifest(transfer.source_location,
+            transfer.source_path)
+        destination = self._read_manifest(transfer.destination_location,
+            transfer.destination_path)
+
+        # nothing to compare. a destination manifest doesn't mean the
+        # source hasn't changed since, so the size is just unknown.
+        if source is None:
+            return True
+
+        (changed, _) = source.diff(destination)
+        if destination is not None and not changed:
+            return False
+
+        transfer.bytes_estimate = sum(
+            source.entries[p].get('size', 0) for p in changed)
+
+        return True
+
+    # ------------------------------------------------------------------------
+    def _location(self, code):
+
+        if code not in self._locations:
+            try:
+                self._locations[code] = Location.get(code)
+            except Exception as e:
+                Logger.get("sync").warning(
+                    "Unable to retrieve location {c}: {e}".format(
+                        c=code, e=e))
+                self._locations[code] = None
+
+        return self._locations[code]
+
+    # ------------------------------------------------------------------------
+    def _plan_ptask_version(self, ptask, version, children):
+
+        source_location = self._location(version.location_code)
+        destination_location = self._location(self._location_code)
+        if not source_location or not destination_location:
+            return
+
+        # the same filter rules as a ptask sync
+        area = PTaskArea(ptask.spec, validate=False)
+        sync_config = area.config(FILTER_RULES_CONFIG_PATH,
+            composite_ancestors=True)
+
+        includes = list(sync_config.get('includes', []))
+        excludes = list(sync_config.get('excludes', []))
+        excludes.extend(os.path.sep + name for name in children)
+
+        self._add(SyncTransfer(
+            KIND_PTASK,
+            version.spec,
+            source_location.code,
+            area.dir(version=version.number,
+                root=source_location.filesystem_root, verify=False),
+            destination_location.code,
+            area.dir(version=version.number,
+                root=destination_location.filesystem_root, verify=False),
+            includes=includes,
+            excludes=excludes,
+        ))
+
+    # ------------------------------------------------------------------------
+    def _plan_representation(self, kind, rep, available):
+
+        if self._location_code in available or not available:
+            return
+
+        # prefer the location that created it, then this location
+        if rep.creation_location_code in available:
+            source_code = rep.creation_location_code
+        elif self._cur_loc_code in available:
+            source_code = self._cur_loc_code
+        else:
+            source_code = sorted(available)[0]
+
+        source_location = self._location(source_code)
+        destination_location = self._location(self._location_code)
+        if not source_location or not destination_location:
+            return
+
+        area = PTaskArea(rep.spec, validate=False)
+
+        self._add(SyncTransfer(
+            kind,
+            rep.spec,
+            source_location.code,
+            area.dir(root=source_location.filesystem_root, verify=False),
+            destination_location.code,
+            area.dir(root=destination_location.filesystem_root,
+                verify=False),
+            representation=rep.spec,
+        ))
+
+    # ------------------------------------------------------------------------
+    def _read_manifest(self, location_code, path):
+
+        if location_code == self._cur_loc_code:
+            try:
+                return Manifest.read(path)
+            except ManifestError:
+                return None
+
+        location = self._location(location_code)
+        if not location or not location.host:
+            return None
+
+        # just the manifest, without walking the remote tree
+        host = current_username() + "@" + location.host
+        command = "cat " + pipes.quote(os.path.join(path, MANIFEST_FILE))
+        try:
+            proc = subprocess.Popen(
+                ["ssh", "-o", "BatchMode=yes", host, command],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            (output, _) = proc.communicate()
+        except OSError:
+            return None
+
+        if proc.returncode != 0:
+            return None
+
+        try:
+            return Manifest.parse(path, output)
+        except ManifestError:
+            return None
+
+    # ------------------------------------------------------------------------
+    def _map(self, function, items):
+
+        if not items:
+            return []
+
+        pool = ThreadPool(min(self._workers, len(items)))
+        try:
+            return pool.map(function, items)
+        finally:
+            pool.close()
+            pool.join()
+
+# ----------------------------------------------------------------------------
+class _PathResolver(object):
+    """Turns location paths into rsync paths relative to this location."""
+
+    # ------------------------------------------------------------------------
+    def __init__(self, cur_loc_code):
+
+        self._cur_loc_code = cur_loc_code
+        self._hosts = {}
+
+    # ------------------------------------------------------------------------
+    def resolve(self, location_code, path):
+
+        path = path.rstrip("/") + "/"
+
+        if location_code == self._cur_loc_code:
+            return path
+
+        if location_code not in self._hosts:
+            self._hosts[location_code] = Location.get(location_code).host
+
+        host = self._hosts[location_code]
+        if not host:
+            raise SyncPlanError(
+                "Unable to sync with location '{l}'. Unknown host.".format(
+                    l=location_code))
+
+        return current_username() + "@" + host + ":" + path
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _in_tree(spec, root_spec):
+
+    # the search filter is a fuzzy match
+    return spec == root_spec or spec.startswith(root_spec + PTaskSpec.SEPARATOR)
+
+# ----------------------------------------------------------------------------
+def _location_limits(ptask_spec, location_codes):
+
+    try:
+        slots = int(DpaVars.sync_slots().get())
+    except ValueError:
+        slots = 0
+
+    limits = {}
+    if slots > 0:
+        limits = dict((code, slots) for code in location_codes)
+
+    # the same per location workers as a ptask sync
+    sync_config = PTaskArea(ptask_spec, validate=False).config(
+        FILTER_RULES_CONFIG_PATH, composite_ancestors=True)
+
+    for (code, value) in sync_config.get('workers', {}).iteritems():
+        if code == 'default':
+            continue
+        try:
+            limits[code] = int(value)
+        except (TypeError, ValueError):
+            Logger.get("sync").warning(
+                "Invalid sync workers for '{k}': {v}".format(k=code, v=value))
+
+    return limits
+
+# ----------------------------------------------------------------------------
+def _product_ptask_spec(product_version_spec):
+    """The spec of the ptask a product version belongs to."""
+
+    separator = PTaskSpec.SEPARATOR + PTaskSpec.PRODUCT_SEPARATOR + \
+        PTaskSpec.SEPARATOR
+
+    return product_version_spec.split(separator)[0]
+
+# ----------------------------------------------------------------------------
+def _ptask_versions(ptask):
+
+    try:
+        return ptask.versions
+    except PTaskVersionError:
+        return []
+
+# ----------------------------------------------------------------------------
+def _product_versions(product):
+
+    try:
+        return product.versions
+    except ProductVersionError:
+        return []
+
+# ----------------------------------------------------------------------------
+def _representations(ptask_spec):
+    """All the representations of the products of a ptask, in one query."""
+
+    version_prefix = PTaskSpec.SEPARATOR.join(
+        [ptask_spec, PTaskSpec.PRODUCT_SEPARATOR, ""])
+
+    try:
+        return [r for r in ProductRepresentation.list(search=version_prefix)
+            if r.spec.startswith(version_prefix)]
+    except ProductRepresentationError as e:
+        raise SyncPlanError(
+            "Unable to list representations of {p}: {e}".format(
+                p=ptask_spec, e=e))
+
+# ----------------------------------------------------------------------------
+def _subscriptions(ptask_version):
+
+    try:
+        return ptask_version.subscriptions
+    except ProductSubscriptionError:
+        return []
+
+# ----------------------------------------------------------------------------
+def _transfer_job(transfer, source, destination, local_destination):
+
+    def _run():
+
+        # rsync only creates the last directory of the destination
+        if local_destination:
+            parent = os.path.dirname(destination.rstrip("/"))
+            try:
+                os.makedirs(parent)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise SyncJobError(
+                        "Unable to create destination: " + str(e))
+
+        job = SyncJobManager().submit(
+            source,
+            destination,
+            includes=transfer.includes,
+            excludes=transfer.excludes,
+        )
+        job.wait()
+
+        if job.status == SyncJob.CANCELLED:
+            raise SyncJobError("Sync cancelled.")
+        elif job.status != SyncJob.SUCCESS:
+            raise SyncJobError(job.error)
+
+        if transfer.representation:
+            _record_available(transfer.representation,
+                transfer.destination_location)
+
+        return job
+
+    return _run
+
+# ----------------------------------------------------------------------------
+def _record_available(representation, location_code):
+
+    try:
+        existing = ProductRepresentationStatus.list(
+            product_representation=representation,
+            location=location_code,
+        )
+        if not existing:
+            ProductRepresentationStatus.create(
+                product_representation=representation,
+                location=location_code,
+                status=STATUS_AVAILABLE,
+            )
+        for status in existing:
+            if status.status != STATUS_AVAILABLE:
+                status.update(status=STATUS_AVAILABLE)
+    except ProductRepresentationStatusError as e:
+        Logger.get("sync").warning(
+            "Unable to record {r} available at {l}: {e}".format(
+                r=representation, l=location_code, e=e))
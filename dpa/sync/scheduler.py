@@ -0,0 +1,243 @@
+"""Run independent sync jobs concurrently.
+
+Classes
+-------
+SyncResult
+    The outcome of a single scheduled sync job.
+
+SyncScheduler
+    Bounded worker pool for running sync jobs concurrently.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# seconds between checks on running jobs. waiting with a timeout keeps the
+# main thread responsive to keyboard interrupts.
+POLL_INTERVAL = 0.5
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class SyncResult(object):
+    """The outcome of a single scheduled sync job."""
+
+    PENDING = 'pending'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    # ------------------------------------------------------------------------
+    def __init__(self, name):
+
+        self.name = name
+        self.status = self.__class__.PENDING
+        self.bytes_transferred = 0
+        self.files_transferred = 0
+        self.error = None
+        self.elapsed = 0.0
+
+    # ------------------------------------------------------------------------
+    @property
+    def succeeded(self):
+        return self.status == self.__class__.SUCCESS
+
+# ----------------------------------------------------------------------------
+class SyncScheduler(object):
+    """Bounded worker pool for running sync jobs concurrently.
+
+    Usage::
+
+        >>> scheduler = SyncScheduler(workers=8, limits={'remote': 2})
+        >>> scheduler.add("v0001", sync_v1, key='remote')
+        >>> scheduler.add("v0002", sync_v2, key='remote')
+        >>> results = scheduler.run()
+
+    A job is any callable. It may return an object with ``bytes_transferred``
+    and ``files_transferred`` attributes, which are totaled by the scheduler.
+    A job fails by raising an exception.
+
+    At most ``workers`` jobs run at once. Jobs added with a key are further
+    limited to the number of concurrent jobs in ``limits`` for that key, for
+    example to keep from flooding a single remote location. Jobs are started
+    in the order added, skipping those whose key is at its limit, so workers
+    are never tied up waiting on a busy key.
+
+    If ``stop_on_failure`` is True, jobs that haven't started when a job fails
+    are cancelled. Jobs that are already running are allowed to finish.
+
+    The optional ``callback`` is called with each job's ``SyncResult`` as it
+    completes. Callbacks are never called concurrently.
+
+    """
+
+    # ------------------------------------------------------------------------
+    # Special methods:
+    # ------------------------------------------------------------------------
+    def __init__(self, workers=4, limits=None, stop_on_failure=True,
+        callback=None):
+
+        self._workers = max(1, int(workers))
+        self._limits = limits or {}
+        self._stop_on_failure = stop_on_failure
+        self._callback = callback
+
+        self._jobs = []
+        self._results = []
+        self._running = {}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition()
+
+    # ------------------------------------------------------------------------
+    # Instance methods:
+    # ------------------------------------------------------------------------
+    def add(self, name, job, key=None):
+        """Add a job to be run. Returns the job's result object."""
+
+        result = SyncResult(name)
+        self._jobs.append((job, key, result))
+        self._results.append(result)
+
+        return result
+
+    # ------------------------------------------------------------------------
+    def cancel(self):
+        """Cancel any jobs that have not started."""
+        self._stop.set()
+
+    # ------------------------------------------------------------------------
+    def run(self):
+        """Run all the jobs. Returns the list of results, in order added."""
+
+        if not self._jobs:
+            return self.results
+
+        workers = min(self._workers, len(self._jobs))
+        pool = ThreadPool(workers)
+
+        # jobs waiting to start, queued by key in the order added
+        queues = OrderedDict()
+        for (index, (job, key, result)) in enumerate(self._jobs):
+            queues.setdefault(key, deque()).append((index, job, key, result))
+
+        try:
+            with self._finished:
+                while True:
+
+                    if self._stop.is_set():
+                        break
+
+                    # start the earliest waiting job whose key has capacity
+                    # for as long as there are free workers
+                    while sum(self._running.values()) < workers:
+                        heads = [q[0] for (k, q) in queues.items()
+                            if q and self._has_capacity(k)]
+                        if not heads:
+                            break
+                        (index, job, key, result) = min(heads)
+                        queues[key].popleft()
+                        self._running[key] = self._running.get(key, 0) + 1
+                        pool.apply_async(self._run_job, (job, key, result))
+
+                    if not any(queues.values()) and \
+                        not any(self._running.values()):
+                        break
+
+                    self._finished.wait(POLL_INTERVAL)
+
+        except KeyboardInterrupt:
+            # let the running jobs finish, skip the rest
+            self.cancel()
+            raise
+
+        finally:
+            for queue in queues.values():
+                for (index, job, key, result) in queue:
+                    result.status = SyncResult.CANCELLED
+            pool.close()
+            pool.join()
+
+        return self.results
+
+    # ------------------------------------------------------------------------
+    # Properties:
+    # ------------------------------------------------------------------------
+    @property
+    def results(self):
+        return list(self._results)
+
+    # ------------------------------------------------------------------------
+    @property
+    def failed(self):
+        return [r for r in self._results if r.status == SyncResult.FAILED]
+
+    # ------------------------------------------------------------------------
+    @property
+    def cancelled(self):
+        return [r for r in self._results if r.status == SyncResult.CANCELLED]
+
+    # ------------------------------------------------------------------------
+    @property
+    def bytes_transferred(self):
+        return sum(r.bytes_transferred for r in self._results)
+
+    # ------------------------------------------------------------------------
+    @property
+    def files_transferred(self):
+        return sum(r.files_transferred for r in self._results)
+
+    # ------------------------------------------------------------------------
+    # Private methods:
+    # ------------------------------------------------------------------------
+    def _has_capacity(self, key):
+
+        if key is None or key not in self._limits:
+            return True
+
+        return self._running.get(key, 0) < max(1, int(self._limits[key]))
+
+    # ------------------------------------------------------------------------
+    def _run_job(self, job, key, result):
+
+        try:
+            if self._stop.is_set():
+                result.status = SyncResult.CANCELLED
+                return
+
+            start = time.time()
+            try:
+                output = job()
+            except Exception as e:
+                result.status = SyncResult.FAILED
+                result.error = str(e)
+                if self._stop_on_failure:
+                    self._stop.set()
+            else:
+                result.status = SyncResult.SUCCESS
+                result.bytes_transferred = \
+                    getattr(output, 'bytes_transferred', None) or 0
+                result.files_transferred = \
+                    getattr(output, 'files_transferred', None) or 0
+            finally:
+                result.elapsed = time.time() - start
+
+        finally:
+            with self._finished:
+                self._running[key] -= 1
+                self._finished.notify()
+
+        if self._callback:
+            with self._lock:
+                self._callback(result)
@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_batch
+# -----------------------------------------------------------------------------
+"""Unit tests for batching related syncs into fewer transfers."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.sync.batch import SyncBatch
+from dpa.sync.job import ENGINE_NATIVE, ENGINE_RSYNC
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+REMOTE = "user@remote:/proj/seq"
+
+LOCAL = "/proj2/seq"
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all sync batch tests."""
+
+    return unittest.TestSuite([
+        SyncBatchTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class SyncBatchTestCase(unittest.TestCase):
+    """Grouping of source/destination pairs into transfers."""
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_group(self):
+        """Pairs sharing roots become a single files-from transfer"""
+
+        batch = SyncBatch(delete=True)
+        batch.add(REMOTE + "/shot1/", LOCAL + "/shot1/",
+            excludes=["/anim", "*.tmp"])
+        batch.add(REMOTE + "/shot1/anim/", LOCAL + "/shot1/anim/",
+            includes=["/cache/"], excludes=["*.tmp"])
+
+        # a directory without a trailing slash is synced into the destination
+        batch.add(REMOTE + "/shot2", LOCAL, excludes=["*.tmp"])
+
+        self.assertEqual(len(batch), 3)
+
+        transfers = batch._plan()
+        self.assertEqual(len(transfers), 1)
+
+        (name, kwargs) = transfers[0]
+        self.assertEqual(name, "/proj2/")
+        self.assertEqual(kwargs['source'], "user@remote:/proj/")
+        self.assertEqual(kwargs['destination'], "/proj2/")
+        self.assertEqual(kwargs['engine'], ENGINE_RSYNC)
+        self.assertTrue(kwargs['delete'])
+        self.assertEqual(kwargs['files_from'],
+            ["seq/shot1", "seq/shot1/anim", "seq/shot2"])
+
+        # each listed path is included ahead of the anchored excludes its
+        # parent pair rewrote relative to the roots
+        self.assertEqual(kwargs['includes'], [
+            "/seq/shot1/", "/seq/shot1/anim/", "/seq/shot2/",
+            "/seq/shot1/anim/cache/",
+        ])
+        self.assertEqual(kwargs['excludes'], ["/seq/shot1/anim", "*.tmp"])
+
+    # -------------------------------------------------------------------------
+    def test_separate(self):
+        """Pairs with different roots or unanchored rules stay separate"""
+
+        batch = SyncBatch()
+        batch.add(REMOTE + "/shot1/", LOCAL + "/shot1/")
+        batch.add("user@other:/proj/seq/shot2/", LOCAL + "/shot2/")
+        batch.add(REMOTE + "/shot3/", LOCAL + "/shot3/", excludes=["*.tmp"])
+
+        transfers = batch._plan()
+
+        self.assertEqual([n for (n, k) in transfers], ["/proj2/"] * 3)
+        self.assertEqual([k['source'] for (n, k) in transfers], [
+            REMOTE + "/shot1/", "user@other:/proj/seq/shot2/",
+            REMOTE + "/shot3/"])
+
+        # single pairs are synced as added, without a file list
+        for (name, kwargs) in transfers:
+            self.assertFalse('files_from' in kwargs)
+            self.assertEqual(kwargs['engine'], ENGINE_RSYNC)
+
+    # -------------------------------------------------------------------------
+    def test_native(self):
+        """Local pairs are synced individually with the native engine"""
+
+        tmp_dir = tempfile.mkdtemp()
+        sync_dir = os.environ.get('DPA_SYNC_DIR')
+        os.environ['DPA_SYNC_DIR'] = os.path.join(tmp_dir, "sync")
+        try:
+            source = os.path.join(tmp_dir, "seq")
+            dest = os.path.join(tmp_dir, "seq2")
+            for shot in ["shot1", "shot2"]:
+                os.makedirs(os.path.join(source, shot))
+                with open(os.path.join(source, shot, "a.ma"), 'w') as fh:
+                    fh.write(shot)
+
+            batch = SyncBatch(engine=ENGINE_NATIVE)
+            batch.add(source + "/shot1/", dest + "/shot1/")
+            batch.add(source + "/shot2/", dest + "/shot2/")
+            batch.add(REMOTE + "/shot3/", dest + "/shot3/")
+
+            transfers = batch._plan()
+            self.assertEqual([k['engine'] for (n, k) in transfers],
+                [ENGINE_NATIVE, ENGINE_NATIVE, ENGINE_RSYNC])
+
+            # only run the local transfers
+            batch = SyncBatch(engine=ENGINE_NATIVE)
+            batch.add(source + "/shot1/", dest + "/shot1/")
+            batch.add(source + "/shot2/", dest + "/shot2/")
+            results = batch.run()
+
+            self.assertEqual([r.succeeded for r in results], [True, True])
+            self.assertEqual(batch.transfers, 2)
+            self.assertEqual(batch.bytes_transferred, 10)
+            self.assertTrue(os.path.isfile(
+                os.path.join(dest, "shot2", "a.ma")))
+        finally:
+            if sync_dir is None:
+                os.environ.pop('DPA_SYNC_DIR', None)
+            else:
+                os.environ['DPA_SYNC_DIR'] = sync_dir
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,141 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_chunked
+# -----------------------------------------------------------------------------
+"""Unit tests for chunked parallel stream transfers."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.sync.chunked import (
+    BLOCK_SIZE, ChunkedTransfer, ChunkedTransferError, LocalTransport,
+    PART_SUFFIX, ThrottledTransport,
+)
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all chunked transfer tests."""
+
+    return unittest.TestSuite([
+        ChunkedTransferTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class ChunkedTransferTestCase(unittest.TestCase):
+    """Chunked transfers over a throttled local transport."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "cache.abc")
+        self.dest = os.path.join(self.tmp_dir, "remote", "cache.abc")
+
+        # 5 and a half chunks
+        with open(self.source, 'wb') as fh:
+            for i in range(11):
+                fh.write(chr(i) * (BLOCK_SIZE / 2))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_transfer(self):
+        """Chunks are reassembled at the destination with the source mtime"""
+
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=ThrottledTransport(LocalTransport(), 100 * BLOCK_SIZE),
+            streams=3, chunk_size=BLOCK_SIZE)
+        transfer.run()
+
+        self.assertEqual(transfer.chunks_transferred, 6)
+        self.assertEqual(transfer.bytes_transferred,
+            os.path.getsize(self.source))
+        self.assertEqual(self._read(self.dest), self._read(self.source))
+        self.assertEqual(int(os.path.getmtime(self.dest)),
+            int(os.path.getmtime(self.source)))
+        self.assertFalse(os.path.exists(self.dest + PART_SUFFIX))
+
+        # up to date
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=LocalTransport(), chunk_size=BLOCK_SIZE)
+        transfer.run()
+        self.assertTrue(transfer.up_to_date)
+        self.assertEqual(transfer.bytes_transferred, 0)
+
+    # -------------------------------------------------------------------------
+    def test_resume(self):
+        """An interrupted transfer only sends the remaining chunks"""
+
+        transport = _FailingTransport(fail_at=3 * BLOCK_SIZE)
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=transport, streams=1, chunk_size=BLOCK_SIZE)
+        self.assertRaises(ChunkedTransferError, transfer.run)
+        self.assertEqual(transfer.chunks_transferred, 3)
+        self.assertFalse(os.path.exists(self.dest))
+
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=LocalTransport(), streams=2, chunk_size=BLOCK_SIZE)
+        transfer.run()
+        self.assertEqual(transfer.chunks_resumed, 3)
+        self.assertEqual(transfer.chunks_transferred, 3)
+        self.assertEqual(self._read(self.dest), self._read(self.source))
+
+    # -------------------------------------------------------------------------
+    def test_other_host(self):
+        """Chunks sent to a path on one host aren't resumed on another"""
+
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=_FailingTransport(fail_at=3 * BLOCK_SIZE), streams=1,
+            chunk_size=BLOCK_SIZE)
+        self.assertRaises(ChunkedTransferError, transfer.run)
+
+        transfer = ChunkedTransfer(self.source, self.dest,
+            transport=_OtherHostTransport(), chunk_size=BLOCK_SIZE)
+        transfer.run()
+        self.assertEqual(transfer.chunks_resumed, 0)
+        self.assertEqual(transfer.chunks_transferred, 6)
+        self.assertEqual(self._read(self.dest), self._read(self.source))
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _read(self, path):
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+# -----------------------------------------------------------------------------
+class _FailingTransport(LocalTransport):
+    """Fails writing the chunk at an offset, like a dropped connection."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+
+    # -------------------------------------------------------------------------
+    def write(self, part_path, offset, blocks):
+        if offset == self.fail_at:
+            raise ChunkedTransferError("Connection lost.")
+        super(_FailingTransport, self).write(part_path, offset, blocks)
+
+# -----------------------------------------------------------------------------
+class _OtherHostTransport(LocalTransport):
+    """The same paths, as if they were on another host."""
+
+    # -------------------------------------------------------------------------
+    def address(self, path):
+        return "otherhost:" + path
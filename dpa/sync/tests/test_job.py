@@ -0,0 +1,192 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_job
+# -----------------------------------------------------------------------------
+"""Unit tests for sync jobs, their records and slots."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+from dpa.sync import job
+from dpa.sync.job import ENGINE_NATIVE, SyncJob, SyncJobManager
+from dpa.user import current_username
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all sync job tests."""
+
+    return unittest.TestSuite([
+        SyncJobTestCase,
+        SyncSlotTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class SyncJobTestCase(unittest.TestCase):
+    """Native jobs between local directories."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sync_dir = _set_sync_dir(os.path.join(self.tmp_dir, "sync"))
+
+        self.source = os.path.join(self.tmp_dir, "source")
+        self.dest = os.path.join(self.tmp_dir, "dest")
+        os.makedirs(os.path.join(self.source, "maya"))
+        for name in ["a.ma", "maya/b.ma"]:
+            with open(os.path.join(self.source, name), 'w') as fh:
+                fh.write(name)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        _set_sync_dir(self.sync_dir)
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_submit(self):
+        """Submitted jobs sync and leave a record in the user's directory"""
+
+        sync_job = SyncJobManager().submit(self.source + "/", self.dest,
+            engine=ENGINE_NATIVE)
+
+        self.assertEqual(sync_job.wait(), SyncJob.SUCCESS)
+        self.assertTrue(sync_job in SyncJobManager().jobs)
+        self.assertFalse(sync_job in SyncJobManager().running)
+        self.assertEqual(sync_job.files_transferred, 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "maya/b.ma")))
+
+        # local syncs don't need a slot
+        self.assertEqual(sync_job.to_dict()['slot_key'], None)
+
+        record_dir = os.path.dirname(sync_job.record_path)
+        self.assertEqual(record_dir, os.path.join(self.tmp_dir, "sync",
+            job.JOB_RECORD_DIR, current_username()))
+        with open(sync_job.record_path) as record_fh:
+            record = json.load(record_fh)
+        self.assertEqual(record['status'], SyncJob.SUCCESS)
+        self.assertEqual(record['files_transferred'], 2)
+
+        # other users may add their own records, but not touch this user's
+        shared_mode = os.stat(os.path.dirname(record_dir)).st_mode
+        self.assertEqual(stat.S_IMODE(shared_mode), 01777)
+        self.assertEqual(stat.S_IMODE(os.stat(record_dir).st_mode) & 022, 0)
+
+    # -------------------------------------------------------------------------
+    def test_old_records(self):
+        """Records and output older than the max age are removed"""
+
+        sync_job = SyncJobManager().submit(self.source + "/", self.dest,
+            engine=ENGINE_NATIVE)
+        sync_job.wait()
+
+        record_dir = os.path.dirname(sync_job.record_path)
+        old_output = os.path.join(record_dir, "old.out")
+        with open(old_output, 'w') as fh:
+            fh.write("rsync: connection unexpectedly closed")
+        old = time.time() - job.RECORD_MAX_AGE - 60
+        os.utime(old_output, (old, old))
+
+        job._remove_old_records()
+
+        self.assertFalse(os.path.exists(old_output))
+        self.assertTrue(os.path.exists(sync_job.record_path))
+
+# -----------------------------------------------------------------------------
+class SyncSlotTestCase(unittest.TestCase):
+    """Slots limiting concurrent syncs with a host."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sync_dir = _set_sync_dir(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        _set_sync_dir(self.sync_dir)
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_slots(self):
+        """A job waits for a free slot, or until cancelled"""
+
+        first = job._acquire_slot("user@remote", 1, threading.Event())
+        self.assertTrue(first is not None)
+
+        slot_dir = os.path.join(self.tmp_dir, job.SLOT_DIR)
+        self.assertEqual(stat.S_IMODE(os.stat(slot_dir).st_mode), 01777)
+        slot_mode = os.stat(os.path.join(slot_dir, "user_remote.0.lock"))
+        self.assertEqual(stat.S_IMODE(slot_mode.st_mode), 0666)
+
+        # another slot key isn't limited by this one
+        other = job._acquire_slot("elsewhere", 1, threading.Event())
+        self.assertTrue(other is not None)
+        os.close(other)
+
+        acquired = []
+        waiting = threading.Thread(target=lambda: acquired.append(
+            job._acquire_slot("user@remote", 1, threading.Event())))
+        waiting.start()
+        time.sleep(job.POLL_INTERVAL)
+        self.assertEqual(acquired, [])
+
+        os.close(first)
+        waiting.join(5)
+        self.assertEqual(len(acquired), 1)
+
+        # still held, so a cancelled wait gives up
+        cancel = threading.Event()
+        cancel.set()
+        self.assertEqual(job._acquire_slot("user@remote", 1, cancel), None)
+        os.close(acquired[0])
+
+    # -------------------------------------------------------------------------
+    def test_cancel_waiting(self):
+        """Cancelling a job waiting for a slot cancels it without running"""
+
+        held = job._acquire_slot("remote", 1, threading.Event())
+
+        sync_job = SyncJob("/nonexistent/", "remote:/dest/",
+            engine=ENGINE_NATIVE, slot_key="remote", slots=1)
+        sync_job.start()
+        time.sleep(job.POLL_INTERVAL)
+        self.assertEqual(sync_job.status, SyncJob.WAITING)
+
+        sync_job.cancel()
+
+        self.assertEqual(sync_job.wait(5), SyncJob.CANCELLED)
+        os.close(held)
+
+# -----------------------------------------------------------------------------
+# Private functions:
+# -----------------------------------------------------------------------------
+def _set_sync_dir(path):
+    """Set $DPA_SYNC_DIR, or unset it if None. Returns the previous value."""
+
+    previous = os.environ.get('DPA_SYNC_DIR')
+    if path is None:
+        os.environ.pop('DPA_SYNC_DIR', None)
+    else:
+        os.environ['DPA_SYNC_DIR'] = path
+
+    return previous
@@ -0,0 +1,270 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_manifest
+# -----------------------------------------------------------------------------
+"""Unit tests for sync manifests and the native sync engine."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.sync.frames import FramePattern, FramePatternError
+from dpa.sync.manifest import FilterRules, Manifest, MANIFEST_FILE
+from dpa.sync.native import NativeSync
+from dpa.sync.verify import verify_tree, MISSING, WRONG_HASH, WRONG_SIZE
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all manifest tests."""
+
+    return unittest.TestSuite([
+        FilterRulesTestCase,
+        FramePatternTestCase,
+        NativeSyncTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class FilterRulesTestCase(unittest.TestCase):
+    """Rsync style filter rule tests."""
+
+    # -------------------------------------------------------------------------
+    def test_rules(self):
+        """Filter rules follow rsync's anchoring and directory rules"""
+
+        rules = FilterRules(
+            includes=["/keep/cache"],
+            excludes=["/cache", "*.tmp", "/.[0-9]*/", "maya/project/*"],
+        )
+
+        self.assertTrue(rules.excluded("cache", True))
+        self.assertFalse(rules.excluded("sub/cache", True))
+        self.assertFalse(rules.excluded("keep/cache", True))
+        self.assertTrue(rules.excluded("sub/file.tmp", False))
+        self.assertTrue(rules.excluded(".0001", True))
+        self.assertFalse(rules.excluded(".0001", False))
+        self.assertTrue(rules.excluded("a/maya/project/scenes", True))
+        self.assertFalse(rules.excluded("work.ma", False))
+
+# -----------------------------------------------------------------------------
+class FramePatternTestCase(unittest.TestCase):
+    """Image sequence pattern tests."""
+
+    # -------------------------------------------------------------------------
+    def test_paths(self):
+        """Frame paths are padded and listed in frame order"""
+
+        pattern = FramePattern("exr/layer.####.exr")
+        self.assertEqual(pattern.paths("1003,1001-1002"), [
+            "exr/layer.1001.exr",
+            "exr/layer.1002.exr",
+            "exr/layer.1003.exr",
+        ])
+        self.assertEqual(FramePattern("img.%03d.dpx").path(7), "img.007.dpx")
+        self.assertEqual(FramePattern("img.%d.dpx").path(7), "img.7.dpx")
+        self.assertEqual(FramePattern("img.$F3.dpx").path(7), "img.007.dpx")
+        self.assertRaises(FramePatternError, FramePattern, "img.exr")
+        self.assertRaises(FramePatternError, FramePattern, "#.####.exr")
+
+# -----------------------------------------------------------------------------
+class NativeSyncTestCase(unittest.TestCase):
+    """Native sync engine tests."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "source")
+        self.dest = os.path.join(self.tmp_dir, "dest")
+
+        self._write("a.txt", "a")
+        self._write("sub/b.txt", "bb")
+        self._write("sub/skip.tmp", "skip")
+        os.makedirs(os.path.join(self.source, "empty"))
+        os.symlink("a.txt", os.path.join(self.source, "link"))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_sync_and_resync(self):
+        """Only new and changed files are copied on later syncs"""
+
+        sync = self._sync()
+        self.assertEqual(sync.files_transferred, 3)
+        self.assertEqual(sync.bytes_transferred, 3)
+        self.assertEqual(self._read("sub/b.txt"), "bb")
+        self.assertEqual(os.readlink(os.path.join(self.dest, "link")), "a.txt")
+        self.assertTrue(os.path.isdir(os.path.join(self.dest, "empty")))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.dest, "sub", "skip.tmp")))
+        self.assertTrue(
+            os.path.exists(os.path.join(self.dest, MANIFEST_FILE)))
+
+        # unchanged
+        sync = self._sync()
+        self.assertEqual(sync.files_transferred, 0)
+
+        # one changed file
+        self._write("sub/b.txt", "bbb")
+        sync = self._sync()
+        self.assertEqual(sync.files_transferred, 1)
+        self.assertEqual(self._read("sub/b.txt"), "bbb")
+
+    # -------------------------------------------------------------------------
+    def test_delete(self):
+        """Files removed from the source are deleted only if requested"""
+
+        self._sync()
+        os.remove(os.path.join(self.source, "a.txt"))
+
+        self._sync()
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "a.txt")))
+
+        sync = self._sync(delete=True)
+        self.assertEqual(sync.files_deleted, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "a.txt")))
+        self.assertNotIn("a.txt", Manifest.read(self.dest))
+
+    # -------------------------------------------------------------------------
+    def test_modified_destination(self):
+        """Changes made directly to the destination are undone"""
+
+        self._sync()
+
+        with open(os.path.join(self.dest, "a.txt"), 'w') as fh:
+            fh.write("edited")
+        with open(os.path.join(self.dest, "new.txt"), 'w') as fh:
+            fh.write("new")
+
+        self._sync(delete=True)
+
+        self.assertEqual(self._read("a.txt"), "a")
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "new.txt")))
+
+    # -------------------------------------------------------------------------
+    def test_checksum_reuse(self):
+        """Hashes are reused for files that haven't changed"""
+
+        first = Manifest.record(self.source, checksum=True)
+        entry = first.entries["a.txt"]
+        self.assertEqual(entry['hash'], "0cc175b9c0f1b6a831c399e269772661")
+
+        # a stale hash is only reused if the size and mtime still match
+        first.entries["a.txt"]['hash'] = "stale"
+        first.write()
+        second = Manifest.scan(self.source, checksum=True,
+            previous=Manifest.read(self.source))
+        self.assertEqual(second.entries["a.txt"]['hash'], "stale")
+
+    # -------------------------------------------------------------------------
+    def test_verify(self):
+        """Synced copies are verified against the source's checksums"""
+
+        for i in range(4):
+            self._write("seq/img.{i}.exr".format(i=i), "frame" + str(i))
+        Manifest.record(self.source, checksum=True, workers=2)
+
+        self._sync()
+        self.assertEqual(verify_tree(self.dest, workers=2), [])
+
+        os.remove(os.path.join(self.dest, "seq", "img.0.exr"))
+        with open(os.path.join(self.dest, "seq", "img.1.exr"), 'w') as fh:
+            fh.write("frame")
+        with open(os.path.join(self.dest, "seq", "img.2.exr"), 'w') as fh:
+            fh.write("framex")
+
+        self.assertEqual(
+            [(m.path, m.reason) for m in verify_tree(self.dest, workers=2)],
+            [
+                ("seq/img.0.exr", MISSING),
+                ("seq/img.1.exr", WRONG_SIZE),
+                ("seq/img.2.exr", WRONG_HASH),
+            ]
+        )
+
+    # -------------------------------------------------------------------------
+    def test_link_dest(self):
+        """Files unchanged since the link destination are hard linked"""
+
+        previous = os.path.join(self.tmp_dir, "previous")
+        NativeSync(self.source + os.path.sep, previous,
+            excludes=["*.tmp"]).run()
+        self._write("sub/b.txt", "changed")
+
+        sync = NativeSync(self.source + os.path.sep, self.dest,
+            excludes=["*.tmp"], link_dest=previous, reflink=True)
+        sync.run()
+
+        self.assertEqual(sync.files_linked, 1)
+        self.assertEqual(
+            os.stat(os.path.join(self.dest, "a.txt")).st_ino,
+            os.stat(os.path.join(previous, "a.txt")).st_ino,
+        )
+        self.assertNotEqual(
+            os.stat(os.path.join(self.dest, "sub", "b.txt")).st_ino,
+            os.stat(os.path.join(previous, "sub", "b.txt")).st_ino,
+        )
+        self.assertEqual(self._read("sub/b.txt"), "changed")
+
+    # -------------------------------------------------------------------------
+    def test_files_from(self):
+        """Only listed paths are synced, and missing ones are skipped"""
+
+        for frame in range(1, 6):
+            self._write("seq/img.{f:04d}.exr".format(f=frame), "x")
+
+        # no destination manifest yet, so none is written
+        files_from = FramePattern("seq/img.####.exr").paths("2-3,9")
+        sync = NativeSync(self.source + os.path.sep, self.dest,
+            files_from=files_from)
+        sync.run()
+        self.assertEqual(sync.files_transferred, 2)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dest, "seq"))),
+            ["img.0002.exr", "img.0003.exr"])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.dest, MANIFEST_FILE)))
+
+        # a recorded destination keeps its manifest up to date
+        self._sync()
+        sync = NativeSync(self.source + os.path.sep, self.dest,
+            files_from=["seq/img.0004.exr"])
+        sync.run()
+        self.assertEqual(sync.files_transferred, 0)
+        manifest = Manifest.read(self.dest)
+        self.assertIn("a.txt", manifest)
+        self.assertIn("seq/img.0005.exr", manifest)
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _read(self, rel_path):
+        with open(os.path.join(self.dest, rel_path)) as fh:
+            return fh.read()
+
+    # -------------------------------------------------------------------------
+    def _sync(self, delete=False):
+        sync = NativeSync(self.source + os.path.sep, self.dest,
+            excludes=["*.tmp"], delete=delete, workers=2)
+        sync.run()
+        return sync
+
+    # -------------------------------------------------------------------------
+    def _write(self, rel_path, data):
+        path = os.path.join(self.source, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write(data)
@@ -0,0 +1,372 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_plan
+# -----------------------------------------------------------------------------
+"""Unit tests for planning the syncs that bring a location up to date."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dpa.action import ActionError
+from dpa.restful.client import RestfulClient, RestfulClientError
+from dpa.sync import plan
+from dpa.sync.action import SyncPlanAction
+from dpa.sync.plan import (
+    KIND_PRODUCT, KIND_PTASK, KIND_SUBSCRIBED, SyncPlan, SyncPlanError,
+    SyncTransfer,
+)
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+LIGHT = "show=s010=light"
+COMP = "show=s020=comp"
+
+BEAUTY = LIGHT + "=products=beauty=render"
+FINAL = COMP + "=products=final=render"
+
+LOCATIONS = {
+    'site': "/site",
+    'remote': "/remote",
+}
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all sync plan tests."""
+
+    return unittest.TestSuite([
+        SyncPlanTestCase,
+        SyncPlanActionTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class SyncPlanTestCase(unittest.TestCase):
+    """Plans a ptask tree at the site against an in memory server.
+
+    The light ptask was worked on remotely, then at the site, and subscribes
+    to a comp product outside the tree.
+
+    """
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['DPA_LOCATION_CODE'] = "site"
+        os.environ['DPA_PROJECTS_ROOT'] = os.path.join(self.tmp_dir, "site")
+        os.environ['DPA_FILESYSTEM_ROOT'] = os.path.join(self.tmp_dir, "site")
+
+        self.server = _StandInServer()
+        self.execute_request = RestfulClient.execute_request
+        RestfulClient.execute_request = \
+            lambda client, *args, **kwargs: self.server.request(
+                *args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        RestfulClient.execute_request = self.execute_request
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_build(self):
+        """Subscribed products first, then published products, then ptasks"""
+
+        sync_plan = SyncPlan.build("show=s010", location="site",
+            estimate=False)
+
+        self.assertEqual(
+            [(t.kind, t.spec, t.source_location) for t in sync_plan.transfers],
+            [
+                (KIND_SUBSCRIBED, FINAL + "=0001=exr=1920x1080", "remote"),
+                (KIND_PRODUCT, BEAUTY + "=0001=exr=1920x1080", "remote"),
+                (KIND_PTASK, LIGHT + "@1", "remote"),
+            ])
+
+        (comp, beauty, light) = sync_plan.transfers
+        self.assertEqual(comp.source_path,
+            "/remote/show/s020/comp/products/final/render/0001/exr/1920x1080")
+        self.assertEqual(comp.destination_path,
+            "/site/show/s020/comp/products/final/render/0001/exr/1920x1080")
+        self.assertEqual(comp.representation, comp.spec)
+        self.assertEqual(light.source_path, "/remote/show/s010/light/.0001")
+        self.assertEqual(light.representation, None)
+        self.assertTrue("/products" in light.excludes)
+
+        # one representation listing per ptask, not per product version
+        self.assertEqual(self.server.searches('product-representations'),
+            [LIGHT + "=products=", COMP + "=products="])
+
+    # -------------------------------------------------------------------------
+    def test_list_error(self):
+        """A failed representation listing fails the plan"""
+
+        self.server.fail = 'product-representations'
+
+        self.assertRaises(SyncPlanError, SyncPlan.build, "show=s010",
+            location="site", estimate=False)
+
+    # -------------------------------------------------------------------------
+    def test_status_error(self):
+        """A failed status listing fails the plan"""
+
+        self.server.fail = 'product-representation-statuses'
+
+        self.assertRaises(SyncPlanError, SyncPlan.build, "show=s010",
+            location="site", estimate=False)
+
+    # -------------------------------------------------------------------------
+    def test_record_available(self):
+        """Synced representations are recorded as available"""
+
+        rep = BEAUTY + "=0001=exr=1920x1080"
+        self.server.statuses[(rep, "site")] = 0
+
+        plan._record_available(rep, "site")
+        plan._record_available(rep, "other")
+
+        self.assertEqual(self.server.statuses[(rep, "site")], 1)
+        self.assertEqual(self.server.statuses[(rep, "other")], 1)
+        self.assertEqual(self.server.actions, ['list', 'update', 'list',
+            'create'])
+
+    # -------------------------------------------------------------------------
+    def test_write_read(self):
+        """Plans survive being written and read back"""
+
+        sync_plan = SyncPlan.build("show=s010", location="site",
+            estimate=False)
+        path = os.path.join(self.tmp_dir, "s010.plan")
+        sync_plan.write(path)
+
+        read_plan = SyncPlan.read(path)
+
+        self.assertEqual(read_plan.ptask_spec, "show=s010")
+        self.assertEqual(read_plan.location_code, "site")
+        self.assertEqual([t.to_dict() for t in read_plan.transfers],
+            [t.to_dict() for t in sync_plan.transfers])
+        self.assertEqual(len(read_plan.unestimated), 3)
+        self.assertEqual(read_plan.total_bytes, 0)
+
+# -----------------------------------------------------------------------------
+class SyncPlanActionTestCase(unittest.TestCase):
+    """The sync plan action with written plans."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.location_code = os.environ.get('DPA_LOCATION_CODE')
+        os.environ['DPA_LOCATION_CODE'] = "site"
+
+        self.path = os.path.join(self.tmp_dir, "s010.plan")
+        SyncPlan("show=s010", "remote", [
+            SyncTransfer(KIND_PTASK, LIGHT + "@2", "site",
+                "/site/show/s010/light/.0002", "remote",
+                "/remote/show/s010/light/.0002", bytes_estimate=100),
+        ]).write(self.path)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        if self.location_code is None:
+            os.environ.pop('DPA_LOCATION_CODE', None)
+        else:
+            os.environ['DPA_LOCATION_CODE'] = self.location_code
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_read(self):
+        """A plan read and written again is unchanged"""
+
+        output = os.path.join(self.tmp_dir, "copy.plan")
+        action = _PlanAction("", read=self.path, output=output)
+        action()
+
+        self.assertEqual(len(action.plan), 1)
+        self.assertEqual(action.plan.total_bytes, 100)
+        self.assertEqual(action.results, [])
+        with open(self.path) as plan_fh:
+            with open(output) as output_fh:
+                self.assertEqual(output_fh.read(), plan_fh.read())
+
+    # -------------------------------------------------------------------------
+    def test_execute_elsewhere(self):
+        """Only plans for this location can be executed"""
+
+        action = _PlanAction("", read=self.path, execute=True)
+
+        self.assertRaises(ActionError, action)
+        self.assertEqual(action.results, [])
+
+    # -------------------------------------------------------------------------
+    def test_workers(self):
+        """At least one worker is needed"""
+
+        action = _PlanAction("", read=self.path, workers=0)
+
+        self.assertRaises(ActionError, action.validate)
+
+# -----------------------------------------------------------------------------
+# Test actions:
+# -----------------------------------------------------------------------------
+class _PlanAction(SyncPlanAction):
+
+    logging = False
+
+# -----------------------------------------------------------------------------
+# Private classes:
+# -----------------------------------------------------------------------------
+class _StandInServer(object):
+    """Just enough of the data server to plan a ptask tree."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self.requests = []
+        self.fail = None
+
+        self.ptasks = {
+            "show=s010": "show",
+            LIGHT: "show=s010",
+        }
+        self.ptask_versions = [
+            ("show=s010", 1, "site"),
+            (LIGHT, 1, "remote"),
+            (LIGHT, 2, "site"),
+        ]
+        self.subscriptions = {
+            LIGHT + "@2": [FINAL + "=0001"],
+        }
+        self.product_versions = {
+            BEAUTY: [(1, True), (2, False)],
+            FINAL: [(1, True)],
+        }
+        self.representations = [
+            (BEAUTY + "=0001", "exr=1920x1080", "remote"),
+            (BEAUTY + "=0001", "jpg=960x540", "site"),
+            (BEAUTY + "=0002", "exr=1920x1080", "site"),
+            (FINAL + "=0001", "exr=1920x1080", "remote"),
+        ]
+        self.statuses = {
+            (BEAUTY + "=0001=exr=1920x1080", "remote"): 1,
+            (BEAUTY + "=0001=jpg=960x540", "site"): 1,
+            (BEAUTY + "=0002=exr=1920x1080", "site"): 1,
+            (FINAL + "=0001=exr=1920x1080", "remote"): 1,
+        }
+
+    # -------------------------------------------------------------------------
+    @property
+    def actions(self):
+        return [a for (a, t, p) in self.requests]
+
+    # -------------------------------------------------------------------------
+    def searches(self, data_type):
+        return [p['search'] for (a, t, p) in self.requests
+            if t == data_type and 'search' in p]
+
+    # -------------------------------------------------------------------------
+    def request(self, action, data_type, primary_key=None, data=None,
+        params=None, headers=None):
+
+        self.requests.append((action, data_type, params or {}))
+        if data_type == self.fail:
+            raise RestfulClientError("Server unavailable")
+
+        params = params or {}
+        handler = getattr(self,
+            "_" + action + "_" + data_type.replace("-", "_"))
+
+        if action == 'get':
+            return handler(primary_key)
+        elif action in ('create', 'update'):
+            return handler(data)
+
+        return handler(**params)
+
+    # -------------------------------------------------------------------------
+    def _get_locations(self, code):
+        return {'code': code, 'host': code + ".example.com",
+            'filesystem_root': LOCATIONS[code]}
+
+    # -------------------------------------------------------------------------
+    def _get_ptasks(self, spec):
+        return {'spec': spec, 'name': spec.split("=")[-1],
+            'parent': self.ptasks[spec]}
+
+    # -------------------------------------------------------------------------
+    def _list_ptasks(self, search):
+        return [self._get_ptasks(s) for s in sorted(self.ptasks)
+            if search in s]
+
+    # -------------------------------------------------------------------------
+    def _list_ptask_versions(self, ptask):
+        return [{'spec': p + "@" + str(n), 'ptask': p, 'number': n,
+            'location': l} for (p, n, l) in self.ptask_versions if p == ptask]
+
+    # -------------------------------------------------------------------------
+    def _list_product_subscriptions(self, ptask_version):
+        return [{'spec': ptask_version + "," + v, 'product_version': v}
+            for v in self.subscriptions.get(ptask_version, [])]
+
+    # -------------------------------------------------------------------------
+    def _list_products(self, search):
+        return [{'spec': p} for p in sorted(self.product_versions)
+            if search in p]
+
+    # -------------------------------------------------------------------------
+    def _list_product_versions(self, product):
+        return [{'spec': product + "=" + str(n).zfill(4), 'product': product,
+            'published': published, 'deprecated': False}
+            for (n, published) in self.product_versions[product]]
+
+    # -------------------------------------------------------------------------
+    def _list_product_representations(self, search):
+        return [{'spec': v + "=" + r, 'product_version': v,
+            'creation_location': l} for (v, r, l) in self.representations
+            if search in v + "=" + r]
+
+    # -------------------------------------------------------------------------
+    def _list_product_representation_statuses(self, search=None,
+        product_representation=None, location=None):
+
+        return [self._status(r, l) for (r, l) in sorted(self.statuses)
+            if (search is None or search in r) and
+               (product_representation in (None, r)) and
+               (location in (None, l))]
+
+    # -------------------------------------------------------------------------
+    def _create_product_representation_statuses(self, data):
+        key = (data['product_representation'], data['location'])
+        self.statuses[key] = data['status']
+        return self._status(*key)
+
+    # -------------------------------------------------------------------------
+    def _update_product_representation_statuses(self, data):
+        return self._create_product_representation_statuses(data)
+
+    # -------------------------------------------------------------------------
+    def _status(self, rep, location):
+        return {'spec': rep + "," + location, 'product_representation': rep,
+            'location': location, 'status': self.statuses[(rep, location)]}
@@ -0,0 +1,134 @@
+# -----------------------------------------------------------------------------
+# Module: dpa.sync.tests.test_scheduler
+# -----------------------------------------------------------------------------
+"""Unit tests for the concurrent sync scheduler."""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from collections import namedtuple
+import threading
+import time
+import unittest
+
+from dpa.sync.scheduler import SyncResult, SyncScheduler
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+Output = namedtuple('Output', 'bytes_transferred files_transferred')
+
+# -----------------------------------------------------------------------------
+# Suite for all test cases defined:
+# -----------------------------------------------------------------------------
+def suite():
+    """Returns a test suite for all scheduler tests."""
+
+    return unittest.TestSuite([
+        SyncSchedulerTestCase,
+    ])
+
+# -----------------------------------------------------------------------------
+# Test Cases:
+# -----------------------------------------------------------------------------
+class SyncSchedulerTestCase(unittest.TestCase):
+    """Fake jobs that record when they start and how many run at once."""
+
+    # -------------------------------------------------------------------------
+    # Setup:
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = {}
+        self.peak = {}
+
+    # -------------------------------------------------------------------------
+    # Tests:
+    # -------------------------------------------------------------------------
+    def test_key_limits(self):
+        """A busy key doesn't hold up jobs for other keys"""
+
+        scheduler = SyncScheduler(workers=3, limits={'remote': 1})
+        for num in range(3):
+            name = "remote{n}".format(n=num)
+            scheduler.add(name, self._job(name, 'remote', 0.2), key='remote')
+        for num in range(4):
+            name = "local{n}".format(n=num)
+            scheduler.add(name, self._job(name, 'local', 0.05), key='local')
+
+        start = time.time()
+        results = scheduler.run()
+
+        self.assertTrue(all(r.succeeded for r in results))
+        self.assertEqual(self.peak, {'remote': 1, 'local': 2})
+
+        # the local jobs all finish while the remote ones run one at a time
+        self.assertTrue(self.started.index("local3") <
+            self.started.index("remote1"))
+        self.assertTrue(time.time() - start < 0.9)
+
+    # -------------------------------------------------------------------------
+    def test_order(self):
+        """Jobs start in the order added, and results keep that order"""
+
+        scheduler = SyncScheduler(workers=1)
+        names = ["v0003", "v0001", "v0002"]
+        for name in names:
+            scheduler.add(name, self._job(name, None, 0))
+
+        results = scheduler.run()
+
+        self.assertEqual(self.started, names)
+        self.assertEqual([r.name for r in results], names)
+        self.assertEqual(scheduler.bytes_transferred, 300)
+        self.assertEqual(scheduler.files_transferred, 3)
+
+    # -------------------------------------------------------------------------
+    def test_failure(self):
+        """A failure cancels jobs that haven't started"""
+
+        def _fail():
+            raise ValueError("no space left")
+
+        reported = []
+        scheduler = SyncScheduler(workers=1, callback=reported.append)
+        scheduler.add("v0001", self._job("v0001", None, 0))
+        scheduler.add("v0002", _fail)
+        scheduler.add("v0003", self._job("v0003", None, 0))
+
+        results = scheduler.run()
+
+        self.assertEqual([r.status for r in results],
+            [SyncResult.SUCCESS, SyncResult.FAILED, SyncResult.CANCELLED])
+        self.assertEqual(results[1].error, "no space left")
+        self.assertEqual([r.name for r in scheduler.failed], ["v0002"])
+        self.assertEqual([r.name for r in reported], ["v0001", "v0002"])
+
+        # without stopping, the rest still run
+        scheduler = SyncScheduler(workers=1, stop_on_failure=False)
+        scheduler.add("v0002", _fail)
+        scheduler.add("v0003", self._job("v0003", None, 0))
+
+        self.assertEqual([r.status for r in scheduler.run()],
+            [SyncResult.FAILED, SyncResult.SUCCESS])
+
+    # -------------------------------------------------------------------------
+    # Helpers:
+    # -------------------------------------------------------------------------
+    def _job(self, name, key, duration):
+
+        def _run():
+            with self.lock:
+                self.started.append(name)
+                self.running[key] = self.running.get(key, 0) + 1
+                self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+            time.sleep(duration)
+            with self.lock:
+                self.running[key] -= 1
+            return Output(100, 1)
+
+        return _run
@@ -0,0 +1,136 @@
+"""Verify a directory tree against its checksum manifest.
+
+A checksum manifest (see :py:meth:`dpa.sync.manifest.Manifest.record`)
+records a hash of each file's contents. It is recorded where the tree is
+created and travels with the tree when it is synced, so the copy at any
+location can be checked for missing, truncated or corrupt files.
+
+Classes
+-------
+Mismatch
+    A file that doesn't match its manifest entry.
+
+"""
+
+# ----------------------------------------------------------------------------
+# Imports:
+# ----------------------------------------------------------------------------
+
+from collections import namedtuple
+import os
+import stat
+
+from dpa.sync.manifest import (
+    Manifest, ManifestError, TYPE_DIR, TYPE_FILE, TYPE_LINK, hash_files,
+)
+
+# ----------------------------------------------------------------------------
+# Globals:
+# ----------------------------------------------------------------------------
+
+# mismatch reasons
+MISSING = "missing"
+WRONG_TYPE = "type"
+WRONG_SIZE = "size"
+WRONG_LINK = "link"
+WRONG_HASH = "checksum"
+
+# ----------------------------------------------------------------------------
+# Classes:
+# ----------------------------------------------------------------------------
+class Mismatch(namedtuple('Mismatch', 'path reason expected actual')):
+    """A file that doesn't match its manifest entry.
+
+    ``path`` is relative to the verified root. ``expected`` and ``actual``
+    are the values that differ, None if not applicable.
+
+    """
+    __slots__ = ()
+
+# ----------------------------------------------------------------------------
+# Public functions:
+# ----------------------------------------------------------------------------
+def verify_tree(root, manifest=None, workers=None):
+    """Verify the tree against a manifest. Returns a list of mismatches.
+
+    The manifest defaults to the one recorded in the root. Every entry is
+    checked with a stat first, and only files of the expected size are
+    hashed, in parallel by ``workers`` threads (see
+    :py:func:`dpa.sync.manifest.hash_files`). Files without a recorded hash
+    are only checked by size. Files in the tree that aren't in the manifest
+    are ignored.
+
+    Raises ManifestError if there is no manifest to verify against.
+
+    """
+
+    root = os.path.abspath(root)
+
+    if manifest is None:
+        manifest = Manifest.read(root)
+        if manifest is None:
+            raise ManifestError("No manifest to verify against: " + root)
+
+    mismatches = []
+    to_hash = []
+
+    for (rel_path, entry) in sorted(manifest.entries.iteritems()):
+
+        full_path = os.path.join(root, rel_path)
+        try:
+            info = os.lstat(full_path)
+        except OSError:
+            mismatches.append(Mismatch(rel_path, MISSING, None, None))
+            continue
+
+        actual_type = _entry_type(info)
+        if actual_type != entry['type']:
+            mismatches.append(
+                Mismatch(rel_path, WRONG_TYPE, entry['type'], actual_type))
+
+        elif entry['type'] == TYPE_LINK:
+            link = os.readlink(full_path)
+            if link != entry['link']:
+                mismatches.append(
+                    Mismatch(rel_path, WRONG_LINK, entry['link'], link))
+
+        elif entry['type'] == TYPE_FILE:
+            if info.st_size != entry['size']:
+                mismatches.append(Mismatch(rel_path, WRONG_SIZE,
+                    entry['size'], info.st_size))
+            elif 'hash' in entry:
+                to_hash.append(rel_path)
+
+    try:
+        digests = hash_files(root, to_hash, workers=workers)
+    except ManifestError:
+        # a file became unreadable since the stat. hash the slow way to
+        # find out which.
+        digests = {}
+        for rel_path in to_hash:
+            try:
+                digests.update(hash_files(root, [rel_path], workers=1))
+            except ManifestError:
+                mismatches.append(Mismatch(rel_path, MISSING, None, None))
+
+    for (rel_path, digest) in digests.iteritems():
+        expected = manifest.entries[rel_path]['hash']
+        if digest != expected:
+            mismatches.append(
+                Mismatch(rel_path, WRONG_HASH, expected, digest))
+
+    return sorted(mismatches)
+
+# ----------------------------------------------------------------------------
+# Private functions:
+# ----------------------------------------------------------------------------
+def _entry_type(info):
+
+    if stat.S_ISLNK(info.st_mode):
+        return TYPE_LINK
+    elif stat.S_ISDIR(info.st_mode):
+        return TYPE_DIR
+    elif stat.S_ISREG(info.st_mode):
+        return TYPE_FILE
+
+    return None
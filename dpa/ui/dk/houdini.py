@@ -13,6 +13,7 @@ from dpa.notify import Notification, emails_from_unames
 from dpa.ptask.area import PTaskArea, PTaskAreaError
 from dpa.ptask import PTask
 from dpa.queue import get_unique_id, create_queue_task
+from dpa.sequence import TOKEN_HOUDINI, format_pattern
 from dpa.ui.dk.base import BaseDarkKnightDialog, DarkKnightError
 from dpa.user import current_username, User
 
@@ -175,9 +176,11 @@ class HoudiniDarkKnightDialog(BaseDarkKnightDialog):
                 "Unable to create ifd file directory: " + str(e))
 
         ifd_dir = os.path.join(create_action.product_repr.area.path,
-            'ifd', product_name + '.$F4.ifd')
+            'ifd', format_pattern(product_name + '.', '.ifd',
+                token=TOKEN_HOUDINI))
         out_path = os.path.join(create_action.product_repr.area.path,
-            product_name + '.$F4.' + file_type)
+            format_pattern(product_name + '.', '.' + file_type,
+                token=TOKEN_HOUDINI))
 
         # by default, the mantra frame range has an expression on frame numbers
         render_node.parm('f1').deleteAllKeyframes()
@@ -5,8 +5,12 @@ from PySide import QtCore, QtGui
 class SubscriptionTreeWidget(QtGui.QTreeWidget):
 
     # -------------------------------------------------------------------------
-    def __init__(self, subscriptions, show_categories=None, parent=None):
+    def __init__(self, subscriptions, show_categories=None,
+        availability=None, parent=None):
 
+        # when given, representations not available at the index's location
+        # are left out
+        self._availability = availability
         self._show_categories = show_categories
         self._category_items = dict()
         self._repr_items = []
@@ -49,6 +53,10 @@ class SubscriptionTreeWidget(QtGui.QTreeWidget):
     # -------------------------------------------------------------------------
     def add_representation(self, representation):
 
+        if self._availability and \
+            not self._availability.is_available(representation.spec):
+            return None
+
         repr_item = SubscriptionTreeWidgetItem(representation)
         category = repr_item.product.category
 
@@ -7,7 +7,7 @@ from dpa.app.entity import EntityError
 from dpa.app.session import SessionRegistry
 from dpa.ui.action.options import ActionOptionWidget
 from dpa.ui.icon.factory import IconFactory
-from dpa.ui.product.subscription import SubscriptionTreeWidget
+from dpa.ui.product.subscription.model import SubscriptionTreeView
 
 # list product representations for all subscriptions
 # select representations
@@ -50,13 +50,11 @@ class SubscriptionImportWizard(QtGui.QWizard):
         self.setOption(QtGui.QWizard.CancelButtonOnLeft, on=True)
         self.setButtonText(QtGui.QWizard.FinishButton, 'Import')
 
-        self._subs_widget.itemSelectionChanged.connect(self._toggle_options)
-
-        if not self._subs_widget.repr_items: 
-            QtGui.QMessageBox.warning(self.parent(), "Import Warning",
-                "<b>No subs available to Import</b>."
-            )
-            self.NO_SUBS = True
+        # the subscriptions are fetched in the background
+        subs_model = self._subs_widget.model()
+        subs_model.representations_added.connect(self._add_options)
+        subs_model.loaded.connect(self._check_loaded)
+        self._subs_widget.selection_changed.connect(self._toggle_options)
 
     # -------------------------------------------------------------------------
     def accept(self):
@@ -96,6 +94,11 @@ class SubscriptionImportWizard(QtGui.QWizard):
 
         super(SubscriptionImportWizard, self).accept()
 
+    # -------------------------------------------------------------------------
+    def done(self, result):
+        self._subs_widget.model().cancel()
+        super(SubscriptionImportWizard, self).done(result)
+
     # -------------------------------------------------------------------------
     def showEvent(self, event):
         super(SubscriptionImportWizard, self).showEvent(event)
@@ -115,46 +118,9 @@ class SubscriptionImportWizard(QtGui.QWizard):
 
         self._options = defaultdict(dict)
 
+        # filled in as the representations are fetched
         options_layout = QtGui.QVBoxLayout()
-
-        for repr_item in self._subs_widget.repr_items:
-            representation = repr_item.representation
-
-            entity_class = self._category_lookup[repr_item.product.category]
-            option_config = entity_class.option_config(
-                self.session, 'import', file_type=representation.type)
-
-            display_name = repr_item.product.name
-            if representation.resolution != "none":
-                display_name += " @" + representation.resolution
-            display_name += " (." + representation.type + " " + \
-                repr_item.product.category + ")"
-
-            option_widget = ActionOptionWidget(option_config, 
-                name=display_name)
-            option_header = option_widget.header
-
-            form_layout = QtGui.QFormLayout()
-            form_layout.addRow(option_header)
-
-            spacer = QtGui.QLabel()
-            spacer.setFixedWidth(10)
-
-            form_layout.addRow(option_widget)
-
-            options_layout.addLayout(form_layout)
-
-            h_rule = QtGui.QFrame()
-            h_rule.setLineWidth(0)
-            h_rule.setMidLineWidth(0)
-            h_rule.setFrameStyle(QtGui.QFrame.HLine | QtGui.QFrame.Plain)
-
-            options_layout.addWidget(h_rule)
-
-            self._options[representation]['widget'] = option_widget
-            self._options[representation]['header'] = option_header
-
-            option_widget.value_changed.connect(self._check_option_values)
+        self._options_layout = options_layout
 
         options_layout.addStretch()
 
@@ -186,8 +152,10 @@ class SubscriptionImportWizard(QtGui.QWizard):
         page.setSubTitle(
             "Select the subs you'd like to import.")
 
-        self._subs_widget = SubscriptionTreeWidget(self.subs, 
-            show_categories=self._category_lookup.keys())
+        # only what can be imported here
+        self._subs_widget = SubscriptionTreeView(lambda: self.subs,
+            show_categories=self._category_lookup.keys(),
+            available_only=True)
         self._subs_widget.setFocusPolicy(QtCore.Qt.NoFocus)
 
         layout = QtGui.QVBoxLayout()
@@ -215,6 +183,63 @@ class SubscriptionImportWizard(QtGui.QWizard):
 
         return self._subs
 
+    # -------------------------------------------------------------------------
+    def _add_options(self, repr_items):
+
+        # before the stretch at the end of the options
+        insert_at = self._options_layout.count() - 1
+
+        for repr_item in repr_items:
+            representation = repr_item.representation
+
+            entity_class = self._category_lookup[repr_item.product.category]
+            option_config = entity_class.option_config(
+                self.session, 'import', file_type=representation.type)
+
+            display_name = repr_item.product.name
+            if representation.resolution != "none":
+                display_name += " @" + representation.resolution
+            display_name += " (." + representation.type + " " + \
+                repr_item.product.category + ")"
+
+            option_widget = ActionOptionWidget(option_config, 
+                name=display_name)
+            option_header = option_widget.header
+
+            form_layout = QtGui.QFormLayout()
+            form_layout.addRow(option_header)
+
+            spacer = QtGui.QLabel()
+            spacer.setFixedWidth(10)
+
+            form_layout.addRow(option_widget)
+
+            self._options_layout.insertLayout(insert_at, form_layout)
+
+            h_rule = QtGui.QFrame()
+            h_rule.setLineWidth(0)
+            h_rule.setMidLineWidth(0)
+            h_rule.setFrameStyle(QtGui.QFrame.HLine | QtGui.QFrame.Plain)
+
+            self._options_layout.insertWidget(insert_at + 1, h_rule)
+            insert_at += 2
+
+            self._options[representation]['widget'] = option_widget
+            self._options[representation]['header'] = option_header
+
+            option_widget.value_changed.connect(self._check_option_values)
+
+        self._toggle_options()
+
+    # -------------------------------------------------------------------------
+    def _check_loaded(self):
+
+        if not self._subs_widget.repr_items:
+            QtGui.QMessageBox.warning(self, "Import Warning",
+                "<b>No subs available to Import</b>."
+            )
+            self.NO_SUBS = True
+
     # -------------------------------------------------------------------------
     def _check_option_values(self):
 
@@ -0,0 +1,590 @@
+"""A subscription tree model populated in the background.
+
+Listing the representations of each subscription, and the product and
+version behind each of them, takes several requests per subscription. The
+model fetches them in bulk on a worker thread instead, so the views using it
+show up immediately: a placeholder row per subscription is replaced by the
+subscription's representations once they arrive. Category rows are filled
+in batches as the view asks for them.
+
+"""
+
+# -----------------------------------------------------------------------------
+# Imports:
+# -----------------------------------------------------------------------------
+
+from PySide import QtCore, QtGui
+
+from dpa.product.representation import ProductRepresentationError
+from dpa.product.representation.availability import AvailabilityIndex
+from dpa.product.representation.status import (
+    ProductRepresentationStatusError,
+)
+from dpa.product.subscription.resolver import SubscriptionResolver
+from dpa.product.version import ProductVersionError
+from dpa.ptask.spec import PTaskSpec
+
+# -----------------------------------------------------------------------------
+# Globals:
+# -----------------------------------------------------------------------------
+
+# rows added to a category each time the view asks for more
+FETCH_BATCH = 100
+
+LOADING = "Loading ..."
+
+# fetchers still running, kept alive until they finish
+_fetchers = set()
+
+# -----------------------------------------------------------------------------
+# Public Classes:
+# -----------------------------------------------------------------------------
+class SubscriptionFetcher(QtCore.QThread):
+    """Fetches subscriptions and their representations on a worker thread.
+
+    ``subscriptions`` may be a callable returning them, which is called on
+    the worker thread too.
+
+    """
+
+    subscriptions_fetched = QtCore.Signal(object)
+    versions_fetched = QtCore.Signal(object)
+    representations_fetched = QtCore.Signal(object)
+    failed = QtCore.Signal(str)
+
+    # -------------------------------------------------------------------------
+    def __init__(self, subscriptions, available_only=False, parent=None):
+
+        super(SubscriptionFetcher, self).__init__(parent=parent)
+
+        self._subscriptions = subscriptions
+        self._available_only = available_only
+        self._cancelled = False
+
+    # -------------------------------------------------------------------------
+    def cancel(self):
+        self._cancelled = True
+
+    # -------------------------------------------------------------------------
+    def run(self):
+
+        try:
+            self._fetch()
+        except Exception as e:
+            if not self._cancelled:
+                self.failed.emit(str(e))
+
+    # -------------------------------------------------------------------------
+    def _fetch(self):
+
+        subscriptions = self._subscriptions
+        if callable(subscriptions):
+            subscriptions = subscriptions()
+        subscriptions = list(subscriptions or [])
+
+        if self._cancelled:
+            return
+        self.subscriptions_fetched.emit(subscriptions)
+
+        # product version spec -> (product, product version)
+        resolver = SubscriptionResolver(subscriptions)
+        versions = {}
+        for sub in subscriptions:
+            spec = sub.product_version_spec
+            try:
+                versions[spec] = (resolver.product(spec),
+                    resolver.product_version(spec))
+            except (KeyError, ProductVersionError):
+                continue
+
+        if self._cancelled:
+            return
+        self.versions_fetched.emit(versions)
+
+        # a failed listing fails the fetch. the subscriptions would
+        # otherwise show up without any representations.
+        try:
+            availability = None
+            if self._available_only:
+                availability = AvailabilityIndex.for_subscriptions(
+                    subscriptions)
+
+            # product version spec -> representations
+            representations = {}
+            for sub in subscriptions:
+                spec = sub.product_version_spec
+                product_reprs = resolver.representations(spec)
+                if availability:
+                    product_reprs = availability.filter(product_reprs)
+                representations[spec] = product_reprs
+        except (ProductRepresentationError,
+            ProductRepresentationStatusError) as e:
+            if not self._cancelled:
+                self.failed.emit(str(e))
+            return
+
+        if self._cancelled:
+            return
+        self.representations_fetched.emit(representations)
+
+# -----------------------------------------------------------------------------
+class SubscriptionModel(QtCore.QAbstractItemModel):
+    """Representations of subscriptions, grouped by product category.
+
+    Rows are placeholders for subscriptions until their representations
+    have been fetched. Only representation rows are selectable.
+
+    """
+
+    COLUMNS = ['Subscriptions', 'Produced by']
+
+    # a list of the representation items added
+    representations_added = QtCore.Signal(list)
+
+    # everything has been fetched
+    loaded = QtCore.Signal()
+
+    failed = QtCore.Signal(str)
+
+    # -------------------------------------------------------------------------
+    def __init__(self, subscriptions, show_categories=None,
+        available_only=False, parent=None):
+
+        super(SubscriptionModel, self).__init__(parent=parent)
+
+        self._subscriptions = subscriptions
+        self._show_categories = show_categories
+        self._available_only = available_only
+
+        self._root = _Node(None)
+        self._root.children.append(_Node(self._root, text=LOADING))
+
+        self._categories = {}
+        self._sub_nodes = {}
+        self._repr_items = []
+        self._is_loaded = False
+        self._fetcher = None
+
+    # -------------------------------------------------------------------------
+    def load(self):
+        """Start fetching in the background."""
+
+        if self._fetcher:
+            return
+
+        fetcher = SubscriptionFetcher(self._subscriptions,
+            available_only=self._available_only)
+        fetcher.subscriptions_fetched.connect(self._add_subscriptions)
+        fetcher.versions_fetched.connect(self._add_versions)
+        fetcher.representations_fetched.connect(self._add_representations)
+        fetcher.failed.connect(self._failed)
+        fetcher.finished.connect(lambda: _fetchers.discard(fetcher))
+
+        _fetchers.add(fetcher)
+        self._fetcher = fetcher
+        fetcher.start()
+
+    # -------------------------------------------------------------------------
+    def cancel(self):
+        """Ignore anything still being fetched."""
+
+        if self._fetcher:
+            self._fetcher.cancel()
+
+    # -------------------------------------------------------------------------
+    def item(self, index):
+        """The item for an index, or None for the root."""
+
+        if not index.isValid():
+            return None
+
+        return index.internalPointer()
+
+    # -------------------------------------------------------------------------
+    # Model interface:
+    # -------------------------------------------------------------------------
+    def canFetchMore(self, parent):
+
+        node = self.item(parent) or self._root
+        return bool(node.pending)
+
+    # -------------------------------------------------------------------------
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.COLUMNS)
+
+    # -------------------------------------------------------------------------
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+
+        node = self.item(index)
+        if node is None:
+            return None
+
+        if role == QtCore.Qt.DisplayRole:
+            return node.column(index.column())
+
+        if role == QtCore.Qt.ToolTipRole and node.product:
+            return node.product.description
+
+        if role == QtCore.Qt.ForegroundRole and node.is_placeholder:
+            return QtGui.QBrush(QtCore.Qt.gray)
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def fetchMore(self, parent):
+
+        node = self.item(parent) or self._root
+
+        batch = node.pending[:FETCH_BATCH]
+        if not batch:
+            return
+
+        first = len(node.children)
+        self.beginInsertRows(parent, first, first + len(batch) - 1)
+        node.children.extend(batch)
+        del node.pending[:len(batch)]
+        self.endInsertRows()
+
+    # -------------------------------------------------------------------------
+    def flags(self, index):
+
+        node = self.item(index)
+        if node is None:
+            return QtCore.Qt.NoItemFlags
+
+        if node.representation:
+            return QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+
+        return QtCore.Qt.ItemIsEnabled
+
+    # -------------------------------------------------------------------------
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+
+        node = self.item(parent) or self._root
+        return bool(node.children or node.pending)
+
+    # -------------------------------------------------------------------------
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+
+        if orientation == QtCore.Qt.Horizontal and \
+            role == QtCore.Qt.DisplayRole:
+            return self.COLUMNS[section]
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+
+        node = self.item(parent) or self._root
+        if row < 0 or row >= len(node.children):
+            return QtCore.QModelIndex()
+
+        return self.createIndex(row, column, node.children[row])
+
+    # -------------------------------------------------------------------------
+    def parent(self, index):
+
+        node = self.item(index)
+        if node is None or node.parent is self._root:
+            return QtCore.QModelIndex()
+
+        return self._index_of(node.parent)
+
+    # -------------------------------------------------------------------------
+    def rowCount(self, parent=QtCore.QModelIndex()):
+
+        node = self.item(parent) or self._root
+        return len(node.children)
+
+    # -------------------------------------------------------------------------
+    # Properties:
+    # -------------------------------------------------------------------------
+    @property
+    def is_loaded(self):
+        return self._is_loaded
+
+    # -------------------------------------------------------------------------
+    @property
+    def repr_items(self):
+        """The representation items fetched so far."""
+        return list(self._repr_items)
+
+    # -------------------------------------------------------------------------
+    # Private methods:
+    # -------------------------------------------------------------------------
+    def _add_subscriptions(self, subscriptions):
+
+        self._clear_root()
+
+        for sub in subscriptions:
+            spec = sub.product_version_spec
+            (ptask_spec, name, category) = _product_parts(spec)
+
+            if self._show_categories and \
+                category not in self._show_categories:
+                continue
+
+            category_node = self._categories.get(category)
+            if category_node is None:
+                category_node = _Node(self._root, text=category)
+                self._categories[category] = category_node
+                self._insert(self._root, [category_node])
+
+            sub_node = _Node(category_node, text=name + "  " + LOADING,
+                produced_by=ptask_spec)
+            sub_node.is_placeholder = True
+            self._sub_nodes.setdefault(spec, []).append(sub_node)
+            category_node.pending.append(sub_node)
+
+    # -------------------------------------------------------------------------
+    def _add_versions(self, versions):
+
+        for (spec, (product, version)) in versions.iteritems():
+            for sub_node in self._sub_nodes.get(spec, []):
+                sub_node.product = product
+                sub_node.product_version = version
+                sub_node.produced_by = _produced_by(product, version)
+                self._changed(sub_node)
+
+    # -------------------------------------------------------------------------
+    def _add_representations(self, representations):
+
+        added = []
+
+        for (spec, sub_nodes) in self._sub_nodes.iteritems():
+            for sub_node in sub_nodes:
+                repr_nodes = [
+                    _Node(sub_node.parent, product=sub_node.product,
+                        product_version=sub_node.product_version,
+                        representation=r, produced_by=sub_node.produced_by)
+                    for r in representations.get(spec, [])
+                    if sub_node.product
+                ]
+                self._replace(sub_node, repr_nodes)
+                added.extend(repr_nodes)
+
+        # categories left without anything to import
+        for (category, category_node) in self._categories.items():
+            if not category_node.children and not category_node.pending:
+                self._remove(category_node)
+                del self._categories[category]
+
+        self._sub_nodes = {}
+        self._repr_items.extend(added)
+        self._is_loaded = True
+
+        if added:
+            self.representations_added.emit(added)
+        self.loaded.emit()
+
+    # -------------------------------------------------------------------------
+    def _changed(self, node):
+
+        if node.parent.pending and node in node.parent.pending:
+            return
+
+        self.dataChanged.emit(self._index_of(node),
+            self._index_of(node, len(self.COLUMNS) - 1))
+
+    # -------------------------------------------------------------------------
+    def _clear_root(self):
+
+        placeholders = [n for n in self._root.children if n.text == LOADING]
+        for node in placeholders:
+            self._remove(node)
+
+    # -------------------------------------------------------------------------
+    def _failed(self, message):
+
+        self._clear_root()
+        self._insert(self._root,
+            [_Node(self._root,
+                text="Unable to load subscriptions: " + message)])
+        self._is_loaded = True
+
+        self.failed.emit(message)
+        self.loaded.emit()
+
+    # -------------------------------------------------------------------------
+    def _index_of(self, node, column=0):
+
+        if node is self._root:
+            return QtCore.QModelIndex()
+
+        return self.createIndex(node.parent.children.index(node), column,
+            node)
+
+    # -------------------------------------------------------------------------
+    def _insert(self, parent_node, nodes, row=None):
+
+        if not nodes:
+            return
+
+        if row is None:
+            row = len(parent_node.children)
+
+        self.beginInsertRows(self._index_of(parent_node), row,
+            row + len(nodes) - 1)
+        parent_node.children[row:row] = nodes
+        self.endInsertRows()
+
+    # -------------------------------------------------------------------------
+    def _remove(self, node):
+
+        row = node.parent.children.index(node)
+        self.beginRemoveRows(self._index_of(node.parent), row, row)
+        del node.parent.children[row]
+        self.endRemoveRows()
+
+    # -------------------------------------------------------------------------
+    def _replace(self, node, nodes):
+
+        parent_node = node.parent
+
+        # rows the view hasn't asked for yet are replaced quietly
+        if node in parent_node.pending:
+            row = parent_node.pending.index(node)
+            parent_node.pending[row:row + 1] = nodes
+            return
+
+        row = parent_node.children.index(node)
+        self._remove(node)
+        self._insert(parent_node, nodes, row=row)
+
+# -----------------------------------------------------------------------------
+class SubscriptionTreeView(QtGui.QTreeView):
+    """A view of a :py:class:`SubscriptionModel`, loading as it opens."""
+
+    selection_changed = QtCore.Signal()
+
+    # -------------------------------------------------------------------------
+    def __init__(self, subscriptions, show_categories=None,
+        available_only=False, parent=None):
+
+        super(SubscriptionTreeView, self).__init__(parent=parent)
+
+        self.setAllColumnsShowFocus(True)
+        self.setAnimated(True)
+        self.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+        self.setUniformRowHeights(True)
+
+        model = SubscriptionModel(subscriptions,
+            show_categories=show_categories, available_only=available_only,
+            parent=self)
+        self.setModel(model)
+
+        model.rowsInserted.connect(self._rows_inserted)
+        model.loaded.connect(self._resize_columns)
+        self.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.selection_changed.emit())
+
+        model.load()
+
+    # -------------------------------------------------------------------------
+    def closeEvent(self, event):
+        self.model().cancel()
+        super(SubscriptionTreeView, self).closeEvent(event)
+
+    # -------------------------------------------------------------------------
+    def select_all_representations(self):
+
+        model = self.model()
+
+        # rows not shown yet can't be selected
+        for row in range(model.rowCount()):
+            category_index = model.index(row, 0)
+            while model.canFetchMore(category_index):
+                model.fetchMore(category_index)
+
+        for repr_item in self.repr_items:
+            self.selectionModel().select(
+                self.model()._index_of(repr_item),
+                QtGui.QItemSelectionModel.Select | \
+                    QtGui.QItemSelectionModel.Rows)
+
+    # -------------------------------------------------------------------------
+    def selected_repr_items(self):
+
+        items = [self.model().item(i)
+            for i in self.selectionModel().selectedRows()]
+
+        return [i for i in items if i and i.representation]
+
+    # -------------------------------------------------------------------------
+    def selected_representations(self):
+        return [i.representation for i in self.selected_repr_items()]
+
+    # -------------------------------------------------------------------------
+    @property
+    def repr_items(self):
+        return self.model().repr_items
+
+    # -------------------------------------------------------------------------
+    def _resize_columns(self):
+
+        for col in range(0, self.model().columnCount()):
+            self.resizeColumnToContents(col)
+
+    # -------------------------------------------------------------------------
+    def _rows_inserted(self, parent, first, last):
+
+        # categories open as they appear, filling in as they are scrolled
+        if not parent.isValid():
+            for row in range(first, last + 1):
+                self.expand(self.model().index(row, 0, parent))
+
+# -----------------------------------------------------------------------------
+# Private Classes:
+# -----------------------------------------------------------------------------
+class _Node(object):
+    """A row of the model: a category, subscription or representation."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, parent, text="", product=None, product_version=None,
+        representation=None, produced_by=""):
+
+        self.parent = parent
+        self.children = []
+        self.pending = []
+        self.text = text
+        self.product = product
+        self.product_version = product_version
+        self.representation = representation
+        self.produced_by = produced_by
+        self.is_placeholder = False
+
+    # -------------------------------------------------------------------------
+    def column(self, column):
+
+        if column == 1:
+            return self.produced_by
+
+        if not self.representation:
+            return self.text
+
+        # as the import option headers name them
+        display_name = self.product.name
+        if self.representation.resolution != "none":
+            display_name += " @" + self.representation.resolution
+        display_name += " (" + self.representation.type + ")"
+
+        return display_name
+
+# -----------------------------------------------------------------------------
+# Private Functions:
+# -----------------------------------------------------------------------------
+def _produced_by(product, version):
+    return product.ptask_spec + ' v' + version.number_padded
+
+# -----------------------------------------------------------------------------
+def _product_parts(product_version_spec):
+
+    # <ptask>=products=<name>=<category>=<version>
+    parts = product_version_spec.split(PTaskSpec.SEPARATOR)
+    product_index = parts.index(PTaskSpec.PRODUCT_SEPARATOR)
+
+    return (
+        PTaskSpec.SEPARATOR.join(parts[:product_index]),
+        parts[product_index + 1],
+        parts[product_index + 2],
+    )